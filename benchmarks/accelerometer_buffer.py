@@ -0,0 +1,88 @@
+"""
+Compares the deque-based `Accelerometer` with `RingBufferAccelerometer`.
+
+For each input rate the script feeds the same number of seconds of
+32-sample HBK messages into both backends and reports:
+    - ingestion throughput (messages/s)
+    - memory held by the buffer after ingestion (tracemalloc)
+    - read throughput when draining the buffer in 1 s chunks (samples/s)
+"""
+import argparse
+import contextlib
+import os
+import struct
+import time
+import tracemalloc
+from unittest.mock import MagicMock
+import numpy as np
+
+from data.accel.hbk.accelerometer import Accelerometer, RingBufferAccelerometer
+from data.accel.constants import MAX_MAP_SIZE
+
+RATES_HZ = [250, 1_000, 10_000, 50_000]
+BATCH_SIZE = 32
+
+
+class _Message:  # pylint: disable=too-few-public-methods
+    def __init__(self, payload: bytes):
+        self.topic = "bench"
+        self.payload = payload
+
+
+def make_messages(rate: int, seconds: float):
+    """Builds the HBK binary messages for `seconds` of data at `rate` Hz."""
+    num_messages = max(1, int(rate * seconds) // BATCH_SIZE)
+    samples = np.random.default_rng(0).standard_normal(
+        num_messages * BATCH_SIZE).astype("<f4")
+    messages = []
+    for i in range(num_messages):
+        key = i * BATCH_SIZE
+        descriptor = struct.pack("<HHQQQ", 28, 1, 0, 0, key)
+        messages.append(_Message(descriptor + samples[key:key + BATCH_SIZE].tobytes()))
+    return messages
+
+
+def run_backend(cls, messages, map_size: int, read_chunk: int):
+    tracemalloc.start()
+    acc = cls(MagicMock(), topic="bench", map_size=map_size)
+    # The backends log every message; keep the console out of the timings
+    with open(os.devnull, "w", encoding="utf-8") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for msg in messages:
+            acc.process_message(msg)
+        ingest_time = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    total = 0
+    while True:
+        _, data = acc.read(read_chunk)
+        total += len(data)
+        if len(data) < read_chunk:
+            break
+    read_time = time.perf_counter() - start
+    return len(messages) / ingest_time, memory, total / read_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10.0,
+                        help="Seconds of data generated per rate")
+    parser.add_argument("--map-size", type=int, default=MAX_MAP_SIZE,
+                        help="Samples retained per channel")
+    args = parser.parse_args()
+
+    print(f"{'rate [Hz]':>10} {'backend':>10} {'ingest [msg/s]':>15} "
+          f"{'memory [MB]':>12} {'read [samples/s]':>17}")
+    for rate in RATES_HZ:
+        messages = make_messages(rate, args.seconds)
+        for name, cls in (("deque", Accelerometer), ("ring", RingBufferAccelerometer)):
+            ingest, memory, read = run_backend(cls, messages, args.map_size, rate)
+            print(f"{rate:>10} {name:>10} {ingest:>15,.0f} "
+                  f"{memory / 1e6:>12.2f} {read:>17,.0f}")
+
+
+if __name__ == "__main__":
+    main()
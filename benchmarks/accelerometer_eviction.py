@@ -0,0 +1,85 @@
+"""
+Measures the per-message latency of `Accelerometer` once its buffer is full.
+
+The buffer is filled to `MAX_MAP_SIZE` samples, then further 32-sample
+batches are stored so that every message triggers an eviction. The
+"before" row replays the previous eviction loop, which rescanned the
+whole map for every evicted sample; the "after" row uses the running
+sample counter and ordered key index.
+"""
+import argparse
+import time
+from collections import deque
+from unittest.mock import MagicMock
+import numpy as np
+
+from data.accel.hbk.accelerometer import Accelerometer
+from data.accel.constants import MAX_MAP_SIZE
+
+BATCH_SIZE = 32
+
+
+class RescanAccelerometer(Accelerometer):
+    """The eviction loop used before the running counter was introduced."""
+
+    def _store(self, samples_from_daq_start, accel_values):
+        with self._lock:
+            if samples_from_daq_start not in self.data_map:
+                self.data_map[samples_from_daq_start] = deque(accel_values.tolist())
+
+            total_samples = sum(len(dq) for dq in self.data_map.values())
+            while total_samples > self._map_size:
+                oldest_key = min(self.data_map.keys())
+                oldest_deque = self.data_map[oldest_key]
+                oldest_deque.popleft()
+                if not oldest_deque:
+                    del self.data_map[oldest_key]
+                total_samples = sum(len(dq) for dq in self.data_map.values())
+
+
+def fill(map_size: int) -> Accelerometer:
+    acc = Accelerometer(MagicMock(), topic="bench", map_size=map_size)
+    batch = np.zeros(BATCH_SIZE, dtype=np.float32)
+    for key in range(0, map_size, BATCH_SIZE):
+        acc._store(key, batch)  # pylint: disable=protected-access
+    return acc
+
+
+def measure(acc: Accelerometer, first_key: int, messages: int) -> np.ndarray:
+    batch = np.zeros(BATCH_SIZE, dtype=np.float32)
+    latencies = np.empty(messages)
+    for i in range(messages):
+        start = time.perf_counter()
+        acc._store(first_key + i * BATCH_SIZE, batch)  # pylint: disable=protected-access
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--map-size", type=int, default=MAX_MAP_SIZE)
+    parser.add_argument("--messages-before", type=int, default=5,
+                        help="Messages timed with the rescanning loop (slow)")
+    parser.add_argument("--messages-after", type=int, default=10_000)
+    args = parser.parse_args()
+
+    map_size = args.map_size - args.map_size % BATCH_SIZE
+    print(f"Filling {map_size:,} samples ({map_size // BATCH_SIZE:,} batches)...")
+    acc = fill(map_size)
+
+    before = RescanAccelerometer(MagicMock(), topic="bench", map_size=map_size)
+    before.data_map = {key: deque(batch) for key, batch in acc.data_map.items()}
+    results = {
+        "before": measure(before, map_size, args.messages_before),
+        "after": measure(acc, map_size, args.messages_after),
+    }
+
+    print(f"{'':>8} {'messages':>9} {'mean [us]':>12} {'p99 [us]':>12} {'max [us]':>12}")
+    for name, latencies in results.items():
+        micros = latencies * 1e6
+        print(f"{name:>8} {len(micros):>9} {micros.mean():>12,.1f} "
+              f"{np.percentile(micros, 99):>12,.1f} {micros.max():>12,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measures `Aligner.extract` for a 5-minute window at 250 Hz (75,000 samples)
+with 2, 8 and 64 channels.
+
+Data arrives in 32-sample batches and `extract` is polled every
+`--poll-seconds` of data, as `sys_id.publish_oma_results` does. The
+"window" column times the call that returns the full window, "total" the
+sum over all polls, and "ingest" the time spent storing the batches,
+including the listener the aligner registers on every channel. "before"
+replays the previous extraction, which walked every key, sample index and
+channel in nested Python loops; "after" copies each batch into the
+aligner's float32 block as soon as every channel stored it, so a poll only
+slices the window from the block. "poll" times a call that cannot be served yet, with the
+whole buffer filled: the previous extraction rebuilt and intersected the
+key sets of all channels, the alignment index answers in O(1).
+"""
+import argparse
+import contextlib
+import os
+import time
+from typing import Tuple
+from datetime import datetime
+from unittest.mock import MagicMock
+import numpy as np
+
+from data.accel.hbk.aligner import Aligner
+
+BATCH_SIZE = 32
+
+
+class NestedLoopAligner(Aligner):
+    """The extraction used before the aligned block was introduced."""
+
+    def extract(self, requested_samples):
+        with self._lock:
+            batch_size, key_groups = self.find_continuous_key_groups()
+            for group in key_groups:
+                if len(group) * batch_size >= requested_samples:
+                    return self._extract_group(group, batch_size, requested_samples)
+            return np.empty((0, len(self.channels)), dtype=np.float32), None
+
+    def _on_batch(self, ch_idx, key, num_samples):
+        """Batches were only aligned at extraction."""
+
+    def _extract_group(self, group, batch_size, requested_samples):
+        aligned_data = [[] for _ in self.channels]
+        samples_collected = 0
+        for key in group:
+            entries = [ch.get_samples_for_key(key) for ch in self.channels]
+            for i in range(batch_size):
+                if samples_collected >= requested_samples:
+                    break
+                for ch_idx, channel_data in enumerate(entries):
+                    aligned_data[ch_idx].append(channel_data[i])
+                samples_collected += 1
+            if samples_collected >= requested_samples:
+                break
+        for ch in self.channels:
+            ch.clear_used_data(group[0], requested_samples)
+        return np.array(aligned_data, dtype=np.float32), datetime.now()
+
+
+def measure(aligner_cls, num_channels: int, num_samples: int,  # pylint: disable=too-many-locals
+            poll_batches: int) -> Tuple[float, float, float]:
+    topics = [f"bench/{ch}" for ch in range(num_channels)]
+    aligner = aligner_cls(MagicMock(), topics, map_size=num_samples + BATCH_SIZE)
+    batch = np.zeros(BATCH_SIZE, dtype=np.float32)
+    total = window = ingest = 0.0
+    with open(os.devnull, "w", encoding="utf-8") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        for key in range(0, num_samples, BATCH_SIZE):
+            start = time.perf_counter()
+            for ch in aligner.channels:
+                ch._store(key, batch)  # pylint: disable=protected-access
+            ingest += time.perf_counter() - start
+            last = key + BATCH_SIZE == num_samples
+            if not last and (key // BATCH_SIZE + 1) % poll_batches:
+                continue
+            start = time.perf_counter()
+            data, _ = aligner.extract(num_samples)
+            window = time.perf_counter() - start
+            total += window
+    assert data.shape == (num_channels, num_samples)
+    return window, total, ingest
+
+
+def measure_poll(aligner_cls, num_channels: int, num_samples: int, repeats: int) -> float:
+    topics = [f"bench/{ch}" for ch in range(num_channels)]
+    aligner = aligner_cls(MagicMock(), topics, map_size=num_samples + BATCH_SIZE)
+    batch = np.zeros(BATCH_SIZE, dtype=np.float32)
+    for ch in aligner.channels:
+        for key in range(0, num_samples, BATCH_SIZE):
+            ch._store(key, batch)  # pylint: disable=protected-access
+    aligner.extract(num_samples + BATCH_SIZE)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        aligner.extract(num_samples + BATCH_SIZE)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=75_000)
+    parser.add_argument("--channels", type=int, nargs="+", default=[2, 8, 64])
+    parser.add_argument("--fs", type=float, default=250.0)
+    parser.add_argument("--poll-seconds", type=float, default=10.0)
+    parser.add_argument("--poll-repeats", type=int, default=20)
+    args = parser.parse_args()
+    num_samples = args.samples - args.samples % BATCH_SIZE
+    poll_batches = max(1, int(args.poll_seconds * args.fs) // BATCH_SIZE)
+
+    print(f"{num_samples:,} samples, polled every {poll_batches * BATCH_SIZE} samples")
+    print(f"{'channels':>8} {'':>7} {'window [ms]':>12} {'total [ms]':>12} {'ingest [ms]':>12} "
+          f"{'poll [ms]':>10}")
+    for num_channels in args.channels:
+        for name, aligner_cls in (("before", NestedLoopAligner), ("after", Aligner)):
+            window, total, ingest = measure(aligner_cls, num_channels, num_samples, poll_batches)
+            poll = measure_poll(aligner_cls, num_channels, num_samples, args.poll_repeats)
+            print(f"{num_channels:>8} {name:>7} {window * 1e3:>12,.1f} {total * 1e3:>12,.1f} "
+                  f"{ingest * 1e3:>12,.1f} {poll * 1e3:>10,.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures the decode throughput of HBK data messages.
+
+Compares the previous decoding, a `struct.unpack` of the descriptor and
+of every sample into a tuple of Python floats, with `codec.decode`, which
+returns a float32 view over the payload. The "decode+store" rows also
+copy the samples into a preallocated float32 channel buffer, which is
+what the ring buffer backend does with every message.
+"""
+import argparse
+import struct
+import time
+import numpy as np
+
+from data.accel.hbk import codec
+
+
+def decode_with_struct(payload: bytes):
+    descriptor_length = struct.unpack("<H", payload[:2])[0]
+    descriptor = struct.unpack("<HHQQQ", payload[:descriptor_length])
+    data_payload = payload[descriptor_length:]
+    return descriptor, struct.unpack(f"<{len(data_payload) // 4}f", data_payload)
+
+
+def measure(decode, payloads, repeats: int, store: np.ndarray = None) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for payload in payloads:
+            _, samples = decode(payload)
+            if store is not None:
+                store[:len(samples)] = samples
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'samples/msg':>12} {'decoder':>8} {'mode':>13} {'messages/s':>14} {'MB/s':>10}")
+    for batch_size in (32, 256, 4096):
+        payloads = [codec.encode(rng.standard_normal(batch_size), i * batch_size)
+                    for i in range(args.messages)]
+        megabytes = sum(len(p) for p in payloads) * args.repeats / 1e6
+        store = np.zeros(batch_size, dtype=np.float32)
+        for name, decode in (("struct", decode_with_struct), ("codec", codec.decode)):
+            for mode, target in (("decode", None), ("decode+store", store)):
+                elapsed = measure(decode, payloads, args.repeats, target)
+                print(f"{batch_size:>12} {name:>8} {mode:>13} "
+                      f"{args.messages * args.repeats / elapsed:>14,.0f} "
+                      f"{megabytes / elapsed:>10,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measures MAC throughput in pairs/s for stacks of complex mode shapes.
+
+"per pair" replays `mode_track.calculate_mac` called once per pair inside
+a Python loop, as `clusterexpansion` and `pair_calculate` did before, and
+"double loop" replays the previous `genWrapper.MAC`, which divided the
+numerators element by element. The remaining columns are the batched
+`mac.mac_matrix` in double precision, in single precision (complex64)
+and in double precision with chunks of 256 rows. The slow loops are
+timed on a subset of the pairs.
+"""
+# pylint: disable=invalid-name
+import argparse
+import time
+import numpy as np
+
+from methods.packages import mac
+
+LOOP_PAIRS = 20_000
+
+
+def calculate_mac_loop(phi_X, phi_A):
+    """One MAC per pair, as the mode tracking loops computed it."""
+    result = np.empty((phi_X.shape[0], phi_A.shape[0]))
+    for i, reference_mode in enumerate(phi_X):
+        for j, mode_shape in enumerate(phi_A):
+            numerator = np.abs(np.dot(reference_mode.conj().T, mode_shape)) ** 2
+            denominator = (np.dot(reference_mode.conj().T, reference_mode)
+                           * np.dot(mode_shape.conj().T, mode_shape))
+            result[i, j] = np.real(numerator / denominator)
+    return result
+
+
+def gen_mac_double_loop(phi_X, phi_A):
+    """The previous genWrapper.MAC, for (n_locations, n_modes) matrices."""
+    phi_X, phi_A = phi_X.T, phi_A.T
+    MAC = np.abs(np.conj(phi_X).T @ phi_A) ** 2
+    MAC = MAC.astype(complex)
+    for i in range(phi_X.shape[1]):
+        for j in range(phi_A.shape[1]):
+            MAC[i, j] = MAC[i, j] / (
+                np.conj(phi_X[:, i]) @ phi_X[:, i] * np.conj(phi_A[:, j]) @ phi_A[:, j]
+            )
+    return MAC.real
+
+
+def pairs_per_second(func, phi_X, phi_A, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(phi_X, phi_A)
+        best = min(best, time.perf_counter() - start)
+    return phi_X.shape[0] * phi_A.shape[0] / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", type=int, nargs="+", default=[100, 1000, 4000])
+    parser.add_argument("--locations", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    columns = ("per pair", "double loop", "batched", "complex64", "chunked")
+    print(f"{'modes':>6} " + " ".join(f"{c + ' [pairs/s]':>22}" for c in columns))
+    for n_modes in args.modes:
+        shape = (n_modes, args.locations)
+        phi = rng.normal(size=shape) + 1j * rng.normal(size=shape)
+        loop_rows = max(1, min(n_modes, LOOP_PAIRS // n_modes))
+        rates = (
+            pairs_per_second(calculate_mac_loop, phi[:loop_rows], phi, 1),
+            pairs_per_second(gen_mac_double_loop, phi[:loop_rows], phi, 1),
+            pairs_per_second(mac.mac_matrix, phi, phi, args.repeats),
+            pairs_per_second(lambda x, a: mac.mac_matrix(x, a, dtype=np.complex64),
+                             phi, phi, args.repeats),
+            pairs_per_second(lambda x, a: mac.mac_matrix(x, a, chunk_size=256),
+                             phi, phi, args.repeats),
+        )
+        print(f"{n_modes:>6} " + " ".join(f"{rate:>22,.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Measures the final steps of `mode_track.mode_allingment` - removing repeated
+poles, filtering by `mstab`, sorting, cleaning by median, removing repeated
+clusters and gathering the mode shapes - on the expanded clusters of the
+expected sysid output of the 4-DOF test record
+(tests/integration/input_data/expected_sysid_output.npz), a sysid output of
+the same record with ordmax 40, and synthetic cluster lists of 100 - 10,000
+clusters on an ordmax 480 grid.
+
+"before" replays the previous steps over lists of cluster dicts; "after" is
+`mode_track._final_clusters`, which works on a `ClusterSet`. The clusters of
+both are checked to be identical.
+"""
+# pylint: disable=invalid-name, too-many-locals
+import argparse
+import contextlib
+import copy
+import io
+import logging
+import time
+import warnings
+import numpy as np
+
+from methods.constants import MSTAB_FACTOR, TMAC
+from methods.packages import mode_track
+
+EXPECTED_PATH = "tests/integration/input_data/expected_sysid_output.npz"
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+BOUNDS = 2
+NPZ_KEYS = {"Fn_poles": "frequencies", "Fn_poles_cov": "cov_freq", "Xi_poles": "damping_ratios",
+            "Xi_poles_cov": "cov_damping", "Phi_poles": "mode_shapes"}
+
+
+def clean_clusters_by_median_dicts(clusters, cov_freq, bound_multiplier=2):
+    """clean_clusters_by_median as it was before the ClusterSet."""
+    cleaned_clusters = []
+    for cluster in clusters:
+        f_cluster_values = np.array(cluster["f_values"])
+        z_cluster_values = np.array(cluster["z_values"])
+        cluster_indices = np.array(cluster["indices"])
+        f_cluster_cov = cov_freq[tuple(cluster_indices.T)]
+        f_unique_values, unique_indices = np.unique(f_cluster_values, return_index=True)
+        f_unique_cov = f_cluster_cov[unique_indices]
+        z_unique = z_cluster_values[unique_indices]
+        unique_indices_2D = cluster_indices[unique_indices]
+        cluster["f_values"] = f_unique_values
+        cluster["z_values"] = z_unique
+        cluster["indices"] = unique_indices_2D
+        median_value = np.nanmedian(f_unique_values)
+        lower_bound = f_unique_values - bound_multiplier * np.sqrt(f_unique_cov)
+        upper_bound = f_unique_values + bound_multiplier * np.sqrt(f_unique_cov)
+        mask = (median_value >= lower_bound) & (median_value <= upper_bound)
+        if len(f_unique_values[mask]) > 1:
+            cleaned_clusters.append({
+                "original_cluster": cluster,
+                "f_values": f_unique_values[mask],
+                "z_values": z_unique[mask],
+                "indices": unique_indices_2D[mask],
+                "median": median_value,
+                "bound_multiplier": bound_multiplier,
+            })
+    return cleaned_clusters
+
+
+def final_clusters_dicts(C_expanded, cov_freq, mode_shapes, mstab, bounds):
+    """The final steps of mode_allingment as they were before the ClusterSet."""
+    for cluster in C_expanded:
+        _, unique_indices = np.unique(cluster['f_values'], return_index=True)
+        cluster['f_values'] = cluster['f_values'][unique_indices]
+        cluster['indices'] = cluster['indices'][unique_indices]
+        cluster['z_values'] = cluster['z_values'][unique_indices]
+    C_expanded_filtered = [cluster for cluster in C_expanded if cluster['indices'].shape[0] > mstab]
+    C_expanded_filtered.sort(key=lambda cluster: cluster['confidence_interval'][0])
+    cleaned_clusters = clean_clusters_by_median_dicts(C_expanded_filtered, cov_freq, bound_multiplier=bounds)
+    seen = set()
+    uq_clusters = []
+    for d in cleaned_clusters:
+        f_values_tuple = tuple(d['f_values'])
+        if f_values_tuple not in seen:
+            seen.add(f_values_tuple)
+            uq_clusters.append(d)
+    for cluster in uq_clusters:
+        cluster['mode_shapes'] = np.array([mode_shapes[idx[0], idx[1], :] for idx in cluster['indices']])
+    return sorted(uq_clusters, key=lambda cluster: cluster["median"])
+
+
+def same(a, b):
+    """Deep equality of cluster lists, dicts, tuples and arrays (NaN == NaN)."""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        return a.shape == b.shape and np.array_equal(a, b, equal_nan=a.dtype.kind in "fc")
+    return a == b or (a != a and b != b)  # pylint: disable=comparison-with-itself
+
+
+def recorded_call(oma_output, mstab):
+    """Arguments of the _final_clusters call made by mode_allingment."""
+    calls = []
+    final_clusters = mode_track._final_clusters  # pylint: disable=protected-access
+
+    def record(*args):
+        calls.append(copy.deepcopy(args))
+        return final_clusters(*args)
+
+    mode_track._final_clusters = record  # pylint: disable=protected-access
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            mode_track.mode_allingment(copy.deepcopy(oma_output), mstab, TMAC)
+    finally:
+        mode_track._final_clusters = final_clusters  # pylint: disable=protected-access
+    return calls[0]
+
+
+def synthetic_call(n_clusters, ordmax=480, n_channels=16, seed=0):
+    """
+    Clusters of 1 - ordmax random poles of an (ordmax / 2, ordmax + 1) grid,
+    with repeated poles, and a tenth of the clusters repeated.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (ordmax // 2, ordmax + 1)
+    frequencies = rng.uniform(0, 50, shape)
+    cov_freq = rng.uniform(0.5, 2.0, shape) ** 2
+    mode_shapes = rng.normal(size=shape + (n_channels,)) + 1j * rng.normal(size=shape + (n_channels,))
+    clusters = []
+    for ip in range(n_clusters):
+        if clusters and rng.random() < 0.1:
+            clusters.append(dict(copy.deepcopy(clusters[rng.integers(len(clusters))]), ip_index=ip))
+            continue
+        cells = rng.integers(0, shape, size=(rng.integers(1, ordmax), 2))
+        cells = np.concatenate((cells, cells[:len(cells) // 4]))  # Repeated poles, as after a merge
+        f_lower = rng.uniform(0, 50)
+        clusters.append({"ip_index": ip, "confidence_interval": (f_lower, f_lower + 1, 0.0, 1.0),
+                         "indices": cells, "f_values": frequencies[tuple(cells.T)],
+                         "z_values": rng.uniform(0.01, 0.05, len(cells))})
+    return clusters, cov_freq, mode_shapes, ordmax * MSTAB_FACTOR / 4, BOUNDS
+
+
+def best_of(function, args, repeat=3):
+    """Result and best time [s]; every call gets its own copy of the clusters."""
+    elapsed = np.inf
+    for _ in range(repeat):
+        inputs = (copy.deepcopy(args[0]),) + tuple(args[1:])
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function(*inputs)
+            elapsed = min(elapsed, time.perf_counter() - start)
+    return result, elapsed
+
+
+def cases(ordmax_values, synthetic):
+    expected = np.load(EXPECTED_PATH)
+    output = {key: expected[name] for key, name in NPZ_KEYS.items()}
+    yield "expected_sysid_output", 20, recorded_call(output, 20 * MSTAB_FACTOR)
+    if ordmax_values:
+        from methods.sys_id import sysid  # pylint: disable=import-outside-toplevel
+        data = np.loadtxt(DATA_PATH)
+        for ordmax in ordmax_values:
+            with contextlib.redirect_stdout(io.StringIO()):
+                output = sysid(data, {"Fs": FS, "block_shift": 30, "model_order": ordmax})
+            yield "Acc_4DOF sysid", ordmax, recorded_call(output, ordmax * MSTAB_FACTOR)
+    for n_clusters in synthetic:
+        yield "synthetic", 480, synthetic_call(n_clusters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ordmax", type=int, nargs="*", default=[40],
+                        help="Model orders of extra sysid outputs of the 4-DOF record")
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[100, 1000, 10000],
+                        help="Numbers of clusters of the synthetic cluster lists")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    print(f"{'clusters of':>22} {'ordmax':>6} {'clusters':>8} {'poles':>9} {'kept':>5} {'before [ms]':>12} "
+          f"{'after [ms]':>11} {'speedup':>8} {'identical':>9}")
+    for name, ordmax, call in cases(args.ordmax, args.synthetic):
+        expected, before = best_of(final_clusters_dicts, call)
+        clusters, after = best_of(mode_track._final_clusters, call)  # pylint: disable=protected-access
+        poles = sum(len(cluster["f_values"]) for cluster in call[0])
+        print(f"{name:>22} {ordmax:>6} {len(call[0]):>8,} {poles:>9,} {len(clusters):>5} {before * 1e3:>12,.2f} "
+              f"{after * 1e3:>11,.2f} {before / after:>7.1f}x {str(same(expected, clusters)):>9}")
+
+
+if __name__ == "__main__":
+    main()
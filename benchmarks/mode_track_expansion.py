@@ -0,0 +1,238 @@
+"""
+Measures `mode_track.clusterexpansion` and `mode_track.mode_allingment` on
+recorded OMA outputs: the expected sysid output of the 4-DOF test record
+(tests/integration/input_data/expected_sysid_output.npz) and, optionally,
+sysid outputs of the same record with a higher model order.
+
+"before" replays the previous clusterexpansion, with nested MAC loops,
+np.vstack/np.append growth and a scan of every grid cell for the
+unclustered indices; "after" is the rewritten one. Every call of
+clusterexpansion within mode_allingment is run with both and the outputs
+are checked to be identical, as are the final clusters.
+"""
+# pylint: disable=invalid-name, too-many-arguments, too-many-positional-arguments, too-many-locals
+# pylint: disable=too-many-branches, too-many-statements, line-too-long
+import argparse
+import contextlib
+import copy
+import io
+import logging
+import time
+import warnings
+import numpy as np
+
+from methods.constants import MSTAB_FACTOR, TMAC
+from methods.packages import mode_track
+from methods.packages.mac import mac_matrix
+from methods.packages.mode_track import _stack_mode_shapes
+
+EXPECTED_PATH = "tests/integration/input_data/expected_sysid_output.npz"
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+NPZ_KEYS = {"Fn_poles": "frequencies", "Fn_poles_cov": "cov_freq", "Xi_poles": "damping_ratios",
+            "Xi_poles_cov": "cov_damping", "Phi_poles": "mode_shapes"}
+
+
+def clusterexpansion_loop(C_clusters, unClustered_frequencies, unClustered_damping, cov_freq,
+                          cov_damping, mode_shapes, unClustered_indices, tMAC,
+                          bound_multiplier=2):
+    """The clusterexpansion used before the rewrite."""
+
+    Ip_plus = []
+
+    for cluster in C_clusters:
+
+        f_values = cluster['f_values']
+        z_values = cluster['z_values']
+        indices = cluster['indices']
+
+        if len(f_values) == 0:
+            print("Skipping empty cluster...")
+            continue  # Move to the next cluster
+
+        f_lower_bound = np.min(f_values - bound_multiplier * np.sqrt(cov_freq[tuple(indices.T)]))  # Minimum of all points for frequencies
+        f_upper_bound = np.max(f_values + bound_multiplier * np.sqrt(cov_freq[tuple(indices.T)]))  # Maximum of all points for frequencies
+        z_lower_bound = np.min(z_values - bound_multiplier * np.sqrt(cov_damping[tuple(indices.T)]))  # Minimum of all points for damping
+        z_upper_bound = np.max(z_values + bound_multiplier * np.sqrt(cov_damping[tuple(indices.T)]))  # Maximum of all points for damping
+
+        condition_mask2 = (unClustered_frequencies >= f_lower_bound) & (unClustered_frequencies <= f_upper_bound) & (unClustered_damping >= z_lower_bound) & (unClustered_damping <= z_upper_bound)
+        expanded_indices = np.argwhere(condition_mask2)
+
+        updated_indices3 = []
+        f_updated_values3 = []
+        z_updated_values3 = []
+
+        for idx in expanded_indices:
+            freq_value = unClustered_frequencies[tuple(idx)]  # Get the frequency value at this index
+            damp_value = unClustered_damping[tuple(idx)]      # Get the damping value at this index
+            updated_indices3.append(idx)  # Append the index
+            f_updated_values3.append(freq_value)  # Append the frequency value
+            z_updated_values3.append(damp_value)  # Append the damping value
+
+        Ip_plus.append({
+            "ip_index": cluster['ip_index'],  # Use the ip_index from the original cluster
+            "indices": np.array(updated_indices3),  # Updated indices
+            "f_values": np.array(f_updated_values3),  # Updated frequency values
+            "z_values": np.array(z_updated_values3)  # Updated damping values
+        })
+
+    Ip_plus_C = []
+    for item1 in C_clusters:
+
+        for item2 in Ip_plus:
+            if item1['ip_index'] != item2['ip_index']:
+                continue  # Skip the comparison if ip_index is not the same
+
+            if len(item1['f_values']) == len(item2['f_values']):
+
+                if np.all(item1['f_values'] != item2['f_values']):
+                    continue
+                else:
+                    print(f'Values are the same between C_cluster and Ip_plus: {item1["f_values"]}')
+
+            else:
+                updated_indices4 = np.empty((0, 2), dtype=int)  # Reset to empty 2D array
+                f_updated_values4  = []
+                z_updated_values4  = []
+                mac_values = mac_matrix(_stack_mode_shapes(mode_shapes, item1['indices']),
+                                        _stack_mode_shapes(mode_shapes, item2['indices']))
+                for pp_idx, _ in enumerate(item1['indices']):
+                    for kk_idx, kk in enumerate(item2['indices']):
+                        mac_value = mac_values[pp_idx, kk_idx]
+                        if mac_value > tMAC:
+                            updated_indices4 = np.vstack([updated_indices4,kk])
+                            f_updated_values4  = np.append(f_updated_values4, unClustered_frequencies[tuple(kk.T)])
+                            z_updated_values4  = np.append(z_updated_values4, unClustered_damping[tuple(kk.T)])
+                            Ip_plus_C.append({
+                                "ip_index": item1['ip_index'],
+                                "indices" : updated_indices4,
+                                "f_values"  : f_updated_values4,
+                                "z_values" : z_updated_values4
+                                })
+
+        C_cluster_finale = copy.deepcopy(C_clusters)
+
+        for item1 in C_clusters:
+            for item2 in Ip_plus_C:
+                if item1['ip_index'] != item2['ip_index']:
+                    continue  # Skip the comparison if ip_index is not the same
+
+                f_merged_values2 = np.concatenate((item1['f_values'], item2['f_values']))       # concatenate frequencies
+                z_merged_values2 = np.concatenate((item1['z_values'], item2['z_values']))       # concatenate damping
+                merged_indices2 = np.concatenate((item1['indices'], item2['indices']))
+
+                for finale_item in C_cluster_finale:
+                    if finale_item['ip_index'] == item1['ip_index']:
+                        finale_item['f_values'] = f_merged_values2
+                        finale_item['z_values'] = z_merged_values2
+                        finale_item['indices'] = merged_indices2
+                        break  # Exit the loop once the match is found
+
+    valid_indices = [item['indices'] for item in C_clusters if item['indices'].size > 0]
+
+    if valid_indices:
+        Ip_plus_indices = np.vstack(valid_indices)
+    else:
+        Ip_plus_indices = np.array([])  # Or choose another fallback behavior
+    unclustered_frequencies_expanded = unClustered_frequencies.copy()
+    unclustered_damping_expanded = unClustered_damping.copy()
+    for idx in Ip_plus_indices:
+        unclustered_frequencies_expanded[tuple(idx)] = np.nan  # Set to NaN
+        unclustered_damping_expanded[tuple(idx)] = np.nan  # Set to NaN
+
+    all_indices = np.array(np.meshgrid(np.arange(unClustered_frequencies.shape[0]), np.arange(unClustered_frequencies.shape[1]))).T.reshape(-1, 2)
+
+    unclustered_indices_expnaded = []
+    for idx in all_indices:
+        if Ip_plus_indices.size > 0 and not np.isnan(unClustered_frequencies[tuple(idx)]) and not any((idx == Ip_plus_indices).all(axis=1)):
+            unclustered_indices_expnaded.append(idx)
+
+    unclustered_indices_expnaded = np.array(unclustered_indices_expnaded)
+
+    return C_cluster_finale, unclustered_frequencies_expanded, unclustered_damping_expanded, unclustered_indices_expnaded
+
+
+def same(a, b):
+    """Deep equality of cluster lists, dicts, tuples and arrays (NaN == NaN)."""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        return a.shape == b.shape and np.array_equal(a, b, equal_nan=a.dtype.kind in "fc")
+    return a == b or (a != a and b != b)  # pylint: disable=comparison-with-itself
+
+
+class Recorder:
+    """Stands in for clusterexpansion: runs both versions, times them and compares."""
+
+    def __init__(self):
+        self.before = self.after = 0.0
+        self.calls = 0
+        self.identical = True
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        expected = clusterexpansion_loop(*copy.deepcopy(args), **kwargs)
+        middle = time.perf_counter()
+        result = EXPANSION(*args, **kwargs)
+        end = time.perf_counter()
+        self.before += middle - start
+        self.after += end - middle
+        self.calls += 1
+        self.identical &= same(list(expected), list(result))
+        return result
+
+
+EXPANSION = mode_track.clusterexpansion
+
+
+def run_mode_allingment(oma_output, mstab, expansion):
+    mode_track.clusterexpansion = expansion
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            clusters = mode_track.mode_allingment(copy.deepcopy(oma_output), mstab, TMAC)
+            return clusters, time.perf_counter() - start
+    finally:
+        mode_track.clusterexpansion = EXPANSION
+
+
+def oma_outputs(ordmax_values):
+    expected = np.load(EXPECTED_PATH)
+    yield "expected_sysid_output", 20, {key: expected[name] for key, name in NPZ_KEYS.items()}
+    if ordmax_values:
+        from methods.sys_id import sysid  # pylint: disable=import-outside-toplevel
+        data = np.loadtxt(DATA_PATH).T
+        for ordmax in ordmax_values:
+            with contextlib.redirect_stdout(io.StringIO()):
+                output = sysid(data, {"Fs": FS, "block_shift": 30, "model_order": ordmax})
+            yield "Acc_4DOF sysid", ordmax, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ordmax", type=int, nargs="*", default=[40],
+                        help="Model orders of extra sysid outputs of the 4-DOF record")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    print(f"{'OMA output':>22} {'ordmax':>6} {'calls':>5} {'expansion before [ms]':>22} "
+          f"{'expansion after [ms]':>21} {'speedup':>8} {'mode_allingment before [ms]':>28} "
+          f"{'mode_allingment after [ms]':>27} {'identical':>9}")
+    for name, ordmax, output in oma_outputs(args.ordmax):
+        mstab = ordmax * MSTAB_FACTOR
+        recorder = Recorder()
+        checked, _ = run_mode_allingment(output, mstab, recorder)
+        before_clusters, before = run_mode_allingment(output, mstab, clusterexpansion_loop)
+        after_clusters, after = run_mode_allingment(output, mstab, EXPANSION)
+        identical = recorder.identical and same(before_clusters, after_clusters) and same(checked, after_clusters)
+        print(f"{name:>22} {ordmax:>6} {recorder.calls:>5} {recorder.before * 1e3:>22,.1f} "
+              f"{recorder.after * 1e3:>21,.1f} {recorder.before / recorder.after:>7.1f}x "
+              f"{before * 1e3:>28,.1f} {after * 1e3:>27,.1f} {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Measures the seed neighbourhood lookup of `mode_track.cluster_frequencies`
+on the calls made by `mode_allingment`, for the expected sysid output of the
+4-DOF test record (tests/integration/input_data/expected_sysid_output.npz)
+and sysid outputs of the same record with higher model orders, and on
+synthetic grids with half of the (pole, model order) cells occupied and
+every pole at the maximum model order as a seed.
+
+"before" evaluates the four-way mask over the whole grid for every seed,
+as cluster_frequencies did; "after" builds the frequency-sorted pole index
+once per call and bisects it per seed. The indices found for every seed are
+checked to be identical.
+"""
+# pylint: disable=invalid-name, too-many-locals
+import argparse
+import contextlib
+import copy
+import io
+import logging
+import time
+import warnings
+import numpy as np
+
+from methods.constants import MSTAB_FACTOR, TMAC
+from methods.packages import mode_track
+from methods.packages.mode_track import _poles_in_bounds, _sorted_pole_index
+
+EXPECTED_PATH = "tests/integration/input_data/expected_sysid_output.npz"
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+BOUNDS = 2
+NPZ_KEYS = {"Fn_poles": "frequencies", "Fn_poles_cov": "cov_freq", "Xi_poles": "damping_ratios",
+            "Xi_poles_cov": "cov_damping", "Phi_poles": "mode_shapes"}
+
+
+def seed_bounds(frequencies_max_MO, cov_freq_max_MO, damping_ratios_max_MO, cov_damping_max_MO):
+    """Confidence intervals of the seeds, in the order cluster_frequencies visits them."""
+    order = np.argsort(frequencies_max_MO)
+    fn_unique, unique = np.unique(frequencies_max_MO[order], return_index=True)
+    fcov = cov_freq_max_MO[order][unique]
+    z = damping_ratios_max_MO[order][unique]
+    zcov = cov_damping_max_MO[order][unique]
+    return [(f - BOUNDS * np.sqrt(fc), f + BOUNDS * np.sqrt(fc), zz - BOUNDS * np.sqrt(zc), zz + BOUNDS * np.sqrt(zc))
+            for f, fc, zz, zc in zip(fn_unique, fcov, z, zcov) if not np.isnan(f)]
+
+
+def lookup_mask(frequencies, damping_ratios, bounds):
+    """The lookup used before: one mask over the grid per seed."""
+    return [np.argwhere((frequencies >= f_lo) & (frequencies <= f_hi)
+                        & (damping_ratios >= z_lo) & (damping_ratios <= z_hi))
+            for f_lo, f_hi, z_lo, z_hi in bounds]
+
+
+def lookup_index(frequencies, damping_ratios, bounds):
+    pole_index = _sorted_pole_index(frequencies)
+    return [_poles_in_bounds(pole_index, frequencies, damping_ratios, *bound) for bound in bounds]
+
+
+def recorded_calls(oma_output, mstab):
+    """Arguments of every cluster_frequencies call made by mode_allingment."""
+    calls = []
+    cluster_frequencies = mode_track.cluster_frequencies
+
+    def record(*args, **kwargs):
+        calls.append(copy.deepcopy(args[:2] + args[3:7]))
+        return cluster_frequencies(*args, **kwargs)
+
+    mode_track.cluster_frequencies = record
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            mode_track.mode_allingment(copy.deepcopy(oma_output), mstab, TMAC)
+    finally:
+        mode_track.cluster_frequencies = cluster_frequencies
+    return calls
+
+
+def best_of(function, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def synthetic_grid(ordmax, seed=0):
+    """Random poles between 0 and 50 Hz on half of an (ordmax / 2, ordmax + 1) grid."""
+    rng = np.random.default_rng(seed)
+    frequencies = rng.uniform(0, 50, (ordmax // 2, ordmax + 1))
+    frequencies[rng.random(frequencies.shape) < 0.5] = np.nan
+    damping_ratios = rng.uniform(0.01, 0.05, frequencies.shape)
+    cov_freq = np.full(frequencies.shape, 0.05 ** 2)
+    cov_damping = np.full(frequencies.shape, 0.01 ** 2)
+    return frequencies, damping_ratios, frequencies[:, -1], cov_freq[:, -1], damping_ratios[:, -1], cov_damping[:, -1]
+
+
+def oma_outputs(ordmax_values):
+    expected = np.load(EXPECTED_PATH)
+    yield "expected_sysid_output", 20, {key: expected[name] for key, name in NPZ_KEYS.items()}
+    if ordmax_values:
+        from methods.sys_id import sysid  # pylint: disable=import-outside-toplevel
+        data = np.loadtxt(DATA_PATH).T
+        for ordmax in ordmax_values:
+            with contextlib.redirect_stdout(io.StringIO()):
+                block_shift = max(30, ordmax // min(data.shape) + 1)
+                output = sysid(data, {"Fs": FS, "block_shift": block_shift, "model_order": ordmax})
+            yield "Acc_4DOF sysid", ordmax, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ordmax", type=int, nargs="*", default=[40],
+                        help="Model orders of extra sysid outputs of the 4-DOF record")
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[120, 240, 480],
+                        help="Model orders of the synthetic grids")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    print(f"{'OMA output':>22} {'ordmax':>6} {'calls':>5} {'seeds':>6} {'before [ms]':>12} "
+          f"{'after [ms]':>11} {'speedup':>8} {'identical':>9}")
+    cases = [(name, ordmax, recorded_calls(output, ordmax * MSTAB_FACTOR))
+             for name, ordmax, output in oma_outputs(args.ordmax)]
+    cases += [("synthetic", ordmax, [synthetic_grid(ordmax)]) for ordmax in args.synthetic]
+    for name, ordmax, calls in cases:
+        seeds = 0
+        before = after = 0.0
+        identical = True
+        for frequencies, damping_ratios, *max_MO in calls:
+            bounds = seed_bounds(*max_MO)
+            expected, t_before = best_of(lookup_mask, frequencies, damping_ratios, bounds)
+            result, t_after = best_of(lookup_index, frequencies, damping_ratios, bounds)
+            identical &= all(np.array_equal(e, r) for e, r in zip(expected, result))
+            seeds += len(bounds)
+            before += t_before
+            after += t_after
+        print(f"{name:>22} {ordmax:>6} {len(calls):>5} {seeds:>6} {before * 1e3:>12,.2f} "
+              f"{after * 1e3:>11,.2f} {before / after:>7.1f}x {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Measures the time and peak memory (tracemalloc) of `mode_track.mode_allingment`
+on the expected sysid output of the 4-DOF test record
+(tests/integration/input_data/expected_sysid_output.npz) and a sysid output
+of the same record with ordmax 40. The mode shapes are tiled to 3, 192 and
+1536 channels, which leaves the MAC values and so the clusters unchanged.
+
+"before" replays the previous outer loop, which copied the frequency,
+damping and covariance grids and the mode shapes on every iteration and
+NaN-masked the mode shapes one channel at a time; "after" is the current
+one, with one unclustered mask updated in place. The clusters of both are
+checked to be identical.
+"""
+# pylint: disable=invalid-name, too-many-locals, too-many-statements, line-too-long
+import argparse
+import contextlib
+import copy
+import io
+import logging
+import time
+import tracemalloc
+import warnings
+import numpy as np
+
+from methods.constants import MSTAB_FACTOR, TMAC
+from methods.packages.mode_track import (
+    clean_clusters_by_median, cluster_frequencies, clusterexpansion, mode_allingment)
+
+EXPECTED_PATH = "tests/integration/input_data/expected_sysid_output.npz"
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+NPZ_KEYS = {"Fn_poles": "frequencies", "Fn_poles_cov": "cov_freq", "Xi_poles": "damping_ratios",
+            "Xi_poles_cov": "cov_damping", "Phi_poles": "mode_shapes"}
+
+
+def mode_allingment_copies(ssi_mode_track_res, mstab, tMAC):
+    """mode_allingment with the outer loop used before the shared mask."""
+    print("DEBUG: oma_output inside mode_allingment:", type(ssi_mode_track_res), ssi_mode_track_res)
+    frequencies = ssi_mode_track_res['Fn_poles']
+    cov_freq = ssi_mode_track_res['Fn_poles_cov']
+    damping_ratios = ssi_mode_track_res['Xi_poles']
+    cov_damping = ssi_mode_track_res['Xi_poles_cov']
+    mode_shapes = ssi_mode_track_res['Phi_poles']
+    bounds = 2
+
+    frequencies_max_MO = frequencies[:, -1]
+    cov_freq_max_MO = cov_freq[:, -1]
+    damping_ratios_max_MO = damping_ratios[:, -1]
+    cov_damping_max_MO = cov_damping[:, -1]
+    mode_shapes_max_MO = mode_shapes[:, -1, :]
+
+    frequencies_copy = frequencies.copy()  # pylint: disable=unused-variable
+
+    frequencies = frequencies[::2]
+    damping_ratios = damping_ratios[::2]
+    mode_shapes = mode_shapes[::2, :, :]
+    cov_freq = cov_freq[::2]
+    cov_damping = cov_damping[::2]
+
+    frequency_coefficient_variation = np.sqrt(cov_freq) / frequencies
+    damping_coefficient_variation = np.sqrt(cov_damping) / damping_ratios
+    combined_indices = (frequency_coefficient_variation > 0.05) & (damping_coefficient_variation > 0.5)
+    frequencies[combined_indices] = np.nan
+    damping_ratios[combined_indices] = np.nan
+    cov_freq[combined_indices] = np.nan
+    cov_damping[combined_indices] = np.nan
+
+    C_clusters, unClustd_frequencies, unClustd_damping, unClustd_indices = cluster_frequencies(
+        frequencies, damping_ratios, mode_shapes, frequencies_max_MO, cov_freq_max_MO,
+        damping_ratios_max_MO, cov_damping_max_MO, mode_shapes_max_MO, tMAC, bound_multiplier=bounds)
+    C_expanded, unClustd_frequencies_expanded, unClustd_damping_expanded, unClustd_indices_expanded = clusterexpansion(
+        C_clusters, unClustd_frequencies, unClustd_damping, cov_freq, cov_damping, mode_shapes,
+        unClustd_indices, tMAC, bound_multiplier=bounds)
+
+    last_ip_index = max(cluster['ip_index'] for cluster in C_expanded)
+
+    while True:
+        if unClustd_indices_expanded.size <= 2:
+            break
+        highest_column = np.max(unClustd_indices_expanded[:, 1])
+
+        mask1 = np.full(frequencies.shape, False)
+        mask1[tuple(unClustd_indices_expanded.T)] = True
+        unClustd_frequencies = frequencies.copy()
+        unClustd_damping = damping_ratios.copy()
+        unClustd_frequencies[~mask1] = np.nan
+        unClustd_damping[~mask1] = np.nan
+        unClustd_cov_freq = cov_freq.copy()
+        unClustd_cov_damp = cov_damping.copy()
+        unClustd_cov_freq[~mask1] = np.nan
+        unClustd_cov_damp[~mask1] = np.nan
+        unClustd_mode_shapes = mode_shapes.copy()
+        for ii in range(unClustd_mode_shapes.shape[2]):
+            slice_2d = unClustd_mode_shapes[:, :, ii]
+            slice_2d[~mask1] = np.nan
+            unClustd_mode_shapes[:, :, ii] = slice_2d
+
+        frequencies_max_MO = unClustd_frequencies_expanded[:, highest_column]
+        damping_ratios_max_MO = unClustd_damping_expanded[:, highest_column]
+        cov_freq_max_MO = unClustd_cov_freq[:, highest_column]
+        mode_shapes_max_MO = unClustd_mode_shapes[:, highest_column, :]
+
+        C_cluster_loop, unClustd_frequencies_loop, unClustd_damping_loop, unClustd_indices_loop = cluster_frequencies(
+            unClustd_frequencies, unClustd_damping, unClustd_mode_shapes, frequencies_max_MO,
+            cov_freq_max_MO, damping_ratios_max_MO, cov_damping_max_MO, mode_shapes_max_MO, tMAC,
+            bound_multiplier=bounds)
+
+        if unClustd_indices_loop.size == 0:
+            for cluster in C_cluster_loop:
+                last_ip_index += 1
+                cluster["ip_index"] = last_ip_index
+                C_expanded.append(cluster)
+            break
+
+        C_expanded_loop, _, _, unClustd_indices_expanded_loop = clusterexpansion(
+            C_cluster_loop, unClustd_frequencies_loop, unClustd_damping_loop, cov_freq, cov_damping,
+            mode_shapes, unClustd_indices_loop, tMAC, bound_multiplier=bounds)
+        for cluster in C_expanded_loop:
+            last_ip_index += 1
+            cluster["ip_index"] = last_ip_index
+            C_expanded.append(cluster)
+
+        if unClustd_indices_expanded_loop.size == 0:
+            break
+        unClustd_indices_expanded = unClustd_indices_expanded_loop[
+            unClustd_indices_expanded_loop[:, 1] != highest_column]
+        if unClustd_indices_expanded.size <= 2:
+            break
+
+    for cluster in C_expanded:
+        _, unique_indices = np.unique(cluster['f_values'], return_index=True)
+        cluster['f_values'] = cluster['f_values'][unique_indices]
+        cluster['indices'] = cluster['indices'][unique_indices]
+        cluster['z_values'] = cluster['z_values'][unique_indices]
+
+    C_expanded_filtered = [cluster for cluster in C_expanded if cluster['indices'].shape[0] > mstab]
+    C_expanded_filtered.sort(key=lambda cluster: cluster['confidence_interval'][0])
+    cleaned_clusters = clean_clusters_by_median(C_expanded_filtered, cov_freq, bound_multiplier=bounds)
+
+    seen = set()
+    uq_clusters = []
+    for d in cleaned_clusters:
+        f_values_tuple = tuple(d['f_values'])
+        if f_values_tuple not in seen:
+            seen.add(f_values_tuple)
+            uq_clusters.append(d)
+    for cluster in uq_clusters:
+        cluster['mode_shapes'] = np.array([mode_shapes[idx[0], idx[1], :] for idx in cluster['indices']])
+    return sorted(uq_clusters, key=lambda cluster: cluster["median"])
+
+
+def same(a, b):
+    """Deep equality of cluster lists, dicts, tuples and arrays (NaN == NaN)."""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        return a.shape == b.shape and np.array_equal(a, b, equal_nan=a.dtype.kind in "fc")
+    return a == b or (a != a and b != b)  # pylint: disable=comparison-with-itself
+
+
+def measure(alignment, oma_output, mstab, repeat=3):
+    """Clusters, best time [s] and peak memory above the input [bytes] of a call."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed = np.inf
+        for _ in range(repeat):
+            inputs = copy.deepcopy(oma_output)
+            start = time.perf_counter()
+            clusters = alignment(inputs, mstab, TMAC)
+            elapsed = min(elapsed, time.perf_counter() - start)
+
+        oma_output = copy.deepcopy(oma_output)
+        tracemalloc.start()
+        alignment(oma_output, mstab, TMAC)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return clusters, elapsed, peak
+
+
+def oma_outputs(ordmax_values):
+    expected = np.load(EXPECTED_PATH)
+    yield "expected_sysid_output", 20, {key: expected[name] for key, name in NPZ_KEYS.items()}
+    if ordmax_values:
+        from methods.sys_id import sysid  # pylint: disable=import-outside-toplevel
+        data = np.loadtxt(DATA_PATH)
+        for ordmax in ordmax_values:
+            with contextlib.redirect_stdout(io.StringIO()):
+                output = sysid(data, {"Fs": FS, "block_shift": 30, "model_order": ordmax})
+            yield "Acc_4DOF sysid", ordmax, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ordmax", type=int, nargs="*", default=[40],
+                        help="Model orders of extra sysid outputs of the 4-DOF record")
+    parser.add_argument("--tiles", type=int, nargs="*", default=[1, 64, 512],
+                        help="Number of times the 3 channels of the mode shapes are tiled")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    print(f"{'OMA output':>22} {'ordmax':>6} {'channels':>8} {'before [ms]':>12} {'after [ms]':>11} "
+          f"{'before peak [MB]':>17} {'after peak [MB]':>16} {'identical':>9}")
+    for name, ordmax, output in oma_outputs(args.ordmax):
+        for tiles in args.tiles:
+            tiled = dict(output, Phi_poles=np.tile(output["Phi_poles"], (1, 1, tiles)))
+            mstab = ordmax * MSTAB_FACTOR
+            expected, before, before_peak = measure(mode_allingment_copies, tiled, mstab)
+            clusters, after, after_peak = measure(mode_allingment, tiled, mstab)
+            print(f"{name:>22} {ordmax:>6} {tiled['Phi_poles'].shape[2]:>8} {before * 1e3:>12,.1f} "
+                  f"{after * 1e3:>11,.1f} {before_peak / 1e6:>17,.2f} {after_peak / 1e6:>16,.2f} "
+                  f"{str(same(expected, clusters)):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measures `mode_track.mode_allingment` from scratch against the incremental
+`ModeTracker` on consecutive sysid outputs of the 4-DOF test record
+(tests/integration/input_data/Acc_4DOF.txt): overlapping windows of
+--window samples, every --hop samples.
+
+For each window it prints the time of both, the median frequencies found
+from scratch and the (mode_id, median frequency) pairs of the tracker, so the
+modes can be followed across the windows. The time from scratch includes
+formatting the debug print of the whole result at the start of
+`mode_allingment`, which the tracker only pays for the first window; without
+it, the tracked windows took about half the time from scratch on the
+default settings.
+"""
+# pylint: disable=invalid-name
+import argparse
+import contextlib
+import copy
+import io
+import logging
+import time
+import warnings
+import numpy as np
+
+from methods.constants import MSTAB_FACTOR, TMAC
+from methods.packages.mode_track import mode_allingment
+from methods.packages.mode_tracker import ModeTracker
+from methods.sys_id import sysid
+
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+
+
+def windows(data, window, hop, ordmax):
+    """Sysid outputs of the overlapping windows of the record."""
+    for start in range(0, data.shape[1] - window + 1, hop):
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = sysid(data[:, start:start + window].T,
+                           {"Fs": FS, "block_shift": 30, "model_order": ordmax})
+        yield start, output
+
+
+def best_of(function, oma_output, repeat):
+    """Result and best time [s]; every call gets its own copy of the output."""
+    elapsed = np.inf
+    for _ in range(repeat):
+        inputs = copy.deepcopy(oma_output)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function(inputs)
+            elapsed = min(elapsed, time.perf_counter() - start)
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--window", type=int, default=25000, help="Window length in samples")
+    parser.add_argument("--hop", type=int, default=5000, help="Samples between the window starts")
+    parser.add_argument("--ordmax", type=int, default=20, help="Maximum model order of sysid")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed calls per window")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    mstab = args.ordmax * MSTAB_FACTOR
+    tracker = ModeTracker(mstab, TMAC)
+    data = np.loadtxt(DATA_PATH)
+    print(f"{'start':>6} {'scratch [ms]':>12} {'tracked [ms]':>12}  scratch medians [Hz] | tracked (mode_id, median [Hz])")
+    for start, output in windows(data, args.window, args.hop, args.ordmax):
+        scratch, t_scratch = best_of(lambda res: mode_allingment(res, mstab, TMAC), output, args.repeat)
+        # The tracker may only see each window once, so it is timed on one call
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            tracked = tracker.update(output)
+            t_tracked = time.perf_counter() - start_time
+        medians = ", ".join(f"{cluster['median']:.3f}" for cluster in scratch)
+        modes = ", ".join(f"({cluster['mode_id']}, {cluster['median']:.3f})" for cluster in tracked)
+        print(f"{start:>6} {t_scratch * 1e3:>12,.1f} {t_tracked * 1e3:>12,.1f}  {medians} | {modes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures the encode and decode time and the payload size of an OMA result
+message for ordmax 20, 60 and 120: the JSON message of
+`convert_numpy_to_list` decoded by `model_update_module._convert_oma_output`,
+and the binary message of `methods.oma_codec`, plain and zlib-compressed.
+
+The result has the fields `sys_id.sysid` publishes, with random values
+(NaN for about half of the poles, as after the hard criteria).
+"""
+# pylint: disable=invalid-name
+import argparse
+import json
+import time
+import numpy as np
+
+from functions.util import convert_numpy_to_list
+from methods import oma_codec
+from methods.model_update_module import _convert_oma_output
+
+TIMESTAMP = "2024-01-01T00:00:00"
+
+
+def make_output(ordmax, n_channels, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = (ordmax, ordmax + 1)
+    missing = rng.random(shape) < 0.5
+
+    def poles(size=shape):
+        values = rng.random(size)
+        values[missing] = np.nan
+        return values
+
+    return {
+        "Fn_poles": poles(),
+        "Fn_poles_cov": poles(),
+        "Xi_poles": poles(),
+        "Xi_poles_cov": poles(),
+        "Phi_poles": poles(shape + (n_channels,)) + 1j * poles(shape + (n_channels,)),
+        "Lab": rng.integers(0, 4, size=shape),
+    }
+
+
+def encode_json(output):
+    return json.dumps({"timestamp": TIMESTAMP,
+                       "OMA_output": convert_numpy_to_list(output)}).encode()
+
+
+def decode_json(payload):
+    return oma_codec.decode_message(payload, _convert_oma_output)
+
+
+def measure(function, argument, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function(argument)
+    return (time.perf_counter() - start) / repeats, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ordmax", type=int, nargs="+", default=[20, 60, 120])
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    formats = {
+        "json": (encode_json, decode_json),
+        "binary": (lambda o: oma_codec.encode(o, TIMESTAMP), oma_codec.decode),
+        "binary_zlib": (lambda o: oma_codec.encode(o, TIMESTAMP, compress=True),
+                        oma_codec.decode),
+    }
+    print(f"{'ordmax':>6} {'format':>11} {'size [kB]':>10} {'encode [ms]':>12} "
+          f"{'decode [ms]':>12}")
+    for ordmax in args.ordmax:
+        output = make_output(ordmax, args.channels)
+        for name, (encode, decode) in formats.items():
+            encode_time, payload = measure(encode, output, args.repeats)
+            decode_time, _ = measure(decode, payload, args.repeats)
+            print(f"{ordmax:>6} {name:>11} {len(payload) / 1e3:>10,.1f} "
+                  f"{encode_time * 1e3:>12,.2f} {decode_time * 1e3:>12,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measures the soft-criteria stability labelling `genWrapper.SC_apply`
+for ordmax = 20, 60 and 120.
+
+The poles come from SSI-cov on the 4-DOF test record, with the same hard
+criteria as `SSIcov.run`. The "before" column replays the previous
+implementation, which looped over orders and poles and called `MAC` per
+pole; "after" is the vectorized `SC_apply`. The labels of both are
+checked to be identical.
+"""
+# pylint: disable=invalid-name, too-many-arguments, too-many-positional-arguments, too-many-locals
+import argparse
+import logging
+import time
+import warnings
+import numpy as np
+from pyoma2.functions import ssi
+
+from methods.packages.pyoma import genWrapper as gen
+
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+SC = {"err_fn": 0.01, "err_xi": 0.05, "err_phi": 0.03}
+
+
+def sc_apply_loop(Fn, Xi, Phi, ordmin, ordmax, step, err_fn, err_xi, err_phi):
+    """The labelling loop used before SC_apply was vectorized."""
+    Lab = np.zeros(Fn.shape, dtype="int")
+    for oo in range(ordmin, ordmax + 1, step):
+        o = int(oo / step)
+        f_n = Fn[:, o].reshape(-1, 1)
+        xi_n = Xi[:, o].reshape(-1, 1)
+        phi_n = Phi[:, o, :]
+        f_n1 = Fn[:, o - 1].reshape(-1, 1)
+        xi_n1 = Xi[:, o - 1].reshape(-1, 1)
+        phi_n1 = Phi[:, o - 1, :]
+        if o == 0:
+            continue
+        for i in range(f_n.shape[0]):
+            try:
+                idx = np.nanargmin(np.abs(f_n1 - f_n[i]))
+                cond1 = np.abs(f_n[i] - f_n1[idx]) / f_n[i]
+                cond2 = np.abs(xi_n[i] - xi_n1[idx]) / xi_n[i]
+                cond3 = 1 - gen.MAC(phi_n[i, :], phi_n1[idx, :])
+                if cond1 < err_fn and cond2 < err_xi and cond3 < err_phi:
+                    Lab[i, o] = 1
+            except Exception:  # pylint: disable=broad-exception-caught
+                pass
+    return Lab
+
+
+def ssi_poles(data: np.ndarray, ordmax: int):
+    """Poles of SSI-cov after the hard criteria, as in SSIcov.run."""
+    br = max(30, ordmax // data.shape[0] + 1)
+    H, _ = ssi.build_hank(Y=data, Yref=data, br=br, method="cov_mm")
+    Obs, A, C, *_ = ssi.SSI_fast(H, br, ordmax)
+    Fns, Xis, Phis, Lambds, *_ = ssi.SSI_poles(Obs, A, C, ordmax, 1 / FS)
+    Lambds, mask = gen.HC_realEigen(Lambds)
+    Fns, Xis, Phis = gen.applymask(  # pylint: disable=unbalanced-tuple-unpacking
+        [Fns, Xis, Phis], mask, Phis.shape[2])
+    _, mask = gen.HC_removeZeroImg(Lambds)
+    return gen.applymask([Fns, Xis, Phis], mask, Phis.shape[2])
+
+
+def measure(sc_apply, poles, ordmax: int, repeats: int):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        lab = sc_apply(*poles, 0, ordmax, 1, SC["err_fn"], SC["err_xi"], SC["err_phi"])
+        best = min(best, time.perf_counter() - start)
+    return best, lab
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ordmax", type=int, nargs="+", default=[20, 60, 120])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    data = np.loadtxt(DATA_PATH)
+    print(f"{'ordmax':>6} {'before [ms]':>12} {'after [ms]':>12} {'speedup':>8} {'identical':>10}")
+    for ordmax in args.ordmax:
+        poles = ssi_poles(data, ordmax)
+        before, lab_before = measure(sc_apply_loop, poles, ordmax, args.repeats)
+        after, lab_after = measure(gen.SC_apply, poles, ordmax, args.repeats)
+        print(f"{ordmax:>6} {before * 1e3:>12,.1f} {after * 1e3:>12,.2f} {before / after:>7.0f}x "
+              f"{str(np.array_equal(lab_before, lab_after)):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measures the pole extraction of SSI-cov on the 4-DOF test record for a
+range of model orders, serial (`ssi.SSI_poles`) and split across worker
+processes (`SSI_poles_parallel`), with the speedup over the serial run.
+
+The state-space matrices are identified once per model order; only the
+pole extraction is timed. The worker pools are warmed up before timing,
+and are used at every order, also below `PARALLEL_POLES_MIN_ORDER`, where
+`SSI_poles_parallel` extracts the poles in-process by default.
+"""
+# pylint: disable=invalid-name
+import argparse
+import logging
+import time
+import warnings
+import numpy as np
+from pyoma2.functions import ssi
+
+from methods.packages.pyoma.ssiWrapper import SSI_poles_parallel
+
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+
+
+def measure(SSI_poles, args, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = SSI_poles(*args[0], **args[1])
+    return (time.perf_counter() - start) / repeats, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ordmax", type=int, nargs="+", default=[20, 60, 120])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--br", type=int, default=40)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-unc", action="store_true", help="Skip the uncertainty")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    calc_unc = not args.no_unc
+    data = np.loadtxt(DATA_PATH)
+    H, T = ssi.build_hank(Y=data, Yref=data, br=args.br, method="cov_mm",
+                          calc_unc=calc_unc, nb=50)
+
+    print(f"{'ordmax':>6} {'workers':>7} {'time [ms]':>10} {'speedup':>8} {'identical':>9}")
+    for ordmax in args.ordmax:
+        Obs, A, C, Q1, Q2, Q3, Q4 = ssi.SSI_fast(H, args.br, ordmax, calc_unc=calc_unc,
+                                                 T=T, nb=T.shape[1] if calc_unc else 50)
+        call = ((Obs, A, C, ordmax, 1 / FS),
+                {"calc_unc": calc_unc, "Q1": Q1, "Q2": Q2, "Q3": Q3, "Q4": Q4})
+        serial, expected = measure(ssi.SSI_poles, call, args.repeats)
+        print(f"{ordmax:>6} {'serial':>7} {serial * 1e3:>10,.1f} {1:>8.2f} {'':>9}")
+        for workers in args.workers:
+            SSI_poles = SSI_poles_parallel(workers, min_order=0)
+            measure(SSI_poles, call, 1)
+            elapsed, result = measure(SSI_poles, call, args.repeats)
+            identical = all(
+                (res is None and exp is None) or np.array_equal(res, exp, equal_nan=True)
+                for res, exp in zip(result, expected))
+            print(f"{ordmax:>6} {workers:>7} {elapsed * 1e3:>10,.1f} "
+                  f"{serial / elapsed:>8.2f} {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures SSI-cov per window on overlapping windows of the 4-DOF test record.
+
+"batch" assembles the block Hankel matrix of every window with
+`ssi.build_hank`, as `sys_id.sysid` does; "stream" pushes only the new
+samples of each window into `SSIcovStream`. Both then run the same SVD
+and pole extraction. The Hankel column is the assembly alone, the total
+column includes the identification. The record is repeated as needed.
+"""
+# pylint: disable=invalid-name
+import argparse
+import logging
+import time
+import warnings
+import numpy as np
+from pyoma2.algorithms.data.run_params import SSIRunParams
+from pyoma2.functions import ssi
+
+from methods.packages.pyoma.ssiWrapper import SSIcovStream, ssi_from_hankel
+
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--window", type=float, default=5, help="Window length in minutes")
+    parser.add_argument("--hops", type=float, nargs="+", default=[0.5, 0.1],
+                        help="Hop lengths in minutes")
+    parser.add_argument("--windows", type=int, default=5, help="Windows per measurement")
+    parser.add_argument("--br", type=int, default=30)
+    parser.add_argument("--ordmax", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    params = {"br": args.br, "ordmax": args.ordmax, "calc_unc": True}
+    run_params = SSIRunParams(method="cov_mm", **params)
+    record = np.loadtxt(DATA_PATH)
+    window = int(args.window * 60 * FS)
+
+    print(f"{'hop [min]':>9} {'batch Hankel [ms]':>18} {'stream Hankel [ms]':>19} "
+          f"{'batch total [ms]':>17} {'stream total [ms]':>18}")
+    for hop_minutes in args.hops:
+        hop = int(hop_minutes * 60 * FS)
+        needed = window + args.windows * hop
+        data = np.tile(record, (1, -(-needed // record.shape[1])))[:, :needed]
+        estimator = SSIcovStream(window, FS, **params)
+        estimator.push(data[:, :window])
+
+        times = np.zeros(4)
+        for k in range(1, args.windows + 1):
+            end = window + k * hop
+            start = time.perf_counter()
+            H, T = ssi.build_hank(Y=data[:, end - window:end], Yref=data[:, end - window:end],
+                                  br=args.br, method="cov_mm", calc_unc=True, nb=run_params.nb)
+            assembled = time.perf_counter()
+            ssi_from_hankel(H, T, run_params, 1 / FS)
+            done = time.perf_counter()
+            estimator.push(data[:, end - hop:end])
+            pushed = time.perf_counter()
+            estimator.run()
+            streamed = time.perf_counter()
+            times += (assembled - start, pushed - done, done - start, streamed - done)
+        times *= 1e3 / args.windows
+        print(f"{hop_minutes:>9} {times[0]:>18,.1f} {times[1]:>19,.1f} "
+              f"{times[2]:>17,.1f} {times[3]:>18,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measures SSI-cov without uncertainty with the Hankel decomposition of
+`hankel_svd`: the exact `np.linalg.svd`, the truncated ARPACK SVD and the
+randomized SVD, for a range of block rows and channel counts.
+
+The channels are made from the 4-DOF test record by mixing its channels
+with random weights and adding noise. The time column is `ssi_from_hankel`
+in total; the error column is the largest relative deviation of the
+frequency poles from the exact path, over the poles both paths find.
+"""
+# pylint: disable=invalid-name
+import argparse
+import logging
+import time
+import warnings
+import numpy as np
+from pyoma2.functions import ssi
+
+from methods.packages.pyoma.ssiWrapper import SSIWrapperRunParams, ssi_from_hankel
+
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+
+
+def make_channels(record, n_channels, seed=0):
+    rng = np.random.default_rng(seed)
+    mixed = rng.normal(size=(n_channels, record.shape[0])) @ record
+    return mixed + 0.05 * mixed.std() * rng.normal(size=mixed.shape)
+
+
+def max_rel_error(result, exact):
+    both = np.isfinite(result.Fn_poles) & np.isfinite(exact.Fn_poles)
+    if not both.any():
+        return np.nan
+    # Poles come out of the eigenvalue solver in arbitrary order per model order
+    res = np.sort(np.where(both, result.Fn_poles, np.inf), axis=0)
+    exp = np.sort(np.where(both, exact.Fn_poles, np.inf), axis=0)
+    valid = np.isfinite(exp)
+    return np.max(np.abs(res[valid] - exp[valid]) / exp[valid])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--br", type=int, nargs="+", default=[30, 60, 120])
+    parser.add_argument("--channels", type=int, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--ordmax", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    record = np.loadtxt(DATA_PATH)
+    print(f"{'br':>4} {'channels':>8} {'Hankel':>9} {'svd':>10} {'time [ms]':>10} "
+          f"{'speedup':>8} {'max rel. error':>14}")
+    for n_channels in args.channels:
+        data = make_channels(record, n_channels)
+        for br in args.br:
+            H, _ = ssi.build_hank(Y=data, Yref=data, br=br, method="cov_mm", calc_unc=False)
+            exact_time = None
+            for svd in ("full", "truncated", "randomized"):
+                run_params = SSIWrapperRunParams(br=br, ordmax=args.ordmax, svd=svd)
+                start = time.perf_counter()
+                for _ in range(args.repeats):
+                    result = ssi_from_hankel(H, None, run_params, 1 / FS)
+                elapsed = (time.perf_counter() - start) / args.repeats
+                if svd == "full":
+                    exact, exact_time = result, elapsed
+                shape = f"{H.shape[0]}x{H.shape[1]}"
+                print(f"{br:>4} {n_channels:>8} {shape:>9} {svd:>10} {elapsed * 1e3:>10,.1f} "
+                      f"{exact_time / elapsed:>8.2f} {max_rel_error(result, exact):>14.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measures `sys_id.sysid` on the 4-DOF test record with each uncertainty
+tier: 'none' and 'full' (the default of `sysid`, which the frequency and
+damping covariances for mode tracking need).
+
+The time column is the mean of the runs; the memory column is the peak of
+the Python allocations (tracemalloc) during one run.
+"""
+# pylint: disable=invalid-name
+import argparse
+import contextlib
+import io
+import logging
+import time
+import tracemalloc
+import warnings
+import numpy as np
+
+from methods.sys_id import sysid
+from methods.packages.pyoma.ssiWrapper import UNCERTAINTY_TIERS
+
+DATA_PATH = "tests/integration/input_data/Acc_4DOF.txt"
+FS = 100
+
+
+def run(data, params):
+    # sysid prints its inputs
+    with contextlib.redirect_stdout(io.StringIO()):
+        return sysid(data, params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--br", type=int, default=30)
+    parser.add_argument("--ordmax", type=int, nargs="+", default=[20, 40])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    data = np.loadtxt(DATA_PATH).T
+
+    print(f"{'ordmax':>6} {'tier':>6} {'time [ms]':>10} {'peak memory [MB]':>17}")
+    for ordmax in args.ordmax:
+        for tier in UNCERTAINTY_TIERS:
+            params = {"Fs": FS, "block_shift": args.br, "model_order": ordmax,
+                      "uncertainty": tier}
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                run(data, params)
+            elapsed = (time.perf_counter() - start) / args.repeats
+
+            tracemalloc.start()
+            run(data, params)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{ordmax:>6} {tier:>6} {elapsed * 1e3:>10,.1f} {peak / 1e6:>17,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Binary recording format for MQTT messages, and conversion to and from the
+JSONL format of record.py.
+
+A log file starts with the magic b"MQLOG1\n" and holds one record per message:
+    - timestamp (int64, microseconds since the epoch, UTC)
+    - payload_length (uint32)
+    - the raw payload
+All integers are little-endian. Records are only appended, so a log cut
+short by a crash is readable up to its last complete record.
+
+Usage:
+    python record/binary_log.py to-binary record/mqtt_recordings/data1.jsonl data1.mqlog
+    python record/binary_log.py to-jsonl data1.mqlog record/mqtt_recordings/data1.jsonl
+"""
+import os
+import sys
+import json
+import time
+import struct
+import threading
+from datetime import datetime, timedelta
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+MAGIC = b"MQLOG1\n"
+RECORD_HEADER = struct.Struct("<qI")
+
+BUFFER_SIZE = 1 << 20  # Bytes buffered per writer before they go to the file
+FSYNC_INTERVAL = 5.0  # Max seconds written data waits before it is flushed to disk
+CHUNK_SIZE = 1 << 30  # Bytes per chunk file before a new one is started
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_micros(timestamp: datetime) -> int:
+    """Microseconds since the epoch of a naive UTC timestamp, as record.py writes them."""
+    return (timestamp - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+class BinaryLogWriter:  # pylint: disable=too-many-instance-attributes
+    """
+    Appends messages to per-topic chunked binary logs through a buffered file.
+
+    The chunks are named `<base>.<n>.mqlog`, starting at the first unused
+    number, and a new chunk starts once `chunk_size` bytes are written. A
+    background thread flushes and fsyncs the buffer every `fsync_interval`
+    seconds if anything was written since, so an idle recorder does not
+    hold back its last messages; `close` flushes the rest.
+    """
+
+    def __init__(self, base_path: str, chunk_size: int = CHUNK_SIZE,
+                 fsync_interval: float = FSYNC_INTERVAL, buffer_size: int = BUFFER_SIZE):
+        self.base_path = base_path
+        self.chunk_size = chunk_size
+        self.fsync_interval = fsync_interval
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._chunk = 0
+        while os.path.exists(self.chunk_path(self._chunk)):
+            self._chunk += 1
+        self._file: Optional[BinaryIO] = None
+        self._written = 0
+        self._unsynced = False
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically,
+                                         name=f"flush-{os.path.basename(base_path)}",
+                                         daemon=True)
+        self._flusher.start()
+
+    def chunk_path(self, chunk: int) -> str:
+        return f"{self.base_path}.{chunk:04d}.mqlog"
+
+    def write(self, payload: bytes, timestamp: Optional[datetime] = None) -> None:
+        """Appends one message, received at `timestamp` (naive UTC, default: now)."""
+        micros = _to_micros(timestamp) if timestamp is not None else time.time_ns() // 1000
+        with self._lock:
+            if self._file is None or self._written >= self.chunk_size:
+                self._open_next_chunk()
+            self._file.write(RECORD_HEADER.pack(micros, len(payload)))
+            self._file.write(payload)
+            self._written += RECORD_HEADER.size + len(payload)
+            self._unsynced = True
+
+    def close(self) -> None:
+        """Stops the flush thread, then flushes and closes the current chunk."""
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if self._file is not None and self._unsynced:
+                    self._sync()
+
+    def _open_next_chunk(self) -> None:
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._chunk += 1
+        directory = os.path.dirname(self.base_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # pylint: disable=consider-using-with
+        self._file = open(self.chunk_path(self._chunk), "ab", buffering=self.buffer_size)
+        self._file.write(MAGIC)
+        self._written = len(MAGIC)
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = False
+
+
+def read_binary_log(path: str) -> Iterator[Tuple[datetime, bytes]]:
+    """
+    Yields (timestamp, payload) of each complete record of a log file.
+
+    Raises:
+        ValueError: If the file is not a binary log.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a binary MQTT log")
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            micros, length = RECORD_HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+            yield _from_micros(micros), payload
+
+
+def chunk_paths(base_path: str) -> Iterator[str]:
+    """Yields the existing chunk files of `base_path` in order."""
+    chunk = 0
+    while os.path.exists(path := f"{base_path}.{chunk:04d}.mqlog"):
+        yield path
+        chunk += 1
+
+
+def read_jsonl(path: str) -> Iterator[Tuple[datetime, bytes]]:
+    """Yields (timestamp, payload) of each line of a JSONL recording."""
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            payload = record["payload"]
+            payload = bytes(payload) if isinstance(payload, list) else bytes.fromhex(payload)
+            yield datetime.fromisoformat(record["timestamp"]), payload
+
+
+def jsonl_to_binary(jsonl_path: str, log_path: str) -> int:
+    """Converts a JSONL recording to one binary log file. Returns the number of messages."""
+    count = 0
+    with open(log_path, "wb", buffering=BUFFER_SIZE) as file:
+        file.write(MAGIC)
+        for timestamp, payload in read_jsonl(jsonl_path):
+            file.write(RECORD_HEADER.pack(_to_micros(timestamp), len(payload)))
+            file.write(payload)
+            count += 1
+    return count
+
+
+def binary_to_jsonl(log_path: str, jsonl_path: str) -> int:
+    """Converts a binary log file to a JSONL recording. Returns the number of messages."""
+    count = 0
+    with open(jsonl_path, "w", encoding="utf-8") as file:
+        for timestamp, payload in read_binary_log(log_path):
+            record = {"timestamp": timestamp.isoformat(), "payload": list(payload)}
+            file.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+
+def main(argv):
+    if len(argv) != 4 or argv[1] not in ("to-binary", "to-jsonl"):
+        print(__doc__)
+        sys.exit(1)
+    convert = jsonl_to_binary if argv[1] == "to-binary" else binary_to_jsonl
+    count = convert(argv[2], argv[3])
+    print(f"Converted {count} messages from {argv[2]} to {argv[3]}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
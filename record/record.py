@@ -4,6 +4,7 @@ import json
 import threading
 from datetime import datetime
 import paho.mqtt.client as mqtt
+from binary_log import BinaryLogWriter
 
 # MQTT Configuration
 MQTT_CONFIG = {
@@ -22,12 +23,23 @@ MQTT_CONFIG = {
 
 DURATION_SECONDS = 3000 
 
+# "jsonl": one JSON line per message with the payload as a list of ints (default)
+# "binary": raw payloads in per-topic chunked logs (<file>.<n>.mqlog, see binary_log.py),
+# opt in with RECORD_FORMAT=binary
+RECORD_FORMAT = os.environ.get("RECORD_FORMAT", "jsonl")
+
 # Ensure output directory exists
 os.makedirs("mqtt_recordings", exist_ok=True)
 
 # Thread-safe file locks
 file_locks = {topic: threading.Lock() for topic in MQTT_CONFIG["TopicsToSubscribe"]}
 
+# Buffered binary writers, kept open for the whole recording
+log_writers = {
+    topic: BinaryLogWriter(os.path.splitext(path)[0])
+    for topic, path in MQTT_CONFIG["TopicsToSubscribe"].items()
+} if RECORD_FORMAT == "binary" else {}
+
 
 def on_connect(client, userdata, flags, rc, properties):
     print("Connected with result code", rc)
@@ -38,7 +50,9 @@ def on_connect(client, userdata, flags, rc, properties):
 
 def on_message(client, userdata, msg):
     topic = msg.topic
-    if topic in MQTT_CONFIG["TopicsToSubscribe"]:
+    if topic in log_writers:
+        log_writers[topic].write(msg.payload, datetime.utcnow())
+    elif topic in MQTT_CONFIG["TopicsToSubscribe"]:
         timestamp = datetime.utcnow().isoformat()
         record = {
             "timestamp": timestamp,
@@ -64,6 +78,8 @@ def record_mqtt():
 
     client.loop_stop()
     client.disconnect()
+    for writer in log_writers.values():
+        writer.close()
     print("Recording complete.")
 
 
@@ -1,7 +1,9 @@
 import os
 import json
 import time
+import itertools
 from datetime import datetime
+from binary_log import chunk_paths, read_binary_log
 from paho.mqtt.client import Client as MQTTClient, CallbackAPIVersion, MQTTv5  # type: ignore
 
 RECORDINGS_DIR = "record/mqtt_recordings"
@@ -36,39 +38,50 @@ def replay_mqtt_messages():
     publish_client.loop_start()
 
     files = {}
+    iterators = {}
     for fname in TOPIC_MAPPING:
         path = os.path.join(RECORDINGS_DIR, fname)
+        # Binary recordings of the same topic: <name>.<n>.mqlog
+        chunks = list(chunk_paths(os.path.splitext(path)[0]))
+        if not os.path.exists(path) and chunks:
+            iterators[fname] = itertools.chain.from_iterable(
+                read_binary_log(chunk) for chunk in chunks)
+            continue
         if not os.path.exists(path):
             print(f"[SKIP] File not found: {path}")
             continue
         files[fname] = open(path, "r", encoding="utf-8")
+        iterators[fname] = iter(files[fname])
 
-    iterators = {fname: iter(files[fname]) for fname in files}
-
-    prev_timestamps = {fname: None for fname in files}
+    prev_timestamps = {fname: None for fname in iterators}
     done = set()
 
 
-    while len(done) < len(files):
+    while len(done) < len(iterators):
         for fname, fiter in iterators.items():
             if fname in done:
                 continue
 
             try:
                 line = next(fiter)
-                record = json.loads(line.strip())
-                payload = record["payload"]
-                if isinstance(payload, list):
-                    payload_bytes = bytes(payload)
-                elif isinstance(payload, str):
-                    payload_bytes = bytes.fromhex(payload)
+                if isinstance(line, tuple):
+                    current_timestamp, payload_bytes = line
+                    record = {}
                 else:
-                    raise ValueError("Invalid payload format")
+                    record = json.loads(line.strip())
+                    payload = record["payload"]
+                    if isinstance(payload, list):
+                        payload_bytes = bytes(payload)
+                    elif isinstance(payload, str):
+                        payload_bytes = bytes.fromhex(payload)
+                    else:
+                        raise ValueError("Invalid payload format")
+                    timestamp_str = record.get("timestamp")
+                    current_timestamp = (datetime.fromisoformat(timestamp_str)
+                                         if timestamp_str else None)
 
                 qos = record.get("qos", 1)
-                timestamp_str = record.get("timestamp")
-                if timestamp_str:
-                    current_timestamp = datetime.fromisoformat(timestamp_str)
+                if current_timestamp:
                     prev = prev_timestamps[fname]
                     if prev:
                         delay = (current_timestamp - prev).total_seconds()
@@ -0,0 +1,110 @@
+from typing import Optional, Sequence
+import numpy as np
+
+
+class AlignedBlock:
+    """
+    Growable (channels x samples) float32 matrix of aligned samples.
+
+    Column `j` holds the samples with absolute index `start_index + j`
+    (samples since DAQ start) for every channel. Samples are appended at
+    the end and consumed from the front, so reading a window is a slice.
+
+    Appending never writes to columns that were already filled; when the
+    matrix is full, the retained columns are moved into a new array. Views
+    returned by `window()` therefore stay valid after further appends, but
+    each one keeps the whole array it was taken from alive, up to twice
+    `max_samples` columns, until the view is released. Copy a window that
+    is kept for long.
+
+    The block is not thread-safe; the owner is expected to hold a lock.
+    """
+
+    def __init__(self, num_channels: int, max_samples: int, dtype: np.dtype = np.float32):
+        """
+        Parameters:
+            num_channels (int): Number of rows (channels).
+            max_samples (int): Maximum number of retained columns. The oldest
+                columns are dropped when more samples are appended.
+            dtype (np.dtype): The storage type of the samples.
+        """
+        self._num_channels = num_channels
+        self._max_samples = max_samples
+        self._data = np.empty((num_channels, 0), dtype=dtype)
+        self._head = 0
+        self._tail = 0
+        self._start_index: Optional[int] = None
+
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+
+    @property
+    def start_index(self) -> Optional[int]:
+        """Absolute index of the first retained sample, or None if never started."""
+        return self._start_index
+
+
+    @property
+    def end_index(self) -> Optional[int]:
+        """Absolute index expected for the next appended sample."""
+        if self._start_index is None:
+            return None
+        return self._start_index + len(self)
+
+
+    def reset(self, start_index: int) -> None:
+        """Drops all samples and restarts the block at `start_index`."""
+        # Filled columns are not rewritten, so earlier windows stay valid
+        self._head = self._tail
+        self._start_index = start_index
+
+
+    def append(self, rows: Sequence[np.ndarray]) -> None:
+        """
+        Appends one equally long array per channel at `end_index`.
+        """
+        num_samples = len(rows[0]) if len(rows) else 0
+        if num_samples == 0:
+            return
+        self._reserve(num_samples)
+        for ch_idx, row in enumerate(rows):
+            self._data[ch_idx, self._tail:self._tail + num_samples] = row
+        self._tail += num_samples
+        if len(self) > self._max_samples:
+            self.advance(len(self) - self._max_samples)
+
+
+    def last_column(self) -> Optional[np.ndarray]:
+        """Returns a copy of the most recently appended column, even if it was advanced past."""
+        if self._tail == 0:
+            return None
+        return self._data[:, self._tail - 1].copy()
+
+
+    def window(self, num_samples: int) -> np.ndarray:
+        """
+        Returns a (channels x num_samples) view of the oldest samples. The
+        view keeps the whole backing array alive, see the class docstring.
+        """
+        return self._data[:, self._head:self._head + num_samples]
+
+
+    def advance(self, num_samples: int) -> None:
+        """Drops the `num_samples` oldest samples."""
+        num_samples = min(num_samples, len(self))
+        self._head += num_samples
+        if self._start_index is not None:
+            self._start_index += num_samples
+
+
+    def _reserve(self, num_samples: int) -> None:
+        if self._tail + num_samples <= self._data.shape[1]:
+            return
+        retained = len(self)
+        capacity = max(self._data.shape[1], 2 * (retained + num_samples))
+        data = np.empty((self._num_channels, capacity), dtype=self._data.dtype)
+        data[:, :retained] = self._data[:, self._head:self._tail]
+        self._data = data
+        self._head, self._tail = 0, retained
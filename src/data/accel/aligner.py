@@ -1,9 +1,19 @@
 # pylint: disable=W0107
 import abc
+from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Optional, Tuple
 import numpy as np
 
+
+@dataclass
+class AlignedWindow:
+    data: np.ndarray  # Shape (num_channels, num_samples)
+    timestamp: Optional[datetime]  # When the window was extracted, None if no window
+    filled_samples: int = 0  # Samples per channel that were filled in for gaps
+    start_index: Optional[int] = None  # Samples since DAQ start of the first sample
+
+
 class IAligner(abc.ABC):
     @abc.abstractmethod
     def find_continuous_key_groups(self) -> Tuple[Optional[int], Optional[List[List[int]]]]:
@@ -20,12 +30,17 @@ class IAligner(abc.ABC):
 
 
     @abc.abstractmethod
-    def extract(self, requested_samples: int) -> Tuple[np.ndarray, Optional[datetime]]:
+    def extract(self, requested_samples: int,
+                hop_samples: Optional[int] = None) -> Tuple[np.ndarray, Optional[datetime]]:
         """
         Extracts aligned accelerometer samples from all channels.
 
         Parameters:
             requested_samples (int): The number of aligned samples to extract.
+            hop_samples (Optional[int]): The number of samples the next window
+                starts after this one. The remaining `requested_samples - hop_samples`
+                samples are kept for the next, overlapping window.
+                Defaults to `requested_samples` (disjoint windows).
 
         Returns:
             Tuple:
@@ -34,3 +49,17 @@ class IAligner(abc.ABC):
                             when the aligned samples were extracted, or None on failure.
         """
         pass
+
+
+    @abc.abstractmethod
+    def extract_window(self, requested_samples: int,
+                       hop_samples: Optional[int] = None) -> AlignedWindow:
+        """
+        Same as `extract`, and also reports how many samples of the window
+        were filled in to bridge gaps.
+
+        Returns:
+            AlignedWindow: The window. Its data has shape (0, num_channels)
+                            if not enough aligned samples are available.
+        """
+        pass
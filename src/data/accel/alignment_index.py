@@ -0,0 +1,134 @@
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+
+class AlignmentIndex:  # pylint: disable=too-many-instance-attributes
+    """
+    Tracks which batches have been received by every channel.
+
+    Channels report each stored batch with `add()`. A key becomes complete
+    once all channels have reported it, and complete keys that follow each
+    other without a gap are merged into runs, indexed by both their first
+    and their end sample index. Adding a batch, checking how many aligned
+    samples follow a sample index and popping the next batch are O(1).
+
+    The index is not thread-safe; the owner is expected to hold a lock.
+    """
+
+    def __init__(self, num_channels: int, max_samples: int):
+        """
+        Parameters:
+            num_channels (int): Number of channels that must report a key.
+            max_samples (int): Keys more than `max_samples` samples older than
+                the newest batch are dropped, as the channels evict them too.
+        """
+        self._full_mask = (1 << num_channels) - 1
+        self._max_samples = max_samples
+        # key -> (bitmask of channels that reported it, smallest batch size)
+        self._pending: Dict[int, Tuple[int, int]] = {}
+        # key -> batch size, for keys reported by every channel
+        self._complete: Dict[int, int] = {}
+        self._run_end_by_start: Dict[int, int] = {}
+        self._run_start_by_end: Dict[int, int] = {}
+        # All keys in ascending order, used to drop old keys. Popped keys
+        # are removed lazily by `discard_before()`.
+        self._keys = deque()
+        self._floor = None
+
+
+    def add(self, channel: int, key: int, num_samples: int) -> bool:
+        """
+        Records that `channel` stored the batch at `key`.
+
+        Returns:
+            bool: True if the key became complete with this batch.
+        """
+        if (self._floor is not None and key < self._floor) or key in self._complete:
+            return False
+        mask, size = self._pending.get(key, (0, num_samples))
+        if not mask:
+            self._insert_key(key)
+        mask |= 1 << channel
+        size = min(size, num_samples)
+
+        complete = mask == self._full_mask
+        if not complete:
+            self._pending[key] = (mask, size)
+        else:
+            self._pending.pop(key, None)
+            self._complete[key] = size
+            self._merge_run(key, key + size)
+
+        oldest_retained = key + size - self._max_samples
+        if self._floor is None or oldest_retained > self._floor:
+            self.discard_before(oldest_retained)
+        return complete and key in self._complete
+
+
+    def available(self, start_index: int) -> int:
+        """Returns the number of aligned samples in the run starting at `start_index`."""
+        return self._run_end_by_start.get(start_index, start_index) - start_index
+
+
+    def first_run(self, start_index: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """
+        Returns (start, end) of the oldest run of complete keys, or of the
+        oldest run starting at or after `start_index`. None if there is none.
+        O(number of runs).
+        """
+        starts = [start for start in self._run_end_by_start
+                  if start_index is None or start >= start_index]
+        if not starts:
+            return None
+        start = min(starts)
+        return start, self._run_end_by_start[start]
+
+
+    def longest_run(self) -> int:
+        """Returns the number of samples in the longest run. O(number of runs)."""
+        return max((end - start for start, end in self._run_end_by_start.items()), default=0)
+
+
+    def pop(self, key: int) -> Optional[int]:
+        """
+        Removes the complete key at the start of a run.
+
+        Returns:
+            Optional[int]: The batch size of the key, or None if no run starts at `key`.
+        """
+        if key not in self._run_end_by_start:
+            return None
+        size = self._complete.pop(key)
+        end = self._run_end_by_start.pop(key)
+        if key + size < end:
+            self._run_end_by_start[key + size] = end
+            self._run_start_by_end[end] = key + size
+        else:
+            del self._run_start_by_end[end]
+        return size
+
+
+    def discard_before(self, index: int) -> None:
+        """Drops all keys older than `index` and ignores them if they arrive later."""
+        self._floor = index if self._floor is None else max(self._floor, index)
+        while self._keys and self._keys[0] < self._floor:
+            key = self._keys.popleft()
+            if self._pending.pop(key, None) is None:
+                self.pop(key)
+
+
+    def _insert_key(self, key: int) -> None:
+        # Batches normally arrive in order
+        pos = len(self._keys)
+        while pos > 0 and self._keys[pos - 1] > key:
+            pos -= 1
+        self._keys.insert(pos, key)
+
+
+    def _merge_run(self, start: int, end: int) -> None:
+        if start in self._run_start_by_end:
+            start = self._run_start_by_end.pop(start)
+        if end in self._run_end_by_start:
+            end = self._run_end_by_start.pop(end)
+        self._run_end_by_start[start] = end
+        self._run_start_by_end[end] = start
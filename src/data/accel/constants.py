@@ -7,3 +7,7 @@ INTERVAL = 0.001  # Check every 0.001s to see if samples are collected
 MIN_SAMPLES_NEEDED = 500  # Minimum samples needed before running it to sysid
 
 WAIT_METADATA = 11 # Wait max 11 seconds for getting metadata message
+
+METADATA_CACHE_FILE = "~/.cache/example-shm/metadata.json" # Last metadata per topic
+
+INGESTION_QUEUE_SIZE = 1024 # Max messages waiting per ingestion worker before they are dropped
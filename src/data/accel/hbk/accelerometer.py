@@ -1,20 +1,25 @@
+import itertools
 import threading
-import struct
 from collections import deque
-from typing import Tuple, Any, Optional, List
+from typing import Tuple, Any, Callable, Optional, List
 import numpy as np
 import paho.mqtt.client as mqtt
 # Project Imports
 from data.accel.accelerometer import IAccelerometer
 from data.accel.constants import MAX_MAP_SIZE
-from data.accel.metadata_constants import DESCRIPTOR_LENGTH_BYTES
+from data.accel.ingestion import IngestionExecutor
+from data.accel.hbk import codec
+from data.accel.ring_buffer import SampleRingBuffer
 
-class Accelerometer(IAccelerometer):
+class Accelerometer(IAccelerometer):  # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
     def __init__(
         self,
         mqtt_client: mqtt.Client,
         topic: str,
-        map_size: int = MAX_MAP_SIZE ):
+        map_size: int = MAX_MAP_SIZE,
+        executor: Optional[IngestionExecutor] = None,
+        subscribe: bool = True ):
         """
         Initializes the Accelerometer instance with a pre-configured MQTT client.
 
@@ -22,31 +27,53 @@ class Accelerometer(IAccelerometer):
             mqtt_client: A pre-configured and connected MQTT client.
             topic (str): The MQTT topic to subscribe to. Defaults to "channel 0 topic".
             map_size (int): The maximum number of samples to store in the Map.
+            executor (IngestionExecutor): Executor that processes incoming messages.
+                Several channels can share one executor, which its owner shuts
+                down. By default the channel gets its own single worker, which
+                `close()` stops.
+            subscribe (bool): Subscribe to `topic` and install the client's
+                `on_message` callback. Set to False when messages are routed
+                to the channel, e.g. by a `ChannelRouter`.
         """
         self.mqtt_client = mqtt_client
+        self._owns_executor = executor is None
+        self.executor = executor or IngestionExecutor(name=f"ingestion-{topic}")
 
         self.topic = topic
         self._map_size = map_size
         self.data_map = {}
+        # Keys of data_map in ascending order and the number of samples stored,
+        # so that eviction does not rescan the whole map
+        self._sorted_keys = deque()
+        self._total_samples = 0
         self._lock = threading.Lock()
+        self._listeners: List[Callable[[int, int], None]] = []
 
         # Setting up MQTT callback
-        self.mqtt_client.subscribe(self.topic, qos=1)
-
-        self.mqtt_client.on_message = self._on_message
+        if subscribe:
+            self.mqtt_client.subscribe(self.topic, qos=1)
+            self.mqtt_client.on_message = self._on_message
 
     # pylint: disable=unused-argument
     def _on_message(self, client: Any, userdata: Any, msg: mqtt.MQTTMessage) -> None:
         """Handles incoming MQTT messages."""
         print(f"Received message on topic {msg.topic}")
+        self.submit_message(msg)
+
 
-        def safe_process():  # This ensures that an exception does not crash the entire thread
-            try:
-                self.process_message(msg)
-            except Exception as e:
-                print(f"Error processing message: {e}")
+    def submit_message(self, msg: mqtt.MQTTMessage) -> bool:
+        """
+        Queues a message for processing on the ingestion executor.
+        Messages of this channel are processed in the order they are submitted.
 
-        threading.Thread(target=safe_process, daemon=True).start()
+        Returns:
+            bool: False if the message was dropped because the queue is full
+                or the executor is shut down.
+        """
+        if not self.executor.submit(self.topic, self._ingest, msg):
+            print(f"Ingestion queue full or shut down, dropped message on topic {msg.topic}")
+            return False
+        return True
 
 
     def process_message(self, msg: mqtt.MQTTMessage) -> None:
@@ -59,39 +86,92 @@ class Accelerometer(IAccelerometer):
             the oldest key is removed (oldest data batch is discarded).
             """
         try:
-            raw_payload = msg.payload
-
-            descriptor_length = struct.unpack("<H", raw_payload[:DESCRIPTOR_LENGTH_BYTES])[0]
-            (descriptor_length, _, __, ___,
-             samples_from_daq_start,) = struct.unpack("<HHQQQ", raw_payload[:descriptor_length])
-
-            # Extract sensor data
-            data_payload = raw_payload[descriptor_length:]
-            num_samples = len(data_payload) // 4
-            accel_values = struct.unpack(f"<{num_samples}f", data_payload)
-
-            # Store each data batch (e.g 32 samples in one message)
-            # in the map samples_from_daq_start is used as the key for each batch
-            with self._lock:
-                if samples_from_daq_start not in self.data_map:
-                    self.data_map[samples_from_daq_start] = deque(accel_values)
-
-                total_samples = sum(len(dq) for dq in self.data_map.values())
-                # Check if the total samples in the map exceeds the max,
-                # then remove the oldest data batch
-                while total_samples > self._map_size:
-                    oldest_key = min(self.data_map.keys())  # Find the oldest batch
-                    oldest_deque = self.data_map[oldest_key]
-                    oldest_deque.popleft() # Delete samples from the oldest deque
-                    if not oldest_deque:  # Remove the key/deque from the map if it's empty
-                        del self.data_map[oldest_key]
-                    total_samples = sum(len(dq) for dq in self.data_map.values())
-            print(f" Channel: {self.topic}  Key: {samples_from_daq_start}, Samples: {num_samples}")
-
+            self._ingest(msg)
         except Exception as e:
             print(f"Error processing message: {e}")
 
 
+    def _ingest(self, msg: mqtt.MQTTMessage) -> None:
+        """
+        Decodes and stores one message. Errors propagate, so the ingestion
+        executor counts the message as failed instead of processed.
+        """
+        # accel_values is a float32 view over the payload, not a copy
+        descriptor, accel_values = codec.decode(msg.payload)
+        samples_from_daq_start = descriptor.samples_from_daq_start
+
+        self._store(samples_from_daq_start, accel_values)
+        print(f" Channel: {self.topic}  Key: {samples_from_daq_start}, "
+              f"Samples: {len(accel_values)}")
+
+
+    def add_listener(self, callback: Callable[[int, int], None]) -> None:
+        """
+        Registers `callback(key, num_samples)`, called after a new batch has been stored.
+        It runs on the ingestion worker, without the accelerometer lock held.
+        """
+        self._listeners.append(callback)
+
+
+    def _store(self, samples_from_daq_start: int, accel_values: np.ndarray) -> None:
+        """
+        Stores one data batch (e.g 32 samples in one message)
+        and notifies the listeners if it is new.
+        """
+        with self._lock:
+            stored = self._write(samples_from_daq_start, accel_values)
+        if stored:
+            for callback in self._listeners:
+                callback(samples_from_daq_start, len(accel_values))
+
+
+    def _write(self, samples_from_daq_start: int, accel_values: np.ndarray) -> bool:
+        """
+        Stores one data batch in the map. samples_from_daq_start is used
+        as the key for each batch. Must be called with the lock held.
+
+        Returns:
+            bool: True if the batch was stored, False if the key already exists.
+        """
+        stored = samples_from_daq_start not in self.data_map
+        if stored:
+            self.data_map[samples_from_daq_start] = deque(accel_values.tolist())
+            self._insert_key(samples_from_daq_start)
+            self._total_samples += len(accel_values)
+        # Check if the total samples in the map exceeds the max,
+        # then remove the oldest data
+        self._evict_oldest(self._total_samples - self._map_size)
+        return stored
+
+
+    def _insert_key(self, key: int) -> None:
+        """Inserts a key into the ordered key index. Batches normally arrive in order."""
+        pos = len(self._sorted_keys)
+        while pos > 0 and self._sorted_keys[pos - 1] > key:
+            pos -= 1
+        self._sorted_keys.insert(pos, key)
+
+
+    def _evict_oldest(self, samples_to_remove: int) -> None:
+        """
+        Removes `samples_to_remove` samples from the oldest batches.
+        Whole batches are dropped at once; only the last batch is trimmed.
+        """
+        while samples_to_remove > 0 and self._sorted_keys:
+            oldest_key = self._sorted_keys[0]
+            oldest_deque = self.data_map[oldest_key]
+            if len(oldest_deque) <= samples_to_remove:
+                samples_to_remove -= len(oldest_deque)
+                self._total_samples -= len(oldest_deque)
+                self._sorted_keys.popleft()
+                del self.data_map[oldest_key]
+            else:
+                for _ in range(samples_to_remove):
+                    oldest_deque.popleft()
+                self._total_samples -= samples_to_remove
+                samples_to_remove = 0
+
+
     def get_batch_size(self) -> Optional[int]:
         """
         Returns the number of samples in the first available data batch.
@@ -109,7 +189,13 @@ class Accelerometer(IAccelerometer):
         Returns the sorted list of sample keys currently available.
         """
         with self._lock:
-            return sorted(self.data_map.keys())
+            return list(self._sorted_keys)
+
+
+    def has_key(self, key: int) -> bool:
+        """Returns True if the batch at `key` is stored, without copying it."""
+        with self._lock:
+            return key in self.data_map
 
 
     def get_samples_for_key(self, key: int) -> Optional[List[float]]:
@@ -130,28 +216,20 @@ class Accelerometer(IAccelerometer):
         """
         with self._lock:
             # Delete older keys
-            keys_to_delete = [k for k in self.data_map if k < start_key]
-            for k in keys_to_delete:
-                del self.data_map[k]
+            while self._sorted_keys and self._sorted_keys[0] < start_key:
+                oldest_key = self._sorted_keys.popleft()
+                self._total_samples -= len(self.data_map.pop(oldest_key))
 
             # Remove samples from start_key and onwards until all samples used are removed
-            keys = sorted(k for k in self.data_map if k >= start_key)
-            remaining_to_remove = samples_to_remove
-
-            for key in keys:
-                if remaining_to_remove <= 0:
-                    break
-                dq = self.data_map[key]
-                num_available = len(dq)
-                num_to_remove = min(remaining_to_remove, num_available)
+            self._evict_oldest(samples_to_remove)
 
-                for _ in range(num_to_remove):
-                    dq.popleft()
 
-                if not dq:
-                    del self.data_map[key]
-
-                remaining_to_remove -= num_to_remove
+    def clear(self) -> None:
+        """Removes all samples from the buffer."""
+        with self._lock:
+            self.data_map.clear()
+            self._sorted_keys.clear()
+            self._total_samples = 0
 
 
     def read(self, requested_samples: int) -> Tuple[(int, np.ndarray)]:
@@ -168,34 +246,92 @@ class Accelerometer(IAccelerometer):
                 - data: A NumPy array of shape (n_samples,).
         """
         with self._lock:
-            sorted_keys = sorted(self.data_map.keys())
-
             samples = []
-            samples_collected = 0
-
-            for key in sorted_keys:
+            for key in self._sorted_keys:
+                if len(samples) >= requested_samples:
+                    break
                 entry = self.data_map[key]  # Access the deque directly
+                samples.extend(itertools.islice(entry, requested_samples - len(samples)))
 
-                if samples_collected + len(entry) <= requested_samples:
-                    # Take the whole entry and remove it
-                    samples.extend(entry)
-                    samples_collected += len(entry)
-                    del self.data_map[key]
-                else:
-                    # Take only the required number of samples
-                    remaining_samples = requested_samples - samples_collected
-                    # Using list here because we need to slice it in order to only take what we need
-                    samples.extend(list(entry)[:remaining_samples])
-                    for _ in range(remaining_samples):
-                        entry.popleft()  # Remove samples from deque
-                    samples_collected += remaining_samples
-                    break  # Stop once we have enough samples
-
-            samples = np.array(samples, dtype=np.float64)
-            status = 1 if samples_collected == requested_samples else 0
+            self._evict_oldest(len(samples))
+            status = 1 if len(samples) == requested_samples else 0
 
-        return status, samples
+        return status, np.array(samples, dtype=np.float64)
 
 
     def acquire_lock(self)-> threading.Lock:
         return self._lock
+
+
+    def close(self) -> None:
+        """
+        Stops the ingestion worker if the channel created it. A shared
+        executor is left to its owner.
+        """
+        if self._owns_executor:
+            self.executor.shutdown()
+
+
+class RingBufferAccelerometer(Accelerometer):
+    """
+    Accelerometer that keeps its samples in a preallocated float32
+    `SampleRingBuffer` instead of a dictionary of deques.
+
+    Samples are stored at their index since DAQ start, so `read()`,
+    `get_samples_for_key()` and `clear_used_data()` are slice operations.
+    Returned samples are float32.
+    """
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    def __init__(
+        self,
+        mqtt_client: mqtt.Client,
+        topic: str,
+        map_size: int = MAX_MAP_SIZE,
+        executor: Optional[IngestionExecutor] = None,
+        subscribe: bool = True ):
+        # Created before subscribing, as messages can arrive as soon as on_message is installed
+        self._buffer = SampleRingBuffer(map_size)
+        super().__init__(mqtt_client, topic=topic, map_size=map_size, executor=executor,
+                         subscribe=subscribe)
+
+
+    def _write(self, samples_from_daq_start: int, accel_values: np.ndarray) -> bool:
+        # Copies the decoded payload view straight into the ring buffer
+        return self._buffer.write(samples_from_daq_start, accel_values)
+
+
+    def get_batch_size(self) -> Optional[int]:
+        with self._lock:
+            return self._buffer.first_batch_size()
+
+
+    def get_sorted_keys(self) -> List[int]:
+        with self._lock:
+            return self._buffer.keys()
+
+
+    def has_key(self, key: int) -> bool:
+        with self._lock:
+            return key in self._buffer
+
+
+    def get_samples_for_key(self, key: int) -> Optional[np.ndarray]:
+        with self._lock:
+            return self._buffer.get(key)
+
+
+    def clear_used_data(self, start_key: int, samples_to_remove: int) -> None:
+        with self._lock:
+            self._buffer.consume(start_key, samples_to_remove)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffer.clear()
+
+
+    def read(self, requested_samples: int) -> Tuple[(int, np.ndarray)]:
+        with self._lock:
+            samples = self._buffer.read(requested_samples)
+        status = 1 if len(samples) == requested_samples else 0
+        return status, samples
@@ -1,17 +1,31 @@
+import asyncio
 import threading
-from typing import List, Tuple, Optional
+from collections import deque
+from typing import Callable, List, Tuple, Optional, Type
 from datetime import datetime
 import numpy as np
 
 # project imports
-from data.accel.aligner import IAligner
+from data.accel.aligner import AlignedWindow, IAligner
+from data.accel.aligned_block import AlignedBlock
+from data.accel.alignment_index import AlignmentIndex
 from data.accel.hbk.accelerometer import Accelerometer
 from data.accel.constants import MAX_MAP_SIZE
+from data.accel.ingestion import IngestionExecutor
+from data.accel.hbk.router import ChannelRouter
 
 
 
-class Aligner(IAligner):
-    def __init__(self, mqtt_client, topics: list, map_size=MAX_MAP_SIZE, missing_value=np.nan):
+GAP_POLICIES = ("discard", "fill", "interpolate")
+
+
+class Aligner(IAligner):  # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    def __init__(self, mqtt_client, topics: list, map_size=MAX_MAP_SIZE, missing_value=np.nan,
+                 accelerometer_cls: Optional[Type[Accelerometer]] = None,
+                 executor: Optional[IngestionExecutor] = None,
+                 router: Optional[ChannelRouter] = None,
+                 gap_policy: str = "discard", max_gap: int = 0):
         """
         Initializes the Aligner to receive and align data from multiple MQTT topics.
 
@@ -19,25 +33,150 @@ class Aligner(IAligner):
             mqtt_client: MQTT client instance.
             topics (list): List of MQTT topics (one per channel).
             map_size (int): Maximum number of stored keys for each channel.
-            missing_value (float): Value to use when a sample is missing (default: NaN).
+            missing_value (float): Value used for missing samples by the "fill"
+                gap policy (default: NaN).
+            accelerometer_cls: Buffer backend used for each channel, e.g.
+                `RingBufferAccelerometer` (default: `Accelerometer`).
+            executor (IngestionExecutor): Executor shared by all channels to
+                process incoming messages (default: the executor of `router`,
+                or one owned by the aligner with one worker per channel, which
+                `close()` shuts down).
+            router (ChannelRouter): Router that receives the messages of all topics
+                through one subscription. By default the aligner subscribes
+                to each topic.
+            gap_policy (str): What to do when samples are missing between two runs
+                of aligned keys, e.g. after a dropped message:
+                - "discard": restart alignment after the gap (default).
+                - "fill": bridge the gap with `missing_value`.
+                - "interpolate": bridge the gap linearly between the samples
+                  on both sides of it.
+            max_gap (int): Longest gap in samples that "fill" and "interpolate"
+                bridge; longer gaps are discarded.
         """
+        if gap_policy not in GAP_POLICIES:
+            raise ValueError(f"gap_policy must be one of {GAP_POLICIES}, got {gap_policy!r}")
         self.mqtt_client = mqtt_client
         self.topics = topics
         self.map_size = map_size
         self.missing_value = missing_value
+        self.gap_policy = gap_policy
+        self.max_gap = max_gap
+
+        accelerometer_cls = accelerometer_cls or Accelerometer
 
-        self.channels = []
-        self._lock = threading.Lock()
         seen = set()
         # Create one Accelerometer per uniqe topic
         unique_topics = [topic for topic in topics if not (topic in seen or seen.add(topic))]
-        for topic in unique_topics:
-            seen.add(topic)
-            acc = Accelerometer(mqtt_client, topic=topic, map_size=map_size)
+        if executor is None and router is not None:
+            executor = router.executor
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = IngestionExecutor(num_workers=max(1, len(unique_topics)))
+        self.executor = executor
+        self._router = router
+
+        self.channels = []
+        self._lock = threading.Lock()
+        # Notified whenever a batch becomes aligned, see wait_for()
+        self._ready = threading.Condition(self._lock)
+        self._window_callbacks: List[Tuple[int, Callable[[], None]]] = []
+        for ch_idx, topic in enumerate(unique_topics):
+            acc = accelerometer_cls(mqtt_client, topic=topic, map_size=map_size,
+                                    executor=executor, subscribe=False)
+            acc.add_listener(lambda key, num_samples, ch_idx=ch_idx:
+                             self._on_batch(ch_idx, key, num_samples))
             self.channels.append(acc)
-            mqtt_client.subscribe(topic, qos=1)
-            mqtt_client.message_callback_add(topic, lambda _,
-                                             __, msg, acc=acc: acc.process_message(msg))
+            if router is not None:
+                router.add_channel(acc)
+            else:
+                mqtt_client.subscribe(topic, qos=1)
+                mqtt_client.message_callback_add(topic, lambda _,
+                                                 __, msg, acc=acc: acc.submit_message(msg))
+
+        # Samples already aligned across all channels; the channels free
+        # them once copied. Extraction slices from the front.
+        self._block = AlignedBlock(len(self.channels), map_size)
+        # Batches received by every channel that are not in the block yet
+        self._index = AlignmentIndex(len(self.channels), map_size)
+        # (start, end) sample indices of the gaps bridged in the block
+        self._filled = deque()
+        # Window size of the last wait or extraction, which decides whether
+        # the block is restarted after a long gap
+        self._requested_samples: Optional[int] = None
+
+
+    def _on_batch(self, ch_idx: int, key: int, num_samples: int) -> None:
+        """Called by channel `ch_idx` after it stored a new batch."""
+        with self._lock:
+            # Skips a batch that reset() cleared between its store and this call
+            if not self.channels[ch_idx].has_key(key):
+                return
+            if self._index.add(ch_idx, key, num_samples):
+                # Copied into the block once every channel has it, so extraction only slices
+                self._append_aligned_batches(self._requested_samples)
+            self._ready.notify_all()
+            ready = self._pop_ready_callbacks()
+        for callback in ready:
+            callback()
+
+
+    def wait_for(self, requested_samples: int, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until `requested_samples` aligned samples can be extracted.
+
+        Parameters:
+            requested_samples (int): The window size to wait for.
+            timeout (float): Maximum number of seconds to wait (default: no limit).
+
+        Returns:
+            bool: True if the window is available, False if the timeout expired.
+        """
+        with self._ready:
+            self._requested_samples = requested_samples
+            return self._ready.wait_for(
+                lambda: self._available_samples() >= requested_samples, timeout)
+
+
+    def add_window_callback(self, requested_samples: int, callback: Callable[[], None]) -> None:
+        """
+        Calls `callback()` once as soon as `requested_samples` aligned samples
+        can be extracted, or right away if they already can. The callback runs
+        on the ingestion worker that stored the last batch.
+        """
+        with self._lock:
+            self._requested_samples = requested_samples
+            self._window_callbacks.append((requested_samples, callback))
+            ready = self._pop_ready_callbacks()
+        for ready_callback in ready:
+            ready_callback()
+
+
+    async def wait_for_async(self, requested_samples: int) -> None:
+        """
+        Awaitable version of `wait_for()`. Combine with `asyncio.wait_for`
+        for a timeout.
+        """
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def set_ready() -> None:
+            if not ready.done():
+                ready.set_result(None)
+
+        self.add_window_callback(requested_samples,
+                                 lambda: loop.call_soon_threadsafe(set_ready))
+        await ready
+
+
+    def _pop_ready_callbacks(self) -> List[Callable[[], None]]:
+        """Removes and returns the callbacks whose window is available. Needs the lock."""
+        if not self._window_callbacks:
+            return []
+        available = self._available_samples()
+        ready = [callback for n, callback in self._window_callbacks if n <= available]
+        self._window_callbacks = [(n, callback) for n, callback in self._window_callbacks
+                                  if n > available]
+        return ready
 
 
     def _get_common_keys(self, batch_size: Optional[int]) -> Optional[List[int]]:
@@ -77,6 +216,8 @@ class Aligner(IAligner):
 
 
     def find_continuous_key_groups(self) -> Tuple[Optional[int], Optional[List[List[int]]]]:
+        # Rebuilt from the keys of every channel on each call. `extract()` and
+        # `available_samples()` use the incrementally updated index instead.
         if not self.channels:
             return None, None
 
@@ -91,61 +232,175 @@ class Aligner(IAligner):
         return batch_size, self._group_continuous_keys(common_keys, batch_size)
 
 
-    def _extract_aligned_block(self, group: List[int], batch_size: int,
-                               requested_samples: int) -> Tuple[np.ndarray, datetime]:
+    def available_samples(self) -> int:
         """
-        Extracts samples from the given aligned key group.
+        Returns the number of aligned samples that `extract()` can return
+        without waiting for more data.
+        """
+        with self._lock:
+            return self._available_samples()
 
-        Collects aligned samples across all channels and returns them
-        along with the UTC timestamp of the first aligned sample.
 
-        Returns:
-            A tuple (aligned_data, utc_time)
+    def _available_samples(self) -> int:
+        # Either the block continues, possibly across bridged gaps,
+        # or extract() restarts it at a later run
+        end_index = self._block.end_index
+        if end_index is None:
+            run = self._index.first_run()
+            if run is None:
+                return 0
+            end_index = run[0]
+        continued = len(self._block) + self._index.available(end_index)
+        end_index += self._index.available(end_index)
+        while (run := self._index.first_run(end_index)) and self._can_bridge(run[0] - end_index):
+            continued += run[1] - end_index
+            end_index = run[1]
+        return max(continued, self._index.longest_run())
+
+
+    def _can_bridge(self, gap: Optional[int]) -> bool:
+        return self.gap_policy != "discard" and gap is not None and 0 < gap <= self.max_gap
+
+
+    def _append_aligned_batches(self, requested_samples: Optional[int]) -> None:
         """
-        aligned_data = [[] for _ in self.channels]
-        samples_collected = 0
-        utc_time = datetime.now()
+        Copies the batches received by every channel that continue the
+        aligned block into it. It runs for every aligned batch, so only the
+        keys that arrived since the previous call are touched and
+        extraction only slices the block.
 
-        for key in group:
-            entries = [ch.get_samples_for_key(key) for ch in self.channels]
-            for i in range(batch_size):
-                if samples_collected >= requested_samples:
+        Gaps up to `max_gap` samples are bridged according to the gap policy.
+        At a longer gap, the block is restarted at the oldest run of aligned
+        keys if it holds fewer than `requested_samples`; otherwise, or while
+        no window size is known yet, copying stops at the gap until the
+        block has been extracted.
+        """
+        end_index = self._block.end_index
+        while True:
+            gap = 0
+            if self._index.pop(end_index) is None:
+                run = self._index.first_run(end_index)
+                if run is None:
                     break
-                # Iterate over each channel index and
-                # its corresponding data entries for the current key
-                for ch_idx, channel_data in enumerate(entries):
-                    # Get the i-th sample from the channel, if it exists
-                    sample = channel_data[i] if channel_data and i < len(channel_data) else None
-                    # If a valid sample was retrieved,
-                    # append it to the aligned data for that channel
-                    if sample is not None:
-                        aligned_data[ch_idx].append(sample)
-                    else:
-                        print(f"Missing data for channel index {ch_idx} skipping")
-                samples_collected += 1
-            if samples_collected >= requested_samples:
-                break
+                gap = run[0] - end_index if end_index is not None else None
+                if not self._can_bridge(gap):
+                    if end_index is not None and len(self._block) > 0 and (
+                            requested_samples is None or len(self._block) >= requested_samples):
+                        break
+                    self._block.reset(run[0])
+                    self._filled.clear()
+                    gap = 0
+                end_index = run[0]
+                self._index.pop(end_index)
 
-        for ch in self.channels:
-            ch.clear_used_data(group[0], requested_samples)
+            entries = [ch.get_samples_for_key(end_index) for ch in self.channels]
+            if any(entry is None for entry in entries):
+                break  # Evicted from a channel before it could be aligned
+            rows = [np.asarray(entry, dtype=np.float32) for entry in entries]
+            num_samples = min(len(row) for row in rows)
+            if any(len(row) != num_samples for row in rows):
+                print(f"Missing data for key {end_index}, truncating to {num_samples} samples")
+            if gap:
+                self._fill_gap(gap, np.array([row[0] for row in rows]))
+            self._block.append([row[:num_samples] for row in rows])
+            end_index = self._block.end_index
+        # Drops keys that were copied, or are older than the block and
+        # can no longer be aligned
+        if end_index is not None:
+            self._index.discard_before(end_index)
+            # The block holds its own copy of the samples, so the channels
+            # do not need to retain them
+            for ch in self.channels:
+                ch.clear_used_data(end_index, 0)
 
-        aligned_array = np.array(aligned_data, dtype=np.float32)
-        print(f"Aligned shape: {aligned_array.shape}")
-        return aligned_array, utc_time
 
+    def _fill_gap(self, gap: int, next_column: np.ndarray) -> None:
+        """Appends `gap` filled samples per channel before `next_column`."""
+        start_index = self._block.end_index
+        last_column = self._block.last_column()
+        if self.gap_policy == "interpolate" and last_column is not None:
+            weights = np.arange(1, gap + 1, dtype=np.float32) / (gap + 1)
+            filled = last_column[:, None] + (next_column - last_column)[:, None] * weights
+        else:
+            filled = np.full((len(self.channels), gap), self.missing_value, dtype=np.float32)
+        print(f"Filled {gap} missing samples from index {start_index}")
+        self._block.append(filled)
+        self._filled.append((start_index, start_index + gap))
 
-    def extract(self, requested_samples: int) -> Tuple[np.ndarray, Optional[datetime]]:
-        with self._lock:
-            batch_size, key_groups = self.find_continuous_key_groups()
-            #print("Keys", key_groups)
 
-            if batch_size is None or key_groups is None:
+    def _filled_between(self, start_index: int, end_index: int) -> int:
+        """Returns the number of filled samples in [start_index, end_index)."""
+        return sum(max(0, min(end, end_index) - max(start, start_index))
+                   for start, end in self._filled)
+
+
+    def _consume_block(self, requested_samples: int, hop_samples: int) -> AlignedWindow:
+        """
+        Returns the first `requested_samples` of the aligned block, then
+        removes `hop_samples` from its front.
+        """
+        utc_time = datetime.now()
+        start_index = self._block.start_index
+        window = AlignedWindow(
+            data=self._block.window(requested_samples),
+            timestamp=utc_time,
+            filled_samples=self._filled_between(start_index, start_index + requested_samples),
+            start_index=start_index)
+        self._block.advance(hop_samples)
+        while self._filled and self._filled[0][1] <= self._block.start_index:
+            self._filled.popleft()
+        print(f"Aligned shape: {window.data.shape}")
+        return window
+
+
+    def extract_window(self, requested_samples: int,
+                       hop_samples: Optional[int] = None) -> AlignedWindow:
+        if hop_samples is None:
+            hop_samples = requested_samples
+        if not 0 < hop_samples <= requested_samples:
+            raise ValueError(f"hop_samples must be in [1, {requested_samples}], got {hop_samples}")
+        with self._lock:
+            self._requested_samples = requested_samples
+            if self.channels:
+                # Only restarts the block after a gap, the batches are copied as they arrive
+                self._append_aligned_batches(requested_samples)
+            if not self.channels or len(self._block) < requested_samples:
                 # No data or groups to align, returun empty
-                return np.empty((0, len(self.channels)), dtype=np.float32), None
-
-            for group in key_groups:
-                total_samples = len(group) * batch_size
-                if total_samples >= requested_samples:
-                    return self._extract_aligned_block(group, batch_size, requested_samples)
-            # No data or groups to align, returun empty
-            return np.empty((0, len(self.channels)), dtype=np.float32), None
+                return AlignedWindow(np.empty((0, len(self.channels)), dtype=np.float32), None)
+            return self._consume_block(requested_samples, hop_samples)
+
+
+    def extract(self, requested_samples: int,
+                hop_samples: Optional[int] = None) -> Tuple[np.ndarray, Optional[datetime]]:
+        window = self.extract_window(requested_samples, hop_samples)
+        return window.data, window.timestamp
+
+
+    def reset(self) -> None:
+        """
+        Drops every buffered sample, aligned or not, e.g. when the sampling
+        frequency changes, so no window mixes samples from before and after.
+        Alignment restarts with the next batches, even if their sample
+        index starts over.
+        """
+        with self._lock:
+            for ch in self.channels:
+                ch.clear()
+            self._block = AlignedBlock(len(self.channels), self.map_size)
+            self._index = AlignmentIndex(len(self.channels), self.map_size)
+            self._filled.clear()
+
+
+    def close(self) -> None:
+        """
+        Stops receiving messages for the channels and shuts down the ingestion
+        executor if the aligner created it. Queued messages are processed first.
+        """
+        for ch in self.channels:
+            if self._router is not None:
+                self._router.remove_channel(ch.topic)
+            else:
+                self.mqtt_client.message_callback_remove(ch.topic)
+                self.mqtt_client.unsubscribe(ch.topic)
+        if self._owns_executor:
+            self.executor.shutdown()
@@ -0,0 +1,74 @@
+"""
+Encoding and decoding of HBK accelerometer data messages.
+
+Each message on a /data topic is a little-endian binary descriptor
+followed by the samples as 32-bit floats:
+    - descriptor_length (uint16)
+    - metadata_version (uint16)
+    - seconds_since_epoch (uint64)
+    - nanoseconds (uint64)
+    - samples_from_daq_start (uint64)
+"""
+import struct
+from typing import NamedTuple, Sequence, Tuple, Union
+import numpy as np
+
+DESCRIPTOR_FORMAT = "<HHQQQ"
+DESCRIPTOR_SIZE = struct.calcsize(DESCRIPTOR_FORMAT)
+_DESCRIPTOR_STRUCT = struct.Struct(DESCRIPTOR_FORMAT)
+SAMPLE_DTYPE = np.dtype("<f4")
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class Descriptor(NamedTuple):
+    descriptor_length: int
+    metadata_version: int
+    seconds_since_epoch: int
+    nanoseconds: int
+    samples_from_daq_start: int
+
+
+def decode(payload: Buffer) -> Tuple[Descriptor, np.ndarray]:
+    """
+    Decodes a data message without copying the samples.
+
+    Args:
+        payload: The raw MQTT message payload.
+
+    Returns:
+        Tuple[Descriptor, np.ndarray]: The descriptor, and a read-only float32
+        view of the samples over `payload`.
+
+    Raises:
+        struct.error: If the payload is shorter than the descriptor.
+        ValueError: If the sample section is not a whole number of float32 values.
+    """
+    descriptor = Descriptor._make(_DESCRIPTOR_STRUCT.unpack_from(payload))
+    data_length = len(payload) - descriptor.descriptor_length
+    if data_length < 0 or data_length % SAMPLE_DTYPE.itemsize:
+        raise ValueError(f"Invalid sample section of {data_length} bytes")
+    samples = np.frombuffer(payload, dtype=SAMPLE_DTYPE,
+                            offset=descriptor.descriptor_length)
+    return descriptor, samples
+
+
+def encode(samples: Union[Sequence[float], np.ndarray], samples_from_daq_start: int,
+           metadata_version: int = 1, seconds_since_epoch: int = 0,
+           nanoseconds: int = 0) -> bytes:
+    """
+    Encodes samples into a data message.
+
+    Args:
+        samples: The samples of the batch.
+        samples_from_daq_start: Index of the first sample since DAQ start.
+        metadata_version: Metadata version written in the descriptor.
+        seconds_since_epoch: Timestamp of the first sample, seconds part.
+        nanoseconds: Timestamp of the first sample, nanoseconds part.
+
+    Returns:
+        bytes: The descriptor followed by the samples as little-endian float32.
+    """
+    descriptor = _DESCRIPTOR_STRUCT.pack(DESCRIPTOR_SIZE, metadata_version,
+                                         seconds_since_epoch, nanoseconds, samples_from_daq_start)
+    return descriptor + np.asarray(samples, dtype=SAMPLE_DTYPE).tobytes()
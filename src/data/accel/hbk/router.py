@@ -0,0 +1,99 @@
+import threading
+from typing import Any, Dict, List, Optional
+import paho.mqtt.client as mqtt
+# Project Imports
+from data.accel.hbk.accelerometer import Accelerometer
+from data.accel.ingestion import IngestionExecutor
+
+
+class ChannelRouter:
+    """
+    Receives the data messages of many channels through one wildcard
+    subscription and routes each message to the channel of its topic.
+
+    The client is subscribed once, with one message callback. Channels can
+    be added and removed at any time without touching the subscription;
+    messages on topics without a channel are counted and dropped.
+
+    The router also provides `executor`, the ingestion executor its channels
+    share, see `Aligner`.
+    """
+
+    def __init__(self, mqtt_client: mqtt.Client, subscription: str, qos: int = 1,
+                 executor: Optional[IngestionExecutor] = None):
+        """
+        Parameters:
+            mqtt_client: A pre-configured MQTT client.
+            subscription (str): Topic filter covering all channel topics,
+                e.g. "cpsens/recorded/+/data".
+            qos (int): QoS of the subscription.
+            executor (IngestionExecutor): Executor shared by the channels. By
+                default the router creates one, which `close()` shuts down.
+        """
+        self.mqtt_client = mqtt_client
+        self.subscription = subscription
+        self._owns_executor = executor is None
+        self.executor = executor or IngestionExecutor(name="ingestion-router")
+        self._channels: Dict[str, Accelerometer] = {}
+        self._lock = threading.Lock()
+        self.unrouted_messages = 0
+
+        self.mqtt_client.subscribe(subscription, qos=qos)
+        self.mqtt_client.message_callback_add(subscription, self._on_message)
+
+
+    def add_channel(self, channel: Accelerometer) -> None:
+        """
+        Routes the messages on `channel.topic` to `channel`. The channel should
+        be created with `subscribe=False`.
+
+        Raises:
+            ValueError: If the topic is not covered by the subscription,
+                or another channel is registered for it.
+        """
+        if not mqtt.topic_matches_sub(self.subscription, channel.topic):
+            raise ValueError(
+                f"Topic {channel.topic} is not covered by subscription {self.subscription}")
+        with self._lock:
+            if channel.topic in self._channels:
+                raise ValueError(f"A channel is already registered for topic {channel.topic}")
+            self._channels[channel.topic] = channel
+
+
+    def remove_channel(self, topic: str) -> Optional[Accelerometer]:
+        """Stops routing messages on `topic` and returns its channel, if any."""
+        with self._lock:
+            return self._channels.pop(topic, None)
+
+
+    def get_channel(self, topic: str) -> Optional[Accelerometer]:
+        with self._lock:
+            return self._channels.get(topic)
+
+
+    def topics(self) -> List[str]:
+        """Returns the topics that currently have a channel."""
+        with self._lock:
+            return list(self._channels)
+
+
+    def close(self) -> None:
+        """
+        Removes the message callback and the subscription, and shuts down
+        the executor if the router created it.
+        """
+        self.mqtt_client.message_callback_remove(self.subscription)
+        self.mqtt_client.unsubscribe(self.subscription)
+        if self._owns_executor:
+            self.executor.shutdown()
+
+
+    # pylint: disable=unused-argument
+    def _on_message(self, client: Any, userdata: Any, msg: mqtt.MQTTMessage) -> None:
+        """Hands the message to the ingestion executor of its channel."""
+        with self._lock:
+            channel = self._channels.get(msg.topic)
+            if channel is None:
+                self.unrouted_messages += 1
+                return
+        channel.submit_message(msg)
@@ -0,0 +1,158 @@
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from data.accel.constants import INGESTION_QUEUE_SIZE
+
+
+@dataclass
+class ChannelStats:
+    submitted: int = 0
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of accepted messages that are still waiting in a queue."""
+        return self.submitted - self.dropped - self.processed - self.failed
+
+
+_Task = Tuple[str, Callable[..., None], Tuple[Any, ...]]
+
+
+class IngestionExecutor:  # pylint: disable=too-many-instance-attributes
+    """
+    Runs message processing on a fixed set of worker threads.
+
+    Every channel is pinned to one worker, and each worker drains its own
+    bounded FIFO queue, so messages of a channel are processed in the order
+    they were submitted. When a queue is full, `submit` waits up to
+    `block_timeout` seconds (backpressure on the caller) and then drops
+    the message. After `shutdown`, messages are dropped as well: the
+    workers are not restarted, so a channel is never served by two workers.
+    `shutdown` waits for submits that already passed the closed check, so
+    every accepted message is queued ahead of the stop sentinel.
+    """
+
+    def __init__(self, num_workers: int = 1, max_queue_size: int = INGESTION_QUEUE_SIZE,
+                 block_timeout: float = 0.0, name: str = "ingestion"):
+        """
+        Parameters:
+            num_workers (int): Number of worker threads shared by all channels.
+            max_queue_size (int): Maximum number of messages waiting per worker.
+            block_timeout (float): Seconds `submit` waits for queue space before
+                dropping a message. 0 drops immediately.
+            name (str): Prefix of the worker thread names.
+        """
+        if num_workers < 1:
+            raise ValueError(f"num_workers must be at least 1, got {num_workers}")
+        self._queues: List["queue.Queue[Optional[_Task]]"] = [
+            queue.Queue(maxsize=max_queue_size) for _ in range(num_workers)]
+        self._block_timeout = block_timeout
+        self._name = name
+        self._workers: List[threading.Thread] = []
+        self._assignment: Dict[str, int] = {}
+        self._stats: Dict[str, ChannelStats] = {}
+        self._closed = False
+        # Submits between the closed check and the end of their put
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+
+    def submit(self, channel: str, fn: Callable[..., None], *args: Any) -> bool:
+        """
+        Queues `fn(*args)` on the worker assigned to `channel`.
+
+        Returns:
+            bool: True if the message was queued, False if it was dropped
+                because the queue is full or the executor is shut down.
+        """
+        with self._lock:
+            if not self._workers and not self._closed:
+                self._start_workers()
+            worker = self._assignment.get(channel)
+            if worker is None:
+                worker = len(self._assignment) % len(self._queues)
+                self._assignment[channel] = worker
+                self._stats[channel] = ChannelStats()
+            stats = self._stats[channel]
+            stats.submitted += 1
+            if self._closed:
+                stats.dropped += 1
+                return False
+            self._in_flight += 1
+
+        queued = True
+        try:
+            if self._block_timeout > 0:
+                self._queues[worker].put((channel, fn, args), timeout=self._block_timeout)
+            else:
+                self._queues[worker].put_nowait((channel, fn, args))
+        except queue.Full:
+            queued = False
+        with self._lock:
+            if not queued:
+                stats.dropped += 1
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.notify_all()
+        return queued
+
+
+    def queue_depth(self) -> int:
+        """Returns the total number of messages waiting in all worker queues."""
+        return sum(q.qsize() for q in self._queues)
+
+
+    def stats(self) -> Dict[str, ChannelStats]:
+        """Returns a snapshot of the per-channel counters."""
+        with self._lock:
+            return {channel: ChannelStats(s.submitted, s.processed, s.dropped, s.failed)
+                    for channel, s in self._stats.items()}
+
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stops the workers after the queued messages have been processed.
+        Messages submitted afterwards are dropped.
+        """
+        with self._lock:
+            self._closed = True
+            # The sentinels must follow the messages of submits still in progress
+            self._idle.wait_for(lambda: self._in_flight == 0)
+            workers, self._workers = self._workers, []
+        for q in self._queues[:len(workers)]:
+            q.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+
+    def _start_workers(self) -> None:
+        for index, work_queue in enumerate(self._queues):
+            worker = threading.Thread(target=self._run, args=(work_queue,),
+                                      name=f"{self._name}-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+
+    def _run(self, work_queue: "queue.Queue[Optional[_Task]]") -> None:
+        while True:
+            task = work_queue.get()
+            if task is None:
+                return
+            channel, fn, args = task
+            try:  # This ensures that an exception does not crash the worker
+                fn(*args)
+                failed = False
+            except Exception as e:
+                print(f"Error processing message: {e}")
+                failed = True
+            with self._lock:
+                if failed:
+                    self._stats[channel].failed += 1
+                else:
+                    self._stats[channel].processed += 1
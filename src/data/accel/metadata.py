@@ -1,8 +1,11 @@
 import json
+import os
+import threading
 import time
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional
+import paho.mqtt.client as mqtt
 from paho.mqtt.client import Client as MQTTClient
-from data.accel.constants import WAIT_METADATA
+from data.accel.constants import WAIT_METADATA, METADATA_CACHE_FILE
 from data.comm.mqtt import setup_mqtt_client
 
 def extract_fs_from_metadata(mqtt_config: Dict[str, Any]) -> int:
@@ -34,3 +37,164 @@ def extract_fs_from_metadata(mqtt_config: Dict[str, Any]) -> int:
     if fs_result["fs"] is None:
         raise TimeoutError("Sampling frequency not received within timeout")
     return fs_result["fs"]
+
+
+def sampling_frequency(metadata: Dict[str, Any]) -> Optional[float]:
+    """Returns the sampling frequency of a metadata payload, if it has one."""
+    try:
+        return metadata["Analysis chain"][0]["Sampling"] or None
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+class MetadataService:  # pylint: disable=too-many-instance-attributes
+    """
+    Keeps the last metadata of each metadata topic, received on the data
+    client, in memory and in a JSON file on disk.
+
+    On start the cached metadata is loaded from disk, so the sampling
+    frequency is known at once on a warm start. Metadata messages update
+    the cache live; listeners are called when the sampling frequency of a
+    topic changes. The subscription is renewed whenever the client
+    reconnects, after the client's own on_connect callback.
+    """
+
+    def __init__(self, mqtt_client: MQTTClient, subscription: str,
+                 cache_file: Optional[str] = METADATA_CACHE_FILE, qos: int = 1):
+        """
+        Parameters:
+            mqtt_client: A connected MQTT client, e.g. the data client.
+            subscription (str): Metadata topic, or a filter covering several,
+                e.g. "cpsens/recorded/+/metadata".
+            cache_file (str): JSON file of the cache, or None to keep it in
+                memory only.
+            qos (int): QoS of the subscription.
+        """
+        self.mqtt_client = mqtt_client
+        self.subscription = subscription
+        self.qos = qos
+        self.cache_file = os.path.expanduser(cache_file) if cache_file else None
+        self._metadata: Dict[str, Dict[str, Any]] = self._load()
+        self._last_topic: Optional[str] = None
+        self._listeners: List[Callable[[str, float], None]] = []
+        self._changed = threading.Condition()
+
+        self.mqtt_client.message_callback_add(subscription, self._on_message)
+        # The broker drops the subscription on a reconnect, so it is renewed on every connect
+        self._client_on_connect = self.mqtt_client.on_connect
+        self.mqtt_client.on_connect = self._on_connect
+        self.mqtt_client.subscribe(subscription, qos=qos)
+
+
+    def add_listener(self, listener: Callable[[str, float], None]) -> None:
+        """Calls `listener(topic, fs)` whenever the sampling frequency of a topic changes."""
+        with self._changed:
+            self._listeners.append(listener)
+
+
+    def remove_listener(self, listener: Callable[[str, float], None]) -> None:
+        """Stops calling a listener added with `add_listener`."""
+        with self._changed:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+
+    def metadata(self, topic: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns the last metadata of `topic`, by default of the subscription
+        topic or, for a filter, of the topic that was updated last.
+        """
+        with self._changed:
+            return self._metadata.get(self._resolve(topic))
+
+
+    def get_fs(self, topic: Optional[str] = None, timeout: float = 0) -> Optional[float]:
+        """
+        Returns the sampling frequency of `topic` (see `metadata`), waiting
+        up to `timeout` seconds for a metadata message if none is cached.
+
+        Returns:
+            The sampling frequency, or None if it is not known.
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: sampling_frequency(self._metadata.get(self._resolve(topic), {})),
+                timeout)
+            return sampling_frequency(self._metadata.get(self._resolve(topic), {}))
+
+
+    def close(self) -> None:
+        """Removes the message callback and the subscription."""
+        self.mqtt_client.on_connect = self._client_on_connect
+        self.mqtt_client.message_callback_remove(self.subscription)
+        self.mqtt_client.unsubscribe(self.subscription)
+
+
+    def _resolve(self, topic: Optional[str]) -> Optional[str]:
+        if topic is not None:
+            return topic
+        if self.subscription in self._metadata:
+            return self.subscription
+        if self._last_topic is not None:
+            return self._last_topic
+        return next((t for t in self._metadata
+                     if mqtt.topic_matches_sub(self.subscription, t)), None)
+
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self.cache_file is None:
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring the metadata cache {self.cache_file}: {e}")
+            return {}
+
+
+    def _save(self) -> None:
+        if self.cache_file is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            temporary = f"{self.cache_file}.tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump(self._metadata, file)
+            os.replace(temporary, self.cache_file)
+        except OSError as e:
+            print(f"Failed to write the metadata cache {self.cache_file}: {e}")
+
+
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    def _on_connect(self, client: Any, userdata: Any, flags: Any, rc: Any,
+                    properties: Any = None) -> None:
+        if self._client_on_connect is not None:
+            self._client_on_connect(client, userdata, flags, rc, properties)
+        if rc == 0:  # Connection was successful
+            client.subscribe(self.subscription, qos=self.qos)
+
+
+    # pylint: disable=unused-argument
+    def _on_message(self, client: Any, userdata: Any, msg: mqtt.MQTTMessage) -> None:
+        try:
+            metadata = json.loads(msg.payload.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError) as e:
+            print(f"Failed to decode metadata on {msg.topic}: {e}")
+            return
+        with self._changed:
+            previous = self._metadata.get(msg.topic)
+            self._last_topic = msg.topic
+            if metadata == previous:
+                return
+            self._metadata[msg.topic] = metadata
+            self._save()
+            fs = sampling_frequency(metadata)
+            fs_changed = fs is not None and fs != sampling_frequency(previous or {})
+            listeners = list(self._listeners)
+            self._changed.notify_all()
+        if fs_changed:
+            print(f"Sampling frequency of {msg.topic}: {fs}")
+            for listener in listeners:
+                listener(msg.topic, fs)
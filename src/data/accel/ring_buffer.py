@@ -0,0 +1,193 @@
+import bisect
+from typing import List, Optional
+import numpy as np
+
+
+class SampleRingBuffer:
+    """
+    Fixed-capacity, contiguous float32 ring buffer for one accelerometer channel.
+
+    Samples are addressed by their absolute index since DAQ start
+    (`samples_from_daq_start`), and sample `i` is stored at position
+    `i % capacity`. Batches are tracked by an ordered key index, so reads,
+    lookups and removals are slice operations instead of per-sample loops.
+
+    The capacity bounds the span between the oldest and the newest retained
+    sample, so missing batches also consume capacity.
+
+    The buffer is not thread-safe; the owner is expected to hold a lock.
+    """
+
+    def __init__(self, capacity: int, dtype: np.dtype = np.float32):
+        """
+        Parameters:
+            capacity (int): The maximum number of samples to retain.
+            dtype (np.dtype): The storage type of the samples.
+        """
+        if capacity <= 0:
+            raise ValueError(f"Capacity must be positive, got {capacity}")
+        self._capacity = capacity
+        self._data = np.zeros(capacity, dtype=dtype)
+        # Parallel lists ordered by key: the batch key, and the absolute index
+        # range [start, end) still retained for that batch
+        self._keys: List[int] = []
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._size = 0
+
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    def keys(self) -> List[int]:
+        """Returns the sorted list of batch keys currently retained."""
+        return list(self._keys)
+
+
+    def first_batch_size(self) -> Optional[int]:
+        """Returns the number of samples retained for the oldest batch."""
+        if not self._keys:
+            return None
+        return self._ends[0] - self._starts[0]
+
+
+    def write(self, key: int, values: np.ndarray) -> bool:
+        """
+        Stores a batch of samples starting at absolute index `key`.
+
+        Batches that are already present, overlap a retained batch, or are
+        older than the retained span are ignored. The oldest samples are
+        evicted when the batch would exceed the capacity.
+
+        Returns:
+            bool: True if the batch was stored.
+        """
+        num_samples = len(values)
+        if num_samples == 0:
+            return False
+        end = key + num_samples
+
+        idx = bisect.bisect_left(self._keys, key)
+        if idx < len(self._keys) and (self._keys[idx] == key or self._starts[idx] < end):
+            return False
+        if idx > 0 and self._ends[idx - 1] > key:
+            return False
+
+        newest_end = max(end, self._ends[-1]) if self._ends else end
+        floor = newest_end - self._capacity
+        if end <= floor:
+            return False
+
+        idx -= self._evict_before(floor)
+        start = max(key, floor)
+        self._keys.insert(idx, key)
+        self._starts.insert(idx, start)
+        self._ends.insert(idx, end)
+        self._put(start, values[start - key:])
+        self._size += end - start
+        return True
+
+
+    def __contains__(self, key: int) -> bool:
+        idx = bisect.bisect_left(self._keys, key)
+        return idx < len(self._keys) and self._keys[idx] == key
+
+
+    def get(self, key: int) -> Optional[np.ndarray]:
+        """Returns a copy of the samples retained for `key`, or None."""
+        idx = bisect.bisect_left(self._keys, key)
+        if idx == len(self._keys) or self._keys[idx] != key:
+            return None
+        return self._slice(self._starts[idx], self._ends[idx]).copy()
+
+
+    def consume(self, start_key: int, samples_to_remove: int) -> None:
+        """
+        Drops all batches older than `start_key`, then removes
+        `samples_to_remove` samples from the front of the remaining batches.
+        """
+        self._drop_batches(bisect.bisect_left(self._keys, start_key))
+        self._remove_front(samples_to_remove)
+
+
+    def read(self, requested_samples: int) -> np.ndarray:
+        """Removes and returns up to `requested_samples` of the oldest samples."""
+        pieces = []
+        remaining = requested_samples
+        for start, end in zip(self._starts, self._ends):
+            if remaining <= 0:
+                break
+            take = min(remaining, end - start)
+            pieces.append(self._slice(start, start + take))
+            remaining -= take
+        data = (np.concatenate(pieces) if pieces
+                else np.empty(0, dtype=self._data.dtype))
+        self._remove_front(len(data))
+        return data
+
+
+    def clear(self) -> None:
+        """Removes all retained batches."""
+        self._keys.clear()
+        self._starts.clear()
+        self._ends.clear()
+        self._size = 0
+
+
+    def _evict_before(self, floor: int) -> int:
+        """Drops samples older than `floor`. Returns the number of dropped batches."""
+        dropped = 0
+        while dropped < len(self._ends) and self._ends[dropped] <= floor:
+            dropped += 1
+        self._drop_batches(dropped)
+        if self._starts and self._starts[0] < floor:
+            self._size -= floor - self._starts[0]
+            self._starts[0] = floor
+        return dropped
+
+
+    def _drop_batches(self, count: int) -> None:
+        """Drops the `count` oldest batches."""
+        if count <= 0:
+            return
+        self._size -= sum(e - s for s, e in zip(self._starts[:count], self._ends[:count]))
+        del self._keys[:count]
+        del self._starts[:count]
+        del self._ends[:count]
+
+
+    def _remove_front(self, samples_to_remove: int) -> None:
+        """Removes samples from the oldest batches, dropping emptied batches."""
+        emptied = 0
+        remaining = samples_to_remove
+        while remaining > 0 and emptied < len(self._keys):
+            available = self._ends[emptied] - self._starts[emptied]
+            if available > remaining:
+                self._starts[emptied] += remaining
+                self._size -= remaining
+                break
+            remaining -= available
+            emptied += 1
+        self._drop_batches(emptied)
+
+
+    def _put(self, start: int, values: np.ndarray) -> None:
+        pos = start % self._capacity
+        first = min(len(values), self._capacity - pos)
+        self._data[pos:pos + first] = values[:first]
+        self._data[:len(values) - first] = values[first:]
+
+
+    def _slice(self, start: int, end: int) -> np.ndarray:
+        """Returns samples [start, end); a view unless the range wraps around."""
+        pos = start % self._capacity
+        length = end - start
+        if pos + length <= self._capacity:
+            return self._data[pos:pos + length]
+        return np.concatenate((self._data[pos:], self._data[:pos + length - self._capacity]))
@@ -17,8 +17,7 @@ def read_accelerometers(config_path):
         map_size=1920
     )
 
-    with accelerometer.acquire_lock():
-        accelerometer.data_map.clear()
+    accelerometer.clear()
 
     time.sleep(1)
     with accelerometer.acquire_lock():
@@ -26,6 +25,7 @@ def read_accelerometers(config_path):
             print(f"Key: {key} -> Data: {list(fifo)}\n")
     _, data = accelerometer.read(requested_samples=256)
 
+    accelerometer.close()
     mqtt_client.loop_stop()
     mqtt_client.disconnect()
 
@@ -1,5 +1,3 @@
-import time
-
 from data.comm.mqtt import setup_mqtt_client, load_config  # type: ignore
 from data.accel.hbk.aligner import Aligner
 
@@ -18,13 +16,9 @@ def align_acceleration_readings(config_path):
 
     aligner = Aligner(mqtt_client, topics=selected_topics, map_size=2560)
 
-    while True:
-        time.sleep(1)
-        data, utime = aligner.extract(16)
-        if data.shape[0] == 0:
-            print("Not enough aligned data yet.")
-        else:
-            print(f"Collected this batch at: {utime}")
-            print(f"Extracted aligned data shape: {data.shape}\n{data}")
-            break
-        time.sleep(1)
+    while not aligner.wait_for(16, timeout=1):
+        print("Not enough aligned data yet.")
+    data, utime = aligner.extract(16)
+    aligner.close()
+    print(f"Collected this batch at: {utime}")
+    print(f"Extracted aligned data shape: {data.shape}\n{data}")
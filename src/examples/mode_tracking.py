@@ -20,7 +20,8 @@ def run_mode_tracking_with_local_sysid(config_path):
 
     aligner_time = None
     while aligner_time is None:
-        oma_output, aligner_time = sysID.get_oma_results(number_of_minutes, aligner, fs)
+        oma_output, aligner_time = sysID.wait_for_oma_results(number_of_minutes, aligner, fs)
+    aligner.close()
     data_client.disconnect()
 
     # Mode Track
@@ -45,10 +46,12 @@ def run_mode_tracking_with_local_sysid(config_path):
 
 
 def run_mode_tracking_with_remote_sysid(config_path):
-    config = load_config(config_path)
-    cleaned_values, median_frequencies, confidence_intervals = (
-        MT.subscribe_and_get_cleaned_values(config_path)
-    )
-    print("Cleaned values:", cleaned_values)
-    print("Tracked frequencies:", median_frequencies)
-    print("\nConfidence intervals:", confidence_intervals)
+    try:
+        for cleaned_values, median_frequencies, confidence_intervals in (
+                MT.track_oma_results(config_path)):
+            print("Cleaned values:", cleaned_values)
+            print("Mode ids:", [cluster["mode_id"] for cluster in cleaned_values])
+            print("Tracked frequencies:", median_frequencies)
+            print("\nConfidence intervals:", confidence_intervals)
+    except KeyboardInterrupt:
+        print("Cancel")
@@ -15,30 +15,31 @@ def setup_oma(config_path, data_topic_indexes):
         data_topic_indexes (list): Indexes of topics to subscribe to.
 
     Returns:
-        tuple: (aligner, data_client, fs)
+        tuple: (aligner, data_client, fs, metadata)
     """
     config = load_config(config_path)
     mqtt_config = config["MQTT"]
 
-    # Setting up the client and extracting Fs
-    data_client, fs = sysID.setup_client(mqtt_config)
+    # Setting up the client, extracting Fs and following its live updates
+    data_client, metadata, fs = sysID.setup_client_with_metadata(mqtt_config)
 
     # Setting up the aligner
     selected_topics = [mqtt_config["TopicsToSubscribe"][i] for i in data_topic_indexes]
     aligner = Aligner(data_client, topics=selected_topics)
 
-    return aligner, data_client, fs
+    return aligner, data_client, fs, metadata
 
 
 def run_oma_and_plot(config_path):
     number_of_minutes = 0.2
     data_topic_indexes = [0, 2]
-    aligner, data_client, fs = setup_oma(config_path, data_topic_indexes)
+    aligner, data_client, fs, _ = setup_oma(config_path, data_topic_indexes)
 
     fig_ax = None
     aligner_time = None
     while aligner_time is None:
-        results, aligner_time = sysID.get_oma_results(number_of_minutes, aligner, fs)
+        results, aligner_time = sysID.wait_for_oma_results(number_of_minutes, aligner, fs)
+    aligner.close()
     data_client.disconnect()
     fig_ax = plot_natural_frequencies(results['Fn_poles'], freqlim=(0, 75), fig_ax=fig_ax)
     plt.show(block=True)
@@ -48,11 +49,12 @@ def run_oma_and_plot(config_path):
 def run_oma_and_print(config_path):
     number_of_minutes = 0.2
     data_topic_indexes = [0, 2]
-    aligner, data_client, fs = setup_oma(config_path, data_topic_indexes)
+    aligner, data_client, fs, _ = setup_oma(config_path, data_topic_indexes)
 
     aligner_time = None
     while aligner_time is None:
-        results, aligner_time = sysID.get_oma_results(number_of_minutes, aligner, fs)
+        results, aligner_time = sysID.wait_for_oma_results(number_of_minutes, aligner, fs)
+    aligner.close()
     data_client.disconnect()
     sys.stdout.flush()
 
@@ -65,7 +67,7 @@ def run_oma_and_print(config_path):
 def run_oma_and_publish(config_path):
     number_of_minutes = 0.02
     data_topic_indexes = [0, 2]
-    aligner, data_client, fs = setup_oma(config_path, data_topic_indexes)
+    aligner, data_client, fs, metadata = setup_oma(config_path, data_topic_indexes)
     publish_config = load_config(config_path)["sysID"]
 
     # Setting up the client for publishing OMA results
@@ -76,9 +78,11 @@ def run_oma_and_publish(config_path):
         aligner,
         publish_client,
         publish_config["TopicsToSubscribe"][0],
-        fs
+        fs,
+        metadata=metadata
     )
 
     print(f"Publishing to topic: {publish_config['TopicsToSubscribe'][0]}")
+    aligner.close()
     data_client.disconnect()
     sys.stdout.flush()
@@ -1,4 +1,3 @@
-import time
 from data.comm.mqtt import load_config
 from data.accel.hbk.aligner import Aligner
 from methods import sys_id as sysID
@@ -20,9 +19,9 @@ def run_model_update_local_sysid(config_path):
 
     aligner_time = None
     while aligner_time is None:
-        print("Not enough aligned yet")
-        time.sleep(10)
-        oma_output, aligner_time = sysID.get_oma_results(number_of_minutes, aligner, fs)
+        print("Waiting for aligned data")
+        oma_output, aligner_time = sysID.wait_for_oma_results(number_of_minutes, aligner, fs)
+    aligner.close()
     data_client.disconnect()
 
     # Mode Track
@@ -57,33 +56,33 @@ def run_model_update_local_sysid(config_path):
 
 
 def run_model_update_remote_sysid(config_path):
-    config = load_config(config_path)
-    cleaned_values, _, _ = (
-        MT.subscribe_and_get_cleaned_values(config_path)
-    )
-
-    # Run model update
-    update_result = MT.run_model_update(cleaned_values)
-
-    if update_result is not None:
-        optimized_parameters = update_result['optimized_parameters']
-        omegaN_rad = update_result['omegaN_rad']
-        omegaN_Hz = update_result['omegaN_Hz']
-        mode_shapes = update_result['mode_shapes']
-        damping_matrix = update_result['damping_matrix']
-        pars_model = update_result['pars_updated']
-        system_up = update_result['System_updated']
-
-        print("\nOptimized parameters (k, m):", optimized_parameters)
-        print("\nNatural frequencies (rad/s):", omegaN_rad)
-        print("\nNatural frequencies (Hz):", omegaN_Hz)
-        print("\nMode shapes (normalized):\n", mode_shapes)
-        print("\nDamping matrix:\n", damping_matrix)
-        print("\nUpdated model parameters (dictionary):", pars_model)
-        print("\nUpdated system:")
-        print("\nMass matrix M:", system_up["M"])
-        print("\nStiffness matrix K:\n", system_up["K"])
-        print("\nDamping matrix C:\n", system_up["C"])
-
-    else:
-        print("Model update failed.")
+    # The tracker follows the modes from one OMA result to the next
+    try:
+        for cleaned_values, _, _ in MT.track_oma_results(config_path):
+            # Run model update
+            update_result = MT.run_model_update(cleaned_values)
+
+            if update_result is not None:
+                optimized_parameters = update_result['optimized_parameters']
+                omegaN_rad = update_result['omegaN_rad']
+                omegaN_Hz = update_result['omegaN_Hz']
+                mode_shapes = update_result['mode_shapes']
+                damping_matrix = update_result['damping_matrix']
+                pars_model = update_result['pars_updated']
+                system_up = update_result['System_updated']
+
+                print("\nOptimized parameters (k, m):", optimized_parameters)
+                print("\nNatural frequencies (rad/s):", omegaN_rad)
+                print("\nNatural frequencies (Hz):", omegaN_Hz)
+                print("\nMode shapes (normalized):\n", mode_shapes)
+                print("\nDamping matrix:\n", damping_matrix)
+                print("\nUpdated model parameters (dictionary):", pars_model)
+                print("\nUpdated system:")
+                print("\nMass matrix M:", system_up["M"])
+                print("\nStiffness matrix K:\n", system_up["K"])
+                print("\nDamping matrix C:\n", system_up["C"])
+
+            else:
+                print("Model update failed.")
+    except KeyboardInterrupt:
+        print("Cancel")
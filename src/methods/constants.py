@@ -6,10 +6,15 @@ DEFAULT_FS = 250 # In case the Fs from metadata doesn't arrive
 
 MIN_SAMPLES_NEEDED = 540  # Minimum samples for running sysid
 
+WINDOW_WAIT_TIMEOUT = 10 # Max seconds to wait for an aligned window before checking again
+
 BLOCK_SHIFT = 30
 
 MODEL_ORDER = 20
 
+# Format of published OMA results: "binary", "binary_zlib" (compressed) or "json"
+OMA_PAYLOAD_FORMAT = "binary"
+
 # Constants for Model track
 MSTAB_FACTOR = 0.4 # This is goning to be multiplied by the MODEL_ORDER to get the mstab
 TMAC = 0.9
@@ -1,12 +1,13 @@
-import json
 import threading
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Iterator, Tuple, Optional
 import numpy as np
 import paho.mqtt.client as mqtt
 from scipy.optimize import minimize
 from scipy.linalg import eigh
 from methods.constants import MODEL_ORDER, MSTAB_FACTOR, TMAC
 from methods.packages.mode_track import mode_allingment
+from methods.packages.mode_tracker import ModeTracker
+from methods import oma_codec
 from methods.packages.eval_yafem_model import eval_yafem_model
 from methods.packages import model_update
 from methods.constants import X0, BOUNDS
@@ -48,9 +49,7 @@ def _on_message(_client: mqtt.Client, _userdata: dict, msg: mqtt.MQTTMessage) ->
     global oma_output_global
     print(f"Message received on topic: {msg.topic}")
     try:
-        raw = json.loads(msg.payload.decode("utf-8"))
-        oma_output = _convert_oma_output(raw["OMA_output"])
-        timestamp = raw["timestamp"]
+        oma_output, timestamp = oma_codec.decode_message(msg.payload, _convert_oma_output)
         print(f"Received OMA data at timestamp: {timestamp}")
         oma_output_global = oma_output
         result_ready.set()
@@ -58,19 +57,35 @@ def _on_message(_client: mqtt.Client, _userdata: dict, msg: mqtt.MQTTMessage) ->
         print(f"Error processing OMA message: {e}")
 
 
-def run_mode_track(oma_output: Any) -> Tuple[List[Dict], np.ndarray, np.ndarray]:
+def mode_tracker() -> ModeTracker:
+    """
+    Creates a mode tracker with the settings of `run_mode_track`.
+
+    Pass it to `run_mode_track` for consecutive OMA results: the modes of the
+    previous result seed the next one, and keep their "mode_id".
+    """
+    return ModeTracker(MODEL_ORDER * MSTAB_FACTOR, TMAC)
+
+
+def run_mode_track(oma_output: Any, tracker: Optional[ModeTracker] = None
+                   ) -> Tuple[List[Dict], np.ndarray, np.ndarray]:
     """
     Runs the mode tracking algorithm.
 
     Args:
         oma_output (Any): OMA output from subscription or elsewhere.
+        tracker (ModeTracker, optional): Tracker of the previous OMA results,
+            see `mode_tracker`. Without one, the modes are clustered from scratch.
     Returns:
         cleaned_values (List[Dict]), 
         median_frequencies (np.ndarray), 
         confidence_intervals (np.ndarray)
     """
-    mstab = MODEL_ORDER * MSTAB_FACTOR
-    cleaned_values = mode_allingment(oma_output, mstab, TMAC)
+    if tracker is not None:
+        cleaned_values = tracker.update(oma_output)
+    else:
+        mstab = MODEL_ORDER * MSTAB_FACTOR
+        cleaned_values = mode_allingment(oma_output, mstab, TMAC)
     median_frequencies = np.array([cluster["median"] for cluster in cleaned_values])
     confidence_intervals = np.array([
         cluster["original_cluster"]["confidence_interval"]
@@ -183,3 +198,51 @@ def subscribe_and_get_cleaned_values(config_path: str,
 
     print("OMA data received. Running mode tracking...")
     return run_mode_track(oma_output_global)
+
+
+def track_oma_results(config_path: str, tracker: Optional[ModeTracker] = None
+                      ) -> Iterator[Tuple[List[Dict], np.ndarray, np.ndarray]]:
+    """
+    Subscribes to MQTT broker and runs mode tracking on every OMA message received.
+
+    The same tracker is used for all messages, so every mode keeps its
+    "mode_id" and each result only clusters the poles the tracked modes do
+    not take. A message that arrives while the previous one is processed
+    replaces any older one that is still waiting.
+
+    Args:
+        config_path (str): Path to config JSON.
+        tracker (ModeTracker, optional): Tracker to continue, see `mode_tracker`.
+            A new one is created by default.
+
+    Yields:
+        cleaned_values (List[Dict]),
+        median_frequencies (np.ndarray),
+        confidence_intervals (np.ndarray)
+    """
+    global oma_output_global
+    if tracker is None:
+        tracker = mode_tracker()
+    oma_output_global = None
+    result_ready.clear()
+
+    config = load_config(config_path)
+    mqtt_client, selected_topic = setup_mqtt_client(config["sysID"], topic_index=0)
+
+    mqtt_client.user_data_set({"topic": selected_topic, "qos": 0})
+    mqtt_client.on_connect = _on_connect
+    mqtt_client.on_message = _on_message
+    mqtt_client.connect(config["sysID"]["host"], config["sysID"]["port"], keepalive=60)
+    mqtt_client.loop_start()
+    try:
+        while True:
+            print("Waiting for OMA data...")
+            while not result_ready.wait(timeout=0.1):
+                pass
+            result_ready.clear()
+            oma_output = oma_output_global
+            print("OMA data received. Running mode tracking...")
+            yield run_mode_track(oma_output, tracker)
+    finally:
+        mqtt_client.loop_stop()
+        mqtt_client.disconnect()
@@ -0,0 +1,158 @@
+"""
+Encoding and decoding of OMA result messages.
+
+A binary message is a little-endian header followed by a body that is
+optionally zlib-compressed:
+    - magic (4 bytes, b"OMA1")
+    - flags (uint8, bit 0: the body is compressed)
+    - number_of_fields (uint16)
+    - timestamp_length (uint16), then the ISO timestamp in UTF-8
+
+Each field of the body is a descriptor followed by the raw array data in
+C order:
+    - name_length (uint8)
+    - dtype_length (uint8), 0 for a field that is None
+    - ndim (uint8)
+    - the name and the numpy dtype string (e.g. "<c16") in ASCII
+    - the shape (ndim x uint64)
+
+JSON messages, as published before, are still decoded, see `decode_message`.
+"""
+import json
+import struct
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+import numpy as np
+
+MAGIC = b"OMA1"
+FLAG_COMPRESSED = 0x01
+
+_HEADER_STRUCT = struct.Struct("<4sBHH")
+_FIELD_STRUCT = struct.Struct("<BBB")
+# Largest values of the uint16 header and the uint8 descriptor entries
+_MAX_FIELDS = _MAX_TIMESTAMP_LENGTH = 0xFFFF
+_MAX_DESCRIPTOR_VALUE = 0xFF
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def is_binary(payload: Buffer) -> bool:
+    """Returns True if the payload is a binary OMA message."""
+    return bytes(payload[:len(MAGIC)]) == MAGIC
+
+
+def encode(oma_output: Dict[str, Any], timestamp: str, compress: bool = False) -> bytes:
+    """
+    Encodes an OMA result into a binary message.
+
+    Args:
+        oma_output: Field name -> array (or anything `np.asarray` turns into a
+            numeric, boolean or string array), or None.
+        timestamp: ISO timestamp of the result.
+        compress: Compress the body with zlib.
+
+    Returns:
+        bytes: The message.
+
+    Raises:
+        ValueError: If a field cannot be stored as a typed array, e.g. a
+            ragged list, or the result exceeds the limits of the header and
+            the field descriptors (e.g. a field name longer than 255 bytes).
+    """
+    if len(oma_output) > _MAX_FIELDS:
+        raise ValueError(f"{len(oma_output)} fields exceed the limit of {_MAX_FIELDS}")
+    body = []
+    for name, value in oma_output.items():
+        name_bytes = name.encode("ascii")
+        if len(name_bytes) > _MAX_DESCRIPTOR_VALUE:
+            raise ValueError(f"Field name {name[:32]}... exceeds {_MAX_DESCRIPTOR_VALUE} bytes")
+        if value is None:
+            body.append(_FIELD_STRUCT.pack(len(name_bytes), 0, 0) + name_bytes)
+            continue
+        array = np.asarray(value)
+        if array.dtype.hasobject:
+            raise ValueError(f"Field {name} is not a typed array")
+        if array.ndim > _MAX_DESCRIPTOR_VALUE:
+            raise ValueError(f"Field {name} has more than {_MAX_DESCRIPTOR_VALUE} dimensions")
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+        dtype = array.dtype.str.encode("ascii")
+        body.append(_FIELD_STRUCT.pack(len(name_bytes), len(dtype), array.ndim)
+                    + name_bytes + dtype
+                    + struct.pack(f"<{array.ndim}Q", *array.shape))
+        body.append(array.tobytes())
+    body = b"".join(body)
+    if compress:
+        body = zlib.compress(body)
+    stamp = timestamp.encode("utf-8")
+    if len(stamp) > _MAX_TIMESTAMP_LENGTH:
+        raise ValueError(f"Timestamp exceeds {_MAX_TIMESTAMP_LENGTH} bytes")
+    header = _HEADER_STRUCT.pack(MAGIC, FLAG_COMPRESSED if compress else 0,
+                                 len(oma_output), len(stamp))
+    return header + stamp + body
+
+
+def decode(payload: Buffer) -> Tuple[Dict[str, Optional[np.ndarray]], str]:
+    # pylint: disable=too-many-locals
+    """
+    Decodes a binary OMA message.
+
+    The arrays share one writable copy of the body.
+
+    Args:
+        payload: The raw MQTT message payload.
+
+    Returns:
+        Tuple[Dict[str, Optional[np.ndarray]], str]: The fields and the timestamp.
+
+    Raises:
+        ValueError: If the payload is not a valid binary OMA message.
+    """
+    try:
+        magic, flags, n_fields, stamp_length = _HEADER_STRUCT.unpack_from(payload)
+        if magic != MAGIC:
+            raise ValueError("Not a binary OMA message")
+        offset = _HEADER_STRUCT.size
+        timestamp = bytes(payload[offset:offset + stamp_length]).decode("utf-8")
+        body = payload[offset + stamp_length:]
+        body = bytearray(zlib.decompress(body) if flags & FLAG_COMPRESSED else body)
+
+        fields: Dict[str, Optional[np.ndarray]] = {}
+        offset = 0
+        for _ in range(n_fields):
+            name_length, dtype_length, ndim = _FIELD_STRUCT.unpack_from(body, offset)
+            offset += _FIELD_STRUCT.size
+            name = body[offset:offset + name_length].decode("ascii")
+            offset += name_length
+            if dtype_length == 0:
+                fields[name] = None
+                continue
+            dtype = np.dtype(body[offset:offset + dtype_length].decode("ascii"))
+            offset += dtype_length
+            shape = struct.unpack_from(f"<{ndim}Q", body, offset)
+            offset += 8 * ndim
+            count = int(np.prod(shape))
+            fields[name] = np.frombuffer(body, dtype=dtype, count=count,
+                                         offset=offset).reshape(shape)
+            offset += count * dtype.itemsize
+    except (struct.error, zlib.error, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid OMA message: {e}") from e
+    return fields, timestamp
+
+
+def decode_message(payload: Buffer,
+                   convert_json: Callable[[Any], Any] = lambda obj: obj
+                   ) -> Tuple[Dict[str, Any], str]:
+    """
+    Decodes an OMA message, binary or JSON.
+
+    Args:
+        payload: The raw MQTT message payload.
+        convert_json: Applied to the "OMA_output" of a JSON message.
+
+    Returns:
+        Tuple[Dict[str, Any], str]: The OMA output and the timestamp.
+    """
+    if is_binary(payload):
+        return decode(payload)
+    raw = json.loads(bytes(payload).decode("utf-8"))
+    return convert_json(raw["OMA_output"]), raw["timestamp"]
@@ -0,0 +1,233 @@
+"""
+Clusters of poles as a structure of arrays.
+
+A `ClusterSet` holds the poles of all clusters in flat arrays, the poles of
+cluster i being ``offsets[i]:offsets[i + 1]``, with one row per cluster for
+its `ip_index` and `confidence_interval`. Removing duplicate poles, filtering
+by size, sorting, cleaning by median and gathering mode shapes are array
+operations over the whole set instead of loops over cluster dicts.
+
+`mode_track` builds a set from the cluster dicts of the clustering steps and
+converts it back with `to_dicts`, the format downstream code uses.
+"""
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+class ClusterSet:
+    """
+    Clusters of poles in flat arrays.
+
+    Parameters
+    ----------
+    indices : np.ndarray
+        (pole, model order) of the poles of all clusters, shape (n_poles, 2).
+    offsets : np.ndarray
+        Start of every cluster in the pole arrays and the end of the last,
+        shape (n_clusters + 1,).
+    f_values, z_values : np.ndarray
+        Frequency and damping ratio of the poles, shape (n_poles,).
+    ip_index : np.ndarray
+        Index of every cluster, shape (n_clusters,).
+    confidence_interval : np.ndarray
+        (f_lower, f_upper, z_lower, z_upper) of every cluster, shape (n_clusters, 4).
+    """
+
+    __slots__ = ("indices", "offsets", "f_values", "z_values", "ip_index", "confidence_interval")
+
+    def __init__(self, indices, offsets, f_values, z_values, ip_index, confidence_interval):
+        self.indices = indices
+        self.offsets = offsets
+        self.f_values = f_values
+        self.z_values = z_values
+        self.ip_index = ip_index
+        self.confidence_interval = confidence_interval
+
+    @classmethod
+    def from_clusters(cls, clusters: List[Dict[str, Any]]) -> "ClusterSet":
+        """The set of cluster dicts with "ip_index", "confidence_interval", "indices",
+        "f_values" and "z_values"."""
+        sizes = [len(cluster["f_values"]) for cluster in clusters]
+        offsets = np.zeros(len(clusters) + 1, dtype=int)
+        np.cumsum(sizes, out=offsets[1:])
+        if not clusters:
+            return cls(np.empty((0, 2), dtype=int), offsets, np.empty(0), np.empty(0),
+                       np.empty(0, dtype=int), np.empty((0, 4)))
+        return cls(
+            np.concatenate([np.asarray(cluster["indices"], dtype=int).reshape(-1, 2) for cluster in clusters]),
+            offsets,
+            np.concatenate([np.asarray(cluster["f_values"], dtype=float) for cluster in clusters]),
+            np.concatenate([np.asarray(cluster["z_values"], dtype=float) for cluster in clusters]),
+            np.array([cluster["ip_index"] for cluster in clusters]),
+            np.array([cluster["confidence_interval"] for cluster in clusters], dtype=float).reshape(-1, 4))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> "ClusterView":
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"cluster index {i} out of range for {len(self)} clusters")
+        return ClusterView(self, i % len(self))
+
+    def __iter__(self):
+        return (ClusterView(self, i) for i in range(len(self)))
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """Number of poles of every cluster."""
+        return np.diff(self.offsets)
+
+    @property
+    def cluster_of_pole(self) -> np.ndarray:
+        """Cluster of every pole, shape (n_poles,)."""
+        return np.repeat(np.arange(len(self)), self.sizes)
+
+    def take(self, clusters: np.ndarray) -> "ClusterSet":
+        """
+        The clusters selected by a boolean mask or an array of cluster
+        indices, in that order.
+        """
+        clusters = np.arange(len(self))[clusters]
+        sizes = self.sizes[clusters]
+        offsets = np.zeros(len(clusters) + 1, dtype=int)
+        np.cumsum(sizes, out=offsets[1:])
+        # Position of every selected pole in the flat arrays
+        poles = np.repeat(self.offsets[clusters] - offsets[:-1], sizes) + np.arange(offsets[-1])
+        return ClusterSet(self.indices[poles], offsets, self.f_values[poles], self.z_values[poles],
+                          self.ip_index[clusters], self.confidence_interval[clusters])
+
+    def select_poles(self, keep: np.ndarray) -> "ClusterSet":
+        """
+        The clusters with only the poles selected by a boolean mask or an
+        array of pole indices in cluster order; no cluster is removed.
+        """
+        sizes = np.bincount(self.cluster_of_pole[keep], minlength=len(self))
+        offsets = np.zeros(len(self) + 1, dtype=int)
+        np.cumsum(sizes, out=offsets[1:])
+        return ClusterSet(self.indices[keep], offsets, self.f_values[keep], self.z_values[keep],
+                          self.ip_index, self.confidence_interval)
+
+    def unique_poles(self) -> "ClusterSet":
+        """
+        Every cluster with its poles sorted by frequency and the repeated
+        frequencies removed, keeping the first pole of each, as
+        ``np.unique(f_values, return_index=True)`` per cluster.
+        """
+        if len(self.f_values) == 0:
+            return self
+        # Sorting the clusters row by row is much faster than one sort of all poles by (cluster, frequency)
+        padded, valid = self._padded(self.f_values)
+        order = (np.argsort(padded, axis=1, kind="stable") + self.offsets[:-1, np.newaxis])[valid]
+        f_sorted = self.f_values[order]
+        cluster_of_pole = self.cluster_of_pole
+        repeated = (cluster_of_pole[1:] == cluster_of_pole[:-1]) & (
+            (f_sorted[1:] == f_sorted[:-1]) | (np.isnan(f_sorted[1:]) & np.isnan(f_sorted[:-1])))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = ~repeated
+        return self.select_poles(order[first])
+
+    def medians(self) -> np.ndarray:
+        """
+        Median frequency of every cluster, NaN for an empty one. The poles
+        must be sorted by frequency within each cluster, see `unique_poles`.
+        """
+        sizes = self.sizes
+        lower = self.offsets[:-1] + np.maximum(sizes - 1, 0) // 2
+        upper = self.offsets[:-1] + sizes // 2
+        medians = np.full(len(self), np.nan)
+        filled = sizes > 0
+        medians[filled] = (self.f_values[lower[filled]] + self.f_values[upper[filled]]) / 2
+        return medians
+
+    def clean_by_median(self, cov_freq: np.ndarray, medians: np.ndarray,
+                        bound_multiplier: float = 2) -> "ClusterSet":
+        """The clusters with only the poles whose confidence interval holds the median of their cluster."""
+        f_sigma = bound_multiplier * np.sqrt(cov_freq[tuple(self.indices.T)])
+        pole_medians = medians[self.cluster_of_pole]
+        keep = (pole_medians >= self.f_values - f_sigma) & (pole_medians <= self.f_values + f_sigma)
+        return self.select_poles(keep)
+
+    def first_of_duplicates(self) -> np.ndarray:
+        """Mask of the clusters whose frequencies are not the same as those of an earlier cluster."""
+        if len(self) == 0:
+            return np.zeros(0, dtype=bool)
+        # One row per cluster: its size and its frequencies, padded with NaN
+        padded, _ = self._padded(self.f_values)
+        rows = np.column_stack((self.sizes, padded))
+        _, first = np.unique(rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))),
+                             return_index=True)
+        mask = np.zeros(len(self), dtype=bool)
+        mask[first] = True
+        return mask
+
+    def _padded(self, values: np.ndarray) -> tuple:
+        """
+        The per-pole `values` as one row per cluster padded with NaN, shape
+        (n_clusters, largest size), and the mask of the poles in it. NaN
+        sorts last, so the padding stays behind the poles of every row.
+        """
+        sizes = self.sizes
+        valid = np.arange(sizes.max(initial=0)) < sizes[:, np.newaxis]
+        padded = np.full(valid.shape, np.nan)
+        padded[valid] = values
+        return padded, valid
+
+    def to_dicts(self, mode_shapes: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        The clusters as dicts with "ip_index", "confidence_interval",
+        "indices", "f_values" and "z_values", and "mode_shapes" gathered from
+        the (pole, model order, location) grid `mode_shapes` if given. The
+        arrays are views of the flat arrays of the set.
+        """
+        gathered = None if mode_shapes is None else mode_shapes[self.indices[:, 0], self.indices[:, 1], :]
+        return [cluster.to_dict(gathered) for cluster in self]
+
+
+class ClusterView:
+    """One cluster of a `ClusterSet`; its arrays are views of the flat arrays of the set."""
+
+    __slots__ = ("cluster_set", "position")
+
+    def __init__(self, cluster_set: ClusterSet, position: int):
+        self.cluster_set = cluster_set
+        self.position = position
+
+    @property
+    def _poles(self) -> slice:
+        return slice(self.cluster_set.offsets[self.position], self.cluster_set.offsets[self.position + 1])
+
+    @property
+    def ip_index(self) -> int:
+        return self.cluster_set.ip_index[self.position].item()
+
+    @property
+    def confidence_interval(self) -> tuple:
+        return tuple(self.cluster_set.confidence_interval[self.position])
+
+    @property
+    def indices(self) -> np.ndarray:
+        return self.cluster_set.indices[self._poles]
+
+    @property
+    def f_values(self) -> np.ndarray:
+        return self.cluster_set.f_values[self._poles]
+
+    @property
+    def z_values(self) -> np.ndarray:
+        return self.cluster_set.z_values[self._poles]
+
+    def __len__(self) -> int:
+        return int(self.cluster_set.sizes[self.position])
+
+    def to_dict(self, gathered_mode_shapes: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """The cluster as a dict, see `ClusterSet.to_dicts`."""
+        cluster = {
+            "ip_index": self.ip_index,
+            "confidence_interval": self.confidence_interval,
+            "indices": self.indices,
+            "f_values": self.f_values,
+            "z_values": self.z_values,
+        }
+        if gathered_mode_shapes is not None:
+            cluster["mode_shapes"] = gathered_mode_shapes[self._poles]
+        return cluster
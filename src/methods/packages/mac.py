@@ -0,0 +1,124 @@
+"""
+Batched Modal Assurance Criterion (MAC).
+
+MAC(x, a) = |x^H a|^2 / ((x^H x) (a^H a))
+
+Mode shapes are passed as stacks with one mode shape per row, shape
+(n_modes, n_locations). The squared norms in the denominator are computed
+once per mode shape instead of once per pair, and the numerators of all
+pairs come from a single matrix product.
+"""
+from typing import Optional
+import numpy as np
+
+
+def mode_norms(phi: np.ndarray, dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """
+    Squared norms x^H x of a stack of mode shapes.
+
+    Parameters
+    ----------
+    phi : np.ndarray
+        Mode shapes, shape: (..., n_locations).
+    dtype : np.dtype, optional
+        Precision of the computation, see `mac_matrix`.
+
+    Returns
+    -------
+    np.ndarray
+        Real squared norms, shape: (...).
+    """
+    phi = _as_dtype(phi, dtype)
+    return np.einsum("...i,...i->...", np.conj(phi), phi).real
+
+
+def mac_matrix(phi_X: np.ndarray, phi_A: np.ndarray, dtype: Optional[np.dtype] = None,
+               chunk_size: Optional[int] = None, norms_X: Optional[np.ndarray] = None,
+               norms_A: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    MAC between every mode shape of `phi_X` and every mode shape of `phi_A`.
+
+    Parameters
+    ----------
+    phi_X : np.ndarray
+        Mode shapes, shape: (n_X, n_locations) or (n_locations,).
+    phi_A : np.ndarray
+        Mode shapes, shape: (n_A, n_locations) or (n_locations,).
+    dtype : np.dtype, optional
+        Precision of the computation, e.g. np.float32 or np.complex64 for
+        single precision. By default the precision of the inputs is used,
+        and integer inputs are computed as float64.
+    chunk_size : int, optional
+        Number of rows of `phi_X` processed at a time, which bounds the size
+        of the temporary complex products for large stacks.
+    norms_X, norms_A : np.ndarray, optional
+        Precomputed `mode_norms` of the stacks, for stacks that are reused.
+
+    Returns
+    -------
+    np.ndarray
+        Real MAC values, shape: (n_X, n_A).
+
+    Raises
+    ------
+    ValueError
+        If the stacks are not one- or two-dimensional or the number of
+        locations differs.
+    """
+    phi_X = _as_dtype(np.atleast_2d(phi_X), dtype)
+    phi_A = _as_dtype(np.atleast_2d(phi_A), dtype)
+    if phi_X.ndim != 2 or phi_A.ndim != 2:
+        raise ValueError(
+            f"Mode shape stacks must have 1 or 2 dimensions (phi_X: {phi_X.ndim}, phi_A: {phi_A.ndim})")
+    if phi_X.shape[1] != phi_A.shape[1]:
+        raise ValueError(
+            f"Mode shapes must have the same number of locations (phi_X: {phi_X.shape[1]}, "
+            f"phi_A: {phi_A.shape[1]})")
+
+    if norms_X is None:
+        norms_X = mode_norms(phi_X)
+    if norms_A is None:
+        norms_A = mode_norms(phi_A)
+
+    n_X = phi_X.shape[0]
+    chunk_size = n_X if not chunk_size else chunk_size
+    phi_X_conj = np.conj(phi_X)
+    phi_A_T = phi_A.T
+    mac = np.empty((n_X, phi_A.shape[0]), dtype=norms_A.dtype)
+    for start in range(0, n_X, max(chunk_size, 1)):
+        stop = min(start + chunk_size, n_X)
+        num = np.abs(phi_X_conj[start:stop] @ phi_A_T) ** 2
+        mac[start:stop] = num / np.outer(norms_X[start:stop], norms_A)
+    return mac
+
+
+def mac_pairs(phi_X: np.ndarray, phi_A: np.ndarray, dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """
+    MAC between corresponding mode shapes of two stacks.
+
+    Parameters
+    ----------
+    phi_X, phi_A : np.ndarray
+        Mode shapes, shape: (..., n_locations), broadcastable against each other.
+    dtype : np.dtype, optional
+        Precision of the computation, see `mac_matrix`.
+
+    Returns
+    -------
+    np.ndarray
+        Real MAC values, shape: (...).
+    """
+    phi_X = _as_dtype(phi_X, dtype)
+    phi_A = _as_dtype(phi_A, dtype)
+    num = np.abs(np.einsum("...i,...i->...", np.conj(phi_X), phi_A)) ** 2
+    return num / (mode_norms(phi_X) * mode_norms(phi_A))
+
+
+def _as_dtype(phi: np.ndarray, dtype: Optional[np.dtype]) -> np.ndarray:
+    phi = np.asarray(phi)
+    if dtype is None:
+        dtype = phi.dtype if phi.dtype.kind in "fc" else np.float64
+    elif np.iscomplexobj(phi):
+        # A real precision keeps complex mode shapes complex
+        dtype = np.result_type(dtype, np.complex64)
+    return phi.astype(dtype, copy=False)
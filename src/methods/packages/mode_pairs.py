@@ -1,5 +1,6 @@
 "This file is taken from the DTaaS-platform"
 import numpy as np
+from methods.packages.mac import mac_matrix, mac_pairs
 
 def MAC_calculate(mode1, mode2):
     """
@@ -11,10 +12,7 @@ def MAC_calculate(mode1, mode2):
         float: MAC value (between 0 and 1).
      
     """
-    numerator = np.abs(np.dot(mode1.conj().T, mode2)) ** 2  
-    denominator = np.dot(mode1.conj().T, mode1) * np.dot(mode2.conj().T, mode2)
-    
-    return np.real(numerator / denominator)  
+    return mac_pairs(mode1, mode2)
 
 def pair_calculate(omegaM, PhiM, cleaned_clusters, median_frequencies):
     """
@@ -55,25 +53,24 @@ def pair_calculate(omegaM, PhiM, cleaned_clusters, median_frequencies):
     highest_mac_dict_idx = np.zeros(mode_count, dtype=int)  # Dictionary index with highest MAC for each mode
     average_mac_dict_idx = np.zeros(mode_count, dtype=int)  # Dictionary index with best average MAC for each mode
     
+    # MAC of every mode of PhiM with the mode shapes of all dictionaries at once, split per dictionary
+    cluster_macs = []
+    if cleaned_clusters:
+        cluster_sizes = [len(cluster['mode_shapes']) for cluster in cleaned_clusters]
+        all_macs = mac_matrix(PhiM.T, np.concatenate([cluster['mode_shapes'] for cluster in cleaned_clusters]))
+        cluster_macs = np.split(all_macs, np.cumsum(cluster_sizes)[:-1], axis=1)
+
     # Loop through each mode of PhiM
     for i in range(mode_count):
         best_avg_mac = -1  # Track the best average MAC
         best_avg_mac_idx = -1  # Track the dictionary index for best average MAC
     
-        for j, cluster in enumerate(cleaned_clusters):
-            mode_shape = cluster['mode_shapes']  # Mode shapes in current dictionary
+        for j, cluster_mac in enumerate(cluster_macs):
+            mac_per_mode = cluster_mac[i]  # MAC with the mode shapes in current dictionary
     
            # Track the highest MAC for current mode of PhiM
-            max_mac_for_mode = -1  # Track the highest MAC for this mode
-            mac_per_mode = []
-            
-            for k in range(mode_shape.shape[0]):
-                current_mac = MAC_calculate(mode_shape[k, :].T, PhiM[:,i])
-                highest_mac[i, j] = max(highest_mac[i, j], current_mac)
-                mac_per_mode.append(current_mac)
-    
-                if current_mac > max_mac_for_mode:
-                    max_mac_for_mode = current_mac
+            max_mac_for_mode = np.max(mac_per_mode, initial=-1, where=~np.isnan(mac_per_mode))
+            highest_mac[i, j] = max(highest_mac[i, j], max_mac_for_mode)
     
             # Track the dictionary with the highest MAC for the current mode
             if highest_mac[i, j] == max_mac_for_mode:
@@ -123,7 +120,7 @@ def pair_calculate(omegaM, PhiM, cleaned_clusters, median_frequencies):
                 mode_shapes = selected_cluster['mode_shapes']
                 
                 # Find the mode shape with the highest MAC for the current mode
-                mac_values = np.array([MAC_calculate(mode_shapes[k, :].T, PhiM[:, i]) for k in range(mode_shapes.shape[0])])
+                mac_values = cluster_macs[candidate_cluster_idx][i]
                 # print(f'PhiM for MAC: {PhiM[:,i]}')
                 # print(f'Mode track mode shape: {[mode_shapes[k,:].T for k in range(mode_shapes.shape[0])]}')
                 # print(f'MAC values alfa: {mac_values}')
@@ -152,8 +149,7 @@ def pair_calculate(omegaM, PhiM, cleaned_clusters, median_frequencies):
                 if idx in used_clusters:
                     continue
     
-                mode_shapes = cluster['mode_shapes']
-                mac_values = np.array([MAC_calculate(mode_shapes[k, :].T, PhiM[:, i]) for k in range(mode_shapes.shape[0])])
+                mac_values = cluster_macs[idx][i]
                 # print(f'MAC values beta: {mac_values}')
                 max_mac_idx = np.argmax(mac_values)
                 max_mac = mac_values[max_mac_idx]
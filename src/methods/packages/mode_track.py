@@ -4,13 +4,15 @@ import matplotlib.tri as mtri
 import numpy as np
 import numpy.ma as ma
 import copy
+from methods.packages.mac import mac_matrix, mac_pairs
+from methods.packages.cluster_set import ClusterSet
 
 # plt.close('all')
 # Clustering function
 def cluster_frequencies(frequencies, damping_ratios, mode_shapes, 
                         frequencies_max_MO, cov_freq_max_MO, 
                         damping_ratios_max_MO, cov_damping_max_MO,
-                        mode_shapes_max_MO, tMAC, bound_multiplier=2):
+                        mode_shapes_max_MO, tMAC, bound_multiplier=2, unclustered=None):
     """
     
 
@@ -36,6 +38,9 @@ def cluster_frequencies(frequencies, damping_ratios, mode_shapes,
         DESCRIPTION.
     bound_multiplier : TYPE, optional
         DESCRIPTION. The default is 2.
+    unclustered : np.ndarray of bool, optional
+        Poles of the grid that may be clustered; the others are treated as
+        NaN, without copying the grids. The default is all poles.
 
     Returns
     -------
@@ -71,8 +76,8 @@ def cluster_frequencies(frequencies, damping_ratios, mode_shapes,
     C_cluster = [] 
     Ip        = []
     
-    # Mask to track ungrouped elements (initially all elements are ungrouped)
-    ungrouped_mask = np.ones_like(frequencies, dtype=bool)
+    # Poles sorted by frequency, so each seed looks up its neighbourhood by bisection
+    pole_index = _sorted_pole_index(frequencies, unclustered)
     
     # Check each limit and save indices
     for ip, (f_MxMO, fcov_MxMO, z_MxMO, zcov_MxMO) in enumerate(zip(fn_unique, 
@@ -86,9 +91,9 @@ def cluster_frequencies(frequencies, damping_ratios, mode_shapes,
         z_lower_bound = z_MxMO - bound_multiplier * np.sqrt(zcov_MxMO)
         z_upper_bound = z_MxMO + bound_multiplier * np.sqrt(zcov_MxMO)
         
-        # Find elements within the current limit that are still ungrouped
-        condition_mask = (frequencies >= f_lower_bound) & (frequencies <= f_upper_bound) & (damping_ratios >= z_lower_bound) & (damping_ratios <= z_upper_bound) & ungrouped_mask
-        indices = np.argwhere(condition_mask)  # Get indices satisfying the condition
+        # Find elements within the current limit
+        indices = _poles_in_bounds(pole_index, frequencies, damping_ratios, 
+                                   f_lower_bound, f_upper_bound, z_lower_bound, z_upper_bound)
         
         # Initialization of Ip
         Ip.append({
@@ -136,15 +141,9 @@ def cluster_frequencies(frequencies, damping_ratios, mode_shapes,
             print("All values are unique.")
             if len(indices)>1:
                 
-                for ii in indices:
-                    target_mode_shape = mode_shapes[ii[0], ii[1], :]  # Extract mode shape from the 3D array
-                    reference_mode_shape = mode_shape_unique[ip]
-                    
-                    # print(f'print target_mode_shape: {target_mode_shape}')
-                    # print(f'print reference_mode_shape: {reference_mode_shape}')  
-                    
-                    # Calculate MAC with the reference mode shape
-                    mac_value = calculate_mac(reference_mode_shape, target_mode_shape)
+                # Calculate MAC of all mode shapes with the reference mode shape
+                mac_values = mac_matrix(mode_shape_unique[ip], _stack_mode_shapes(mode_shapes, indices))[0]
+                for ii, mac_value in zip(indices, mac_values):
                     # print(f'MAC value: {mac_value}')
                     # print(f'ip : {ip}')
                     # print(f'MAC : {mac_value}')
@@ -185,15 +184,10 @@ def cluster_frequencies(frequencies, damping_ratios, mode_shapes,
         # Handle the duplicate model order for single mode
         else:
             if len(indices_Ipu)>1:                
-                for ii in indices_Ipu:
-                    target_mode_shape = mode_shapes[ii[0], ii[1], :]  # Extract mode shape from the 3D array
-                    reference_mode_shape = mode_shapes[ip_for_Ipu[0], ip_for_Ipu[1], :]
-                    
-                    # print(f'print target_mode_shape: {target_mode_shape}')
-                    # print(f'print reference_mode_shape: {reference_mode_shape}')  
-                    
-                    # Calculate MAC with the reference mode shape
-                    mac_value = calculate_mac(reference_mode_shape, target_mode_shape)
+                # Calculate MAC of all mode shapes with the reference mode shape
+                reference_mode_shape = mode_shapes[ip_for_Ipu[0], ip_for_Ipu[1], :]
+                mac_values = mac_matrix(reference_mode_shape, _stack_mode_shapes(mode_shapes, indices_Ipu))[0]
+                for ii, mac_value in zip(indices_Ipu, mac_values):
                     # print(f'MAC value: {mac_value}')
                     # print(f'ip : {ip}')
                     # print(f'MAC : {mac_value}')
@@ -267,11 +261,11 @@ def cluster_frequencies(frequencies, damping_ratios, mode_shapes,
                 updated_indices2 = np.empty((0, 2), dtype=int)  # Reset to empty 2D array
                 f_updated_values2  = []
                 z_updated_values2  = []
-                for pp in item1['indices']:
-                    for kk in item2['indices']:
-                        reference_mode_shape = mode_shapes[pp[0], pp[1], :]
-                        target_mode_shape    = mode_shapes[kk[0], kk[1], :]
-                        mac_value = calculate_mac(reference_mode_shape, target_mode_shape)
+                mac_values = mac_matrix(_stack_mode_shapes(mode_shapes, item1['indices']),
+                                        _stack_mode_shapes(mode_shapes, item2['indices']))
+                for pp_idx, _ in enumerate(item1['indices']):
+                    for kk_idx, kk in enumerate(item2['indices']):
+                        mac_value = mac_values[pp_idx, kk_idx]
                         if mac_value > tMAC:
                             updated_indices2 = np.vstack([updated_indices2,kk])
                             f_updated_values2  = np.append(f_updated_values2, frequencies[tuple(kk.T)])
@@ -320,26 +314,20 @@ def cluster_frequencies(frequencies, damping_ratios, mode_shapes,
     
     # algorith 2: step 4
     Ip_indices = np.vstack([item['indices'] for item in C_cluster])
-    # Make a copy of frequencies to represent unclustered frequencies
-    unclustered_frequencies = frequencies.copy()
-    unclustered_damping = damping_ratios.copy()
-    # Update the copied matrix to NaN at collected indices
-    for idx in Ip_indices:
-        unclustered_frequencies[tuple(idx)] = np.nan  # Set to NaN
-        unclustered_damping[tuple(idx)] = np.nan
+    # Occupancy of the (pole, model order) grid by the clusters
+    clustered = np.zeros(frequencies.shape, dtype=bool)
+    clustered[tuple(Ip_indices.T)] = True
+    if unclustered is not None:
+        clustered |= ~unclustered
+    unclustered_frequencies = np.where(clustered, np.nan, frequencies)
+    unclustered_damping = np.where(clustered, np.nan, damping_ratios)
          
     # print(f'Unclustred frequencies: {unclustered_frequencies}')  
     
-    # Find all indices in the frequencies matrix
-    all_indices = np.array(np.meshgrid(np.arange(frequencies.shape[0]), np.arange(frequencies.shape[1]))).T.reshape(-1, 2)
-    
-    # Identify unclustered indices: exclude NaN and indices in clustered_indices
-    unclustered_indices = []
-    for idx in all_indices:
-        if not np.isnan(frequencies[tuple(idx)]) and not any((idx == Ip_indices).all(axis=1)):
-            unclustered_indices.append(idx)
-    
-    unclustered_indices = np.array(unclustered_indices) 
+    # Identify unclustered indices in row-major order: exclude NaN, clustered and masked poles
+    unclustered_indices = np.argwhere(~np.isnan(frequencies) & ~clustered)
+    if unclustered_indices.size == 0:
+        unclustered_indices = np.array([])
     # print(f'Unclustred indices: {unclustered_indices}')    
         
     return C_cluster_finale, unclustered_frequencies, unclustered_damping, unclustered_indices
@@ -362,9 +350,55 @@ def calculate_mac(reference_mode, mode_shape):
         DESCRIPTION.
 
     """
-    numerator = np.abs(np.dot(reference_mode.conj().T, mode_shape)) ** 2
-    denominator = np.dot(reference_mode.conj().T, reference_mode) * np.dot(mode_shape.conj().T, mode_shape)
-    return np.real(numerator / denominator)
+    return mac_pairs(reference_mode, mode_shape)
+
+def _sorted_pole_index(frequencies, unclustered=None):
+    """
+    Flat indices of the non-NaN poles in ascending frequency, and those
+    frequencies. Only the poles in the `unclustered` mask are indexed, if given.
+    """
+    flat_frequencies = np.ravel(frequencies)
+    indexed = ~np.isnan(flat_frequencies)
+    if unclustered is not None:
+        indexed &= np.ravel(unclustered)
+    poles = np.flatnonzero(indexed)
+    poles = poles[np.argsort(flat_frequencies[poles], kind='stable')]
+    return poles, flat_frequencies[poles]
+
+def _poles_in_bounds(pole_index, frequencies, damping_ratios, f_lower_bound, f_upper_bound, 
+                     z_lower_bound, z_upper_bound):
+    """
+    Indices of the poles within the frequency and damping bounds, in the
+    row-major order of np.argwhere.
+
+    Parameters
+    ----------
+    pole_index : tuple of np.ndarray
+        Output of `_sorted_pole_index` for `frequencies`.
+    frequencies, damping_ratios : np.ndarray
+        (pole, model order) grids.
+    f_lower_bound, f_upper_bound, z_lower_bound, z_upper_bound : float
+        Inclusive bounds. A NaN bound matches no pole.
+
+    Returns
+    -------
+    np.ndarray
+        (n, 2) array of (pole, model order) indices.
+    """
+    poles, sorted_frequencies = pole_index
+    start = np.searchsorted(sorted_frequencies, f_lower_bound, side='left')
+    stop = np.searchsorted(sorted_frequencies, f_upper_bound, side='right')
+    rows, cols = np.unravel_index(np.sort(poles[start:stop]), frequencies.shape)
+    f = frequencies[rows, cols]
+    z = damping_ratios[rows, cols]
+    # The bisection already bounds the frequency; the comparisons also reject NaN bounds
+    keep = (f >= f_lower_bound) & (f <= f_upper_bound) & (z >= z_lower_bound) & (z <= z_upper_bound)
+    return np.column_stack((rows[keep], cols[keep]))
+
+def _stack_mode_shapes(mode_shapes, indices):
+    """Mode shapes at the (pole, model order) `indices`, shape: (n_indices, n_locations)."""
+    indices = np.asarray(indices, dtype=int).reshape(-1, 2)
+    return mode_shapes[indices[:, 0], indices[:, 1], :]
 
 def clusterexpansion(C_clusters, unClustered_frequencies, unClustered_damping, cov_freq, cov_damping, mode_shapes, unClustered_indices, tMAC, bound_multiplier=2):
     """
@@ -407,172 +441,86 @@ def clusterexpansion(C_clusters, unClustered_frequencies, unClustered_damping, c
 
     """
     
-    # cov_freq = cov_freq[::2]              
-    # mode_shapes = mode_shapes[::2, :, :]
-    
-    # import pprint
-    # for cluster in C_clusters:
-    #     pprint.pprint(cluster)
-    
-    Ip_plus = []
-    
+    # The clusters are expanded independently of each other: the candidates
+    # of a cluster are the unclustered poles inside the bounds of all its
+    # members, and a candidate is added once per member whose MAC with it
+    # exceeds tMAC (in member-major order). Nothing is added if the cluster
+    # has as many candidates as members.
+    C_cluster_finale = []
     for cluster in C_clusters:
-        
         f_values = cluster['f_values']
         z_values = cluster['z_values']
         indices = cluster['indices']
-                
+
         # **Skip if the cluster is empty**
-        if len(f_values) == 0:  
+        if len(f_values) == 0:
             print("Skipping empty cluster...")
-            continue  # Move to the next cluster
-        
-        # print("Covariance Array:", np.sqrt(cov_freq[tuple(indices.T)]))        
-        # Calculate the lower and upper bounds for the current cluster
-        # print(f'f_values: {f_values}')
-        # print(f'cov_freq[tuple(indices.T): {cov_freq[tuple(indices.T)]}')
-        f_lower_bound = np.min(f_values - bound_multiplier * np.sqrt(cov_freq[tuple(indices.T)]))  # Minimum of all points for frequencies
-        f_upper_bound = np.max(f_values + bound_multiplier * np.sqrt(cov_freq[tuple(indices.T)]))  # Maximum of all points for frequencies
-        z_lower_bound = np.min(z_values - bound_multiplier * np.sqrt(cov_damping[tuple(indices.T)]))  # Minimum of all points for damping
-        z_upper_bound = np.max(z_values + bound_multiplier * np.sqrt(cov_damping[tuple(indices.T)]))  # Maximum of all points for damping
-
-        # print(f'Print cluster lower bound: {lower_bound}')
-        # print(f'Print cluster upper bound: {upper_bound}')
-                
-        # Find elements within the current limit that are still ungrouped
-        condition_mask2 = (unClustered_frequencies >= f_lower_bound) & (unClustered_frequencies <= f_upper_bound) & (unClustered_damping >= z_lower_bound) & (unClustered_damping <= z_upper_bound)
-        # Get indices satisfying the condition
-        expanded_indices = np.argwhere(condition_mask2)
-        
-        # Initialize lists to store updated indices and values
-        updated_indices3 = []
-        f_updated_values3 = []
-        z_updated_values3 = []
-    
-        # Loop through the unclustered indices and append matching values to the cluster
-        for idx in expanded_indices:
-            freq_value = unClustered_frequencies[tuple(idx)]  # Get the frequency value at this index
-            damp_value = unClustered_damping[tuple(idx)]      # Get the damping value at this index
-            updated_indices3.append(idx)  # Append the index
-            f_updated_values3.append(freq_value)  # Append the frequency value
-            z_updated_values3.append(damp_value)  # Append the damping value
-        
-        # Create a new cluster and append it to Ip_plus_cluster
-        Ip_plus.append({
-            "ip_index": cluster['ip_index'],  # Use the ip_index from the original cluster
-            "indices": np.array(updated_indices3),  # Updated indices
-            "f_values": np.array(f_updated_values3),  # Updated frequency values
-            "z_values": np.array(z_updated_values3)  # Updated damping values
-        })
-        
-        
-    Ip_plus_C = []  
-    # algorith 2: setp 3 [condition check]
-    for item1 in C_clusters:
-        # print(f'C_cluster item: {item1}')
-        # print(f'C_cluster value: {item1["values"]}')
-        
-        for item2 in Ip_plus:
-            if item1['ip_index'] != item2['ip_index']:
-                continue  # Skip the comparison if ip_index is not the same
-            
-            if len(item1['f_values']) == len(item2['f_values']):
-                # print('For C and Ip - values have the same length. Proceeding to compare the values.')
-                
-                # Compare the values
-                if np.all(item1['f_values'] != item2['f_values']):
-                    # print(f'Values are different between C_cluster and Ip: {item1["values"]} vs {item2["values"]}')
-                    continue
-                else:
-                    print(f'Values are the same between C_cluster and Ip_plus: {item1["f_values"]}')
-            
-            else:
-                # print('Values have different lengths between C_cluster and Ip.')
-                updated_indices4 = np.empty((0, 2), dtype=int)  # Reset to empty 2D array
-                f_updated_values4  = []
-                z_updated_values4  = []
-                for pp in item1['indices']:
-                    for kk in item2['indices']:
-                        reference_mode_shape = mode_shapes[pp[0], pp[1], :]
-                        target_mode_shape    = mode_shapes[kk[0], kk[1], :]
-                        mac_value = calculate_mac(reference_mode_shape, target_mode_shape)
-                        if mac_value > tMAC:
-                            updated_indices4 = np.vstack([updated_indices4,kk])
-                            f_updated_values4  = np.append(f_updated_values4, unClustered_frequencies[tuple(kk.T)])
-                            z_updated_values4  = np.append(z_updated_values4, unClustered_damping[tuple(kk.T)])
-                            # print(f'newly added indices: {kk}')
-                            # print(f'newly added values: {frequencies[tuple(kk.T)]}')
-                            Ip_plus_C.append({ 
-                                "ip_index": item1['ip_index'],
-                                "indices" : updated_indices4,
-                                "f_values"  : f_updated_values4,
-                                "z_values" : z_updated_values4
-                                })
+            C_cluster_finale.append(_copy_cluster(cluster))
+            continue
+
+        rows, cols = tuple(indices.T)
+        f_sigma = bound_multiplier * np.sqrt(cov_freq[rows, cols])
+        z_sigma = bound_multiplier * np.sqrt(cov_damping[rows, cols])
+        f_lower_bound = np.min(f_values - f_sigma)  # Minimum of all points for frequencies
+        f_upper_bound = np.max(f_values + f_sigma)  # Maximum of all points for frequencies
+        z_lower_bound = np.min(z_values - z_sigma)  # Minimum of all points for damping
+        z_upper_bound = np.max(z_values + z_sigma)  # Maximum of all points for damping
+
+        # Unclustered poles within the bounds of the cluster
+        candidate_mask = ((unClustered_frequencies >= f_lower_bound) & (unClustered_frequencies <= f_upper_bound)
+                          & (unClustered_damping >= z_lower_bound) & (unClustered_damping <= z_upper_bound))
+        candidates = np.argwhere(candidate_mask)
+
+        if len(candidates) == len(f_values):
+            if not np.all(f_values != unClustered_frequencies[candidate_mask]):
+                print(f'Values are the same between C_cluster and Ip_plus: {f_values}')
+            C_cluster_finale.append(_copy_cluster(cluster))
+            continue
+
+        # algorith 2: setp 3 [condition check], one MAC matrix per cluster
+        mac_values = mac_matrix(_stack_mode_shapes(mode_shapes, indices),
+                                _stack_mode_shapes(mode_shapes, candidates))
+        _, added = np.nonzero(mac_values > tMAC)
+        if added.size == 0:
+            C_cluster_finale.append(_copy_cluster(cluster))
+            continue
 
-
-        # Initialize C_cluster_finale as a deep copy of C_cluster
-        C_cluster_finale = copy.deepcopy(C_clusters)
-        
-        # Add the points from Ip_C_cluster if they satisfy MAC conditions
         # algorith 2: setp 3 [addition of point]
-        for item1 in C_clusters:
-            for item2 in Ip_plus_C:
-                if item1['ip_index'] != item2['ip_index']:
-                    continue  # Skip the comparison if ip_index is not the same
-                
-                # Combine values from both clusters
-                f_merged_values2 = np.concatenate((item1['f_values'], item2['f_values']))       # concatenate frequencies
-                z_merged_values2 = np.concatenate((item1['z_values'], item2['z_values']))       # concatenate damping
-                # Combine indices from both clusters
-                merged_indices2 = np.concatenate((item1['indices'], item2['indices']))
-                
-                # Find the corresponding cluster in C_cluster_finale
-                for finale_item in C_cluster_finale:
-                    if finale_item['ip_index'] == item1['ip_index']:
-                        # Update values and indices
-                        finale_item['f_values'] = f_merged_values2
-                        finale_item['z_values'] = z_merged_values2
-                        finale_item['indices'] = merged_indices2
-                        break  # Exit the loop once the match is found  
-
+        added_indices = candidates[added]
+        added_rows, added_cols = tuple(added_indices.T)
+        expanded = _copy_cluster(cluster)
+        expanded['f_values'] = np.concatenate((f_values, unClustered_frequencies[added_rows, added_cols]))
+        expanded['z_values'] = np.concatenate((z_values, unClustered_damping[added_rows, added_cols]))
+        expanded['indices'] = np.concatenate((indices, added_indices))
+        C_cluster_finale.append(expanded)
 
     # algorith 2: step 4
-    # Filter out empty 'indices' arrays and check if there are any non-empty ones
-    valid_indices = [item['indices'] for item in C_clusters if item['indices'].size > 0]
-    
-    if valid_indices:
-        # If there are valid indices, proceed with stacking
-        Ip_plus_indices = np.vstack(valid_indices)
+    # Occupancy of the (pole, model order) grid by the clusters before the expansion
+    clustered = np.zeros(unClustered_frequencies.shape, dtype=bool)
+    for cluster in C_clusters:
+        if cluster['indices'].size > 0:
+            clustered[tuple(np.asarray(cluster['indices']).T)] = True
+
+    unclustered_frequencies_expanded = np.where(clustered, np.nan, unClustered_frequencies)
+    unclustered_damping_expanded = np.where(clustered, np.nan, unClustered_damping)
+
+    # Unclustered indices in row-major order, excluding NaN and clustered poles
+    if clustered.any():
+        unclustered_indices_expnaded = np.argwhere(~np.isnan(unClustered_frequencies) & ~clustered)
     else:
-        # If there are no valid indices, handle accordingly (e.g., set to empty or raise a warning)
-        # print("No valid indices to stack.")
-        Ip_plus_indices = np.array([])  # Or choose another fallback behavior    
-    # Make a copy of frequencies to represent unclustered frequencies
-    unclustered_frequencies_expanded = unClustered_frequencies.copy()
-    unclustered_damping_expanded = unClustered_damping.copy()
-    # Update the copied matrix to NaN at collected indices
-    for idx in Ip_plus_indices:
-        unclustered_frequencies_expanded[tuple(idx)] = np.nan  # Set to NaN
-        unclustered_damping_expanded[tuple(idx)] = np.nan  # Set to NaN
-         
-    # print(f'Unclustred frequencies: {unclustered_frequencies}')  
-    
-    # Find all indices in the frequencies matrix
-    all_indices = np.array(np.meshgrid(np.arange(unClustered_frequencies.shape[0]), np.arange(unClustered_frequencies.shape[1]))).T.reshape(-1, 2)
-    
-    # Identify unclustered indices: exclude NaN and indices in clustered_indices
-    unclustered_indices_expnaded = []
-    for idx in all_indices:
-        # if not np.isnan(unClustered_frequencies[tuple(idx)]) and not any((idx == Ip_plus_indices).all(axis=1)):
-        if Ip_plus_indices.size > 0 and not np.isnan(unClustered_frequencies[tuple(idx)]) and not any((idx == Ip_plus_indices).all(axis=1)):
-            unclustered_indices_expnaded.append(idx)
-    
-    unclustered_indices_expnaded = np.array(unclustered_indices_expnaded) 
-    # print(f'Unclustred indices expanded: {unclustered_indices_expnaded}')
+        unclustered_indices_expnaded = np.empty((0, 2), dtype=int)
+    if unclustered_indices_expnaded.size == 0:
+        unclustered_indices_expnaded = np.array([])
 
     return C_cluster_finale, unclustered_frequencies_expanded, unclustered_damping_expanded, unclustered_indices_expnaded
 
 
+def _copy_cluster(cluster):
+    """Copy of a cluster dict with its own arrays."""
+    return {key: np.copy(value) if isinstance(value, np.ndarray) else value
+            for key, value in cluster.items()}
+
+
 def visualize_clusters(clusters, cov_freq, bounds):
     """
     
@@ -656,52 +604,44 @@ def clean_clusters_by_median(clusters, cov_freq, bound_multiplier=2):
         DESCRIPTION.
 
     """
-    cleaned_clusters = []
+    # Poles of all clusters as flat arrays, without repeated frequencies
+    cluster_set = ClusterSet.from_clusters(clusters).unique_poles()
 
-    for cluster_idx, cluster in enumerate(clusters):
-        # Extract values and indices from the cluster
-        f_cluster_values = np.array(cluster["f_values"])
-        z_cluster_values = np.array(cluster["z_values"])
-        cluster_indices = np.array(cluster["indices"])
-        
-        # Extract covariance for each cluster element
-        f_cluster_cov = cov_freq[tuple(cluster_indices.T)]  # Extract covariance for the given indices
-
-        # Remove duplicates by using unique values and their indices
-        f_unique_values, unique_indices = np.unique(f_cluster_values, return_index=True)
-        f_unique_cov = f_cluster_cov[unique_indices]
-        z_unique = z_cluster_values[unique_indices]
-        unique_indices_2D = cluster_indices[unique_indices]
-
-        # Update the original cluster with unique values and indices
-        cluster["f_values"] = f_unique_values
-        cluster["z_values"] = z_unique
-        cluster["indices"] = unique_indices_2D
-
-        # Calculate the median of the unique values
-        median_value = np.nanmedian(f_unique_values)
-
-        # Define bounds for filtering based on the bound_multiplier and covariance
-        lower_bound = f_unique_values - bound_multiplier * np.sqrt(f_unique_cov)
-        upper_bound = f_unique_values + bound_multiplier * np.sqrt(f_unique_cov)
-
-        # Keep elements where the median lies within the bounds
-        mask = (median_value >= lower_bound) & (median_value <= upper_bound)
-        f_cleaned_values = f_unique_values[mask]
-        z_cleaned_values = z_unique[mask]
-        cleaned_indices = unique_indices_2D[mask]
-
-        # Append the cleaned cluster to the result if there are enough values
-        if len(f_cleaned_values) > 1:  # Keep clusters with more than one cleaned value
-            cleaned_clusters.append({
-                "original_cluster": cluster,  # Store the original cluster (now updated with unique values)
-                "f_values": f_cleaned_values,
-                "z_values": z_cleaned_values,
-                "indices": cleaned_indices,
-                "median": median_value,
-                "bound_multiplier": bound_multiplier,  # Store the bound multiplier used
-            })
+    # Update the original clusters with the unique values
+    for cluster, unique in zip(clusters, cluster_set):
+        cluster["f_values"] = unique.f_values
+        cluster["z_values"] = unique.z_values
+        cluster["indices"] = unique.indices
+
+    # Keep the poles whose bounds hold the median of their cluster
+    medians = cluster_set.medians()
+    cleaned = cluster_set.clean_by_median(cov_freq, medians, bound_multiplier=bound_multiplier)
+
+    # Keep clusters with more than one cleaned value
+    kept = np.flatnonzero(cleaned.sizes > 1)
+    return _cleaned_cluster_dicts(cleaned, medians, kept, bound_multiplier, originals=clusters)
 
+
+def _cleaned_cluster_dicts(cleaned, medians, kept, bound_multiplier, originals, mode_shapes=None):
+    """
+    The cleaned clusters `kept`, in that order, as dicts referring to their
+    original cluster; with their mode shapes if `mode_shapes` is given.
+    """
+    gathered = None if mode_shapes is None else _stack_mode_shapes(mode_shapes, cleaned.indices)
+    cleaned_clusters = []
+    for i in kept:
+        cluster = cleaned[i].to_dict(gathered)
+        cleaned_cluster = {
+            "original_cluster": originals[i],  # The original cluster (with unique values)
+            "f_values": cluster["f_values"],
+            "z_values": cluster["z_values"],
+            "indices": cluster["indices"],
+            "median": medians[i],
+            "bound_multiplier": bound_multiplier,  # Store the bound multiplier used
+        }
+        if gathered is not None:
+            cleaned_cluster["mode_shapes"] = cluster["mode_shapes"]
+        cleaned_clusters.append(cleaned_cluster)
     return cleaned_clusters
 
     
@@ -722,8 +662,6 @@ def mode_allingment(ssi_mode_track_res, mstab, tMAC):
     cov_damping_max_MO = cov_damping[:,-1]
     mode_shapes_max_MO = mode_shapes[:,-1,:]
     
-    frequencies_copy = frequencies.copy()
-    
     # Remove the complex conjugate entries
     frequencies = frequencies[::2]              # This is 'S' as per algorithm
     damping_ratios = damping_ratios[::2]        # This is 'S' as per algorithm
@@ -757,6 +695,9 @@ def mode_allingment(ssi_mode_track_res, mstab, tMAC):
     last_ip_index = max(cluster['ip_index'] for cluster in C_expanded)
     
     count = 0
+    
+    # Poles not clustered yet, updated in place instead of NaN-masked copies of the grids
+    unclustered = np.zeros(frequencies.shape, dtype=bool)
       
     # Loop until unClustd_indices contains only one index
     while True:
@@ -771,46 +712,34 @@ def mode_allingment(ssi_mode_track_res, mstab, tMAC):
         # Get the highest column index from unClustd_indices
         highest_column = np.max(unClustd_indices_expanded[:, 1])  # Assuming column index is in the second column
     
-        # Create a mask for the unclustered indices
-        mask1 = np.full(frequencies.shape, False)  # Initialize a boolean mask
-        mask1[tuple(unClustd_indices_expanded.T)] = True  # Set only unclustered indices to True
-        unClustd_frequencies = frequencies.copy()
-        unClustd_damping = damping_ratios.copy()
-        unClustd_frequencies[~mask1] = np.nan
-        unClustd_damping[~mask1] = np.nan
-        unClustd_cov_freq = cov_freq.copy()
-        unClustd_cov_damp = cov_damping.copy()
-        unClustd_cov_freq[~mask1] = np.nan  # Unclustered frequency variance matrix
-        unClustd_cov_damp[~mask1] = np.nan  # Unclustered damping variance matrix
-        unClustd_mode_shapes = mode_shapes.copy()
-    
-        for ii in range(unClustd_mode_shapes.shape[2]):  
-            slice_2d = unClustd_mode_shapes[:, :, ii]    
-            slice_2d[~mask1] = np.nan
-            unClustd_mode_shapes[:, :, ii] = slice_2d  # Unclustered mode shape matrix
+        # Mark the unclustered indices
+        unclustered.fill(False)
+        unclustered[tuple(unClustd_indices_expanded.T)] = True
         
-        # Filter the data for the highest column
+        # Filter the data for the highest column, only that column is masked
+        column_unclustered = unclustered[:, highest_column]
         frequencies_max_MO = unClustd_frequencies_expanded[:, highest_column]
         # print(f'Maximum model order: {highest_column}')
         # print(f'MO frequencies: {frequencies_max_MO}')
         damping_ratios_max_MO = unClustd_damping_expanded[:, highest_column]
         # print(f'frequencies initization: {frequencies_max_MO}')
-        cov_freq_max_MO = unClustd_cov_freq[:, highest_column]
-        cov_damp_max_MO = unClustd_cov_damp[:, highest_column]
-        mode_shapes_max_MO = unClustd_mode_shapes[:, highest_column, :]
+        cov_freq_max_MO = np.where(column_unclustered, cov_freq[:, highest_column], np.nan)
+        cov_damp_max_MO = np.where(column_unclustered, cov_damping[:, highest_column], np.nan)
+        mode_shapes_max_MO = np.where(column_unclustered[:, np.newaxis], mode_shapes[:, highest_column, :], np.nan)
     
         # Call the cluster_frequencies function with updated parameters
         C_cluster_loop, unClustd_frequencies_loop, unClustd_damping_loop, unClustd_indices_loop = cluster_frequencies(
-            unClustd_frequencies, 
-            unClustd_damping,
-            unClustd_mode_shapes, 
+            frequencies, 
+            damping_ratios,
+            mode_shapes, 
             frequencies_max_MO, 
             cov_freq_max_MO, 
             damping_ratios_max_MO, 
             cov_damping_max_MO,
             mode_shapes_max_MO, 
             tMAC, 
-            bound_multiplier=bounds
+            bound_multiplier=bounds,
+            unclustered=unclustered
         )
         print("Initial clustering done.")
         
@@ -878,67 +807,38 @@ def mode_allingment(ssi_mode_track_res, mstab, tMAC):
             print("Unclustered indices size <= 2. Stopping ...")
             break
     
-    # Removing repeatation during merge
-    for cluster in C_expanded:
-        # Get the current values
-        f_values = cluster['f_values']
-        indices = cluster['indices']
-        z_values = cluster['z_values']  
-        # Find unique f_values and their indices
-        unique_f_values, unique_indices = np.unique(f_values, return_index=True)    
-        cluster['f_values'] = unique_f_values
-        cluster['indices'] = indices[unique_indices]
-        cluster['z_values'] = z_values[unique_indices]
-    
+    return _final_clusters(C_expanded, cov_freq, mode_shapes, mstab, bounds)
+
+
+def _final_clusters(C_expanded, cov_freq, mode_shapes, mstab, bounds):
+    """
+    The clusters of mode_allingment from the expanded clusters: without
+    repeated poles, with more than `mstab` poles, cleaned by median, without
+    repeated clusters, with their mode shapes and sorted by median.
+    """
+    # Clusters as flat arrays from here on, removing repeatation during merge
+    cluster_set = ClusterSet.from_clusters(C_expanded).unique_poles()
     
     # # Visualize the initial clusters
     # visualize_clusters(C_expanded, cov_freq, bounds)
     
-    # # import pprint
-    # for cluster in C_expanded:
-    #     print(f"ip_index: {cluster['ip_index']}, f_values length: {len(cluster['f_values'])}")
-    #     print(f"Cluster confidence interval: {cluster['confidence_interval'][0:2]}")
-    #     print(f"Cluster shape: {len(cluster['f_values'])}")
-    #     # pprint.pprint(cluster)
-    #     # print(f"ip_index: {cluster['ip_index']}")
-    #     # print(f"indices shape: {cluster['indices'].shape}")
-    #     # print(f"f_values shape: {len(cluster['f_values'])}")
-    
-    
     print('Cluster filter started')
     # Filter clusters with less than 'mstab' elements
-    C_expanded_filtered = [cluster for cluster in C_expanded if cluster['indices'].shape[0] > mstab]
-    # Sort clusters by the lower bound of their confidence_interval (the first value in the tuple)
-    C_expanded_filtered.sort(key=lambda cluster: cluster['confidence_interval'][0])
+    cluster_set = cluster_set.take(cluster_set.sizes > mstab)
+    # Sort clusters by the lower bound of their confidence_interval
+    cluster_set = cluster_set.take(np.argsort(cluster_set.confidence_interval[:, 0], kind='stable'))
     print('Cluster filter finished')
     
-    # # Visualize the cluster filter by element numbers
-    # visualize_clusters(C_expanded_filtered, cov_freq, bounds)
-    
     # Cluster cleaning based on median
-    cleaned_clusters = clean_clusters_by_median(C_expanded_filtered, cov_freq, bound_multiplier=bounds)
-    
-    # remove repeatative clusters
-    seen = set()
-    uq_clusters = []
-    for d in cleaned_clusters:
-        f_values_tuple = tuple(d['f_values'])
-        if f_values_tuple not in seen:
-            seen.add(f_values_tuple)
-            uq_clusters.append(d)
-            
-    for cluster in uq_clusters:
-        indices = cluster['indices']
-        mode_shapes_list = []
-
-        for idx in indices:
-            # Extract mode shapes using indices
-            mode_shape = mode_shapes[idx[0], idx[1], :]
-            mode_shapes_list.append(mode_shape)
-
-        # Add mode shapes to the dictionary
-        cluster['mode_shapes'] = np.array(mode_shapes_list)
-    
-    uq_clusters_sorted = sorted(uq_clusters, key=lambda cluster: cluster["median"])    
-    
-    return uq_clusters_sorted
+    medians = cluster_set.medians()
+    cleaned = cluster_set.clean_by_median(cov_freq, medians, bound_multiplier=bounds)
+    
+    # Keep clusters with more than one cleaned value, and remove repeatative clusters
+    kept = cleaned.sizes > 1
+    kept[kept] = cleaned.take(kept).first_of_duplicates()
+    
+    # Sort by median, with the mode shapes gathered for all clusters at once
+    kept = np.flatnonzero(kept)
+    kept = kept[np.argsort(medians[kept], kind='stable')]
+    return _cleaned_cluster_dicts(cleaned, medians, kept, bounds, cluster_set.to_dicts(),
+                                  mode_shapes=mode_shapes)
@@ -0,0 +1,327 @@
+"""
+Incremental mode tracking across consecutive OMA results.
+
+`mode_track.mode_allingment` clusters every OMA result from scratch. In
+continuous monitoring the modes barely move between windows, so
+`ModeTracker` keeps the modes found so far and, for each new result,
+first assigns the poles to them:
+
+    - a pole is a candidate of a tracked mode if its frequency and damping
+      lie within the confidence interval of the mode in the previous window,
+    - and it is assigned if its MAC with the representative mode shape of
+      the mode exceeds tMAC; a pole that qualifies for several modes goes to
+      the one with the highest MAC.
+
+The poles of each tracked mode are expanded with `clusterexpansion` over
+the unassigned poles, so a mode drifting towards the edge of its interval is
+not split, and the mode is confirmed if they form a cluster as in
+`mode_allingment`. Only the poles left over, including those of modes that
+are not confirmed, are clustered again with `cluster_frequencies` and
+`clusterexpansion`, but in at most two passes instead of the loop over all
+model orders of `mode_allingment`. The first pass is seeded with the
+leftover poles of the highest model order that has any. So that a mode
+drifting out of its interval is still found, the second pass is seeded with
+the pole still left that lies closest to the last frequency of each tracked
+mode not found yet and matches its shape. A new mode without a pole at the
+highest order is therefore not found until it has one. While no mode is
+tracked, as for the first result or after `reset`, the whole result is
+clustered with `mode_allingment`.
+
+A cluster of the leftovers continues the closest tracked mode not found yet
+if its median lies within the width of the interval of the mode from its
+last frequency and one of its poles matches the mode shape, and otherwise
+becomes a new tracked mode. Every mode keeps its `mode_id` for as long as
+it is tracked.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from methods.packages.mac import mac_matrix
+from methods.packages.mode_track import (
+    _final_clusters, _poles_in_bounds, _sorted_pole_index, _stack_mode_shapes,
+    clean_clusters_by_median, cluster_frequencies, clusterexpansion, mode_allingment)
+
+
+@dataclass
+class TrackedMode:
+    mode_id: int
+    frequency: float  # Median frequency in the last window the mode was found
+    bounds: Tuple[float, float, float, float]  # Frequency and damping interval (f_lo, f_hi, z_lo, z_hi)
+    mode_shape: np.ndarray  # Mode shape of the pole closest to the median frequency
+    missed: int = 0  # Consecutive windows in which the mode was not found
+
+
+class ModeTracker:
+    """
+    Tracks modes across consecutive OMA results, see the module docstring.
+
+    Parameters
+    ----------
+    mstab : float
+        A cluster needs more than `mstab` poles, as in `mode_allingment`.
+    tMAC : float
+        MAC threshold for a pole to belong to a mode.
+    bound_multiplier : float, optional
+        Standard deviations of the confidence intervals. The default is 2.
+    max_missed : int, optional
+        A mode is dropped after it is not found in more than `max_missed`
+        consecutive results. The default is 3.
+    """
+
+    def __init__(self, mstab: float, tMAC: float, bound_multiplier: float = 2, max_missed: int = 3):
+        self.mstab = mstab
+        self.tMAC = tMAC
+        self.bound_multiplier = bound_multiplier
+        self.max_missed = max_missed
+        self.modes: List[TrackedMode] = []
+        self._next_id = 0
+
+    def reset(self) -> None:
+        """Forgets all tracked modes; the next result is clustered from scratch."""
+        self.modes = []
+
+    def update(self, ssi_mode_track_res: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Tracks the modes of the next OMA result.
+
+        Parameters
+        ----------
+        ssi_mode_track_res : dict
+            OMA result, as for `mode_allingment`. It is not modified.
+
+        Returns
+        -------
+        list of dict
+            The clusters of the modes found, in the format of
+            `mode_allingment` with an additional "mode_id", sorted by median
+            frequency.
+        """
+        frequencies, damping_ratios, cov_freq, cov_damping, mode_shapes = _prepare_poles(ssi_mode_track_res)
+        assigned = np.zeros(frequencies.shape, dtype=bool)
+
+        clusters = []
+        found = set()
+        for mode, members in self._expand(list(self._assign(frequencies, damping_ratios, mode_shapes)),
+                                          frequencies, damping_ratios, cov_freq, cov_damping,
+                                          mode_shapes):
+            cluster = self._cluster(mode.mode_id, mode.bounds, members, frequencies,
+                                    damping_ratios, cov_freq, mode_shapes)
+            # The poles of a mode that is not confirmed are left for the leftover clustering
+            if cluster is not None:
+                assigned[tuple(members.T)] = True
+                self._follow(mode, cluster, cov_freq, cov_damping, mode_shapes)
+                clusters.append(cluster)
+                found.add(mode.mode_id)
+
+        for mode in self.modes:
+            mode.missed = 0 if mode.mode_id in found else mode.missed + 1
+        self.modes = [mode for mode in self.modes if mode.missed <= self.max_missed]
+
+        if self.modes:
+            leftovers = self._cluster_leftovers(frequencies, damping_ratios, cov_freq, cov_damping,
+                                                mode_shapes, assigned, found)
+        else:
+            leftovers = _cluster_from_scratch(ssi_mode_track_res, self.mstab, self.tMAC)
+        for cluster in leftovers:
+            mode = self._missed_mode(cluster, found)
+            if mode is None:
+                mode = TrackedMode(self._next_id, np.nan, (np.nan,) * 4, None)
+                self._next_id += 1
+                self.modes.append(mode)
+            mode.missed = 0
+            found.add(mode.mode_id)
+            cluster["mode_id"] = mode.mode_id
+            self._follow(mode, cluster, cov_freq, cov_damping, mode_shapes)
+            clusters.append(cluster)
+
+        return sorted(clusters, key=lambda cluster: cluster["median"])
+
+    def _assign(self, frequencies, damping_ratios, mode_shapes):
+        """Yields (mode, indices of its poles) for the tracked modes with candidates."""
+        if not self.modes:
+            return
+        pole_index = _sorted_pole_index(frequencies)
+        candidates = [_poles_in_bounds(pole_index, frequencies, damping_ratios, *mode.bounds)
+                      for mode in self.modes]
+        n_orders = frequencies.shape[1]
+        flat = [rows * n_orders + cols for rows, cols in (c.T for c in candidates)]
+        poles = np.unique(np.concatenate(flat))
+        if poles.size == 0:
+            return
+        indices = np.column_stack(np.divmod(poles, n_orders))
+
+        # One MAC matrix between all tracked modes and all candidates
+        mac_values = mac_matrix(np.stack([mode.mode_shape for mode in self.modes]),
+                                _stack_mode_shapes(mode_shapes, indices))
+        gated = np.zeros(mac_values.shape, dtype=bool)
+        for row, mode_flat in enumerate(flat):
+            gated[row, np.searchsorted(poles, mode_flat)] = True
+        score = np.where(gated & (mac_values > self.tMAC), mac_values, -np.inf)
+        best = np.argmax(score, axis=0)
+        assigned = np.isfinite(score[best, np.arange(poles.size)])
+
+        for row, mode in enumerate(self.modes):
+            members = indices[assigned & (best == row)]
+            if len(members) > 0:
+                yield mode, members
+
+    def _expand(self, assignments, frequencies, damping_ratios, cov_freq, cov_damping, mode_shapes):
+        """Adds to the poles of each tracked mode the unassigned poles `clusterexpansion` adds to
+        them, so a mode that drifts towards the edge of its interval is not split."""
+        if not assignments:
+            return []
+        unassigned = ~np.isnan(frequencies)
+        for _, members in assignments:
+            unassigned[tuple(members.T)] = False
+        C_clusters = [{"ip_index": mode.mode_id, "confidence_interval": mode.bounds,
+                       "indices": members, "f_values": frequencies[tuple(members.T)],
+                       "z_values": damping_ratios[tuple(members.T)]}
+                      for mode, members in assignments]
+        C_expanded, _, _, _ = clusterexpansion(
+            C_clusters, np.where(unassigned, frequencies, np.nan),
+            np.where(unassigned, damping_ratios, np.nan), cov_freq, cov_damping, mode_shapes,
+            np.argwhere(unassigned), self.tMAC, bound_multiplier=self.bound_multiplier)
+        return [(mode, np.asarray(cluster["indices"]))
+                for (mode, _), cluster in zip(assignments, C_expanded)]
+
+    def _missed_mode(self, cluster, found):
+        """The tracked mode not found yet whose shape matches one of the poles of the cluster
+        and which lies closest to its median, within the width of its interval."""
+        closest, distance = None, np.inf
+        for mode in self.modes:
+            if mode.mode_id in found:
+                continue
+            offset = abs(cluster["median"] - mode.frequency)
+            if offset > mode.bounds[1] - mode.bounds[0] or offset >= distance:
+                continue
+            if np.max(mac_matrix(mode.mode_shape, cluster["mode_shapes"])) > self.tMAC:
+                closest, distance = mode, offset
+        return closest
+
+    def _cluster(self, mode_id, bounds, members, frequencies, damping_ratios, cov_freq, mode_shapes):
+        """The cleaned cluster of the poles of a tracked mode, or None if it is not stable."""
+        # The expansion may add a pole once for each member it matches
+        members = np.unique(members, axis=0)
+        f_values = frequencies[tuple(members.T)]
+        _, unique_indices = np.unique(f_values, return_index=True)
+        if len(unique_indices) <= self.mstab:
+            return None
+        cluster = {
+            "ip_index": mode_id,
+            "confidence_interval": bounds,
+            "indices": members[unique_indices],
+            "f_values": f_values[unique_indices],
+            "z_values": damping_ratios[tuple(members.T)][unique_indices],
+        }
+        cleaned = clean_clusters_by_median([cluster], cov_freq, bound_multiplier=self.bound_multiplier)
+        if not cleaned:
+            return None
+        cleaned = cleaned[0]
+        cleaned["mode_shapes"] = _stack_mode_shapes(mode_shapes, cleaned["indices"])
+        cleaned["mode_id"] = mode_id
+        return cleaned
+
+    def _follow(self, mode, cluster, cov_freq, cov_damping, mode_shapes):
+        """Moves a tracked mode to its cluster in the current result."""
+        indices = tuple(np.asarray(cluster["indices"]).T)
+        f_sigma = self.bound_multiplier * np.sqrt(cov_freq[indices])
+        z_sigma = self.bound_multiplier * np.sqrt(cov_damping[indices])
+        bounds = (np.nanmin(cluster["f_values"] - f_sigma), np.nanmax(cluster["f_values"] + f_sigma),
+                  np.nanmin(cluster["z_values"] - z_sigma), np.nanmax(cluster["z_values"] + z_sigma))
+        if not np.isnan(bounds).any():
+            mode.bounds = tuple(float(bound) for bound in bounds)
+        mode.frequency = float(cluster["median"])
+        closest = np.argmin(np.abs(cluster["f_values"] - cluster["median"]))
+        row, order = np.asarray(cluster["indices"])[closest]
+        mode.mode_shape = mode_shapes[row, order, :]
+
+    def _cluster_leftovers(self, frequencies, damping_ratios, cov_freq, cov_damping, mode_shapes,
+                           assigned, found) -> List[Dict[str, Any]]:
+        """
+        Clusters the poles that are not assigned to a tracked mode with at most
+        two passes of `cluster_frequencies` and `clusterexpansion`, instead of
+        the loop over all model orders of `mode_allingment`. The first pass is
+        seeded with the leftover poles of the highest model order that has
+        any, the second one, on the poles still left, with the pole closest
+        to the last frequency of each tracked mode not found yet that matches
+        its shape.
+        """
+        leftover = ~assigned & ~np.isnan(frequencies) & ~np.isnan(cov_freq) & ~np.isnan(cov_damping)
+        orders = np.flatnonzero(leftover.any(axis=0))
+        if orders.size == 0:
+            return []
+        seeds = np.zeros(frequencies.shape, dtype=bool)
+        seeds[:, orders[-1]] = leftover[:, orders[-1]]
+        grids = (frequencies, damping_ratios, cov_freq, cov_damping, mode_shapes)
+        C_expanded = self._expand_seeds(seeds, leftover, *grids)
+
+        for cluster in C_expanded:
+            leftover[tuple(np.asarray(cluster["indices"]).T)] = False
+        seeds = self._missed_mode_seeds(leftover, frequencies, mode_shapes, found)
+        if seeds.any():
+            # Numbered after the clusters of the first pass, as in the loop of mode_allingment
+            for ip_index, cluster in enumerate(self._expand_seeds(seeds, leftover, *grids),
+                                               start=len(C_expanded)):
+                cluster["ip_index"] = ip_index
+                C_expanded.append(cluster)
+        return _final_clusters(C_expanded, cov_freq, mode_shapes, self.mstab, self.bound_multiplier)
+
+    def _expand_seeds(self, seeds, unclustered, frequencies, damping_ratios, cov_freq, cov_damping,
+                      mode_shapes):
+        """The expanded clusters of the `unclustered` poles around the poles in `seeds`."""
+        C_clusters, unClustd_frequencies, unClustd_damping, unClustd_indices = cluster_frequencies(
+            frequencies, damping_ratios, mode_shapes, frequencies[seeds], cov_freq[seeds],
+            damping_ratios[seeds], cov_damping[seeds], mode_shapes[seeds], self.tMAC,
+            bound_multiplier=self.bound_multiplier, unclustered=unclustered)
+        C_expanded, _, _, _ = clusterexpansion(
+            C_clusters, unClustd_frequencies, unClustd_damping, cov_freq, cov_damping,
+            mode_shapes, unClustd_indices, self.tMAC, bound_multiplier=self.bound_multiplier)
+        return C_expanded
+
+    def _missed_mode_seeds(self, leftover, frequencies, mode_shapes, found):
+        """Mask of the leftover pole closest to the last frequency of each tracked mode not found
+        yet that matches its shape, within the width of its interval."""
+        seeds = np.zeros(frequencies.shape, dtype=bool)
+        missed = [mode for mode in self.modes if mode.mode_id not in found]
+        indices = np.argwhere(leftover)
+        if not missed or indices.size == 0:
+            return seeds
+        mac_values = mac_matrix(np.stack([mode.mode_shape for mode in missed]),
+                                _stack_mode_shapes(mode_shapes, indices))
+        leftover_frequencies = frequencies[tuple(indices.T)]
+        for mode, mode_mac in zip(missed, mac_values):
+            offset = np.abs(leftover_frequencies - mode.frequency)
+            matches = np.flatnonzero((mode_mac > self.tMAC)
+                                     & (offset <= mode.bounds[1] - mode.bounds[0]))
+            if matches.size == 0:
+                continue
+            # Closest to the frequency of the mode first, then the highest model order
+            best = matches[np.lexsort((-indices[matches, 1], offset[matches]))[0]]
+            seeds[tuple(indices[best])] = True
+        return seeds
+
+def _cluster_from_scratch(ssi_mode_track_res, mstab, tMAC) -> List[Dict[str, Any]]:
+    """mode_allingment on a copy of the result, which it modifies."""
+    if np.isnan(ssi_mode_track_res['Fn_poles'][:, -1]).all():
+        return []  # No seeds at the maximum model order
+    result = dict(ssi_mode_track_res)
+    for key in ('Fn_poles', 'Xi_poles', 'Fn_poles_cov', 'Xi_poles_cov'):
+        result[key] = np.array(ssi_mode_track_res[key])
+    return mode_allingment(result, mstab, tMAC)
+
+
+def _prepare_poles(ssi_mode_track_res: Dict[str, Any]) -> Tuple[np.ndarray, ...]:
+    """
+    The pole grids as mode_allingment clusters them, without modifying the
+    result: one pole of each complex conjugate pair, and NaN for poles with a
+    large coefficient of variation of both frequency and damping.
+    """
+    frequencies = np.asarray(ssi_mode_track_res['Fn_poles'])[::2]
+    damping_ratios = np.asarray(ssi_mode_track_res['Xi_poles'])[::2]
+    cov_freq = np.asarray(ssi_mode_track_res['Fn_poles_cov'])[::2]
+    cov_damping = np.asarray(ssi_mode_track_res['Xi_poles_cov'])[::2]
+    mode_shapes = np.asarray(ssi_mode_track_res['Phi_poles'])[::2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rejected = (np.sqrt(cov_freq) / frequencies > 0.05) & (np.sqrt(cov_damping) / damping_ratios > 0.5)
+    return (np.where(rejected, np.nan, frequencies), np.where(rejected, np.nan, damping_ratios),
+            np.where(rejected, np.nan, cov_freq), np.where(rejected, np.nan, cov_damping), mode_shapes)
@@ -3,6 +3,8 @@ import typing
 
 import numpy as np
 
+from methods.packages.mac import mac_matrix, mac_pairs
+
 logger = logging.getLogger(__name__)
 
 
@@ -113,23 +115,12 @@ def MAC(phi_X: np.ndarray, phi_A: np.ndarray) -> np.ndarray:
             f"phi_A: {phi_A.shape[0]})"
         )
 
-    # mine
-    # MAC = np.abs(np.dot(phi_X.conj().T, phi_A)) ** 2 / (
-    #     (np.dot(phi_X.conj().T, phi_X)) * (np.dot(phi_A.conj().T, phi_A))
-    # )
-    # original
-    MAC = np.abs(np.conj(phi_X).T @ phi_A) ** 2
-    MAC = MAC.astype(complex)
-    for i in range(phi_X.shape[1]):
-        for j in range(phi_A.shape[1]):
-            MAC[i, j] = MAC[i, j] / (
-                np.conj(phi_X[:, i]) @ phi_X[:, i] * np.conj(phi_A[:, j]) @ phi_A[:, j]
-            )
+    MAC = mac_matrix(phi_X.T, phi_A.T)
 
     if MAC.shape == (1, 1):
         MAC = MAC[0, 0]
 
-    return MAC.real
+    return MAC
 
 
 # -----------------------------------------------------------------------------
@@ -197,33 +188,33 @@ def SC_apply(Fn, Xi, Phi, ordmin, ordmax, step, err_fn, err_xi, err_phi) -> np.n
 
     # SOFT CONDITIONS
     # STABILITY BETWEEN CONSECUTIVE ORDERS
-    for oo in range(ordmin, ordmax + 1, step):
-        o = int(oo / step)
-
-        f_n = Fn[:, o].reshape(-1, 1)
-        xi_n = Xi[:, o].reshape(-1, 1)
-        phi_n = Phi[:, o, :]
-
-        f_n1 = Fn[:, o - 1].reshape(-1, 1)
-        xi_n1 = Xi[:, o - 1].reshape(-1, 1)
-        phi_n1 = Phi[:, o - 1, :]
-
-        # Skip the first order as it has no previous order to compare with
-        if o == 0:
-            continue
-
-        for i in range(len(f_n)):
-            try:
-                idx = np.nanargmin(np.abs(f_n1 - f_n[i]))
-
-                cond1 = np.abs(f_n[i] - f_n1[idx]) / f_n[i]
-                cond2 = np.abs(xi_n[i] - xi_n1[idx]) / xi_n[i]
-                cond3 = 1 - MAC(phi_n[i, :], phi_n1[idx, :])
-                if cond1 < err_fn and cond2 < err_xi and cond3 < err_phi:
-                    Lab[i, o] = 1  # Stable
-                else:
-                    Lab[i, o] = 0  # Nuovo polo o polo instabile
-            except Exception as e:
-                # If f_n[i] is nan, do nothin, n.b. the lab stays 0
-                logger.debug(e)
+    # All orders are compared at once. Order 0 is skipped as it has no
+    # previous order to compare with
+    orders = np.array([int(oo / step) for oo in range(ordmin, ordmax + 1, step)], dtype=int)
+    orders = orders[orders != 0]
+    if orders.size == 0:
+        return Lab
+
+    f_n, f_n1 = Fn[:, orders], Fn[:, orders - 1]  # (n_poles, n_orders)
+    xi_n, xi_n1 = Xi[:, orders], Xi[:, orders - 1]
+    phi_n = Phi[:, orders, :]  # (n_poles, n_orders, n_locations)
+
+    # Nearest pole of the previous order for every pole, shape (n_poles, n_orders).
+    # Matches np.nanargmin: NaN distances are skipped and ties pick the first pole.
+    dist = np.abs(f_n1[np.newaxis, :, :] - f_n[:, np.newaxis, :])
+    nan_dist = np.isnan(dist)
+    # Poles where nanargmin raises (all distances NaN) stay unstable
+    matched = ~nan_dist.all(axis=1)
+    idx = np.where(nan_dist, np.inf, dist).argmin(axis=1)
+
+    f_m = np.take_along_axis(f_n1, idx, axis=0)
+    xi_m = np.take_along_axis(xi_n1, idx, axis=0)
+    phi_m = Phi[idx, orders - 1, :]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cond1 = np.abs(f_n - f_m) / f_n
+        cond2 = np.abs(xi_n - xi_m) / xi_n
+        cond3 = 1 - mac_pairs(phi_n, phi_m)
+        stable = matched & (cond1 < err_fn) & (cond2 < err_xi) & (cond3 < err_phi)
+    Lab[:, orders] = stable
     return Lab
@@ -1,5 +1,11 @@
+import atexit
 import typing
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.sparse.linalg import svds
 
 from pyoma2.algorithms.data.result import SSIResult
 from pyoma2.algorithms.data.run_params import SSIRunParams
@@ -8,7 +14,474 @@ from pyoma2.functions import plot, ssi
 from pyoma2.support.sel_from_plot import SelFromPlot
 from methods.packages.pyoma import genWrapper as gen
 
-class SSIdat(BaseAlgorithm[SSIRunParams, SSIResult, typing.Iterable[float]]):
+UNCERTAINTY_TIERS = ("none", "full")
+
+# Uncertainty tier that fills each covariance of `SSIResult`. The frequency
+# and damping covariances cannot be had for less than 'full': `ssi.SSI_fast`
+# derives Q1-Q3 and the mode shape term Q4 from the same per-order matrices,
+# and `ssi.SSI_poles` never uses Q4 and returns `Phi_poles_cov` filled with NaN.
+_COV_TIER = {"Fn_poles_cov": "full", "Xi_poles_cov": "full", "Phi_poles_cov": "full"}
+
+# Below this maximum model order `SSI_poles_parallel` extracts the poles in
+# this process: the per-order eigendecompositions are cheaper than sending
+# the matrices to the worker processes, see benchmarks/ssi_poles.py.
+PARALLEL_POLES_MIN_ORDER = 40
+
+# pyOMA-2 release, pinned in pyproject.toml, whose `ssi.SSI_poles` loop is
+# mirrored by `_order_poles`. Re-check the copy when upgrading.
+SSI_POLES_PYOMA_VERSION = "1.0.0"
+
+
+class SSIWrapperRunParams(SSIRunParams):
+    """
+    Run parameters of the SSI wrapper: the pyoma2 `SSIRunParams`, plus the
+    options of this wrapper.
+
+    Attributes
+    ----------
+    pole_workers : int, optional
+        Number of worker processes that extract the poles, each taking a
+        share of the model orders. Default is 1 (serial, `ssi.SSI_poles`).
+        It only pays off with the uncertainty, from a maximum model order
+        of about 40, and on a machine with that many idle cores. On the
+        4-DOF record the serial extraction with uncertainty takes about
+        80 ms at order 20, where 2 workers were measured at 0.65x, but
+        1.3 s at 40 and 10 s at 60. Without uncertainty it stays below
+        0.5 s up to order 120. Below `PARALLEL_POLES_MIN_ORDER` the poles
+        are always extracted in-process.
+    svd : {'full', 'truncated', 'randomized'}, optional
+        Decomposition of the Hankel matrix, see `hankel_svd`. Only used
+        without uncertainty; otherwise the exact `ssi.SSI_fast` runs.
+        Default is 'full'.
+    unc : {'none', 'full'}, optional
+        Uncertainty tier, overrides `calc_unc` if set. 'none' skips the
+        uncertainty, which also allows the `svd` options; 'full' computes
+        the uncertainty with `ssi.SSI_fast` and propagates it to the poles.
+        The frequency and damping covariances cost the same as 'full', see
+        `cheapest_uncertainty`. Default is None ('full' if `calc_unc`,
+        else 'none').
+    svd_oversamples : int, optional
+        Extra random directions of the randomized SVD. Default is 10.
+    svd_power_iters : int, optional
+        Power iterations of the randomized SVD. Default is 2.
+    """
+
+    pole_workers: int = 1
+    svd: typing.Literal["full", "truncated", "randomized"] = "full"
+    svd_oversamples: int = 10
+    svd_power_iters: int = 2
+    unc: typing.Optional[typing.Literal["none", "full"]] = None
+
+
+def uncertainty_tier(run_params: SSIRunParams) -> str:
+    """
+    Uncertainty tier of the run parameters, see `SSIWrapperRunParams.unc`.
+    """
+    unc = getattr(run_params, "unc", None)
+    if unc is not None:
+        return unc
+    return "full" if run_params.calc_unc else "none"
+
+
+def cheapest_uncertainty(covariances: typing.Iterable[str]) -> str:
+    """
+    Cheapest uncertainty tier that computes the given covariances.
+
+    Only an empty selection saves work: any covariance needs 'full', since
+    pyOMA-2 computes the frequency and damping covariances from the same
+    per-order uncertainty matrices as the mode shape term, and leaves
+    `Phi_poles_cov` as NaN. On the 4-DOF record `sysid` with 'none' takes
+    about a fifth of the time of 'full' at model order 20 and a twenty-fifth
+    at 40, with the same peak memory, see benchmarks/ssi_uncertainty.py.
+
+    Parameters
+    ----------
+    covariances : iterable of str
+        Covariance fields of `SSIResult` that are used, e.g. 'Fn_poles_cov'.
+
+    Returns
+    -------
+    str
+        One of `UNCERTAINTY_TIERS`.
+
+    Raises
+    ------
+    ValueError
+        If a field is not a covariance of `SSIResult`.
+    """
+    tier = 0
+    for cov in covariances:
+        if cov not in _COV_TIER:
+            raise ValueError(f"Unknown covariance: {cov}")
+        tier = max(tier, UNCERTAINTY_TIERS.index(_COV_TIER[cov]))
+    return UNCERTAINTY_TIERS[tier]
+
+
+def ssi_from_hankel(
+    H: np.ndarray,
+    T: typing.Optional[np.ndarray],
+    run_params: SSIRunParams,
+    dt: float,
+) -> SSIResult:
+    """
+    Identifies the poles from a block Hankel matrix and applies the hard and
+    soft criteria, as in `SSIdat.run`.
+
+    Parameters
+    ----------
+    H : np.ndarray
+        Block Hankel matrix, shape: ((br + 1) * n_channels, (br + 1) * n_ref_channels).
+    T : np.ndarray or None
+        Square root of the Hankel covariance, one column per data segment.
+        Required unless the uncertainty tier is 'none'.
+    run_params : SSIRunParams
+        Run parameters of the algorithm, see also `SSIWrapperRunParams`.
+    dt : float
+        Sampling period of the data.
+
+    Returns
+    -------
+    SSIResult
+        An object containing the computed matrices and modal parameters.
+    """
+    br = run_params.br
+    ordmin = run_params.ordmin
+    ordmax = run_params.ordmax
+    step = run_params.step
+    sc = run_params.sc
+    calc_unc = uncertainty_tier(run_params) != "none"
+    nb = T.shape[1] if T is not None else run_params.nb
+
+    # Get state matrix and output matrix
+    svd = getattr(run_params, "svd", "full")
+    if svd == "full" or calc_unc:
+        Obs, A, C, Q1, Q2, Q3, Q4 = ssi.SSI_fast(
+            H, br, ordmax, step=step, calc_unc=calc_unc, T=T, nb=nb
+        )
+    else:
+        Obs, A, C = SSI_truncated(
+            H, br, ordmax, step=step, method=svd,
+            oversamples=run_params.svd_oversamples, power_iters=run_params.svd_power_iters
+        )
+        Q1 = Q2 = Q3 = Q4 = None
+
+    # Get frequency poles (and damping and mode shapes)
+    pole_workers = getattr(run_params, "pole_workers", 1)
+    if pole_workers > 1:
+        SSI_poles = SSI_poles_parallel(pole_workers)
+    else:
+        SSI_poles = ssi.SSI_poles
+    Fns, Xis, Phis, Lambds, Fn_cov, Xi_cov, Phi_cov = SSI_poles(
+        Obs,
+        A,
+        C,
+        ordmax,
+        dt,
+        step=step,
+        calc_unc=calc_unc,
+        Q1=Q1,
+        Q2=Q2,
+        Q3=Q3,
+        Q4=Q4,
+    )
+
+    # Criteria regarding eigenvalue stability
+    # HC - remove eigevalues with positive real part
+    Lambds, mask6 = gen.HC_realEigen(Lambds)
+    lista = [Fns, Xis, Phis, Fn_cov, Xi_cov, Phi_cov]
+    Fns, Xis, Phis, Fn_cov, Xi_cov, Phi_cov = gen.applymask(
+        lista, mask6, Phis.shape[2]
+        )
+
+    # Criteria regarding zero imaginary part in eigenvalues
+    # HC - remove eigenvalues with zero imaginary part of eigenvalues
+    Lambds, mask7 = gen.HC_removeZeroImg(Lambds)
+    lista = [Fns, Xis, Phis, Fn_cov, Xi_cov, Phi_cov]
+    Fns, Xis, Phis, Fn_cov, Xi_cov, Phi_cov = gen.applymask(
+        lista, mask7, Phis.shape[2]
+        )
+
+    # Get the labels of the poles
+    Lab = gen.SC_apply(
+        Fns,
+        Xis,
+        Phis,
+        ordmin,
+        ordmax,
+        step,
+        sc["err_fn"],
+        sc["err_xi"],
+        sc["err_phi"],
+    )
+
+    return SSIResult(
+        Obs=Obs,
+        A=A,
+        C=C,
+        H=H,
+        Lambds=Lambds,
+        Fn_poles=Fns,
+        Xi_poles=Xis,
+        Phi_poles=Phis,
+        Lab=Lab,
+        Fn_poles_cov=Fn_cov,
+        Xi_poles_cov=Xi_cov,
+        Phi_poles_cov=Phi_cov,
+    )
+
+
+def hankel_svd(
+    H: np.ndarray,
+    rank: int,
+    method: str = "full",
+    oversamples: int = 10,
+    power_iters: int = 2,
+    seed: typing.Optional[int] = 0,
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Leading `rank` singular triplets of the Hankel matrix.
+
+    Parameters
+    ----------
+    H : np.ndarray
+        Block Hankel matrix.
+    rank : int
+        Number of singular values to keep, typically `ordmax`.
+    method : {'full', 'truncated', 'randomized'}, optional
+        'full' truncates `np.linalg.svd`. 'truncated' computes only the
+        leading triplets with ARPACK (`scipy.sparse.linalg.svds`).
+        'randomized' projects H on `rank + oversamples` random directions,
+        sharpened by `power_iters` power iterations, and decomposes the
+        small projected matrix (Halko et al., 2011). Default is 'full'.
+    oversamples : int, optional
+        Extra random directions of the randomized SVD. Default is 10.
+    power_iters : int, optional
+        Power iterations of the randomized SVD. Default is 2.
+    seed : int or None, optional
+        Seed of the random directions. Default is 0.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        U (rows of H, rank), singular values (rank,) in descending order and
+        Vt (rank, columns of H).
+
+    Raises
+    ------
+    ValueError
+        If the method is unknown.
+    """
+    if method == "full" or rank >= min(H.shape) - 1:
+        U, S, Vt = np.linalg.svd(H, full_matrices=False)
+        return U[:, :rank], S[:rank], Vt[:rank]
+    if method == "truncated":
+        U, S, Vt = svds(H, k=rank)
+        order = np.argsort(S)[::-1]
+        return U[:, order], S[order], Vt[order]
+    if method == "randomized":
+        rng = np.random.default_rng(seed)
+        n_dirs = min(rank + oversamples, min(H.shape))
+        Q, _ = np.linalg.qr(H @ rng.standard_normal((H.shape[1], n_dirs)))
+        for _ in range(power_iters):
+            # Re-orthonormalise between products to keep the small singular values
+            Q, _ = np.linalg.qr(H.T @ Q)
+            Q, _ = np.linalg.qr(H @ Q)
+        Ub, S, Vt = np.linalg.svd(Q.T @ H, full_matrices=False)
+        return (Q @ Ub)[:, :rank], S[:rank], Vt[:rank]
+    raise ValueError(f"Unknown SVD method: {method}")
+
+
+def SSI_truncated(
+    H: np.ndarray,
+    br: int,
+    ordmax: int,
+    step: int = 1,
+    method: str = "truncated",
+    oversamples: int = 10,
+    power_iters: int = 2,
+) -> typing.Tuple[np.ndarray, typing.List[np.ndarray], typing.List[np.ndarray]]:
+    """
+    State and output matrices for the orders up to `ordmax`, as
+    `ssi.SSI_fast` without uncertainty, from the leading `ordmax` singular
+    triplets of H only (see `hankel_svd`).
+
+    Returns
+    -------
+    tuple
+        Observability matrix, and the lists of state matrices A and output
+        matrices C of the orders 0, step, ..., ordmax, indexed like the
+        lists of `ssi.SSI_fast`.
+    """
+    Nch = H.shape[0] // (br + 1)
+    U, S, _ = hankel_svd(H, ordmax, method, oversamples, power_iters)
+    Obs = U * np.sqrt(S)
+    O_p = Obs[: Obs.shape[0] - Nch, :]
+    O_m = Obs[Nch:, :]
+    A = []
+    C = []
+    for ii in range(0, ordmax + 1, step):
+        A.append(np.linalg.pinv(O_p[:, :ii]) @ O_m[:, :ii])
+        C.append(Obs[:Nch, :ii])
+    return Obs, A, C
+
+
+def SSI_poles_parallel(workers: int, min_order: int = PARALLEL_POLES_MIN_ORDER
+                       ) -> typing.Callable[..., typing.Tuple]:
+    """
+    Returns a drop-in replacement of `ssi.SSI_poles` that splits the model
+    orders across `workers` processes, or runs them in this process if
+    `workers` is 1 or the maximum model order is below `min_order`. The
+    uncertainty is propagated to the frequencies and damping ratios only;
+    the mode shape covariance is left NaN, as in `ssi.SSI_poles`.
+
+    The poles of each order only depend on the state-space matrices of that
+    order, so the orders are dealt out round-robin, which balances the cost
+    growing with the order, and the results are merged into the arrays
+    `ssi.SSI_poles` returns. The worker pool is started on first use and
+    reused by later calls until `shutdown_pole_pools`, which also runs at
+    interpreter exit.
+    """
+    def SSI_poles(Obs, AA, CC, ordmax, dt, step=1, calc_unc=False,
+                  Q1=None, Q2=None, Q3=None, Q4=None):  # pylint: disable=unused-argument
+        n_orders = int(ordmax / step + 1)
+        Nch = CC[0].shape[0]
+        Lambdas = np.full((ordmax, n_orders), np.nan, dtype=complex)
+        Fn = np.full((ordmax, n_orders), np.nan)
+        Xi = np.full((ordmax, n_orders), np.nan)
+        Phi = np.full((ordmax, n_orders, Nch), np.nan, dtype=complex)
+        Fn_cov = np.full((ordmax, n_orders), np.nan) if calc_unc else None
+        Xi_cov = np.full((ordmax, n_orders), np.nan) if calc_unc else None
+        Phi_cov = np.full((ordmax, n_orders, Nch), np.nan) if calc_unc else None
+
+        orders = list(range(1, ordmax + 1, step))
+        shares = [orders[k::workers] for k in range(workers) if orders[k::workers]]
+        if workers <= 1 or ordmax < min_order:
+            results = [_poles_for_orders(Obs, [AA[ii] for ii in orders], [CC[ii] for ii in orders],
+                                         orders, ordmax, dt, calc_unc, Q1, Q2, Q3)]
+        else:
+            futures = [
+                _pole_pool(workers).submit(
+                    _poles_for_orders, Obs, [AA[ii] for ii in share], [CC[ii] for ii in share],
+                    share, ordmax, dt, calc_unc, Q1, Q2, Q3)
+                for share in shares
+            ]
+            results = [future.result() for future in futures]
+        for result in results:
+            for ii, fn, xi, phi, lam_c, fn_cov, xi_cov in result:
+                Fn[: len(fn), ii] = fn
+                Xi[: len(fn), ii] = xi
+                Phi[: len(fn), ii, :] = phi
+                Lambdas[: len(fn), ii] = lam_c
+                if calc_unc:
+                    Fn_cov[: len(fn), ii] = fn_cov
+                    Xi_cov[: len(fn), ii] = xi_cov
+        return Fn, Xi, Phi, Lambdas, Fn_cov, Xi_cov, Phi_cov
+
+    return SSI_poles
+
+
+_POLE_POOLS: typing.Dict[int, ProcessPoolExecutor] = {}
+
+
+def shutdown_pole_pools() -> None:
+    """Shuts down the worker pools of `SSI_poles_parallel`; later calls start new ones."""
+    while _POLE_POOLS:
+        _, pool = _POLE_POOLS.popitem()
+        pool.shutdown()
+
+
+atexit.register(shutdown_pole_pools)
+
+
+def _pole_pool(workers: int) -> ProcessPoolExecutor:
+    if workers not in _POLE_POOLS:
+        # Forking a process that runs network threads is unsafe
+        _POLE_POOLS[workers] = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _POLE_POOLS[workers]
+
+
+def _poles_for_orders(Obs, AA, CC, orders, ordmax, dt, calc_unc, Q1, Q2, Q3):
+    """Poles of the given orders, as computed by one iteration of `ssi.SSI_poles`."""
+    return [_order_poles(Obs, A, C, ii, ordmax, dt, calc_unc, Q1, Q2, Q3)
+            for ii, A, C in zip(orders, AA, CC)]
+
+
+def _order_poles(Obs, A, C, ii, ordmax, dt, calc_unc, Q1, Q2, Q3):
+    """
+    One iteration of the order loop of `ssi.SSI_poles` of pyOMA-2
+    `SSI_POLES_PYOMA_VERSION`, without the unused `Q4_n` and the
+    commented-out mode shape covariance. `ssi.SSI_poles` cannot be called
+    here since it always loops over every order up to `ordmax`.
+    """
+    if not calc_unc:
+        fn, xi, phi, lam_c, _, _, _ = ssi.ac2mp(A, C, dt, calc_unc=False)
+        return ii, fn, xi, phi, lam_c, None, None
+
+    fn, xi, phi, lam_c, lam_d, l_eigvt, r_eigvt = ssi.ac2mp(A, C, dt, calc_unc=True)
+    Nch = C.shape[0]
+    Obs_n = Obs[:, :ii]
+    O_p = Obs_n[: Obs_n.shape[0] - Nch, :]
+    OO = np.linalg.inv(np.dot(O_p.T, O_p))
+
+    # Permutation matrix eq. 15
+    Pnn = np.zeros((ii**2, ii**2))
+    for _kk in range(1, ii + 1):
+        ek = np.zeros((ii, 1))
+        ek[_kk - 1] = 1
+        Pnn[:, (_kk - 1) * ii : _kk * ii] = np.kron(np.eye(ii), ek)
+
+    # Selection matrix S4n
+    S4_n = np.kron(
+        np.hstack([np.eye(ii), np.zeros((ii, ordmax - ii))]),
+        np.hstack([np.eye(ii), np.zeros((ii, ordmax - ii))]),
+    )
+    # Eq. 49
+    Q1_n = np.dot(S4_n, Q1)
+    Q2_n = np.dot(S4_n, Q2)
+    Q3_n = np.dot(S4_n, Q3)
+    PnQ1 = np.dot((Pnn + np.eye(ii**2)), Q1_n)
+    PnQ2_Q3 = np.dot(Pnn, Q2_n) + Q3_n
+
+    fn_cov = np.full(len(lam_c), np.nan)
+    xi_cov = np.full(len(lam_c), np.nan)
+    for jj in range(len(lam_c)):
+        # Eq. 44
+        Qi = np.dot(np.kron(r_eigvt[:, jj], np.eye(ii)), (-lam_d[jj] * PnQ1 + PnQ2_Q3))
+        # Lemma 5
+        Mat1 = np.array([[1 / (2 * np.pi), 0], [0, 100 / (np.abs(lam_c[jj]) ** 2)]])
+        Mat2 = np.array(
+            [
+                [np.real(lam_c[jj]), np.imag(lam_c[jj])],
+                [-(np.imag(lam_c[jj]) ** 2), np.real(lam_c[jj]) * np.imag(lam_c[jj])],
+            ]
+        )
+        Mat3 = np.array(
+            [
+                [np.real(lam_d[jj]), np.imag(lam_d[jj])],
+                [-np.imag(lam_d[jj]), np.real(lam_d[jj])],
+            ]
+        )
+        Jfx_l = (
+            1
+            / (dt * np.abs(lam_d[jj]) ** 2 * np.abs(lam_c[jj]))
+            * (np.dot(np.dot(Mat1, Mat2), Mat3))
+        )
+        # Eq. 43
+        JaohT = (
+            1
+            / (np.dot(np.conj(l_eigvt[:, jj]), r_eigvt[:, jj]))
+            * np.dot(np.dot(np.conj(l_eigvt[:, jj]), OO), Qi)
+        )
+        # Eq. 42
+        Ufx = np.dot(Jfx_l, np.vstack([np.real(JaohT), np.imag(JaohT)]))
+        cov_fx = np.dot(Ufx, Ufx.T)  # Eq. 40
+        fn_cov[jj] = abs(cov_fx[0, 0])
+        xi_cov[jj] = abs(cov_fx[1, 0])
+    return ii, fn, xi, phi, lam_c, fn_cov, xi_cov
+
+
+class SSIdat(BaseAlgorithm[SSIWrapperRunParams, SSIResult, typing.Iterable[float]]):
     """
     Data-Driven Stochastic Subspace Identification (SSI) algorithm for single setup
     analysis.
@@ -18,7 +491,7 @@ class SSIdat(BaseAlgorithm[SSIRunParams, SSIResult, typing.Iterable[float]]):
 
     Attributes
     ----------
-    RunParamCls : Type[SSIRunParams]
+    RunParamCls : Type[SSIWrapperRunParams]
         The class of parameters specific to this algorithm's run.
     ResultCls : Type[SSIResult]
         The class of results produced by this algorithm.
@@ -26,7 +499,7 @@ class SSIdat(BaseAlgorithm[SSIRunParams, SSIResult, typing.Iterable[float]]):
         The method used in this SSI algorithm, set to 'dat' by default.
     """
 
-    RunParamCls = SSIRunParams
+    RunParamCls = SSIWrapperRunParams
     ResultCls = SSIResult
     method: typing.Literal["dat"] = "dat"
 
@@ -45,13 +518,6 @@ class SSIdat(BaseAlgorithm[SSIRunParams, SSIResult, typing.Iterable[float]]):
         Y = self.data.T
         br = self.run_params.br
         method_hank = self.run_params.method or self.method
-        ordmin = self.run_params.ordmin
-        ordmax = self.run_params.ordmax
-        step = self.run_params.step
-        sc = self.run_params.sc
-        hc = self.run_params.hc
-        calc_unc = self.run_params.calc_unc
-        nb = self.run_params.nb
 
         if self.run_params.ref_ind is not None:
             ref_ind = self.run_params.ref_ind
@@ -61,80 +527,10 @@ class SSIdat(BaseAlgorithm[SSIRunParams, SSIResult, typing.Iterable[float]]):
 
         # Build Hankel matrix
         H, T = ssi.build_hank(
-            Y=Y, Yref=Yref, br=br, method=method_hank, calc_unc=calc_unc, nb=nb
-        )
-        # Get state matrix and output matrix
-        Obs, A, C, Q1, Q2, Q3, Q4 = ssi.SSI_fast(
-            H, br, ordmax, step=step, calc_unc=calc_unc, T=T, nb=nb
-        )
-
-        # Get frequency poles (and damping and mode shapes)
-        Fns, Xis, Phis, Lambds, Fn_cov, Xi_cov, Phi_cov = ssi.SSI_poles(
-            Obs,
-            A,
-            C,
-            ordmax,
-            self.dt,
-            step=step,
-            calc_unc=calc_unc,
-            Q1=Q1,
-            Q2=Q2,
-            Q3=Q3,
-            Q4=Q4,
-        )
-
-        hc_conj = hc["conj"]
-        hc_xi_max = hc["xi_max"]
-        # print(f'highest limit for damping: {hc_xi_max}')
-        hc_mpc_lim = hc["mpc_lim"]
-        hc_mpd_lim = hc["mpd_lim"]
-        hc_cov_max = hc["cov_max"]
-        
-        
-        # Criteria regarding eigenvalue stability
-        # HC - remove eigevalues with positive real part
-        Lambds, mask6 = gen.HC_realEigen(Lambds)
-        lista = [Fns, Xis, Phis, Fn_cov, Xi_cov, Phi_cov]
-        Fns, Xis, Phis, Fn_cov, Xi_cov, Phi_cov = gen.applymask(
-            lista, mask6, Phis.shape[2]
-            )
-        
-        # Criteria regarding zero imaginary part in eigenvalues
-        # HC - remove eigenvalues with zero imaginary part of eigenvalues
-        Lambds, mask7 = gen.HC_removeZeroImg(Lambds)
-        lista = [Fns, Xis, Phis, Fn_cov, Xi_cov, Phi_cov]
-        Fns, Xis, Phis, Fn_cov, Xi_cov, Phi_cov = gen.applymask(
-            lista, mask7, Phis.shape[2]
-            )
-       
-      
-        # Get the labels of the poles
-        Lab = gen.SC_apply(
-            Fns,
-            Xis,
-            Phis,
-            ordmin,
-            ordmax,
-            step,
-            sc["err_fn"],
-            sc["err_xi"],
-            sc["err_phi"],
-        )
-
-        return SSIResult(
-            Obs=Obs,
-            A=A,
-            C=C,
-            H=H,
-            Lambds=Lambds,
-            Fn_poles=Fns,
-            Xi_poles=Xis,
-            Phi_poles=Phis,
-            Lab=Lab,
-            Fn_poles_cov=Fn_cov,
-            Xi_poles_cov=Xi_cov,
-            Phi_poles_cov=Phi_cov,
+            Y=Y, Yref=Yref, br=br, method=method_hank,
+            calc_unc=uncertainty_tier(self.run_params) != "none", nb=self.run_params.nb
         )
+        return ssi_from_hankel(H, T, self.run_params, self.dt)
 
     def mpe(
         self,
@@ -404,6 +800,218 @@ class SSIcov(SSIdat):
     method: typing.Literal["cov_R", "cov_mm"] = "cov_mm"
 
 
+class SSIcovStream:
+    """
+    Covariance-driven SSI (cov_mm) on a sliding window of a data stream.
+
+    The window holds the last `window_samples` samples. Instead of assembling
+    the block Hankel matrix from the whole window for every estimate, the
+    output-correlation sums behind it are kept up to date: `push` adds the
+    products of the new samples and subtracts those of the samples that left
+    the window. Each estimate then only costs the SVD and the pole
+    extraction. The Hankel matrix equals the one `ssi.build_hank` assembles
+    for the same window, up to rounding.
+
+    With `calc_unc`, the correlation sums are also kept per data segment of
+    `N // nb` columns, as in `ssi.build_hank`. The segments are counted from
+    the start of the stream, so they match the segments of a batch run only
+    when the window has moved by a multiple of the segment length; otherwise
+    the window holds one segment less.
+
+    Attributes
+    ----------
+    run_params : SSIWrapperRunParams
+        Run parameters, with the method set to 'cov_mm'.
+    window_samples : int
+        Number of samples in the window.
+    """
+
+    def __init__(self, window_samples: int, fs: float, **run_params: typing.Any):
+        """
+        Parameters
+        ----------
+        window_samples : int
+            Number of samples per estimate.
+        fs : float
+            Sampling frequency of the data.
+        **run_params
+            Parameters of `SSIWrapperRunParams`, e.g. `br`, `ordmax`, `calc_unc`.
+
+        Raises
+        ------
+        ValueError
+            If the window is too short for the number of block rows.
+        """
+        self.run_params = SSIWrapperRunParams(method="cov_mm", **run_params)
+        self.window_samples = int(window_samples)
+        self.dt = 1 / fs
+        p = int(self.run_params.br)
+        q = p + 1
+        # Column c of the Hankel product uses samples c + 1 ... c + p + q + 1
+        self._span = p + q + 1
+        self._N = self.window_samples - p - q
+        if self._N < 2:
+            raise ValueError(
+                f"window_samples must be larger than {p + q + 1} for br={p}, got {window_samples}")
+        self._calc_unc = uncertainty_tier(self.run_params) != "none"
+        self._segment_size = self._N // self.run_params.nb if self._calc_unc else 0
+        if self._calc_unc and self._segment_size == 0:
+            raise ValueError(f"The window is too short for nb={self.run_params.nb} segments")
+        self.reset()
+
+    def reset(self, start_index: int = 0) -> None:
+        """
+        Drops all samples and restarts the stream.
+
+        Parameters
+        ----------
+        start_index : int, optional
+            Absolute index of the next pushed sample, used by `update_window`.
+        """
+        self._origin = start_index
+        self._samples: typing.Optional[np.ndarray] = None  # (channels, samples)
+        self._samples_start = 0  # stream index of the first retained sample
+        self._end = 0  # stream index of the next sample
+        self._col_start = 0  # first column in the correlation sums
+        self._col_end = 0  # first column not yet in the correlation sums
+        self._sums: typing.Optional[np.ndarray] = None
+        # Segment index -> correlation sum of its columns
+        self._segments: typing.Dict[int, np.ndarray] = {}
+
+    @property
+    def samples_seen(self) -> int:
+        """Number of samples pushed since the last reset."""
+        return self._end
+
+    @property
+    def ready(self) -> bool:
+        """True once the window is full."""
+        return self._end >= self.window_samples
+
+    def push(self, data: np.ndarray) -> None:
+        """
+        Appends new samples to the stream and updates the correlation sums.
 
+        Parameters
+        ----------
+        data : np.ndarray
+            New samples, shape: (n_channels, n_samples).
+        """
+        data = np.asarray(data, dtype=float)
+        if data.shape[1] == 0:
+            return
+        if self._samples is None:
+            self._samples = data[:, -self.window_samples:]
+            self._samples_start = max(0, data.shape[1] - self.window_samples)
+        else:
+            self._samples = np.hstack([self._samples, data])
+        self._end += data.shape[1]
+
+        window_start = max(0, self._end - self.window_samples)
+        col_end = max(0, self._end - self._span)
+        if self._sums is None or window_start >= self._col_end:
+            # No retained columns overlap the new window
+            self._sums = None
+            self._segments.clear()
+            self._col_start = self._col_end = max(window_start, self._col_start)
+        self._add_columns(self._col_end, col_end)
+        self._remove_columns(self._col_start, window_start)
+
+        drop = window_start - self._samples_start
+        if drop > 0:
+            self._samples = self._samples[:, drop:]
+            self._samples_start = window_start
+
+    def update_window(self, data: np.ndarray, start_index: int) -> None:
+        """
+        Feeds a window of samples that may overlap the samples already seen,
+        such as the overlapping windows of an aligner.
 
+        Only the samples after the last pushed one are used. If the window
+        does not continue the stream, the stream is restarted with it.
 
+        Parameters
+        ----------
+        data : np.ndarray
+            Samples, shape: (n_channels, n_samples).
+        start_index : int
+            Absolute index of the first sample of `data`.
+        """
+        if self._end == 0 or not self._origin <= start_index <= self._origin + self._end:
+            self.reset(start_index)
+        self.push(data[:, self._origin + self._end - start_index:])
+
+    def run(self) -> SSIResult:
+        """
+        Identifies the poles of the current window.
+
+        Returns
+        -------
+        SSIResult
+            An object containing the computed matrices and modal parameters.
+
+        Raises
+        ------
+        ValueError
+            If the window is not full yet.
+        """
+        if not self.ready:
+            raise ValueError(
+                f"The window holds {self._end} of {self.window_samples} samples")
+        H = self._sums / self._N
+        T = self._uncertainty(H) if self._calc_unc else None
+        return ssi_from_hankel(H, T, self.run_params, self.dt)
+
+    def _ref(self, Y: np.ndarray) -> np.ndarray:
+        if self.run_params.ref_ind is not None:
+            return Y[self.run_params.ref_ind, :]
+        return Y
+
+    def _products(self, col_start: int, col_end: int) -> np.ndarray:
+        """Yf @ Yp.T of the columns [col_start, col_end), unscaled."""
+        p = int(self.run_params.br)
+        q = p + 1
+        offset = self._samples_start
+        Y = self._samples
+        Yref = self._ref(Y)
+        Yf = np.vstack([Y[:, col_start + q + 1 + i - offset:col_end + q + 1 + i - offset]
+                        for i in range(p + 1)])
+        Yp = np.vstack([Yref[:, col_start + q - j - offset:col_end + q - j - offset]
+                        for j in range(q)])
+        return Yf @ Yp.T
+
+    def _add_columns(self, col_start: int, col_end: int) -> None:
+        if col_end <= col_start:
+            return
+        size = self._segment_size
+        # Split at the segment boundaries, so that each product is computed once
+        bounds = list(range(col_start - col_start % size + size, col_end, size)) if size else []
+        edges = [col_start] + bounds + [col_end]
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            products = self._products(lo, hi)
+            self._sums = products if self._sums is None else self._sums + products
+            if size:
+                self._segments[lo // size] = self._segments.get(lo // size, 0) + products
+        self._col_end = col_end
+
+    def _remove_columns(self, col_start: int, col_end: int) -> None:
+        if col_end <= col_start:
+            return
+        self._sums = self._sums - self._products(col_start, col_end)
+        self._col_start = col_end
+        for segment in [s for s in self._segments if s * self._segment_size < col_end]:
+            del self._segments[segment]
+
+    def _uncertainty(self, H: np.ndarray) -> np.ndarray:
+        """Square root of the Hankel covariance from the complete segments, as in `ssi.build_hank`."""
+        size = self._segment_size
+        segments = sorted(s for s in self._segments
+                          if s * size >= self._col_start and (s + 1) * size <= self._col_end)
+        segments = segments[:self.run_params.nb]
+        nb = len(segments)
+        Hvec0 = H.reshape(-1, 1)
+        T = np.zeros((H.size, nb))
+        for k, segment in enumerate(segments):
+            Hcov_k = self._segments[segment] / self._N / size
+            T[:, k] = (Hcov_k.reshape(-1, 1) - Hvec0).flatten() / np.sqrt(nb * (nb - 1))
+        return T
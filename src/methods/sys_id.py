@@ -1,16 +1,26 @@
-import time
 import json
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple, Union
 from paho.mqtt.client import Client as MQTTClient
 from pyoma2.setup.single import SingleSetup
 from functions.util import convert_numpy_to_list
-from data.accel.metadata import extract_fs_from_metadata
+from data.accel.metadata import MetadataService
+from data.accel.constants import METADATA_CACHE_FILE
 from data.comm.mqtt import setup_mqtt_client
 from data.accel.hbk.aligner import Aligner
-from methods.packages.pyoma.ssiWrapper import SSIcov
-from methods.constants import MODEL_ORDER, BLOCK_SHIFT, DEFAULT_FS
+from methods.packages.pyoma.ssiWrapper import SSIcov, SSIcovStream, cheapest_uncertainty
+from methods.constants import (
+    MODEL_ORDER, BLOCK_SHIFT, DEFAULT_FS, WINDOW_WAIT_TIMEOUT, OMA_PAYLOAD_FORMAT, WAIT_METADATA)
+from methods import oma_codec
 
+if TYPE_CHECKING:
+    from methods.sys_id_service import SysIdService
+
+# Covariances published by _oma_output, used by mode_track.mode_allingment
+OMA_COVARIANCES = ("Fn_poles_cov", "Xi_poles_cov")
 
 
 def sysid(data, params):
@@ -25,6 +35,14 @@ def sysid(data, params):
             - 'Fs' (float): Sampling frequency of the input data.
             - 'block_shift' (int): Block shift parameter for the SSI algorithm.
             - 'model_order' (int): Maximum model order for the system identification.
+            - 'pole_workers' (int, optional): Processes that share the pole
+              extraction across the model orders, from model order
+              PARALLEL_POLES_MIN_ORDER of ssiWrapper on (default: 1).
+            - 'svd' (str, optional): Hankel decomposition without uncertainty,
+              'full', 'truncated' or 'randomized' (default: 'full').
+            - 'uncertainty' (str, optional): Uncertainty tier, 'none' or
+              'full' (default: the cheapest tier that computes
+              OMA_COVARIANCES, which is 'full').
 
     Returns:
         tuple: Contains identified model parameters (frequencies, cov_freq, damping_ratios,
@@ -41,13 +59,51 @@ def sysid(data, params):
         method='cov_mm',
         br=params['block_shift'],
         ordmax=params['model_order'],
-        calc_unc=True
+        calc_unc=_uncertainty(params) != 'none',
+        unc=_uncertainty(params),
+        pole_workers=params.get('pole_workers', 1),
+        svd=params.get('svd', 'full')
     )
 
     my_setup.add_algorithms(ssi_mode_track)
     my_setup.run_by_name("SSIcovmm_mt")
 
-    output = ssi_mode_track.result.model_dump()
+    return _oma_output(ssi_mode_track.result)
+
+
+def streaming_sysid(params: Dict[str, Any], window_samples: int) -> SSIcovStream:
+    """
+    Creates a streaming SSI-COV estimator with the settings of `sysid`.
+
+    Consecutive overlapping windows fed to the estimator only cost the
+    samples that are new, instead of a full pass over each window.
+
+    Args:
+        params (dict): OMA parameters, as for `sysid`.
+        window_samples (int): Number of samples per window.
+
+    Returns:
+        SSIcovStream: The estimator. Feed it with `update_window` and
+            identify the current window with `run`.
+    """
+    return SSIcovStream(
+        window_samples,
+        params['Fs'],
+        br=params['block_shift'],
+        ordmax=params['model_order'],
+        calc_unc=_uncertainty(params) != 'none',
+        unc=_uncertainty(params),
+        pole_workers=params.get('pole_workers', 1),
+        svd=params.get('svd', 'full')
+    )
+
+
+def _uncertainty(params: Dict[str, Any]) -> str:
+    return params.get('uncertainty', cheapest_uncertainty(OMA_COVARIANCES))
+
+
+def _oma_output(result) -> Dict[str, Any]:
+    output = result.model_dump()
     return {
         'Fn_poles': output['Fn_poles'],
         'Fn_poles_cov': output['Fn_poles_cov'],
@@ -58,32 +114,73 @@ def sysid(data, params):
     }
 
 
-def setup_client(mqtt_config: Dict[str, Any]) -> Tuple[MQTTClient, float]:
+def setup_client(mqtt_config: Dict[str, Any],
+                 metadata_cache: Optional[str] = METADATA_CACHE_FILE) -> Tuple[MQTTClient, float]:
     """
     Sets up and starts the MQTT client for subscribing to sensor data.
     Also extracts sampling frequency from metadata if available.
 
     Args:
         mqtt_config: Configuration dictionary for the MQTT client.
+        metadata_cache: File of the metadata cache, see `setup_client_with_metadata`.
 
     Returns:
         A tuple of the connected MQTTClient instance and the extracted sampling frequency.
     """
-    try:
-        fs = extract_fs_from_metadata(mqtt_config)
-        print("Extracted FS from metadata:", fs)
-    except Exception:
-        print("Failed to extract FS from metadata. Using DEFAULT_FS.")
-        fs = DEFAULT_FS
+    data_client, _, fs = setup_client_with_metadata(mqtt_config, metadata_cache)
+    return data_client, fs
+
+
+def setup_client_with_metadata(
+        mqtt_config: Dict[str, Any], metadata_cache: Optional[str] = METADATA_CACHE_FILE
+        ) -> Tuple[MQTTClient, Optional[MetadataService], float]:
+    """
+    Sets up and starts the MQTT client for subscribing to sensor data, with a
+    metadata service on the same client for the metadata topic (the second
+    topic in "TopicsToSubscribe", if any).
+
+    The sampling frequency is taken from the metadata cache at once if it is
+    known from an earlier run; otherwise the metadata message is awaited for
+    up to WAIT_METADATA seconds before falling back to DEFAULT_FS.
+
+    Args:
+        mqtt_config: Configuration dictionary for the MQTT client.
+        metadata_cache: JSON file of the metadata cache, or None to keep it
+            in memory only.
 
+    Returns:
+        A tuple of the connected MQTTClient instance, the metadata service
+        (None without a metadata topic) and the sampling frequency.
+    """
     data_client, _ = setup_mqtt_client(mqtt_config, topic_index=0)
     data_client.connect(mqtt_config["host"], mqtt_config["port"], 60)
     data_client.loop_start()
-    return data_client, fs
+
+    topics = mqtt_config.get("TopicsToSubscribe", [])
+    if len(topics) < 2:
+        return data_client, None, DEFAULT_FS
+    metadata = MetadataService(data_client, topics[1], cache_file=metadata_cache,
+                               qos=mqtt_config.get("QoS", 1))
+    fs = metadata.get_fs(timeout=WAIT_METADATA)
+    if fs is None:
+        print("Failed to extract FS from metadata. Using DEFAULT_FS.")
+        return data_client, metadata, DEFAULT_FS
+    print("Extracted FS from metadata:", fs)
+    return data_client, metadata, fs
+
+
+def _oma_params(fs: float) -> Dict[str, Any]:
+    """Returns the OMA parameters used for data sampled at `fs`."""
+    return {
+        "Fs": fs,
+        "block_shift": BLOCK_SHIFT, 
+        "model_order": MODEL_ORDER  
+    }
 
 
 def get_oma_results(
-        sampling_period: int, aligner: Aligner, fs: float
+        sampling_period: int, aligner: Aligner, fs: float, hop_period: Optional[float] = None,
+        estimator: Optional[SSIcovStream] = None
         ) -> Optional[Tuple[Dict[str, Any], datetime]]:
     """
     Extracts aligned sensor data and runs system identification (sysID).
@@ -92,35 +189,143 @@ def get_oma_results(
         sampling_period: How many minutes of data to pass to sysid.
         aligner: An initialized Aligner object.
         fs: Sampling frequency to use in the OMA algorithm.
+        hop_period: How many minutes the next window starts after this one.
+            The overlap is kept in the aligner. Defaults to `sampling_period`
+            (disjoint windows).
+        estimator: A streaming estimator from `streaming_sysid`. If given,
+            only the samples of the window that it has not seen yet are
+            added to it, instead of running `sysid` on the whole window.
 
     Returns:
         A tuple (OMA_output, timestamp) if successful, or None if data is not ready.
     """
-    oma_params = {
-        "Fs": fs,
-        "block_shift": BLOCK_SHIFT, 
-        "model_order": MODEL_ORDER  
-    }
-
     number_of_samples = int(sampling_period * 60 * fs)
-    data, timestamp = aligner.extract(number_of_samples)
+    hop_samples = int(hop_period * 60 * fs) if hop_period is not None else None
+    if estimator is None:
+        data, timestamp = aligner.extract(number_of_samples, hop_samples)
+    else:
+        window = aligner.extract_window(number_of_samples, hop_samples)
+        data, timestamp = window.data, window.timestamp
 
     if data.size < number_of_samples:
         return None, None
 
     try:
-        oma_output = sysid(data, oma_params)
+        if estimator is None:
+            oma_output = sysid(data, _oma_params(fs))
+        else:
+            estimator.update_window(data, window.start_index)
+            oma_output = _oma_output(estimator.run())
         return oma_output, timestamp
     except Exception as e:
         print(f"sysID failed: {e}")
         return None, None
 
 
+def wait_for_oma_results(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        sampling_period: int, aligner: Aligner, fs: float, timeout: Optional[float] = None,
+        hop_period: Optional[float] = None, estimator: Optional[SSIcovStream] = None
+        ) -> Optional[Tuple[Dict[str, Any], datetime]]:
+    """
+    Waits until the aligner holds enough aligned data, then runs `get_oma_results`.
+
+    Args:
+        sampling_period: How many minutes of data to pass to sysid.
+        aligner: An initialized Aligner object.
+        fs: Sampling frequency to use in the OMA algorithm.
+        timeout: Maximum number of seconds to wait for the data (default: no limit).
+        hop_period: How many minutes the next window starts after this one,
+            see `get_oma_results`.
+        estimator: Streaming estimator, see `get_oma_results`.
+
+    Returns:
+        A tuple (OMA_output, timestamp) if successful, or (None, None) if the
+        timeout expired or sysID failed.
+    """
+    number_of_samples = int(sampling_period * 60 * fs)
+    if not aligner.wait_for(number_of_samples, timeout):
+        return None, None
+    return get_oma_results(sampling_period, aligner, fs, hop_period, estimator)
+
+
+def _publish_oma_output(publish_client: MQTTClient, publish_topic: str,
+                        oma_output: Dict[str, Any], timestamp: datetime,
+                        payload_format: str = OMA_PAYLOAD_FORMAT) -> bool:
+    """
+    Publishes one OMA result. Returns True if it was published.
+    """
+    try:
+        message = _encode_oma_output(oma_output, timestamp, payload_format)
+
+        if not publish_client.is_connected():
+            print("Publisher disconnected. Reconnecting...")
+            publish_client.reconnect()
+
+        publish_client.publish(publish_topic, message, qos=1)
+        print(f"[{timestamp.isoformat()}] Published OMA result to {publish_topic}")
+        return True
+
+    except Exception as e:
+        print(f"Failed to publish OMA result: {e}")
+        return False
+
+
+def _encode_oma_output(oma_output: Dict[str, Any], timestamp: datetime,
+                       payload_format: str) -> Union[bytes, str]:
+    if payload_format != "json":
+        try:
+            return oma_codec.encode(oma_output, timestamp.isoformat(),
+                                    compress=payload_format == "binary_zlib")
+        except ValueError as e:
+            print(f"Falling back to JSON for the OMA result: {e}")
+    return json.dumps({
+        "timestamp": timestamp.isoformat(),
+        "OMA_output": convert_numpy_to_list(oma_output)
+    })
+
+
+def submit_oma_window(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        sampling_period: int, aligner: Aligner, fs: float, service: "SysIdService",
+        timeout: Optional[float] = None, hop_period: Optional[float] = None
+        ) -> Tuple[Optional[Future], Optional[datetime]]:
+    """
+    Waits for aligned data and submits the window to a SysID service,
+    without waiting for the analysis.
+
+    Args:
+        sampling_period: How many minutes of data to pass to sysid.
+        aligner: An initialized Aligner object.
+        fs: Sampling frequency to use in the OMA algorithm.
+        service: The service that runs sysid.
+        timeout: Maximum number of seconds to wait for the data (default: no limit).
+        hop_period: How many minutes the next window starts after this one,
+            see `get_oma_results`.
+
+    Returns:
+        A tuple (future of the OMA_output, timestamp), or (None, None) if the
+        timeout expired.
+    """
+    number_of_samples = int(sampling_period * 60 * fs)
+    if not aligner.wait_for(number_of_samples, timeout):
+        return None, None
+    hop_samples = int(hop_period * 60 * fs) if hop_period is not None else None
+    data, timestamp = aligner.extract(number_of_samples, hop_samples)
+    if data.size < number_of_samples:
+        return None, None
+    return service.submit(data, _oma_params(fs)), timestamp
+
+
 def publish_oma_results(sampling_period: int, aligner: Aligner,
                         publish_client: MQTTClient, publish_topic: str,
-                        fs: float) -> None:
+                        fs: float, hop_period: Optional[float] = None,
+                        service: Optional["SysIdService"] = None,
+                        payload_format: str = OMA_PAYLOAD_FORMAT,
+                        metadata: Optional[MetadataService] = None,
+                        streaming: bool = False) -> None:
+    # pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals
     """
-    Repeatedly tries to get aligned data and publish OMA results once.
+    Waits for aligned data and publishes OMA results once, or continuously
+    for overlapping windows when `hop_period` is given.
 
     Args:
         sampling_period: Duration (in minutes) of data to extract.
@@ -128,37 +333,143 @@ def publish_oma_results(sampling_period: int, aligner: Aligner,
         publish_client: MQTT client used for publishing results.
         publish_topic: The MQTT topic to publish results to.
         fs: Sampling frequency.
+        hop_period: Minutes between the starts of consecutive windows, e.g. 0.5
+            to publish a result for the last `sampling_period` minutes every 30 s.
+        service: Runs sysid in worker processes instead. The loop then keeps
+            extracting windows while earlier ones are analysed, and each result
+            is published when its analysis finishes.
+        payload_format: "binary", "binary_zlib" or "json", see `methods.oma_codec`.
+            Results that do not fit the binary format are published as JSON.
+        metadata: Metadata service of the data client. When it announces a new
+            sampling frequency, the aligner is reset, the window being
+            collected is dropped, and the following windows use the new
+            frequency instead of `fs`.
+        streaming: Identify the overlapping windows of `hop_period` with a
+            streaming estimator, see `streaming_sysid`, instead of `sysid` per
+            window. Its frequency and damping covariances equal those of `sysid`
+            only when the hop is a multiple of the uncertainty segment length
+            (`N // nb` samples); otherwise they are computed from one segment
+            less. Ignored with `service`.
     """
-    while True:
+    if service is not None:
+        _publish_oma_results_from_service(sampling_period, aligner, publish_client,
+                                          publish_topic, fs, hop_period, service,
+                                          payload_format, metadata)
+        return
+    estimator = None
+    if hop_period is not None and streaming:
+        estimator = streaming_sysid(_oma_params(fs), int(sampling_period * 60 * fs))
+    with _reset_on_fs_change(aligner, metadata) as fs_changed:
+        while True:
+            try:
+                fs_changed.clear()
+                current_fs = _current_fs(metadata, fs)
+                if current_fs != fs:
+                    fs = current_fs
+                    if estimator is not None:
+                        estimator = streaming_sysid(_oma_params(fs),
+                                                    int(sampling_period * 60 * fs))
+                oma_output, timestamp = wait_for_oma_results(
+                    sampling_period, aligner, fs, timeout=WINDOW_WAIT_TIMEOUT,
+                    hop_period=hop_period, estimator=estimator)
+                if fs_changed.is_set():
+                    print("Sampling frequency changed during the window, dropping it")
+                    continue
+                print(f"OMA result: {oma_output}")
+                print(f"Timestamp: {timestamp}")
+
+                if oma_output:
+                    published = _publish_oma_output(publish_client, publish_topic,
+                                                    oma_output, timestamp, payload_format)
+                    if published and hop_period is None:
+                        break
+            except KeyboardInterrupt:
+                _shutdown(aligner, publish_client)
+                break
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+
+
+def _publish_oma_results_from_service(
+        sampling_period: int, aligner: Aligner, publish_client: MQTTClient,
+        publish_topic: str, fs: float, hop_period: Optional[float],
+        service: "SysIdService", payload_format: str = OMA_PAYLOAD_FORMAT,
+        metadata: Optional[MetadataService] = None) -> None:
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    def publish(future: Future, timestamp: datetime) -> bool:
         try:
-            time.sleep(0.5)
-            oma_output, timestamp = get_oma_results(sampling_period, aligner, fs)
-            print(f"OMA result: {oma_output}")
-            print(f"Timestamp: {timestamp}")
-
-            if oma_output:
-                payload = {
-                    "timestamp": timestamp.isoformat(),
-                    "OMA_output": convert_numpy_to_list(oma_output)
-                }
-                try:
-                    message = json.dumps(payload)
-
-                    if not publish_client.is_connected():
-                        print("Publisher disconnected. Reconnecting...")
-                        publish_client.reconnect()
-
-                    publish_client.publish(publish_topic, message, qos=1)
-                    print(f"[{timestamp.isoformat()}] Published OMA result to {publish_topic}")
-                    break
-
-                except Exception as e:
-                    print(f"Failed to publish OMA result: {e}")
-        except KeyboardInterrupt:
-            print("Shutting down gracefully")
-            aligner.client.loop_stop()
-            aligner.client.disconnect()
-            publish_client.disconnect()
-            break
+            oma_output = future.result()
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            print(f"sysID failed: {e}")
+            return False
+        return _publish_oma_output(publish_client, publish_topic, oma_output, timestamp,
+                                   payload_format)
+
+    with _reset_on_fs_change(aligner, metadata) as fs_changed:
+        while True:
+            try:
+                fs_changed.clear()
+                fs = _current_fs(metadata, fs)
+                future, timestamp = submit_oma_window(
+                    sampling_period, aligner, fs, service, timeout=WINDOW_WAIT_TIMEOUT,
+                    hop_period=hop_period)
+                if future is None:
+                    continue
+                if fs_changed.is_set():
+                    print("Sampling frequency changed during the window, dropping it")
+                    future.cancel()
+                    continue
+                if hop_period is None:
+                    # A single result is wanted, so wait for it
+                    if publish(future, timestamp):
+                        break
+                    continue
+                future.add_done_callback(lambda f, ts=timestamp: publish(f, ts))
+            except KeyboardInterrupt:
+                _shutdown(aligner, publish_client)
+                break
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+
+
+@contextmanager
+def _reset_on_fs_change(aligner: Aligner,
+                        metadata: Optional[MetadataService]) -> Iterator[threading.Event]:
+    """
+    Resets the aligner as soon as the metadata announces a new sampling
+    frequency, so the buffered samples of the old one never share a window
+    with the new ones. Yields an event that is set on every change.
+    """
+    changed = threading.Event()
+    if metadata is None:
+        yield changed
+        return
+
+    def on_change(topic: str, fs: float) -> None:  # pylint: disable=unused-argument
+        aligner.reset()
+        changed.set()
+
+    metadata.add_listener(on_change)
+    try:
+        yield changed
+    finally:
+        metadata.remove_listener(on_change)
+
+
+def _current_fs(metadata: Optional[MetadataService], fs: float) -> float:
+    """Returns the sampling frequency announced by the metadata, or `fs`."""
+    if metadata is None:
+        return fs
+    current = metadata.get_fs()
+    if current is None:
+        return fs
+    if current != fs:
+        print(f"Sampling frequency changed from {fs} to {current}")
+    return current
+
+
+def _shutdown(aligner: Aligner, publish_client: MQTTClient) -> None:
+    print("Shutting down gracefully")
+    aligner.mqtt_client.loop_stop()
+    aligner.mqtt_client.disconnect()
+    publish_client.disconnect()
@@ -0,0 +1,115 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from methods import sys_id
+
+
+def _sysid_from_shared_memory(name: str, shape: Tuple[int, ...], dtype: str,
+                              params: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs `sys_id.sysid` in a worker on a window stored in shared memory."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Copy out of the segment, so that it can be closed while pyoma2 holds the data
+        data = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    return sys_id.sysid(data, params)
+
+
+class SysIdService:
+    """
+    Runs `sys_id.sysid` in a pool of worker processes.
+
+    Each submitted window is copied once into a shared memory segment, which
+    the worker reads instead of receiving the window through a pipe. The
+    result is returned through a future, so the caller can keep polling the
+    aligner and publishing while the SVD runs, and several windows can be
+    analysed at the same time on multi-core machines.
+
+    Workers are started with the "spawn" method by default, because forking
+    a process that runs the MQTT network thread is unsafe.
+    """
+
+    def __init__(self, params: Dict[str, Any], max_workers: int = 1,
+                 max_pending: Optional[int] = None, mp_context: Any = None):
+        """
+        Args:
+            params (dict): OMA parameters passed to `sysid`, see `sys_id.sysid`.
+            max_workers (int): Number of worker processes.
+            max_pending (int): Maximum number of windows submitted and not yet
+                analysed. `submit` blocks while the limit is reached, which
+                bounds the shared memory in use. Defaults to `2 * max_workers`.
+            mp_context: Multiprocessing context of the workers
+                (default: the "spawn" context).
+        """
+        self.params = params
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=mp_context or multiprocessing.get_context("spawn"))
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * max_workers)
+        self._lock = threading.Lock()
+        self._segments: Dict[str, shared_memory.SharedMemory] = {}
+
+
+    def submit(self, data: np.ndarray, params: Optional[Dict[str, Any]] = None) -> Future:
+        """
+        Schedules `sysid` for one window.
+
+        Args:
+            data (np.ndarray): The aligned window, in either orientation accepted by `sysid`.
+            params (dict): OMA parameters for this window (default: the service parameters).
+
+        Returns:
+            Future: Resolves to the `sysid` output, or raises its exception.
+        """
+        data = np.ascontiguousarray(data)
+        self._slots.acquire()  # pylint: disable=consider-using-with
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+            np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+            with self._lock:
+                self._segments[shm.name] = shm
+            future = self._executor.submit(
+                _sysid_from_shared_memory, shm.name, data.shape, data.dtype.str,
+                params or self.params)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._release(shm.name))
+        return future
+
+
+    def pending(self) -> int:
+        """Returns the number of windows submitted and not yet analysed."""
+        with self._lock:
+            return len(self._segments)
+
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the workers. With `wait`, submitted windows are analysed first."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        with self._lock:
+            names = list(self._segments)
+        for name in names:
+            self._release(name)
+
+
+    def __enter__(self) -> "SysIdService":
+        return self
+
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+
+    def _release(self, name: str) -> None:
+        with self._lock:
+            shm = self._segments.pop(name, None)
+        if shm is None:
+            return
+        shm.close()
+        shm.unlink()
+        self._slots.release()
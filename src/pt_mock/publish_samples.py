@@ -1,6 +1,5 @@
 # pylint: disable=import-error
 import json
-import struct
 import time
 from typing import Tuple, List
 from dataclasses import dataclass
@@ -9,6 +8,7 @@ import busio  # type: ignore
 import adafruit_adxl37x  # type: ignore
 from paho.mqtt.client import Client as MQTTClient
 
+from data.accel.hbk import codec
 from data.comm.mqtt import load_config, setup_mqtt_client
 from pt_mock.constants import (
     SAMPLES_PER_MESSAGE,
@@ -127,17 +127,8 @@ def send_batch(mqttc: MQTTClient, batch: Batch) -> None:
         mqttc (MQTTClient): The MQTT client.
         batch (Batch): A Batch object containing topic, samples, and sample counter.
     """
-    descriptor_format = "<HHQQQ"
-    descriptor_length = struct.calcsize(descriptor_format)
-    descriptor = struct.pack(
-        descriptor_format,
-        descriptor_length,
-        1,  # metadata version
-        0, 0,  # no timestamp
-        batch.sample_counter
-    )
-    data_payload = struct.pack(f"<{len(batch.samples)}f", *batch.samples)
-    payload = descriptor + data_payload
+    payload = codec.encode(batch.samples, batch.sample_counter,
+                           metadata_version=1)  # no timestamp
 
     mqttc.publish(batch.topic, payload, qos=1, retain=False)
 
@@ -3,7 +3,7 @@ import threading
 import pytest
 import numpy as np
 from unittest.mock import MagicMock
-from data.accel.hbk.accelerometer import Accelerometer
+from data.accel.hbk.accelerometer import Accelerometer, RingBufferAccelerometer
 from data.accel.metadata_constants import DESCRIPTOR_LENGTH_BYTES
 
 pytestmark = pytest.mark.unit
@@ -105,16 +105,41 @@ def test_get_batch_size_returns_none_when_empty(test_accelerometer):
     assert test_accelerometer.get_batch_size() is None
 
 
-def test_on_message_invokes_process_in_thread(test_accelerometer, mocker):
+def test_on_message_submits_to_executor(mock_mqtt_client):
+    executor = MagicMock()
+    acc = Accelerometer(mock_mqtt_client, topic="test/topic", executor=executor)
     msg = MockMQTTMessage("test/topic", make_mock_payload(0))
-    process_mock = mocker.patch.object(test_accelerometer, "process_message")
-    thread_mock = mocker.patch("threading.Thread")
 
-    test_accelerometer._on_message(None, None, msg)
+    acc._on_message(None, None, msg)
 
-    thread_mock.assert_called_once()
-    assert thread_mock.call_args.kwargs["target"].__name__ == "safe_process"
-    assert thread_mock.call_args.kwargs["daemon"] is True
+    executor.submit.assert_called_once_with("test/topic", acc._ingest, msg)
+
+
+def test_on_message_processes_messages_in_order(test_accelerometer):
+    for key in [0, 32, 64]:
+        test_accelerometer._on_message(None, None, MockMQTTMessage("test/topic", make_mock_payload(key)))
+    test_accelerometer.executor.shutdown(wait=True)
+
+    assert test_accelerometer.get_sorted_keys() == [0, 32, 64]
+    assert test_accelerometer.executor.stats()["test/topic"].processed == 3
+
+
+def test_on_message_counts_undecodable_message_as_failed(test_accelerometer, capsys):
+    test_accelerometer._on_message(None, None, MockMQTTMessage("test/topic", b"too short"))
+    test_accelerometer.executor.shutdown(wait=True)
+
+    stats = test_accelerometer.executor.stats()["test/topic"]
+    assert (stats.processed, stats.failed) == (0, 1)
+    assert "Error processing message" in capsys.readouterr().out
+
+
+def test_submit_message_reports_dropped_message(mock_mqtt_client, capsys):
+    executor = MagicMock()
+    executor.submit.return_value = False
+    acc = Accelerometer(mock_mqtt_client, topic="test/topic", executor=executor)
+
+    assert acc.submit_message(MockMQTTMessage("test/topic", make_mock_payload(0))) is False
+    assert "dropped message" in capsys.readouterr().out
 
 
 def test_process_message_handles_short_payload(test_accelerometer, capsys):
@@ -182,3 +207,122 @@ def test_clear_used_data_with_zero_samples_to_remove_does_nothing(test_accelerom
     # Data should remain untouched
     assert test_accelerometer.get_sorted_keys() == [0]
     assert test_accelerometer.get_samples_for_key(0) == [float(i) for i in range(32)]
+
+
+@pytest.fixture
+def ring_accelerometer(mock_mqtt_client):
+    return RingBufferAccelerometer(mock_mqtt_client, topic="test/topic", map_size=128)
+
+
+def test_ring_accelerometer_stores_message_arriving_while_subscribing():
+    class DeliveringClient:
+        """Delivers a message as soon as on_message is installed."""
+        subscribe = MagicMock()
+
+        @property
+        def on_message(self):
+            return None
+
+        @on_message.setter
+        def on_message(self, callback):
+            callback(self, None, MockMQTTMessage("test/topic", make_mock_payload(0)))
+
+    executor = MagicMock()
+    executor.submit.side_effect = lambda channel, fn, *args: fn(*args) or True
+
+    acc = RingBufferAccelerometer(DeliveringClient(), topic="test/topic", map_size=128,
+                                  executor=executor)
+
+    assert acc.get_sorted_keys() == [0]
+
+
+def test_ring_accelerometer_stores_and_reads_data(ring_accelerometer):
+    for i in range(3):
+        ring_accelerometer.process_message(MockMQTTMessage("test/topic", make_mock_payload(i * 32)))
+
+    assert ring_accelerometer.get_sorted_keys() == [0, 32, 64]
+    assert ring_accelerometer.get_batch_size() == 32
+    assert np.allclose(ring_accelerometer.get_samples_for_key(32), np.arange(32, 64))
+
+    status, data = ring_accelerometer.read(50)
+    assert status == 1
+    assert data.dtype == np.float32
+    assert np.allclose(data, np.arange(50))
+
+
+def test_ring_accelerometer_clear_used_data(ring_accelerometer):
+    for i in range(3):
+        ring_accelerometer.process_message(MockMQTTMessage("test/topic", make_mock_payload(i * 32)))
+
+    ring_accelerometer.clear_used_data(32, 50)
+
+    assert ring_accelerometer.get_sorted_keys() == [64]
+    assert len(ring_accelerometer.get_samples_for_key(64)) == 14
+
+
+def test_ring_accelerometer_evicts_when_map_size_exceeded():
+    acc = RingBufferAccelerometer(mqtt_client=MagicMock(), topic="test/topic", map_size=64)
+    for key in [0, 32, 64]:
+        acc.process_message(MockMQTTMessage("test/topic", make_mock_payload(key)))
+
+    assert acc.get_sorted_keys() == [32, 64]
+    status, data = acc.read(96)
+    assert status == 0
+    assert np.allclose(data, np.arange(32, 96))
+
+
+def test_eviction_drops_whole_batches_and_trims_partial_batch():
+    acc = Accelerometer(mqtt_client=MagicMock(), topic="test/topic", map_size=80)
+    for key in [0, 32, 64]:
+        acc.process_message(MockMQTTMessage("test/topic", make_mock_payload(key)))
+
+    assert acc.get_sorted_keys() == [0, 32, 64]
+    assert acc.get_samples_for_key(0) == [float(i) for i in range(16, 32)]
+    status, data = acc.read(80)
+    assert status == 1
+    assert np.allclose(data, np.arange(16, 96))
+
+
+def test_out_of_order_batches_keep_keys_sorted(test_accelerometer):
+    for key in [64, 0, 32]:
+        test_accelerometer.process_message(MockMQTTMessage("test/topic", make_mock_payload(key)))
+
+    assert test_accelerometer.get_sorted_keys() == [0, 32, 64]
+    _, data = test_accelerometer.read(96)
+    assert np.allclose(data, np.arange(96))
+
+
+def test_clear_removes_all_data(test_accelerometer):
+    for key in [0, 32]:
+        test_accelerometer.process_message(MockMQTTMessage("test/topic", make_mock_payload(key)))
+
+    test_accelerometer.clear()
+
+    assert test_accelerometer.get_sorted_keys() == []
+    assert test_accelerometer.get_batch_size() is None
+    # The running sample count is reset, so a full map can be stored again
+    for key in range(0, 128, 32):
+        test_accelerometer.process_message(MockMQTTMessage("test/topic", make_mock_payload(key)))
+    assert test_accelerometer.get_sorted_keys() == [0, 32, 64, 96]
+
+
+def test_accelerometer_without_subscribe_leaves_client_untouched():
+    client = MagicMock(spec=["subscribe", "on_message"])
+    client.on_message = None
+
+    Accelerometer(client, topic="test/topic", subscribe=False)
+
+    client.subscribe.assert_not_called()
+    assert client.on_message is None
+
+
+def test_close_stops_own_executor_only(mock_mqtt_client):
+    own = Accelerometer(mock_mqtt_client, topic="test/topic")
+    shared = MagicMock()
+    borrowed = Accelerometer(mock_mqtt_client, topic="test/topic", executor=shared)
+
+    own.close()
+    borrowed.close()
+
+    assert not own.executor.submit("test/topic", print)
+    shared.shutdown.assert_not_called()
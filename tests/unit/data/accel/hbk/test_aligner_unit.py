@@ -1,7 +1,10 @@
+import asyncio
+import threading
 import pytest
 import numpy as np
 from unittest.mock import MagicMock, patch
 from data.accel.hbk.aligner import Aligner
+from data.accel.hbk.accelerometer import Accelerometer, RingBufferAccelerometer
 pytestmark = pytest.mark.unit
 
 
@@ -35,8 +38,18 @@ def test_find_continuous_key_groups(aligner_with_mock_channels):
     assert groups == [[0, 4, 8, 12, 16]]
 
 
-def test_extract_with_enough_samples(aligner_with_mock_channels):
-    aligner, accelerometers = aligner_with_mock_channels
+def make_aligner(keys, batch_size=4, num_channels=3, **kwargs):
+    """Aligner with real channels that stored `batch_size` samples per key."""
+    topics = [f"topic{ch}" for ch in range(num_channels)]
+    aligner = Aligner(MagicMock(), topics, **kwargs)
+    for ch in aligner.channels:
+        for key in keys:
+            ch._store(key, np.arange(key, key + batch_size, dtype=np.float32))
+    return aligner
+
+
+def test_extract_with_enough_samples():
+    aligner = make_aligner([0, 4, 8, 12, 16])
 
     result, _ = aligner.extract(8)
 
@@ -44,12 +57,13 @@ def test_extract_with_enough_samples(aligner_with_mock_channels):
     expected = [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]
     assert np.allclose(result[0], expected)
 
-    for acc in accelerometers:
-        acc.clear_used_data.assert_called_once_with(0, 8)
+    # The aligned block keeps its own copy, so the channels free every copied batch
+    for ch in aligner.channels:
+        assert ch.get_sorted_keys() == []
 
 
-def test_extract_too_few_samples_returns_empty(aligner_with_mock_channels):
-    aligner, _ = aligner_with_mock_channels
+def test_extract_too_few_samples_returns_empty():
+    aligner = make_aligner([0, 4, 8, 12, 16])
 
     result, _ = aligner.extract(210)  # more than available it should return empty array, None
     assert result.shape == (0, 3)
@@ -89,24 +103,16 @@ def test_find_continuous_key_groups_returns_none_when_batch_size_none():
     assert key_groups is None
 
 
-def test_extract_skips_initial_and_gaps_until_valid_block(aligner_with_mock_channels):
-    aligner, accelerometers = aligner_with_mock_channels
-
+def test_extract_skips_initial_and_gaps_until_valid_block():
     # Total keys in the system
     partial_keys = [0, 16, 32]  # Only 48 samples — should be ignored
     missing_keys = [48, 64]     # Break continuity
-    valid_keys = [80, 96, 112, 128, 144, 160, 176, 192, 208, 224, 240]  
+    valid_keys = [80, 96, 112, 128, 144, 160, 176, 192, 208, 224, 240]
     all_keys = partial_keys + valid_keys
 
     batch_size = 16
     required_samples = 128
-    required_keys = required_samples // batch_size  # 8
-
-    for acc in accelerometers:
-        acc.get_batch_size.return_value = batch_size
-        acc.get_sorted_keys.return_value = all_keys
-        acc.clear_used_data = MagicMock()
-        acc.get_samples_for_key.side_effect = lambda key: [float(key + i) for i in range(batch_size)]
+    aligner = make_aligner(all_keys, batch_size=batch_size)
 
     # Extract 128 samples
     result, _ = aligner.extract(required_samples)
@@ -120,3 +126,315 @@ def test_extract_skips_initial_and_gaps_until_valid_block(aligner_with_mock_chan
 
     assert np.allclose(actual_values, expected_values), \
         f"Expected starting from 80, got {actual_values[:10]}"
+    assert aligner.channels[0].get_sorted_keys() == []
+
+
+def test_available_samples_tracks_keys_received_by_all_channels():
+    aligner = make_aligner([0, 4, 8])
+    assert aligner.available_samples() == 12
+
+    # A key is only aligned once every channel has stored it
+    aligner.channels[0]._store(12, np.zeros(4, dtype=np.float32))
+    aligner.channels[1]._store(12, np.zeros(4, dtype=np.float32))
+    assert aligner.available_samples() == 12
+    aligner.channels[2]._store(12, np.zeros(4, dtype=np.float32))
+    assert aligner.available_samples() == 16
+
+    aligner.extract(10)
+    assert aligner.available_samples() == 6
+
+
+def test_extract_does_not_rescan_channel_keys():
+    aligner = make_aligner([0, 4, 8, 12])
+    for ch in aligner.channels:
+        ch.get_sorted_keys = MagicMock(side_effect=AssertionError("rescanned keys"))
+
+    result, _ = aligner.extract(16)
+
+    assert result.shape == (3, 16)
+
+
+def test_aligned_batches_are_copied_into_block_as_they_arrive():
+    aligner = make_aligner([0, 4, 8])
+
+    # Copied when the last channel stored each batch, and freed by the channels
+    assert len(aligner._block) == 12
+    assert all(ch.get_sorted_keys() == [] for ch in aligner.channels)
+    for ch in aligner.channels:
+        ch.get_samples_for_key = MagicMock(side_effect=AssertionError("copied at extraction"))
+
+    result, _ = aligner.extract(12)
+
+    assert np.array_equal(result[0], np.arange(12))
+
+
+def test_block_waits_at_gap_until_window_size_is_known():
+    aligner = make_aligner([0, 4, 16, 20, 24])
+
+    # Without a window size the samples before the gap are kept
+    assert aligner._block.start_index == 0
+    assert len(aligner._block) == 8
+    assert np.array_equal(aligner.extract(8)[0][0], np.arange(8))
+    assert np.array_equal(aligner.extract(8)[0][0], np.arange(16, 24))
+
+
+def test_extract_with_ring_buffer_channels():
+    client = MagicMock()
+    aligner = Aligner(client, ["t1", "t2"], accelerometer_cls=RingBufferAccelerometer)
+    assert all(isinstance(ch, RingBufferAccelerometer) for ch in aligner.channels)
+
+    for ch_idx, ch in enumerate(aligner.channels):
+        for key in range(0, 64, 16):
+            ch._store(key, np.arange(16, dtype=np.float32) + ch_idx * 1000 + key)
+
+    result, _ = aligner.extract(40)
+
+    assert result.shape == (2, 40)
+    assert np.allclose(result[0], np.arange(40))
+    assert np.allclose(result[1], np.arange(1000, 1040))
+    assert aligner.channels[0].get_sorted_keys() == []
+
+
+@pytest.mark.parametrize("accelerometer_cls", [Accelerometer, RingBufferAccelerometer])
+def test_consecutive_extracts_continue_aligned_block(accelerometer_cls):
+    aligner = Aligner(MagicMock(), ["t1", "t2"], accelerometer_cls=accelerometer_cls)
+
+    for ch_idx, ch in enumerate(aligner.channels):
+        for key in range(0, 96, 16):
+            ch._store(key, np.arange(16, dtype=np.float32) + ch_idx * 1000 + key)
+
+    first, _ = aligner.extract(40)
+    second, _ = aligner.extract(40)
+    third, _ = aligner.extract(40)
+
+    assert np.array_equal(first[0], np.arange(40))
+    assert np.array_equal(second[1], np.arange(1040, 1080))
+    assert third.shape == (0, 2)
+    # The samples that were not extracted are kept by the aligned block only
+    assert aligner.channels[0].read(100)[1].tolist() == []
+    assert aligner.available_samples() == 16
+
+
+def test_extract_restarts_block_after_gap():
+    aligner = Aligner(MagicMock(), ["t1", "t2"], accelerometer_cls=RingBufferAccelerometer)
+
+    for ch in aligner.channels:
+        for key in (0, 16, 64, 80, 96):
+            ch._store(key, np.arange(key, key + 16, dtype=np.float32))
+
+    result, _ = aligner.extract(48)
+
+    assert np.array_equal(result[0], np.arange(64, 112))
+
+
+def test_wait_for_returns_when_window_is_aligned():
+    aligner = make_aligner([0, 4])
+    assert aligner.wait_for(8, timeout=0)
+    assert not aligner.wait_for(12, timeout=0.01)
+
+    def store_last_batch():
+        for ch in aligner.channels:
+            ch._store(8, np.arange(8, 12, dtype=np.float32))
+
+    timer = threading.Timer(0.05, store_last_batch)
+    timer.start()
+    assert aligner.wait_for(12, timeout=5)
+    timer.join()
+    assert aligner.extract(12)[0].shape == (3, 12)
+
+
+def test_wait_for_counts_a_later_run_after_a_gap():
+    aligner = make_aligner([0])
+    aligner.extract(8)  # Starts the block at key 0, too short for 8
+    for key in (12, 16, 20):
+        for ch in aligner.channels:
+            ch._store(key, np.arange(key, key + 4, dtype=np.float32))
+
+    assert aligner.wait_for(12, timeout=0)
+    assert np.array_equal(aligner.extract(12)[0][0], np.arange(12, 24))
+
+
+def test_window_callback_fires_once_when_window_is_aligned():
+    aligner = make_aligner([0])
+    callback = MagicMock()
+    aligner.add_window_callback(8, callback)
+    callback.assert_not_called()
+
+    for key in (4, 8):
+        for ch in aligner.channels:
+            ch._store(key, np.zeros(4, dtype=np.float32))
+
+    callback.assert_called_once_with()
+
+
+def test_wait_for_async_resolves_from_ingestion_thread():
+    aligner = make_aligner([0])
+
+    async def wait():
+        waiter = asyncio.ensure_future(aligner.wait_for_async(8))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        thread = threading.Thread(target=lambda: [
+            ch._store(4, np.zeros(4, dtype=np.float32)) for ch in aligner.channels])
+        thread.start()
+        await asyncio.wait_for(waiter, timeout=5)
+        thread.join()
+
+    asyncio.run(wait())
+
+
+def test_extract_keeps_batches_not_yet_received_by_every_channel():
+    aligner = make_aligner([0, 4, 8])
+    aligner.channels[0]._store(12, np.arange(12, 16, dtype=np.float32))
+
+    result, _ = aligner.extract(8)
+
+    assert result.shape == (3, 8)
+    assert aligner.channels[0].get_sorted_keys() == [12]
+    assert aligner.channels[1].get_sorted_keys() == []
+    aligner.channels[1]._store(12, np.arange(12, 16, dtype=np.float32))
+    aligner.channels[2]._store(12, np.arange(12, 16, dtype=np.float32))
+    assert np.array_equal(aligner.extract(8)[0][0], np.arange(8, 16))
+
+
+def test_extract_with_hop_returns_overlapping_windows():
+    aligner = make_aligner(range(0, 24, 4))
+
+    first, _ = aligner.extract(12, hop_samples=4)
+    second, _ = aligner.extract(12, hop_samples=4)
+    third, _ = aligner.extract(12, hop_samples=4)
+
+    assert np.array_equal(first[0], np.arange(12))
+    assert np.array_equal(second[0], np.arange(4, 16))
+    assert np.array_equal(third[0], np.arange(8, 20))
+    # The overlap is kept by the aligned block only, not a second time in the channels
+    assert aligner.channels[0].get_sorted_keys() == []
+    assert aligner.available_samples() == 12
+    assert not aligner.wait_for(16, timeout=0)
+
+
+def test_extract_window_reports_start_index():
+    aligner = make_aligner([0, 4, 8, 12, 24, 28, 32])
+
+    windows = [aligner.extract_window(8, hop_samples=4) for _ in range(4)]
+
+    # The gap at 16 restarts the alignment at 24
+    assert [window.start_index for window in windows] == [0, 4, 8, 24]
+
+
+def test_extract_rejects_invalid_hop():
+    aligner = make_aligner([0, 4])
+    with pytest.raises(ValueError):
+        aligner.extract(8, hop_samples=0)
+    with pytest.raises(ValueError):
+        aligner.extract(8, hop_samples=9)
+
+
+def test_fill_policy_bridges_short_gap_with_missing_value():
+    # Key 8 was dropped by every channel
+    aligner = make_aligner([0, 4, 12, 16], gap_policy="fill", max_gap=4, missing_value=-1.0)
+    assert aligner.available_samples() == 20
+
+    window = aligner.extract_window(20)
+
+    assert window.filled_samples == 4
+    assert window.data.shape == (3, 20)
+    assert np.array_equal(window.data[0, 8:12], [-1.0] * 4)
+    assert np.array_equal(window.data[0, 12:], np.arange(12, 20))
+    # Only the 16 stored samples are freed in the channels
+    assert aligner.channels[0].get_sorted_keys() == []
+
+
+def test_interpolate_policy_bridges_gap_linearly():
+    aligner = make_aligner([0, 4, 12, 16], gap_policy="interpolate", max_gap=4)
+    # Key 8 only reached some channels
+    aligner.channels[0]._store(8, np.zeros(4, dtype=np.float32))
+
+    window = aligner.extract_window(20)
+
+    assert window.filled_samples == 4
+    assert np.allclose(window.data[:, :], np.arange(20))
+
+
+def test_gap_longer_than_max_gap_restarts_alignment():
+    aligner = make_aligner([0, 4, 16, 20, 24], gap_policy="fill", max_gap=4)
+
+    window = aligner.extract_window(12)
+
+    assert window.filled_samples == 0
+    assert np.array_equal(window.data[0], np.arange(16, 28))
+
+
+def test_filled_samples_are_counted_per_overlapping_window():
+    aligner = make_aligner([0, 4, 12, 16, 20], gap_policy="fill", max_gap=4)
+
+    first = aligner.extract_window(12, hop_samples=8)
+    second = aligner.extract_window(12, hop_samples=8)
+
+    assert first.filled_samples == 4
+    assert second.filled_samples == 4
+    assert np.isnan(second.data[0, :4]).all()
+    assert np.array_equal(second.data[0, 4:], np.arange(12, 20))
+
+
+def test_invalid_gap_policy_raises():
+    with pytest.raises(ValueError):
+        Aligner(MagicMock(), ["t1"], gap_policy="zero")
+
+
+def test_close_stops_shared_executor_and_subscriptions():
+    client = MagicMock()
+    aligner = Aligner(client, ["t1", "t2", "t1"])
+    assert all(ch.executor is aligner.executor for ch in aligner.channels)
+    assert aligner.channels[0].submit_message(MagicMock(topic="t1", payload=b""))
+
+    aligner.close()
+
+    assert not aligner.channels[1].submit_message(MagicMock(topic="t2", payload=b""))
+    assert aligner.executor.stats()["t1"].pending == 0
+    assert [c.args for c in client.unsubscribe.call_args_list] == [("t1",), ("t2",)]
+
+
+def test_close_leaves_executor_passed_in_running():
+    executor = MagicMock()
+    aligner = Aligner(MagicMock(), ["t1"], executor=executor)
+
+    aligner.close()
+
+    executor.shutdown.assert_not_called()
+
+
+@pytest.mark.parametrize("accelerometer_cls", [Accelerometer, RingBufferAccelerometer])
+def test_reset_drops_buffered_samples_and_restarts_at_new_index(accelerometer_cls):
+    aligner = Aligner(MagicMock(), ["t1", "t2"], accelerometer_cls=accelerometer_cls)
+    for ch in aligner.channels:
+        for key in (1000, 1016, 1032):
+            ch._store(key, np.full(16, -1.0, dtype=np.float32))
+    aligner.extract(16, hop_samples=8)
+
+    aligner.reset()
+
+    assert aligner.available_samples() == 0
+    assert all(ch.get_sorted_keys() == [] for ch in aligner.channels)
+    # The sample index starts over, e.g. after the DAQ restarted at a new rate
+    for ch in aligner.channels:
+        for key in (0, 16):
+            ch._store(key, np.arange(key, key + 16, dtype=np.float32))
+    result, _ = aligner.extract(32)
+    assert np.array_equal(result[0], np.arange(32))
+
+
+def test_batch_cleared_by_reset_before_it_is_indexed_is_skipped():
+    aligner = make_aligner([0], num_channels=2)
+    first = aligner.channels[0]
+    # The batch is stored, then the aligner is reset before the listener runs
+    with patch.object(first, "_listeners", []):
+        first._store(16, np.zeros(16, dtype=np.float32))
+    aligner.reset()
+    aligner._on_batch(0, 16, 16)
+
+    for ch in aligner.channels:
+        ch._store(0, np.arange(16, dtype=np.float32))
+    aligner.channels[1]._store(16, np.arange(16, 32, dtype=np.float32))
+
+    assert aligner.available_samples() == 16
@@ -0,0 +1,60 @@
+import struct
+import pytest
+import numpy as np
+from data.accel.hbk import codec
+
+pytestmark = pytest.mark.unit
+
+
+def test_encode_matches_hbk_layout():
+    payload = codec.encode([1.0, 2.5, -3.0], samples_from_daq_start=96)
+
+    assert len(payload) == codec.DESCRIPTOR_SIZE + 3 * 4
+    assert struct.unpack("<HHQQQ", payload[:28]) == (28, 1, 0, 0, 96)
+    assert struct.unpack("<3f", payload[28:]) == (1.0, 2.5, -3.0)
+
+
+def test_decode_round_trip():
+    samples = np.arange(32, dtype=np.float32) * 0.5
+    payload = codec.encode(samples, 64, metadata_version=2,
+                           seconds_since_epoch=1742400339, nanoseconds=123456789)
+
+    descriptor, decoded = codec.decode(payload)
+
+    assert descriptor == codec.Descriptor(28, 2, 1742400339, 123456789, 64)
+    assert decoded.dtype == np.float32
+    assert np.array_equal(decoded, samples)
+
+
+def test_decode_returns_view_over_payload():
+    payload = bytearray(codec.encode([1.0, 2.0], 0))
+
+    _, decoded = codec.decode(payload)
+    payload[-4:] = struct.pack("<f", 7.0)
+
+    assert decoded[1] == 7.0
+
+
+def test_decode_respects_descriptor_length():
+    descriptor = struct.pack("<HHQQQ", 32, 1, 0, 0, 5) + b"\x00" * 4
+    payload = descriptor + struct.pack("<2f", 1.0, 2.0)
+
+    descriptor, decoded = codec.decode(payload)
+
+    assert descriptor.samples_from_daq_start == 5
+    assert np.array_equal(decoded, [1.0, 2.0])
+
+
+def test_decode_empty_batch():
+    _, decoded = codec.decode(codec.encode([], 0))
+    assert decoded.shape == (0,)
+
+
+def test_decode_short_payload_raises():
+    with pytest.raises(struct.error):
+        codec.decode(b"too short")
+
+
+def test_decode_partial_sample_raises():
+    with pytest.raises(ValueError):
+        codec.decode(codec.encode([1.0], 0) + b"\x00")
@@ -0,0 +1,112 @@
+import struct
+import pytest
+import numpy as np
+from unittest.mock import MagicMock
+from data.accel.hbk.accelerometer import Accelerometer
+from data.accel.hbk.aligner import Aligner
+from data.accel.hbk.router import ChannelRouter
+
+pytestmark = pytest.mark.unit
+
+SUBSCRIPTION = "cpsens/recorded/+/data"
+
+
+class MockMQTTMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def make_mock_payload(start_key: int, num_samples: int = 32) -> bytes:
+    descriptor = struct.pack("<H H Q Q Q", 28, 1, 0, 0, start_key)
+    data = struct.pack(f"<{num_samples}f", *[float(i + start_key) for i in range(num_samples)])
+    return descriptor + data
+
+
+@pytest.fixture
+def mock_mqtt_client():
+    return MagicMock()
+
+
+def make_channel(client, topic):
+    executor = MagicMock()
+    return Accelerometer(client, topic=topic, executor=executor, subscribe=False)
+
+
+def test_router_subscribes_once(mock_mqtt_client):
+    router = ChannelRouter(mock_mqtt_client, SUBSCRIPTION)
+    for ch in range(1, 4):
+        router.add_channel(make_channel(mock_mqtt_client, f"cpsens/recorded/{ch}/data"))
+
+    mock_mqtt_client.subscribe.assert_called_once_with(SUBSCRIPTION, qos=1)
+    mock_mqtt_client.message_callback_add.assert_called_once_with(
+        SUBSCRIPTION, router._on_message)
+    assert router.topics() == [f"cpsens/recorded/{ch}/data" for ch in range(1, 4)]
+
+
+def test_router_routes_messages_by_topic(mock_mqtt_client):
+    router = ChannelRouter(mock_mqtt_client, SUBSCRIPTION)
+    first = make_channel(mock_mqtt_client, "cpsens/recorded/1/data")
+    second = make_channel(mock_mqtt_client, "cpsens/recorded/2/data")
+    router.add_channel(first)
+    router.add_channel(second)
+
+    msg = MockMQTTMessage("cpsens/recorded/2/data", make_mock_payload(0))
+    router._on_message(None, None, msg)
+
+    second.executor.submit.assert_called_once_with(
+        "cpsens/recorded/2/data", second._ingest, msg)
+    first.executor.submit.assert_not_called()
+
+
+def test_router_drops_messages_without_channel(mock_mqtt_client):
+    router = ChannelRouter(mock_mqtt_client, SUBSCRIPTION)
+    channel = make_channel(mock_mqtt_client, "cpsens/recorded/1/data")
+    router.add_channel(channel)
+    assert router.remove_channel("cpsens/recorded/1/data") is channel
+
+    router._on_message(None, None, MockMQTTMessage("cpsens/recorded/1/data", b""))
+
+    assert router.unrouted_messages == 1
+    channel.executor.submit.assert_not_called()
+    mock_mqtt_client.unsubscribe.assert_not_called()
+
+
+def test_router_rejects_uncovered_and_duplicate_topics(mock_mqtt_client):
+    router = ChannelRouter(mock_mqtt_client, SUBSCRIPTION)
+    router.add_channel(make_channel(mock_mqtt_client, "cpsens/recorded/1/data"))
+
+    with pytest.raises(ValueError):
+        router.add_channel(make_channel(mock_mqtt_client, "cpsens/recorded/1/metadata"))
+    with pytest.raises(ValueError):
+        router.add_channel(make_channel(mock_mqtt_client, "cpsens/recorded/1/data"))
+
+
+def test_aligner_with_router_does_not_subscribe_per_topic(mock_mqtt_client):
+    router = ChannelRouter(mock_mqtt_client, SUBSCRIPTION)
+    topics = [f"cpsens/recorded/{ch}/data" for ch in range(1, 3)]
+    aligner = Aligner(mock_mqtt_client, topics, router=router)
+
+    mock_mqtt_client.subscribe.assert_called_once_with(SUBSCRIPTION, qos=1)
+    assert mock_mqtt_client.message_callback_add.call_count == 1
+    assert router.topics() == topics
+
+    for topic in topics:
+        router.get_channel(topic).process_message(MockMQTTMessage(topic, make_mock_payload(0)))
+    result, _ = aligner.extract(32)
+    assert np.array_equal(result[1], np.arange(32))
+
+
+def test_aligner_channels_share_router_executor_shut_down_on_close(mock_mqtt_client):
+    router = ChannelRouter(mock_mqtt_client, SUBSCRIPTION)
+    topics = [f"cpsens/recorded/{ch}/data" for ch in range(1, 3)]
+    aligner = Aligner(mock_mqtt_client, topics, router=router)
+    assert all(ch.executor is router.executor for ch in aligner.channels)
+
+    aligner.close()
+    assert router.topics() == []
+    assert router.executor.submit("cpsens/recorded/1/data", print)
+
+    router.close()
+    assert not router.executor.submit("cpsens/recorded/1/data", print)
+    mock_mqtt_client.unsubscribe.assert_called_once_with(SUBSCRIPTION)
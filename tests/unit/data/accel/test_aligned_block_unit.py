@@ -0,0 +1,64 @@
+import pytest
+import numpy as np
+from data.accel.aligned_block import AlignedBlock
+
+pytestmark = pytest.mark.unit
+
+
+def rows(start, num_samples=4, num_channels=2):
+    return [np.arange(start, start + num_samples, dtype=np.float32) + 100 * ch
+            for ch in range(num_channels)]
+
+
+def test_append_and_window():
+    block = AlignedBlock(2, 64)
+    block.reset(8)
+    block.append(rows(8))
+    block.append(rows(12))
+
+    assert len(block) == 8
+    assert block.start_index == 8
+    assert block.end_index == 16
+    window = block.window(6)
+    assert window.shape == (2, 6)
+    assert window.dtype == np.float32
+    assert np.array_equal(window[1], np.arange(108, 114))
+
+
+def test_advance_moves_start_index():
+    block = AlignedBlock(2, 64)
+    block.reset(0)
+    block.append(rows(0, 8))
+
+    block.advance(5)
+
+    assert len(block) == 3
+    assert block.start_index == 5
+    assert np.array_equal(block.window(3)[0], [5, 6, 7])
+
+
+def test_window_stays_valid_after_growth_and_reset():
+    block = AlignedBlock(2, 1024)
+    block.reset(0)
+    block.append(rows(0))
+    window = block.window(4)
+    block.advance(4)
+
+    for start in range(4, 400, 4):
+        block.append(rows(start))
+    block.reset(1000)
+    block.append(rows(1000))
+
+    assert np.array_equal(window[0], [0, 1, 2, 3])
+    assert np.array_equal(block.window(4)[0], [1000, 1001, 1002, 1003])
+
+
+def test_append_drops_oldest_beyond_max_samples():
+    block = AlignedBlock(2, 6)
+    block.reset(0)
+    block.append(rows(0))
+    block.append(rows(4))
+
+    assert len(block) == 6
+    assert block.start_index == 2
+    assert np.array_equal(block.window(6)[0], np.arange(2, 8))
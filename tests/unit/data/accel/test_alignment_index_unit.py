@@ -0,0 +1,74 @@
+import pytest
+from data.accel.alignment_index import AlignmentIndex
+
+pytestmark = pytest.mark.unit
+
+
+def add_all(index, key, num_channels=2, num_samples=32):
+    for ch in range(num_channels):
+        index.add(ch, key, num_samples)
+
+
+def test_key_is_complete_once_every_channel_reported_it():
+    index = AlignmentIndex(2, 1024)
+    assert not index.add(0, 0, 32)
+    assert index.available(0) == 0
+    assert index.first_run() is None
+
+    assert index.add(1, 0, 32)
+    assert index.available(0) == 32
+    assert index.first_run() == (0, 32)
+    # Reported again, e.g. by a retransmission
+    assert not index.add(1, 0, 32)
+
+
+def test_runs_merge_out_of_order_keys():
+    index = AlignmentIndex(2, 1024)
+    for key in (0, 64, 32):
+        add_all(index, key)
+
+    assert index.first_run() == (0, 96)
+    assert index.available(0) == 96
+    assert index.available(32) == 0
+
+
+def test_gap_splits_runs():
+    index = AlignmentIndex(2, 1024)
+    for key in (0, 32, 96, 128):
+        add_all(index, key)
+    index.add(0, 64, 32)
+
+    assert index.first_run() == (0, 64)
+    assert index.available(96) == 64
+
+
+def test_pop_advances_run_start():
+    index = AlignmentIndex(2, 1024)
+    for key in (0, 32):
+        add_all(index, key)
+
+    assert index.pop(32) is None
+    assert index.pop(0) == 32
+    assert index.available(32) == 32
+    assert index.pop(32) == 32
+    assert index.first_run() is None
+
+
+def test_discard_before_drops_old_and_late_keys():
+    index = AlignmentIndex(2, 1024)
+    index.add(0, 0, 32)
+    for key in (32, 64):
+        add_all(index, key)
+
+    index.discard_before(64)
+    add_all(index, 0)
+
+    assert index.first_run() == (64, 96)
+
+
+def test_keys_older_than_max_samples_are_dropped():
+    index = AlignmentIndex(2, 64)
+    for key in (0, 32, 64):
+        add_all(index, key)
+
+    assert index.first_run() == (32, 96)
@@ -0,0 +1,150 @@
+import threading
+import pytest
+from data.accel.ingestion import IngestionExecutor
+
+pytestmark = pytest.mark.unit
+
+
+def test_messages_of_a_channel_are_processed_in_order():
+    executor = IngestionExecutor(num_workers=2)
+    processed = {"a": [], "b": []}
+
+    for i in range(100):
+        executor.submit("a", processed["a"].append, i)
+        executor.submit("b", processed["b"].append, i)
+    executor.shutdown(wait=True)
+
+    assert processed["a"] == list(range(100))
+    assert processed["b"] == list(range(100))
+    stats = executor.stats()
+    assert stats["a"].processed == 100 and stats["a"].pending == 0
+    assert executor.queue_depth() == 0
+
+
+def test_full_queue_drops_and_counts_messages():
+    executor = IngestionExecutor(num_workers=1, max_queue_size=2)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(timeout=2)
+
+    assert executor.submit("a", block)
+    started.wait(timeout=2)
+    assert executor.submit("a", lambda: None)
+    assert executor.submit("a", lambda: None)
+    assert not executor.submit("a", lambda: None)
+
+    assert executor.queue_depth() == 2
+    stats = executor.stats()["a"]
+    assert stats.dropped == 1
+    assert stats.pending == 3
+
+    release.set()
+    executor.shutdown(wait=True)
+    stats = executor.stats()["a"]
+    assert stats.processed == 3
+    assert stats.pending == 0
+
+
+def test_submit_after_shutdown_is_dropped():
+    executor = IngestionExecutor(name="closed")
+    results = []
+    executor.submit("a", results.append, 1)
+    executor.shutdown(wait=True)
+
+    assert not executor.submit("a", results.append, 2)
+
+    assert results == [1]
+    assert not any(thread.name.startswith("closed-") for thread in threading.enumerate())
+    assert executor.stats()["a"].dropped == 1
+    assert executor.stats()["a"].pending == 0
+
+
+def test_submit_racing_shutdown_is_processed_before_workers_stop():
+    executor = IngestionExecutor()
+    results = []
+    executor.submit("a", results.append, 1)
+    work_queue = executor._queues[0]
+    put_nowait = work_queue.put_nowait
+    entered, proceed = threading.Event(), threading.Event()
+
+    def slow_put(item):
+        entered.set()
+        proceed.wait(timeout=2)
+        put_nowait(item)
+
+    # The racing submit passes the closed check, then stalls before its put
+    work_queue.put_nowait = slow_put
+    racing = threading.Thread(target=executor.submit, args=("a", results.append, 2))
+    racing.start()
+    entered.wait(timeout=2)
+    stopping = threading.Thread(target=executor.shutdown)
+    stopping.start()
+    while not executor._closed:
+        threading.Event().wait(0.001)
+
+    proceed.set()
+    racing.join(timeout=2)
+    stopping.join(timeout=2)
+
+    assert not stopping.is_alive()
+    assert results == [1, 2]
+    stats = executor.stats()["a"]
+    assert stats.processed == 2 and stats.pending == 0
+    assert executor.queue_depth() == 0
+
+
+def test_concurrent_submits_are_processed_or_dropped_after_shutdown():
+    executor = IngestionExecutor(num_workers=2)
+    start = threading.Barrier(5)
+
+    def submit_many(channel):
+        start.wait()
+        for i in range(200):
+            executor.submit(channel, lambda: None)
+
+    submitters = [threading.Thread(target=submit_many, args=(c,)) for c in "abcd"]
+    for thread in submitters:
+        thread.start()
+    start.wait()
+    executor.shutdown(wait=True)
+    for thread in submitters:
+        thread.join()
+
+    assert executor.queue_depth() == 0
+    assert all(stats.pending == 0 for stats in executor.stats().values())
+
+
+def test_failing_message_does_not_stop_worker(capsys):
+    executor = IngestionExecutor()
+    results = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    executor.submit("a", fail)
+    executor.submit("a", results.append, 1)
+    executor.shutdown(wait=True)
+
+    assert results == [1]
+    assert executor.stats()["a"].failed == 1
+    assert "Error processing message: boom" in capsys.readouterr().out
+
+
+def test_channels_are_spread_over_workers():
+    executor = IngestionExecutor(num_workers=2)
+    threads = {}
+
+    for channel in ["a", "b"]:
+        executor.submit(channel,
+                        lambda c=channel: threads.setdefault(c, threading.current_thread().name))
+    executor.shutdown(wait=True)
+
+    assert threads["a"] != threads["b"]
+
+
+def test_invalid_worker_count_raises():
+    with pytest.raises(ValueError):
+        IngestionExecutor(num_workers=0)
@@ -0,0 +1,103 @@
+import json
+import threading
+import pytest
+from unittest.mock import MagicMock
+from data.accel.metadata import MetadataService, sampling_frequency
+
+pytestmark = pytest.mark.unit
+
+TOPIC = "cpsens/recorded/1/metadata"
+
+
+class MockMQTTMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def metadata_message(fs, topic=TOPIC):
+    return MockMQTTMessage(topic, json.dumps({"Analysis chain": [{"Sampling": fs}]}).encode())
+
+
+def test_sampling_frequency():
+    assert sampling_frequency({"Analysis chain": [{"Sampling": 512}]}) == 512
+    assert sampling_frequency({"Analysis chain": []}) is None
+    assert sampling_frequency({}) is None
+
+
+def test_service_subscribes_on_given_client():
+    client = MagicMock()
+    service = MetadataService(client, TOPIC, cache_file=None)
+
+    client.subscribe.assert_called_once_with(TOPIC, qos=1)
+    client.message_callback_add.assert_called_once_with(TOPIC, service._on_message)
+    assert service.get_fs() is None
+
+
+def test_service_subscribes_again_on_reconnect():
+    client = MagicMock()
+    client_on_connect = client.on_connect
+    service = MetadataService(client, TOPIC, cache_file=None)
+    client.subscribe.reset_mock()
+
+    client.on_connect(client, None, {}, 0, None)
+
+    client_on_connect.assert_called_once_with(client, None, {}, 0, None)
+    client.subscribe.assert_called_once_with(TOPIC, qos=1)
+    client.on_connect(client, None, {}, 5, None)
+    client.subscribe.assert_called_once()
+    service.close()
+    assert client.on_connect is client_on_connect
+
+
+def test_service_updates_fs_live_and_notifies_listeners():
+    service = MetadataService(MagicMock(), TOPIC, cache_file=None)
+    listener = MagicMock()
+    service.add_listener(listener)
+
+    service._on_message(None, None, metadata_message(512))
+    service._on_message(None, None, metadata_message(512))
+    service._on_message(None, None, metadata_message(1024))
+
+    assert service.get_fs() == 1024
+    assert [c.args for c in listener.call_args_list] == [(TOPIC, 512), (TOPIC, 1024)]
+
+
+def test_service_waits_for_first_metadata():
+    service = MetadataService(MagicMock(), TOPIC, cache_file=None)
+    timer = threading.Timer(0.05, service._on_message, (None, None, metadata_message(256)))
+    timer.start()
+
+    assert service.get_fs(timeout=2) == 256
+    timer.join()
+
+
+def test_warm_start_reads_the_cache(tmp_path):
+    cache = tmp_path / "cache" / "metadata.json"
+    first = MetadataService(MagicMock(), TOPIC, cache_file=str(cache))
+    first._on_message(None, None, metadata_message(512))
+
+    second = MetadataService(MagicMock(), TOPIC, cache_file=str(cache))
+
+    assert second.get_fs() == 512
+    assert second.metadata() == {"Analysis chain": [{"Sampling": 512}]}
+
+
+def test_cache_is_keyed_by_topic():
+    service = MetadataService(MagicMock(), "cpsens/recorded/+/metadata", cache_file=None)
+    service._on_message(None, None, metadata_message(512, "cpsens/recorded/1/metadata"))
+    service._on_message(None, None, metadata_message(256, "cpsens/recorded/2/metadata"))
+
+    assert service.get_fs("cpsens/recorded/1/metadata") == 512
+    assert service.get_fs("cpsens/recorded/2/metadata") == 256
+    assert service.get_fs() == 256
+
+
+def test_invalid_cache_and_messages_are_ignored(tmp_path):
+    cache = tmp_path / "metadata.json"
+    cache.write_text("not json")
+    service = MetadataService(MagicMock(), TOPIC, cache_file=str(cache))
+
+    service._on_message(None, None, MockMQTTMessage(TOPIC, b"\xff"))
+
+    assert service.get_fs() is None
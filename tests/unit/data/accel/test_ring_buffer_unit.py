@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+from data.accel.ring_buffer import SampleRingBuffer
+
+pytestmark = pytest.mark.unit
+
+
+def batch(key, num_samples=32):
+    return np.arange(key, key + num_samples, dtype=np.float32)
+
+
+def test_write_and_get_batches():
+    buffer = SampleRingBuffer(128)
+    for key in (0, 32, 64):
+        assert buffer.write(key, batch(key))
+
+    assert buffer.keys() == [0, 32, 64]
+    assert len(buffer) == 96
+    assert buffer.first_batch_size() == 32
+    assert np.array_equal(buffer.get(32), batch(32))
+    assert buffer.get(16) is None
+
+
+def test_write_ignores_duplicate_and_overlapping_batches():
+    buffer = SampleRingBuffer(128)
+    buffer.write(0, batch(0))
+
+    assert not buffer.write(0, batch(0))
+    assert not buffer.write(16, batch(16))
+    assert buffer.keys() == [0]
+
+
+def test_write_out_of_order_keeps_keys_sorted():
+    buffer = SampleRingBuffer(128)
+    buffer.write(64, batch(64))
+    buffer.write(0, batch(0))
+    buffer.write(32, batch(32))
+
+    assert buffer.keys() == [0, 32, 64]
+    assert np.array_equal(buffer.read(96), np.arange(96))
+
+
+def test_write_evicts_oldest_samples_when_full():
+    buffer = SampleRingBuffer(64)
+    for key in (0, 32, 64):
+        buffer.write(key, batch(key))
+
+    assert buffer.keys() == [32, 64]
+    assert len(buffer) == 64
+    # Stale batches older than the retained span are dropped
+    assert not buffer.write(0, batch(0))
+
+
+def test_write_trims_partially_evicted_batch():
+    buffer = SampleRingBuffer(48)
+    buffer.write(0, batch(0))
+    buffer.write(32, batch(32))
+
+    assert buffer.keys() == [0, 32]
+    assert np.array_equal(buffer.get(0), np.arange(16, 32))
+    assert len(buffer) == 48
+
+
+def test_read_across_wrap_around():
+    buffer = SampleRingBuffer(80)
+    for key in range(0, 160, 32):
+        buffer.write(key, batch(key))
+
+    assert buffer.keys() == [64, 96, 128]
+    assert np.array_equal(buffer.get(64), np.arange(80, 96))
+    data = buffer.read(50)
+    assert np.array_equal(data, np.arange(80, 130))
+    assert buffer.keys() == [128]
+    assert len(buffer) == 30
+
+
+def test_consume_drops_older_keys_and_used_samples():
+    buffer = SampleRingBuffer(128)
+    for key in (0, 32, 64):
+        buffer.write(key, batch(key))
+
+    buffer.consume(32, 50)
+
+    assert buffer.keys() == [64]
+    assert np.array_equal(buffer.get(64), np.arange(82, 96))
+    assert len(buffer) == 14
+
+
+def test_read_more_than_available_returns_partial():
+    buffer = SampleRingBuffer(128)
+    buffer.write(0, batch(0))
+
+    data = buffer.read(100)
+
+    assert data.shape == (32,)
+    assert data.dtype == np.float32
+    assert len(buffer) == 0
+    assert buffer.read(10).shape == (0,)
+
+
+def test_invalid_capacity_raises():
+    with pytest.raises(ValueError):
+        SampleRingBuffer(0)
@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+from methods.packages.pyoma import genWrapper as gen
+
+pytestmark = pytest.mark.unit
+
+
+def sc_apply_reference(Fn, Xi, Phi, ordmin, ordmax, step, err_fn, err_xi, err_phi):
+    """Per-pole labelling, as SC_apply did before it was vectorized."""
+    Lab = np.zeros(Fn.shape, dtype="int")
+    for oo in range(ordmin, ordmax + 1, step):
+        o = int(oo / step)
+        if o == 0:
+            continue
+        f_n1 = Fn[:, o - 1]
+        for i in range(Fn.shape[0]):
+            try:
+                idx = np.nanargmin(np.abs(f_n1 - Fn[i, o]))
+            except ValueError:
+                continue
+            cond1 = np.abs(Fn[i, o] - f_n1[idx]) / Fn[i, o]
+            cond2 = np.abs(Xi[i, o] - Xi[idx, o - 1]) / Xi[i, o]
+            cond3 = 1 - gen.MAC(Phi[i, o, :], Phi[idx, o - 1, :])
+            Lab[i, o] = int(cond1 < err_fn and cond2 < err_xi and cond3 < err_phi)
+    return Lab
+
+
+def make_poles(ordmax, n_locations=4, seed=0):
+    rng = np.random.default_rng(seed)
+    n_orders = ordmax + 1
+    base_f = np.sort(rng.uniform(1, 40, ordmax))
+    Fn = base_f[:, None] * (1 + rng.normal(0, 0.004, (ordmax, n_orders)))
+    Xi = 0.02 * (1 + rng.normal(0, 0.02, (ordmax, n_orders)))
+    base_phi = rng.normal(size=(ordmax, n_locations)) + 1j * rng.normal(size=(ordmax, n_locations))
+    Phi = base_phi[:, None, :] + 0.05 * rng.normal(size=(ordmax, n_orders, n_locations))
+    # Poles removed by the hard criteria, a whole order without poles,
+    # and duplicated frequencies to exercise ties
+    mask = rng.random((ordmax, n_orders)) < 0.3
+    Fn[mask], Xi[mask] = np.nan, np.nan
+    Phi[mask] = np.nan
+    Fn[:, 5] = np.nan
+    Fn[3, 7] = Fn[4, 7] = Fn[3, 8]
+    return Fn, Xi, Phi
+
+
+@pytest.mark.parametrize("ordmax", [10, 20, 40])
+def test_sc_apply_matches_per_pole_labelling(ordmax):
+    Fn, Xi, Phi = make_poles(ordmax)
+    for errors in [(0.01, 0.05, 0.03), (0.001, 0.01, 0.001), (0.1, 0.5, 0.5)]:
+        expected = sc_apply_reference(Fn, Xi, Phi, 0, ordmax, 1, *errors)
+        labels = gen.SC_apply(Fn, Xi, Phi, 0, ordmax, 1, *errors)
+        assert labels.dtype == expected.dtype
+        assert np.array_equal(labels, expected)
+
+
+def test_sc_apply_marks_consistent_poles_stable():
+    Fn = np.array([[10.0, 10.0, 10.01], [20.0, 25.0, np.nan]])
+    Xi = np.full(Fn.shape, 0.02)
+    Phi = np.ones((2, 3, 2), dtype=complex)
+
+    labels = gen.SC_apply(Fn, Xi, Phi, 0, 2, 1, 0.01, 0.05, 0.03)
+
+    assert labels.tolist() == [[0, 1, 1], [0, 0, 0]]
@@ -0,0 +1,259 @@
+# pylint: disable=invalid-name
+import logging
+from importlib.metadata import version
+import pytest
+import numpy as np
+from pyoma2.algorithms.data.run_params import SSIRunParams
+from pyoma2.functions import ssi
+from methods.packages.pyoma.ssiWrapper import (
+    SSI_POLES_PYOMA_VERSION, SSI_poles_parallel, SSIcovStream, SSIWrapperRunParams,
+    _POLE_POOLS, cheapest_uncertainty, hankel_svd, shutdown_pole_pools, ssi_from_hankel,
+    uncertainty_tier)
+
+pytestmark = pytest.mark.unit
+
+WINDOW = 1200
+BR = 8
+NB = 10
+
+
+@pytest.fixture(autouse=True)
+def quiet_pyoma():
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def make_stream(n_samples, n_channels=3, seed=0):
+    """Two lightly damped modes seen by all channels, plus noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples) / 100
+    modes = np.vstack([np.sin(2 * np.pi * 3.1 * t), np.sin(2 * np.pi * 7.4 * t + 1)])
+    shapes = rng.normal(size=(n_channels, 2))
+    return shapes @ modes + 0.1 * rng.normal(size=(n_channels, n_samples))
+
+
+def batch_hankel(window, calc_unc=False):
+    return ssi.build_hank(Y=window, Yref=window, br=BR, method="cov_mm", calc_unc=calc_unc, nb=NB)
+
+
+def stream_hankel(estimator):
+    # pylint: disable=protected-access
+    return estimator._sums / estimator._N
+
+
+@pytest.mark.parametrize("chunk", [1, 37, 500, 5000])
+def test_stream_hankel_matches_batch(chunk):
+    data = make_stream(5000)
+    estimator = SSIcovStream(WINDOW, 100, br=BR, ordmax=10)
+    for start in range(0, data.shape[1], chunk):
+        estimator.push(data[:, start:start + chunk])
+
+    H, _ = batch_hankel(data[:, -WINDOW:])
+    assert estimator.samples_seen == 5000
+    assert np.allclose(stream_hankel(estimator), H, rtol=1e-10, atol=1e-12)
+
+
+def test_stream_run_matches_batch_with_aligned_segments():
+    data = make_stream(3000)
+    estimator = SSIcovStream(WINDOW, 100, br=BR, ordmax=10, calc_unc=True, nb=NB)
+    segment = (WINDOW - 2 * BR - 1) // NB
+    estimator.push(data[:, :WINDOW])
+    estimator.push(data[:, WINDOW:WINDOW + 3 * segment])
+    end = WINDOW + 3 * segment
+
+    result = estimator.run()
+
+    H, T = batch_hankel(data[:, end - WINDOW:end], calc_unc=True)
+    expected = ssi_from_hankel(H, T, SSIRunParams(br=BR, ordmax=10, calc_unc=True, nb=NB), 0.01)
+    assert np.allclose(result.Fn_poles, expected.Fn_poles, equal_nan=True)
+    assert np.allclose(result.Fn_poles_cov, expected.Fn_poles_cov, rtol=1e-6, equal_nan=True)
+    assert np.array_equal(result.Lab, expected.Lab)
+
+
+def test_stream_uncertainty_uses_complete_segments_in_window():
+    estimator = SSIcovStream(WINDOW, 100, br=BR, ordmax=10, calc_unc=True, nb=NB)
+    estimator.push(make_stream(WINDOW + 50))
+
+    # pylint: disable=protected-access
+    T = estimator._uncertainty(stream_hankel(estimator))
+    assert T.shape[1] == NB - 1
+
+
+def test_run_before_window_is_full():
+    estimator = SSIcovStream(WINDOW, 100, br=BR, ordmax=10)
+    estimator.push(make_stream(WINDOW - 1))
+    assert not estimator.ready
+    with pytest.raises(ValueError):
+        estimator.run()
+
+
+def test_window_too_short_for_block_rows():
+    with pytest.raises(ValueError):
+        SSIcovStream(2 * BR + 2, 100, br=BR, ordmax=10)
+
+
+def test_update_window_only_pushes_new_samples():
+    data = make_stream(4000)
+    estimator = SSIcovStream(WINDOW, 100, br=BR, ordmax=10)
+    for start in (100, 400, 700):
+        estimator.update_window(data[:, start:start + WINDOW], start)
+
+    assert estimator.samples_seen == 700 + WINDOW - 100
+    H, _ = batch_hankel(data[:, 700:700 + WINDOW])
+    assert np.allclose(stream_hankel(estimator), H, rtol=1e-10, atol=1e-12)
+
+
+def test_update_window_restarts_after_gap():
+    data = make_stream(4000)
+    estimator = SSIcovStream(WINDOW, 100, br=BR, ordmax=10)
+    estimator.update_window(data[:, :WINDOW], 0)
+    estimator.update_window(data[:, 2500:2500 + WINDOW], 2500)
+
+    assert estimator.samples_seen == WINDOW
+    H, _ = batch_hankel(data[:, 2500:2500 + WINDOW])
+    assert np.allclose(stream_hankel(estimator), H, rtol=1e-10, atol=1e-12)
+
+
+# Starting the worker processes imports numpy and pyOMA-2 in each of them
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize("calc_unc", [False, True])
+def test_parallel_pole_extraction_matches_serial(calc_unc):
+    data = make_stream(3000)
+    H, T = ssi.build_hank(Y=data, Yref=data, br=BR, method="cov_mm", calc_unc=calc_unc, nb=NB)
+    ordmax = 12
+    Obs, A, C, Q1, Q2, Q3, Q4 = ssi.SSI_fast(H, BR, ordmax, calc_unc=calc_unc, T=T, nb=NB)
+    unc = {"calc_unc": calc_unc, "Q1": Q1, "Q2": Q2, "Q3": Q3, "Q4": Q4}
+
+    expected = ssi.SSI_poles(Obs, A, C, ordmax, 0.01, **unc)
+    result = SSI_poles_parallel(2, min_order=0)(Obs, A, C, ordmax, 0.01, **unc)
+
+    for res, exp in zip(result, expected):
+        if exp is None:
+            assert res is None
+        else:
+            assert np.array_equal(res, exp, equal_nan=True)
+
+
+@pytest.mark.timeout(30)
+def test_pole_pools_start_from_min_order_and_shut_down():
+    data = make_stream(3000)
+    H, _ = ssi.build_hank(Y=data, Yref=data, br=BR, method="cov_mm", calc_unc=False)
+    Obs, A, C, *_ = ssi.SSI_fast(H, BR, 12)
+    shutdown_pole_pools()
+
+    SSI_poles_parallel(2, min_order=13)(Obs, A, C, 12, 0.01)
+    assert not _POLE_POOLS
+
+    SSI_poles_parallel(2, min_order=12)(Obs, A, C, 12, 0.01)
+    pool = _POLE_POOLS[2]
+    shutdown_pole_pools()
+    assert not _POLE_POOLS
+    with pytest.raises(RuntimeError):
+        pool.submit(int)
+
+
+def test_serial_pole_extraction_matches_installed_pyoma_with_uncertainty():
+    # The order loop is copied from ssi.SSI_poles, so an upgraded pyOMA-2 must be re-checked
+    assert version("pyOMA-2") == SSI_POLES_PYOMA_VERSION
+    data = make_stream(3000)
+    H, T = ssi.build_hank(Y=data, Yref=data, br=BR, method="cov_mm", calc_unc=True, nb=NB)
+    ordmax = 12
+    Obs, A, C, Q1, Q2, Q3, Q4 = ssi.SSI_fast(H, BR, ordmax, calc_unc=True, T=T, nb=NB)
+    unc = {"calc_unc": True, "Q1": Q1, "Q2": Q2, "Q3": Q3, "Q4": Q4}
+
+    expected = ssi.SSI_poles(Obs, A, C, ordmax, 0.01, **unc)
+    result = SSI_poles_parallel(1)(Obs, A, C, ordmax, 0.01, **unc)
+
+    for res, exp in zip(result, expected):
+        assert np.array_equal(res, exp, equal_nan=True)
+
+
+@pytest.mark.timeout(30)
+def test_ssi_from_hankel_with_pole_workers():
+    data = make_stream(3000)
+    H, T = batch_hankel(data, calc_unc=True)
+    params = {"br": BR, "ordmax": 12, "calc_unc": True, "nb": NB}
+
+    serial = ssi_from_hankel(H, T, SSIWrapperRunParams(**params), 0.01)
+    parallel = ssi_from_hankel(H, T, SSIWrapperRunParams(pole_workers=2, **params), 0.01)
+
+    assert np.array_equal(parallel.Fn_poles, serial.Fn_poles, equal_nan=True)
+    assert np.array_equal(parallel.Fn_poles_cov, serial.Fn_poles_cov, equal_nan=True)
+    assert np.array_equal(parallel.Lab, serial.Lab)
+
+
+@pytest.mark.parametrize("method", ["full", "truncated", "randomized"])
+def test_hankel_svd_matches_leading_singular_values(method):
+    H, _ = batch_hankel(make_stream(3000, n_channels=4))
+    exact = np.linalg.svd(H, compute_uv=False)
+
+    U, S, Vt = hankel_svd(H, 6, method)
+
+    assert U.shape == (H.shape[0], 6) and Vt.shape == (6, H.shape[1])
+    # Two modes give four dominant singular values above the noise
+    assert np.allclose(S[:4], exact[:4], rtol=1e-6)
+    assert np.allclose(S, exact[:6], rtol=5e-2)
+    assert np.allclose(U.T @ U, np.eye(6), atol=1e-8)
+
+
+def test_hankel_svd_rejects_unknown_method():
+    H, _ = batch_hankel(make_stream(3000))
+    with pytest.raises(ValueError):
+        hankel_svd(H, 4, "qr")
+
+
+@pytest.mark.parametrize("svd", ["truncated", "randomized"])
+def test_ssi_from_hankel_with_truncated_svd(svd):
+    data = make_stream(3000)
+    H, T = batch_hankel(data)
+    params = {"br": BR, "ordmax": 12}
+
+    exact = ssi_from_hankel(H, T, SSIWrapperRunParams(**params), 0.01)
+    result = ssi_from_hankel(H, T, SSIWrapperRunParams(svd=svd, **params), 0.01)
+
+    # The low orders only use the dominant subspace, which every method recovers
+    assert np.allclose(result.Fn_poles[:, :9], exact.Fn_poles[:, :9], rtol=1e-4, equal_nan=True)
+
+
+def test_uncertainty_tier_follows_calc_unc_unless_set():
+    assert uncertainty_tier(SSIWrapperRunParams(br=BR)) == "none"
+    assert uncertainty_tier(SSIWrapperRunParams(br=BR, calc_unc=True)) == "full"
+    assert uncertainty_tier(SSIWrapperRunParams(br=BR, calc_unc=True, unc="none")) == "none"
+
+
+@pytest.mark.parametrize("covariances, tier", [
+    ((), "none"),
+    (("Fn_poles_cov",), "full"),
+    (("Fn_poles_cov", "Xi_poles_cov"), "full"),
+    (("Xi_poles_cov", "Phi_poles_cov"), "full"),
+])
+def test_cheapest_uncertainty(covariances, tier):
+    assert cheapest_uncertainty(covariances) == tier
+
+
+def test_cheapest_uncertainty_rejects_unknown_field():
+    with pytest.raises(ValueError):
+        cheapest_uncertainty(["Fn_cov"])
+
+
+def test_full_tier_matches_pyoma_and_none_skips_covariances():
+    data = make_stream(3000)
+    H, T = batch_hankel(data, calc_unc=True)
+    params = {"br": BR, "ordmax": 12, "nb": NB}
+
+    full = ssi_from_hankel(H, T, SSIWrapperRunParams(unc="full", **params), 0.01)
+    none = ssi_from_hankel(H, None, SSIWrapperRunParams(unc="none", **params), 0.01)
+
+    Obs, A, C, Q1, Q2, Q3, Q4 = ssi.SSI_fast(H, BR, 12, calc_unc=True, T=T, nb=T.shape[1])
+    Fns, _, _, _, Fn_cov, Xi_cov, Phi_cov = ssi.SSI_poles(
+        Obs, A, C, 12, 0.01, calc_unc=True, Q1=Q1, Q2=Q2, Q3=Q3, Q4=Q4)
+    # Equal except for the poles removed by the hard criteria
+    kept = ~np.isnan(full.Fn_poles)
+    assert np.array_equal(full.Fn_poles[kept], Fns[kept])
+    assert np.array_equal(full.Fn_poles_cov[kept], Fn_cov[kept])
+    assert np.array_equal(full.Xi_poles_cov[kept], Xi_cov[kept])
+    # pyOMA-2 does not propagate the uncertainty to the mode shapes
+    assert np.isnan(Phi_cov).all() and np.isnan(full.Phi_poles_cov).all()
+    assert none.Fn_poles_cov is None and none.Xi_poles_cov is None
+    assert np.array_equal(none.Lab, full.Lab)
@@ -0,0 +1,76 @@
+# pylint: disable=invalid-name
+import pytest
+import numpy as np
+from methods.packages.cluster_set import ClusterSet
+from methods.packages.mode_track import clean_clusters_by_median
+
+pytestmark = pytest.mark.unit
+
+
+def make_clusters():
+    """Three clusters in the format of cluster_frequencies; the first has a repeated frequency."""
+    def cluster(ip_index, f_values, first_row=0):
+        f_values = np.array(f_values)
+        indices = np.column_stack((np.arange(len(f_values)) + first_row, np.arange(len(f_values))))
+        return {"ip_index": ip_index, "confidence_interval": (f_values.min(), f_values.max(), 0.0, 1.0),
+                "indices": indices, "f_values": f_values, "z_values": f_values / 100}
+    return [cluster(0, [2.02, 2.00, 2.02, 2.01]), cluster(1, [5.0]), cluster(2, [2.00, 2.01, 2.02], 2)]
+
+
+def test_from_clusters_views_match_dicts():
+    clusters = make_clusters()
+
+    cluster_set = ClusterSet.from_clusters(clusters)
+
+    assert len(cluster_set) == 3
+    assert np.array_equal(cluster_set.sizes, [4, 1, 3])
+    for view, cluster in zip(cluster_set, clusters):
+        assert view.ip_index == cluster["ip_index"]
+        assert view.confidence_interval == cluster["confidence_interval"]
+        assert np.array_equal(view.indices, cluster["indices"])
+        assert np.array_equal(view.f_values, cluster["f_values"])
+    assert cluster_set[-1].ip_index == 2
+    with pytest.raises(IndexError):
+        cluster_set[3]  # pylint: disable=pointless-statement
+
+
+def test_unique_poles_and_medians_match_numpy_per_cluster():
+    clusters = make_clusters()
+
+    cluster_set = ClusterSet.from_clusters(clusters).unique_poles()
+
+    for view, cluster in zip(cluster_set, clusters):
+        f_unique, first = np.unique(cluster["f_values"], return_index=True)
+        assert np.array_equal(view.f_values, f_unique)
+        assert np.array_equal(view.indices, cluster["indices"][first])
+    assert np.array_equal(cluster_set.medians(), [np.median(np.unique(c["f_values"])) for c in clusters])
+
+
+def test_take_and_first_of_duplicates():
+    cluster_set = ClusterSet.from_clusters(make_clusters()).unique_poles()
+
+    # The first and the last cluster have the same frequencies after removing the repeated one
+    assert np.array_equal(cluster_set.first_of_duplicates(), [True, True, False])
+    reordered = cluster_set.take(np.array([2, 0]))
+    assert np.array_equal(reordered.ip_index, [2, 0])
+    assert np.array_equal(reordered[0].indices, [[2, 0], [3, 1], [4, 2]])
+    assert len(cluster_set.take(cluster_set.sizes > 1)) == 2
+
+
+def test_clean_clusters_by_median_drops_poles_away_from_median():
+    clusters = make_clusters()
+    clusters[0]["indices"] = np.vstack([clusters[0]["indices"], [4, 3]])
+    clusters[0]["f_values"] = np.append(clusters[0]["f_values"], 2.10)
+    clusters[0]["z_values"] = np.append(clusters[0]["z_values"], 0.021)
+    cov_freq = np.full((5, 4), 0.02 ** 2)  # Bounds of +-0.04 Hz around each pole
+
+    cleaned = clean_clusters_by_median(clusters, cov_freq)
+
+    # The one-pole cluster is dropped, and so is the pole at 2.10 Hz, away from the median of 2.015 Hz
+    assert [c["original_cluster"]["ip_index"] for c in cleaned] == [0, 2]
+    assert cleaned[0]["original_cluster"] is clusters[0]
+    assert np.array_equal(clusters[0]["f_values"], [2.00, 2.01, 2.02, 2.10])
+    assert np.array_equal(cleaned[0]["f_values"], [2.00, 2.01, 2.02])
+    assert np.array_equal(cleaned[0]["indices"], [[1, 1], [3, 3], [0, 0]])
+    assert cleaned[0]["median"] == pytest.approx(2.015)
+    assert "mode_shapes" not in cleaned[0]
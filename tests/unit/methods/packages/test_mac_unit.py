@@ -0,0 +1,83 @@
+# pylint: disable=invalid-name
+import pytest
+import numpy as np
+from methods.packages import mac
+from methods.packages.mode_pairs import MAC_calculate
+from methods.packages.mode_track import calculate_mac
+from methods.packages.pyoma import genWrapper as gen
+
+pytestmark = pytest.mark.unit
+
+
+def pair_mac(x, a):
+    return np.real(np.abs(np.vdot(x, a)) ** 2 / (np.vdot(x, x) * np.vdot(a, a)))
+
+
+def make_stack(n_modes, n_locations=6, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n_modes, n_locations)) + 1j * rng.normal(size=(n_modes, n_locations))
+
+
+def test_mac_matrix_matches_pairwise():
+    phi_X, phi_A = make_stack(7), make_stack(5, seed=1)
+    expected = np.array([[pair_mac(x, a) for a in phi_A] for x in phi_X])
+    result = mac.mac_matrix(phi_X, phi_A)
+    assert result.shape == (7, 5)
+    assert result.dtype == np.float64
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+
+
+def test_mac_matrix_identical_and_scaled_shapes():
+    phi = make_stack(4)
+    result = mac.mac_matrix(phi, (2 - 3j) * phi)
+    np.testing.assert_allclose(np.diag(result), 1.0)
+    assert np.all(result <= 1 + 1e-12)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 100])
+def test_mac_matrix_chunking(chunk_size):
+    phi_X, phi_A = make_stack(7), make_stack(5, seed=1)
+    np.testing.assert_allclose(mac.mac_matrix(phi_X, phi_A, chunk_size=chunk_size),
+                               mac.mac_matrix(phi_X, phi_A), rtol=1e-12)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.complex64])
+def test_mac_matrix_single_precision(dtype):
+    phi_X, phi_A = make_stack(7), make_stack(5, seed=1)
+    result = mac.mac_matrix(phi_X, phi_A, dtype=dtype)
+    # Complex mode shapes stay complex with a real precision
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, mac.mac_matrix(phi_X, phi_A), atol=1e-5)
+
+
+def test_mac_matrix_precomputed_norms():
+    phi_X, phi_A = make_stack(7), make_stack(5, seed=1)
+    result = mac.mac_matrix(phi_X, phi_A, norms_X=mac.mode_norms(phi_X),
+                            norms_A=mac.mode_norms(phi_A))
+    np.testing.assert_allclose(result, mac.mac_matrix(phi_X, phi_A), rtol=1e-12)
+
+
+def test_mac_matrix_empty_stack():
+    assert mac.mac_matrix(make_stack(3), np.empty((0, 6))).shape == (3, 0)
+
+
+def test_mac_matrix_location_mismatch():
+    with pytest.raises(ValueError):
+        mac.mac_matrix(make_stack(3, n_locations=4), make_stack(3, n_locations=5))
+
+
+def test_mac_pairs_broadcasts():
+    phi_X, phi_A = make_stack(7), make_stack(7, seed=1)
+    np.testing.assert_allclose(mac.mac_pairs(phi_X, phi_A),
+                               [pair_mac(x, a) for x, a in zip(phi_X, phi_A)], rtol=1e-12)
+    np.testing.assert_allclose(mac.mac_pairs(phi_X[0], phi_A),
+                               mac.mac_matrix(phi_X[0], phi_A)[0], rtol=1e-12)
+
+
+def test_call_sites_use_same_values():
+    phi_X, phi_A = make_stack(4), make_stack(3, seed=1)
+    expected = mac.mac_matrix(phi_X, phi_A)
+    np.testing.assert_allclose(gen.MAC(phi_X.T, phi_A.T), expected, rtol=1e-12)
+    assert gen.MAC(phi_X[0], phi_A[0]) == pytest.approx(expected[0, 0])
+    assert calculate_mac(phi_X[1], phi_A[2]) == pytest.approx(expected[1, 2])
+    assert MAC_calculate(phi_X[3], phi_A[0]) == pytest.approx(expected[3, 0])
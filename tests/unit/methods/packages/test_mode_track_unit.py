@@ -0,0 +1,103 @@
+# pylint: disable=invalid-name
+import pytest
+import numpy as np
+from methods.packages.mode_track import (
+    _poles_in_bounds, _sorted_pole_index, cluster_frequencies, clusterexpansion)
+
+pytestmark = pytest.mark.unit
+
+
+def make_grid():
+    """Three poles over four model orders; the poles around 2 Hz but (1, 3) are one mode."""
+    frequencies = np.array([[np.nan, 2.00, 2.01, 2.02],
+                            [np.nan, np.nan, 5.00, 2.015],
+                            [np.nan, np.nan, 2.005, 9.00]])
+    damping = np.full(frequencies.shape, 0.02)
+    damping[np.isnan(frequencies)] = np.nan
+    cov = np.full(frequencies.shape, 1e-4)
+    mode_shapes = np.zeros(frequencies.shape + (2,), dtype=complex)
+    mode_shapes[..., 0] = 1
+    mode_shapes[1, 3] = [0, 1]  # Close in frequency, but another shape
+    return frequencies, damping, cov, mode_shapes
+
+
+def make_cluster(indices, frequencies, damping):
+    """The cluster and the grids without its members, as mode_allingment passes them."""
+    indices = np.array(indices)
+    cluster = {"ip_index": tuple(indices[0]), "indices": indices,
+               "f_values": frequencies[tuple(indices.T)], "z_values": damping[tuple(indices.T)]}
+    frequencies, damping = frequencies.copy(), damping.copy()
+    frequencies[tuple(indices.T)] = np.nan
+    damping[tuple(indices.T)] = np.nan
+    return cluster, frequencies, damping
+
+
+def test_cluster_frequencies_with_mask_matches_masked_copies():
+    frequencies, damping, cov, mode_shapes = make_grid()
+    unclustered = ~np.isnan(frequencies)
+    unclustered[0, 1] = False
+    seeds = (frequencies[:, -1], cov[:, -1], damping[:, -1], cov[:, -1], mode_shapes[:, -1])
+
+    masked = np.where(unclustered, frequencies, np.nan), np.where(unclustered, damping, np.nan)
+    expected = cluster_frequencies(*masked, mode_shapes, *seeds, tMAC=0.9)
+    result = cluster_frequencies(frequencies, damping, mode_shapes, *seeds, tMAC=0.9,
+                                 unclustered=unclustered)
+
+    assert len(result[0]) == len(expected[0])
+    for cluster, expected_cluster in zip(result[0], expected[0]):
+        assert np.array_equal(cluster["indices"], expected_cluster["indices"])
+        assert np.array_equal(cluster["f_values"], expected_cluster["f_values"])
+    for array, expected_array in zip(result[1:], expected[1:]):
+        assert np.array_equal(array, expected_array, equal_nan=True)
+
+
+def test_clusterexpansion_adds_candidates_with_matching_shape():
+    frequencies, damping, cov, mode_shapes = make_grid()
+    cluster, frequencies, damping = make_cluster([[0, 1], [0, 2]], frequencies, damping)
+    unclustered = np.argwhere(~np.isnan(frequencies))
+
+    clusters, f_left, z_left, indices_left = clusterexpansion(
+        [cluster], frequencies, damping, cov, cov, mode_shapes, unclustered, tMAC=0.9)
+
+    # Each member adds the candidates with its shape; (1, 3) is in the bounds but has another shape
+    assert np.array_equal(clusters[0]["indices"], [[0, 1], [0, 2], [0, 3], [2, 2], [0, 3], [2, 2]])
+    assert np.array_equal(clusters[0]["f_values"], [2.00, 2.01, 2.02, 2.005, 2.02, 2.005])
+    assert np.array_equal(cluster["indices"], [[0, 1], [0, 2]])
+    assert np.isnan(f_left[0, 1]) and np.isnan(z_left[0, 2])
+    assert f_left[1, 3] == 2.015
+    assert np.array_equal(indices_left, [[0, 3], [1, 2], [1, 3], [2, 2], [2, 3]])
+
+
+def test_clusterexpansion_keeps_cluster_without_new_candidates():
+    frequencies, damping, cov, mode_shapes = make_grid()
+    cluster, frequencies, damping = make_cluster([[2, 3]], frequencies, damping)
+    unclustered = np.argwhere(~np.isnan(frequencies))
+
+    clusters, _, _, indices_left = clusterexpansion(
+        [cluster], frequencies, damping, cov, cov, mode_shapes, unclustered, tMAC=0.9)
+
+    assert np.array_equal(clusters[0]["indices"], [[2, 3]])
+    assert clusters[0]["indices"] is not cluster["indices"]
+    assert np.array_equal(indices_left, [[0, 1], [0, 2], [0, 3], [1, 2], [1, 3], [2, 2]])
+
+
+@pytest.mark.parametrize("bounds", [
+    (2.0, 2.02, 0.0, 1.0),
+    (1.0, 10.0, 0.0, 1.0),
+    (2.01, 2.01, 0.0, 1.0),
+    (3.0, 4.0, 0.0, 1.0),
+    (np.nan, 2.02, 0.0, 1.0),
+    (2.0, np.nan, 0.0, 1.0),
+])
+def test_poles_in_bounds_matches_grid_mask(bounds):
+    frequencies, damping, _, _ = make_grid()
+    frequencies = frequencies[::2]  # Strided, as mode_allingment passes it
+    damping = damping[::2]
+    f_lower, f_upper, z_lower, z_upper = bounds
+    expected = np.argwhere((frequencies >= f_lower) & (frequencies <= f_upper)
+                           & (damping >= z_lower) & (damping <= z_upper))
+
+    result = _poles_in_bounds(_sorted_pole_index(frequencies), frequencies, damping, *bounds)
+
+    assert result.shape == expected.shape
+    assert np.array_equal(result, expected)
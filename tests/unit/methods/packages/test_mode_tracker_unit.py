@@ -0,0 +1,143 @@
+# pylint: disable=invalid-name
+import copy
+import pytest
+import numpy as np
+from methods.packages.mode_track import mode_allingment
+from methods.packages.mode_tracker import ModeTracker
+
+pytestmark = pytest.mark.unit
+
+EXPECTED_PATH = "tests/integration/input_data/expected_sysid_output.npz"
+NPZ_KEYS = {"Fn_poles": "frequencies", "Fn_poles_cov": "cov_freq", "Xi_poles": "damping_ratios",
+            "Xi_poles_cov": "cov_damping", "Phi_poles": "mode_shapes"}
+MSTAB = 4
+TMAC = 0.9
+
+
+@pytest.fixture(name="oma_output")
+def fixture_oma_output():
+    expected = np.load(EXPECTED_PATH)
+    return {key: expected[name] for key, name in NPZ_KEYS.items()}
+
+
+def test_first_update_matches_mode_allingment(oma_output, capsys):
+    expected = mode_allingment(copy.deepcopy(oma_output), MSTAB, TMAC)
+    capsys.readouterr()
+
+    clusters = ModeTracker(MSTAB, TMAC).update(oma_output)
+
+    assert len(clusters) == len(expected) > 0
+    for cluster, expected_cluster in zip(clusters, expected):
+        assert cluster["median"] == expected_cluster["median"]
+        assert np.array_equal(cluster["indices"], expected_cluster["indices"])
+    assert [cluster["mode_id"] for cluster in clusters] == list(range(len(clusters)))
+
+
+def test_update_keeps_mode_ids_of_tracked_modes(oma_output):
+    tracker = ModeTracker(MSTAB, TMAC)
+    first = tracker.update(oma_output)
+
+    second = tracker.update(oma_output)
+
+    assert [c["mode_id"] for c in second] == [c["mode_id"] for c in first]
+    assert np.allclose([c["median"] for c in second], [c["median"] for c in first])
+    assert all(mode.missed == 0 for mode in tracker.modes)
+
+
+def test_update_does_not_modify_the_result(oma_output):
+    original = copy.deepcopy(oma_output)
+    tracker = ModeTracker(MSTAB, TMAC)
+
+    tracker.update(oma_output)
+    tracker.update(oma_output)
+
+    for key, value in original.items():
+        assert np.array_equal(oma_output[key], value, equal_nan=True)
+
+
+def test_missed_modes_are_dropped(oma_output):
+    tracker = ModeTracker(MSTAB, TMAC, max_missed=1)
+    tracker.update(oma_output)
+    empty = dict(oma_output, Fn_poles=np.full(oma_output["Fn_poles"].shape, np.nan))
+
+    assert not tracker.update(empty)
+    assert len(tracker.modes) > 0
+    tracker.update(empty)
+
+    assert not tracker.modes
+
+
+SHAPES = [np.array([1.0, 0.8, 0.3]), np.array([1.0, -0.6, -0.9]), np.array([0.2, 1.0, -0.7])]
+ORDERS = 21
+
+
+def synthetic_output(frequencies, seed=0):
+    """
+    OMA result with a pole of every mode, and its complex conjugate in the next
+    row, at each model order from 2 on. `frequencies` holds one frequency per
+    mode of SHAPES, or None for a mode that is not in the result.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (2 * len(SHAPES), ORDERS)
+    output = {key: np.full(shape, np.nan) for key in NPZ_KEYS if key != "Phi_poles"}
+    output["Phi_poles"] = np.full(shape + (3,), np.nan, dtype=complex)
+    for mode, frequency in enumerate(frequencies):
+        if frequency is None:
+            continue
+        poles = {
+            "Fn_poles": frequency * (1 + 1e-3 * rng.normal(size=ORDERS - 2)),
+            "Fn_poles_cov": (2e-3 * frequency) ** 2,
+            "Xi_poles": 0.02 * (1 + 1e-2 * rng.normal(size=ORDERS - 2)),
+            "Xi_poles_cov": 0.005 ** 2,
+            "Phi_poles": SHAPES[mode] + 1e-2 * rng.normal(size=(ORDERS - 2, 3)),
+        }
+        for key, values in poles.items():
+            output[key][2 * mode:2 * mode + 2, 2:] = values
+    return output
+
+
+def track(tracker, windows):
+    """(mode_id, median) pairs of every window, sorted by mode_id."""
+    return [sorted((cluster["mode_id"], cluster["median"]) for cluster in tracker.update(output))
+            for output in windows]
+
+
+def test_drifting_mode_keeps_its_id(capsys):
+    # The first mode moves by 0.6 % per window, 3 % in total
+    windows = [synthetic_output([1.0 * 1.006 ** i, 2.0, None], seed=i) for i in range(6)]
+
+    tracked = track(ModeTracker(MSTAB, TMAC), windows)
+    capsys.readouterr()
+
+    for i, modes in enumerate(tracked):
+        assert [mode_id for mode_id, _ in modes] == [0, 1]
+        assert modes[0][1] == pytest.approx(1.006 ** i, rel=2e-3)
+        assert modes[1][1] == pytest.approx(2.0, rel=2e-3)
+
+
+def test_missed_mode_keeps_its_id_until_dropped(capsys):
+    tracker = ModeTracker(MSTAB, TMAC, max_missed=2)
+    present, missing = [1.0, 2.0, None], [1.0, None, None]
+    windows = [present, missing, missing, present, missing, missing, missing, present]
+
+    tracked = track(tracker, [synthetic_output(modes, seed=i) for i, modes in enumerate(windows)])
+    capsys.readouterr()
+
+    assert [[mode_id for mode_id, _ in modes] for modes in tracked] == [
+        [0, 1], [0], [0], [0, 1], [0], [0], [0], [0, 2]]
+    assert tracked[3][1][1] == pytest.approx(2.0, rel=2e-3)
+    assert tracked[7][1][1] == pytest.approx(2.0, rel=2e-3)
+
+
+def test_new_mode_gets_a_new_id(capsys):
+    before, after = [1.0, 2.0, None], [1.0, 2.0, 3.0]
+    windows = [before, before, after, after]
+    tracker = ModeTracker(MSTAB, TMAC)
+
+    tracked = track(tracker, [synthetic_output(modes, seed=i) for i, modes in enumerate(windows)])
+    capsys.readouterr()
+
+    assert [[mode_id for mode_id, _ in modes] for modes in tracked] == [
+        [0, 1], [0, 1], [0, 1, 2], [0, 1, 2]]
+    assert tracked[3][2][1] == pytest.approx(3.0, rel=2e-3)
+    assert [mode.mode_id for mode in tracker.modes] == [0, 1, 2]
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+import numpy as np
+from methods import model_update_module as MT
+from methods import oma_codec
+from methods.packages.mode_tracker import ModeTracker
+
+pytestmark = pytest.mark.unit
+
+EXPECTED_PATH = "tests/integration/input_data/expected_sysid_output.npz"
+NPZ_KEYS = {"Fn_poles": "frequencies", "Fn_poles_cov": "cov_freq", "Xi_poles": "damping_ratios",
+            "Xi_poles_cov": "cov_damping", "Phi_poles": "mode_shapes"}
+
+
+@pytest.fixture(name="payload")
+def fixture_payload():
+    expected = np.load(EXPECTED_PATH)
+    oma_output = {key: expected[name] for key, name in NPZ_KEYS.items()}
+    return oma_codec.encode(oma_output, "2024-01-01T00:00:30")
+
+
+@pytest.fixture(name="mqtt_client")
+def fixture_mqtt_client(monkeypatch):
+    client = MagicMock()
+    monkeypatch.setattr(MT, "load_config", lambda _: {"sysID": {"host": "localhost", "port": 1883}})
+    monkeypatch.setattr(MT, "setup_mqtt_client", lambda *_, **__: (client, "oma/results"))
+    return client
+
+
+def test_track_oma_results_tracks_every_message_with_one_tracker(mqtt_client, payload, capsys):
+    tracker = ModeTracker(MT.MODEL_ORDER * MT.MSTAB_FACTOR, MT.TMAC)
+    message = SimpleNamespace(topic="oma/results", payload=payload)
+    mqtt_client.loop_start.side_effect = lambda: MT._on_message(mqtt_client, None, message)
+    results = MT.track_oma_results("config.json", tracker)
+
+    first, first_medians, _ = next(results)
+    MT._on_message(mqtt_client, None, message)
+    second, second_medians, _ = next(results)
+    results.close()
+    capsys.readouterr()
+
+    assert len(first) > 0
+    assert [c["mode_id"] for c in second] == [c["mode_id"] for c in first]
+    assert np.allclose(second_medians, first_medians)
+    assert {mode.mode_id for mode in tracker.modes} == {c["mode_id"] for c in first}
+    mqtt_client.loop_stop.assert_called_once()
+    mqtt_client.disconnect.assert_called_once()
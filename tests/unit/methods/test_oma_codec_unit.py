@@ -0,0 +1,89 @@
+import json
+import pytest
+import numpy as np
+from methods import oma_codec
+from methods.model_update_module import _convert_oma_output
+from functions.util import convert_numpy_to_list
+
+pytestmark = pytest.mark.unit
+
+TIMESTAMP = "2024-01-01T00:00:30"
+
+
+def oma_output():
+    rng = np.random.default_rng(0)
+    return {
+        "Fn_poles": rng.random((20, 21)),
+        "Fn_poles_cov": rng.random((20, 21)),
+        "Xi_poles": rng.random((20, 21)),
+        "Xi_poles_cov": None,
+        "Phi_poles": rng.random((20, 21, 4)) + 1j * rng.random((20, 21, 4)),
+        "Lab": rng.integers(0, 4, size=(20, 21)),
+    }
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(compress):
+    expected = oma_output()
+    expected["Fn_poles"][3, 5] = np.nan
+
+    decoded, timestamp = oma_codec.decode(oma_codec.encode(expected, TIMESTAMP, compress))
+
+    assert timestamp == TIMESTAMP
+    assert list(decoded) == list(expected)
+    assert decoded["Xi_poles_cov"] is None
+    for name, array in expected.items():
+        if array is not None:
+            assert decoded[name].dtype == array.dtype
+            assert np.array_equal(decoded[name], array, equal_nan=True)
+
+
+def test_decoded_arrays_are_writable():
+    decoded, _ = oma_codec.decode(oma_codec.encode(oma_output(), TIMESTAMP))
+    decoded["Fn_poles"][0, 0] = 1.0
+
+
+def test_encode_accepts_lists_and_scalars():
+    decoded, _ = oma_codec.decode(oma_codec.encode({"Lab": ["a", "bc"], "order": 3}, TIMESTAMP))
+    assert decoded["Lab"].tolist() == ["a", "bc"]
+    assert decoded["order"].shape == () and decoded["order"] == 3
+
+
+def test_encode_rejects_ragged_fields():
+    with pytest.raises(ValueError):
+        oma_codec.encode({"Fn_poles": np.array([[1.0], [1.0, 2.0]], dtype=object)}, TIMESTAMP)
+
+
+@pytest.mark.parametrize("oma_output_fields", [
+    {"F" * 256: np.zeros(3)},
+    {"F" * 256: None},
+    {f"field_{i}": None for i in range(0x10000)},
+])
+def test_encode_rejects_fields_beyond_descriptor_limits(oma_output_fields):
+    with pytest.raises(ValueError):
+        oma_codec.encode(oma_output_fields, TIMESTAMP)
+
+
+def test_binary_is_smaller_than_json():
+    output = oma_output()
+    binary = oma_codec.encode(output, TIMESTAMP)
+    message = json.dumps({"timestamp": TIMESTAMP, "OMA_output": convert_numpy_to_list(output)})
+    assert len(binary) < len(message) / 2
+
+
+def test_decode_rejects_truncated_message():
+    payload = oma_codec.encode(oma_output(), TIMESTAMP)
+    with pytest.raises(ValueError):
+        oma_codec.decode(payload[:40])
+
+
+def test_decode_message_reads_binary_and_json():
+    output = oma_output()
+    message = json.dumps({"timestamp": TIMESTAMP, "OMA_output": convert_numpy_to_list(output)})
+
+    from_binary, _ = oma_codec.decode_message(oma_codec.encode(output, TIMESTAMP))
+    from_json, timestamp = oma_codec.decode_message(message.encode(), _convert_oma_output)
+
+    assert timestamp == TIMESTAMP
+    assert np.allclose(from_json["Phi_poles"], from_binary["Phi_poles"])
+    assert np.array_equal(from_json["Lab"], from_binary["Lab"])
@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import Future
+import pytest
+import numpy as np
+from methods.sys_id import sysid
+from methods.sys_id_service import SysIdService
+
+pytestmark = pytest.mark.unit
+
+OMA_PARAMS = {
+    "Fs": 100.0,
+    "block_shift": 5,
+    "model_order": 6
+}
+
+
+@pytest.fixture(scope="module")
+def service():
+    with SysIdService(OMA_PARAMS, max_workers=2) as sysid_service:
+        yield sysid_service
+
+
+def wait_until_released(sysid_service, timeout=5):
+    deadline = time.monotonic() + timeout
+    while sysid_service.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return sysid_service.pending() == 0
+
+
+def test_submit_returns_sysid_output(service):
+    data = np.random.default_rng(0).normal(size=(600, 3))
+
+    future = service.submit(data)
+
+    assert isinstance(future, Future)
+    result = future.result(timeout=60)
+    expected = sysid(data, OMA_PARAMS)
+    assert result.keys() == expected.keys()
+    assert np.allclose(result["Fn_poles"], expected["Fn_poles"], equal_nan=True)
+    assert np.array_equal(result["Lab"], expected["Lab"])
+    assert wait_until_released(service)
+
+
+def test_windows_are_analysed_in_parallel(service):
+    rng = np.random.default_rng(1)
+    windows = [rng.normal(size=(3, 600)).astype(np.float32) for _ in range(3)]
+
+    futures = [service.submit(window) for window in windows]
+
+    for window, future in zip(windows, futures):
+        result = future.result(timeout=60)
+        assert np.allclose(result["Fn_poles"], sysid(window, OMA_PARAMS)["Fn_poles"],
+                           equal_nan=True)
+    assert wait_until_released(service)
+
+
+def test_failure_is_raised_by_future_and_frees_window(service):
+    future = service.submit(np.zeros((10, 3)))
+
+    with pytest.raises(Exception):
+        future.result(timeout=60)
+    assert wait_until_released(service)
@@ -7,8 +7,18 @@ from methods.sys_id import (
     sysid,
     get_oma_results,
     publish_oma_results,
+    wait_for_oma_results,
     setup_client,
+    streaming_sysid,
+    submit_oma_window,
+    _encode_oma_output,
 )
+from concurrent.futures import Future
+from data.accel.aligner import AlignedWindow
+from data.accel.hbk.aligner import Aligner
+from data.accel.metadata import MetadataService
+from methods import oma_codec
+from methods.constants import DEFAULT_FS
 from paho.mqtt.client import Client as MQTTClient
 
 
@@ -33,6 +43,18 @@ def test_sysid_returns_expected_keys(sample_data, oma_params):
     assert expected_keys.issubset(result.keys())
 
 
+def test_sysid_uses_frequency_and_damping_uncertainty(sample_data, oma_params):
+    result = sysid(sample_data, oma_params)
+    assert np.isfinite(result['Fn_poles_cov']).any()
+    assert np.isfinite(result['Xi_poles_cov']).any()
+
+
+def test_sysid_without_uncertainty(sample_data, oma_params):
+    result = sysid(sample_data, {**oma_params, "uncertainty": "none"})
+    assert result['Fn_poles_cov'] is None
+    assert np.isfinite(result['Fn_poles']).any()
+
+
 def test_sysid_transposes_data_if_needed(oma_params):
     data = np.random.randn(3, 600)  # More columns than rows
     result = sysid(data, oma_params)
@@ -98,8 +120,6 @@ def test_publish_oma_results_retries_and_publishes_once(mocker):
         'Lab': ['mode1', 'mode2']
     }
 
-    mocker.patch("methods.sys_id.time.sleep", return_value=None)
-
     mocker.patch(
         "methods.sys_id.get_oma_results",
         side_effect=[
@@ -123,24 +143,263 @@ def test_publish_oma_results_retries_and_publishes_once(mocker):
     assert mock_client.publish.called
     assert mock_client.publish.call_count == 1
     assert mock_client.publish.call_args[0][0] == "test/topic"
+    assert aligner.wait_for.call_count == 2
 
 
 def test_setup_client_with_multiple_topics(mocker):
     mqtt_config = {
         "host": "localhost",
         "port": 1883,
-        "topics": ["topic1", "topic2"]
+        "TopicsToSubscribe": ["topic1", "topic2"]
     }
 
-    extract_mock = mocker.patch("methods.sys_id.extract_fs_from_metadata", return_value=123.0)
+    service = mocker.patch("methods.sys_id.MetadataService")
+    service.return_value.get_fs.return_value = 123.0
 
     mock_mqtt_client = MagicMock()
     mocker.patch("methods.sys_id.setup_mqtt_client", return_value=(mock_mqtt_client, None))
 
-    client, fs = setup_client(mqtt_config)
+    client, fs = setup_client(mqtt_config, metadata_cache=None)
 
-    extract_mock.assert_called_once_with(mqtt_config)
+    service.assert_called_once_with(mock_mqtt_client, "topic2", cache_file=None, qos=1)
     client.connect.assert_called_once_with("localhost", 1883, 60)
     client.loop_start.assert_called_once()
     assert client == mock_mqtt_client
     assert fs == 123.0
+
+
+def test_setup_client_falls_back_to_default_fs(mocker):
+    mqtt_config = {"host": "localhost", "port": 1883, "TopicsToSubscribe": ["topic1", "topic2"]}
+    service = mocker.patch("methods.sys_id.MetadataService")
+    service.return_value.get_fs.return_value = None
+    mocker.patch("methods.sys_id.setup_mqtt_client", return_value=(MagicMock(), None))
+
+    _, fs = setup_client(mqtt_config, metadata_cache=None)
+
+    assert fs == DEFAULT_FS
+
+
+def test_publish_oma_results_follows_metadata_fs(mocker):
+    wait = mocker.patch(
+        "methods.sys_id.wait_for_oma_results",
+        side_effect=[({"Fn_poles": [1.0]}, datetime(2024, 1, 1)), KeyboardInterrupt])
+    metadata = MagicMock()
+    metadata.get_fs.return_value = 200
+    mock_client = MagicMock(spec=MQTTClient)
+    mock_client.is_connected.return_value = True
+
+    publish_oma_results(0.1, MagicMock(), mock_client, "test/topic", 100, metadata=metadata)
+
+    assert wait.call_args_list[0][0][2] == 200
+
+
+def metadata_message(fs):
+    return MagicMock(topic="meta",
+                     payload=json.dumps({"Analysis chain": [{"Sampling": fs}]}).encode())
+
+
+def test_publish_oma_results_resets_aligner_when_fs_changes_mid_stream(mocker):
+    metadata = MetadataService(MagicMock(), "meta", cache_file=None)
+    metadata._on_message(None, None, metadata_message(100))
+    aligner = Aligner(MagicMock(), ["t1", "t2"])
+    for ch in aligner.channels:
+        ch._store(0, np.zeros(60, dtype=np.float32))
+    windows = iter([1.0, 2.0])
+
+    def wait(sampling_period, aligner_, fs, **kwargs):
+        fn = next(windows, None)
+        if fn is None:
+            raise KeyboardInterrupt
+        if fn == 1.0:
+            # The new rate is announced while the window at the old one is collected
+            metadata._on_message(None, None, metadata_message(200))
+        return {"Fn_poles": [fn], "fs": fs}, datetime(2024, 1, 1)
+
+    waits = mocker.patch("methods.sys_id.wait_for_oma_results", side_effect=wait)
+    mock_client = MagicMock(spec=MQTTClient)
+    mock_client.is_connected.return_value = True
+
+    publish_oma_results(0.01, aligner, mock_client, "test/topic", 100, hop_period=0.005,
+                        metadata=metadata, payload_format="json")
+
+    # The buffered samples at 100 Hz are gone, and the straddling window is not published
+    assert aligner.available_samples() == 0
+    assert all(ch.get_sorted_keys() == [] for ch in aligner.channels)
+    assert [c.args[2] for c in waits.call_args_list] == [100, 200, 200]
+    assert mock_client.publish.call_count == 1
+    published = json.loads(mock_client.publish.call_args.args[1])
+    assert published["OMA_output"]["Fn_poles"] == [2.0]
+    assert metadata._listeners == []
+    aligner.close()
+
+
+def test_wait_for_oma_results_timeout(mocker):
+    get_results = mocker.patch("methods.sys_id.get_oma_results")
+    aligner = MagicMock()
+    aligner.wait_for.return_value = False
+
+    assert wait_for_oma_results(0.1, aligner, 100, timeout=1) == (None, None)
+    aligner.wait_for.assert_called_once_with(600, 1)
+    get_results.assert_not_called()
+
+
+def test_get_oma_results_with_hop_period(mocker):
+    mocker.patch("methods.sys_id.sysid", return_value={"Fn_poles": []})
+    aligner = MagicMock()
+    aligner.extract.return_value = (np.random.randn(3, 600), datetime.now())
+
+    result, _ = get_oma_results(0.1, aligner, 100, hop_period=0.01)
+
+    assert result == {"Fn_poles": []}
+    aligner.extract.assert_called_once_with(600, 60)
+
+
+def test_get_oma_results_with_estimator_matches_sysid(oma_params):
+    data = np.random.randn(3, 900)
+    estimator = streaming_sysid(oma_params, 600)
+    aligner = MagicMock()
+    aligner.extract_window.side_effect = [
+        AlignedWindow(data[:, :600], datetime.now(), start_index=0),
+        AlignedWindow(data[:, 300:], datetime.now(), start_index=300),
+    ]
+
+    get_oma_results(0.1, aligner, 100, hop_period=0.05, estimator=estimator)
+    result, _ = get_oma_results(0.1, aligner, 100, hop_period=0.05, estimator=estimator)
+
+    aligner.extract_window.assert_called_with(600, 300)
+    assert estimator.samples_seen == 900
+    expected = sysid(data[:, 300:], oma_params)
+    assert np.allclose(result["Fn_poles"], expected["Fn_poles"], equal_nan=True)
+    assert np.array_equal(result["Lab"], expected["Lab"])
+
+
+def test_publish_oma_results_with_hop_period_keeps_publishing(mocker):
+    mocker.patch(
+        "methods.sys_id.get_oma_results",
+        side_effect=[
+            ({"Fn_poles": [1.0]}, datetime(2024, 1, 1)),
+            ({"Fn_poles": [1.1]}, datetime(2024, 1, 1, 0, 0, 30)),
+            KeyboardInterrupt,
+        ]
+    )
+    mock_client = MagicMock(spec=MQTTClient)
+    mock_client.is_connected.return_value = True
+    aligner = MagicMock()
+
+    publish_oma_results(5, aligner, mock_client, "test/topic", 100, hop_period=0.5)
+
+    assert mock_client.publish.call_count == 2
+    mock_client.disconnect.assert_called_once()
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_publish_oma_results_streams_only_when_asked(mocker, streaming):
+    wait = mocker.patch("methods.sys_id.wait_for_oma_results", side_effect=KeyboardInterrupt)
+    mock_client = MagicMock(spec=MQTTClient)
+
+    publish_oma_results(0.1, MagicMock(), mock_client, "test/topic", 100, hop_period=0.05,
+                        streaming=streaming)
+
+    estimator = wait.call_args.kwargs["estimator"]
+    assert (estimator is not None) == streaming
+
+
+def completed_future(result=None, exception=None):
+    future = Future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+def test_submit_oma_window_does_not_wait_for_analysis():
+    aligner = MagicMock()
+    aligner.wait_for.return_value = True
+    data = np.random.randn(3, 600)
+    aligner.extract.return_value = (data, datetime(2024, 1, 1))
+    service = MagicMock()
+
+    future, timestamp = submit_oma_window(0.1, aligner, 100, service, timeout=1, hop_period=0.05)
+
+    aligner.extract.assert_called_once_with(600, 300)
+    service.submit.assert_called_once()
+    assert service.submit.call_args[0][0] is data
+    assert future is service.submit.return_value
+    assert timestamp == datetime(2024, 1, 1)
+
+
+def test_publish_oma_results_with_service_retries_failed_analysis():
+    aligner = MagicMock()
+    aligner.wait_for.return_value = True
+    aligner.extract.return_value = (np.random.randn(3, 600), datetime(2024, 1, 1))
+    service = MagicMock()
+    service.submit.side_effect = [
+        completed_future(exception=ValueError("fail")),
+        completed_future({"Fn_poles": np.array([1.0])}),
+    ]
+    mock_client = MagicMock(spec=MQTTClient)
+    mock_client.is_connected.return_value = True
+
+    publish_oma_results(0.1, aligner, mock_client, "test/topic", 100, service=service)
+
+    assert service.submit.call_count == 2
+    mock_client.publish.assert_called_once()
+    oma_output, timestamp = oma_codec.decode(mock_client.publish.call_args[0][1])
+    assert np.array_equal(oma_output["Fn_poles"], [1.0])
+    assert timestamp == datetime(2024, 1, 1).isoformat()
+
+
+def test_publish_oma_results_as_json():
+    aligner = MagicMock()
+    aligner.wait_for.return_value = True
+    aligner.extract.return_value = (np.random.randn(3, 600), datetime(2024, 1, 1))
+    service = MagicMock()
+    service.submit.return_value = completed_future({"Fn_poles": np.array([1.0])})
+    mock_client = MagicMock(spec=MQTTClient)
+    mock_client.is_connected.return_value = True
+
+    publish_oma_results(0.1, aligner, mock_client, "test/topic", 100, service=service,
+                        payload_format="json")
+
+    assert json.loads(mock_client.publish.call_args[0][1])["OMA_output"] == {"Fn_poles": [1.0]}
+
+
+def test_publish_oma_results_falls_back_to_json_for_ragged_fields():
+    aligner = MagicMock()
+    aligner.wait_for.return_value = True
+    aligner.extract.return_value = (np.random.randn(3, 600), datetime(2024, 1, 1))
+    service = MagicMock()
+    service.submit.return_value = completed_future({"Fn_poles": [[1.0], [1.0, 2.0]]})
+    mock_client = MagicMock(spec=MQTTClient)
+    mock_client.is_connected.return_value = True
+
+    publish_oma_results(0.1, aligner, mock_client, "test/topic", 100, service=service)
+
+    assert json.loads(mock_client.publish.call_args[0][1])["OMA_output"] == {
+        "Fn_poles": [[1.0], [1.0, 2.0]]}
+
+
+def test_encode_oma_output_falls_back_to_json_for_long_field_names():
+    payload = _encode_oma_output({"F" * 300: np.zeros(2)}, datetime(2024, 1, 1), "binary")
+
+    assert json.loads(payload)["OMA_output"] == {"F" * 300: [0.0, 0.0]}
+
+
+def test_publish_oma_results_with_service_publishes_when_done():
+    aligner = MagicMock()
+    aligner.wait_for.side_effect = [True, True, KeyboardInterrupt]
+    aligner.extract.return_value = (np.random.randn(3, 600), datetime(2024, 1, 1))
+    pending = Future()
+    service = MagicMock()
+    service.submit.side_effect = [completed_future({"Fn_poles": [1.0]}), pending]
+    mock_client = MagicMock(spec=MQTTClient)
+    mock_client.is_connected.return_value = True
+
+    publish_oma_results(0.1, aligner, mock_client, "test/topic", 100, hop_period=0.05,
+                        service=service)
+
+    # The loop went on while the second window was still being analysed
+    assert mock_client.publish.call_count == 1
+    pending.set_result({"Fn_poles": [1.1]})
+    assert mock_client.publish.call_count == 2
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+from datetime import datetime
+import pytest
+from binary_log import (
+    MAGIC, RECORD_HEADER, BinaryLogWriter, binary_to_jsonl, chunk_paths, jsonl_to_binary,
+    read_binary_log)
+
+pytestmark = pytest.mark.unit
+
+MESSAGES = [
+    (datetime(2025, 5, 1, 12, 0, 0, 123456), b"\x00\x01\x02"),
+    (datetime(2025, 5, 1, 12, 0, 1), b""),
+    (datetime(2025, 5, 1, 12, 0, 2, 500), bytes(range(256))),
+]
+
+
+def write_jsonl(path, messages):
+    with open(path, "w", encoding="utf-8") as file:
+        for timestamp, payload in messages:
+            file.write(json.dumps({"timestamp": timestamp.isoformat(),
+                                   "payload": list(payload)}) + "\n")
+
+
+def test_jsonl_binary_round_trip(tmp_path):
+    jsonl_path = tmp_path / "data1.jsonl"
+    write_jsonl(jsonl_path, MESSAGES)
+
+    assert jsonl_to_binary(str(jsonl_path), str(tmp_path / "data1.mqlog")) == 3
+    assert list(read_binary_log(str(tmp_path / "data1.mqlog"))) == MESSAGES
+    assert binary_to_jsonl(str(tmp_path / "data1.mqlog"), str(tmp_path / "back.jsonl")) == 3
+
+    assert (tmp_path / "back.jsonl").read_text() == jsonl_path.read_text()
+
+
+def test_writer_rolls_over_to_numbered_chunks(tmp_path):
+    base = str(tmp_path / "logs" / "data1")
+    record_size = RECORD_HEADER.size + 10
+    writer = BinaryLogWriter(base, chunk_size=len(MAGIC) + 2 * record_size)
+    for second in range(5):
+        writer.write(bytes([second]) * 10, datetime(2025, 5, 1, 12, 0, second))
+    writer.close()
+
+    paths = list(chunk_paths(base))
+    assert [os.path.basename(p) for p in paths] == [
+        "data1.0000.mqlog", "data1.0001.mqlog", "data1.0002.mqlog"]
+    assert [len(list(read_binary_log(p))) for p in paths] == [2, 2, 1]
+    assert list(read_binary_log(paths[2])) == [(datetime(2025, 5, 1, 12, 0, 4), b"\x04" * 10)]
+
+    # A new writer continues after the existing chunks
+    writer = BinaryLogWriter(base)
+    writer.write(b"next")
+    writer.close()
+    assert len(list(chunk_paths(base))) == 4
+
+
+def test_reading_stops_at_truncated_last_record(tmp_path):
+    path = tmp_path / "data1.mqlog"
+    jsonl_path = tmp_path / "data1.jsonl"
+    write_jsonl(jsonl_path, MESSAGES)
+    jsonl_to_binary(str(jsonl_path), str(path))
+    data = path.read_bytes()
+
+    path.write_bytes(data[:-1])
+    assert list(read_binary_log(str(path))) == MESSAGES[:2]
+    path.write_bytes(data[:-len(MESSAGES[2][1]) - 3])
+    assert list(read_binary_log(str(path))) == MESSAGES[:2]
+
+
+def test_reading_other_file_raises(tmp_path):
+    path = tmp_path / "data1.mqlog"
+    path.write_bytes(b"{}\n")
+
+    with pytest.raises(ValueError):
+        list(read_binary_log(str(path)))
+
+
+def test_idle_writer_flushes_on_timer(tmp_path):
+    base = str(tmp_path / "data1")
+    writer = BinaryLogWriter(base, fsync_interval=0.01)
+    synced = threading.Event()
+    sync = writer._sync
+
+    def record_sync():
+        sync()
+        synced.set()
+
+    writer._sync = record_sync
+    writer.write(b"tail", datetime(2025, 5, 1))
+
+    # No further write or close is needed for the record to reach the file
+    assert synced.wait(timeout=2)
+    assert list(read_binary_log(writer.chunk_path(0))) == [(datetime(2025, 5, 1), b"tail")]
+    writer.close()
+    assert not writer._flusher.is_alive()